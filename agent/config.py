@@ -4,6 +4,7 @@ Define configuraciones, constantes y parámetros del sistema.
 """
 
 import os
+import tempfile
 from typing import List
 
 # Configuración de logging
@@ -54,14 +55,17 @@ SOUND_TYPES = [
 PATHS = {
     'audio_fragments': 'audio_fragments',
     'models': 'models',
-    'temp': 'temp'
+    'temp': 'temp',
+    'cache': 'cache'
 }
 
 # Configuración del workflow
 WORKFLOW_CONFIG = {
     'max_execution_time': 30,  # Tiempo máximo de ejecución en segundos
     'retry_attempts': 3,       # Número de intentos de reintento
-    'cleanup_temp_files': True # Limpiar archivos temporales
+    'cleanup_temp_files': True, # Limpiar archivos temporales
+    'conversation_sound_type': 'Speech',  # Sonido principal que se considera conversación
+    'conversation_min_confidence': 0.5  # Confianza mínima (estricta) para transcribir
 }
 
 # Mensajes del sistema
@@ -91,16 +95,28 @@ def get_models_folder() -> str:
     """Obtiene la ruta de la carpeta de modelos."""
     return os.path.join(os.getcwd(), PATHS['models'])
 
+def is_conversation(sound_type: str, confidence: float) -> bool:
+    """Regla del workflow para transcribir: el sonido principal es voz con confianza suficiente."""
+    return (
+        sound_type == WORKFLOW_CONFIG['conversation_sound_type']
+        and confidence > WORKFLOW_CONFIG['conversation_min_confidence']
+    )
+
 def get_temp_folder() -> str:
     """Obtiene la ruta de la carpeta temporal."""
     return os.path.join(os.getcwd(), PATHS['temp'])
 
+def get_cache_folder() -> str:
+    """Obtiene la ruta de la carpeta de cachés de resultados."""
+    return os.path.join(os.getcwd(), PATHS['cache'])
+
 def create_directories():
     """Crea las carpetas necesarias si no existen."""
     directories = [
         get_audio_folder(),
         get_models_folder(),
-        get_temp_folder()
+        get_temp_folder(),
+        get_cache_folder()
     ]
     
     for directory in directories:
@@ -165,10 +181,245 @@ SOUND_FILTER_CONFIG = {
     'enabled': True,  # Habilitar filtro de sonidos relevantes
     'min_confidence': 0.3,  # Confianza mínima para considerar un sonido relevante
     'include_unknown': False,  # Incluir sonidos no clasificados
+    'max_detections': 0,  # Máximo de detecciones relevantes por clip (0 = todas las que superan min_confidence)
     'alert_categories': {
         'danger_alert': '🔴 Peligro',
         'attention_alert': '🟡 Atención', 
         'social_alert': '🟢 Social',
         'environment_alert': '�� Entorno'
+    },
+    'critical_categories': ['danger_alert']  # Los tipos de sonido nuevos de estas categorías se marcan como críticos
+}
+
+# Configuración del análisis en streaming (línea temporal de eventos)
+STREAMING_ANALYSIS_CONFIG = {
+    'enabled': True,  # Usar la línea temporal en lugar de la media de todo el clip
+    'block_frames': 16,  # Frames de YAMNet (0.96 s / 0.48 s) por inferencia, acota la memoria
+    'read_block_samples': 65536,  # Muestras leídas del archivo en cada bloque
+    'max_gap_frames': 1,  # Frames por debajo del umbral tolerados dentro de un evento
+    'min_event_frames': 1  # Frames mínimos para reportar un evento
+}
+
+# Configuración del micro-batching de inferencias YAMNet entre peticiones concurrentes
+YAMNET_BATCHING_CONFIG = {
+    'enabled': True,
+    'max_batch_size': 8,  # Peticiones máximas por pasada del modelo
+    'max_wait_ms': 10,  # Espera máxima desde la primera petición del lote
+    'max_batch_seconds': 120  # Duración máxima de audio empaquetado por lote
+}
+
+# Registro local de artefactos de modelos (rutas relativas a la carpeta de modelos).
+# 'source' es el identificador remoto que se usa si el artefacto no está en local.
+MODEL_REGISTRY = {
+    'yamnet': {'kind': 'tfhub', 'path': 'yamnet', 'source': 'https://tfhub.dev/google/yamnet/1'},
+    'yamnet_class_map': {
+        'kind': 'url',
+        'path': 'yamnet_class_map.csv',
+        'source': 'https://raw.githubusercontent.com/tensorflow/models/master/research/audioset/yamnet/yamnet_class_map.csv'
+    },
+    'whisper_tiny': {'kind': 'whisper', 'path': 'whisper/tiny', 'source': 'tiny'},
+    'whisper_base': {'kind': 'whisper', 'path': 'whisper/base', 'source': 'base'},
+    'whisper_small': {'kind': 'whisper', 'path': 'whisper/small', 'source': 'small'},
+    'whisper_medium': {'kind': 'whisper', 'path': 'whisper/medium', 'source': 'medium'},
+    'whisper_large': {'kind': 'whisper', 'path': 'whisper/large', 'source': 'large'},
+    'hf_embeddings': {
+        'kind': 'huggingface',
+        'path': 'embeddings/all-MiniLM-L6-v2',
+        'source': 'sentence-transformers/all-MiniLM-L6-v2'
+    },
+    'stable_diffusion': {
+        'kind': 'huggingface',
+        'path': 'diffusion/dreamlike-anime-1.0',
+        'source': 'dreamlike-art/dreamlike-anime-1.0'
+    },
+    # Backends ligeros de YAMNet generados con `manage.py export_yamnet_backends`
+    'yamnet_tflite': {'kind': 'derived', 'path': 'yamnet_backends/yamnet.tflite', 'source': 'yamnet'},
+    'yamnet_tflite_int8': {'kind': 'derived', 'path': 'yamnet_backends/yamnet_int8.tflite', 'source': 'yamnet'},
+    'yamnet_onnx': {'kind': 'derived', 'path': 'yamnet_backends/yamnet.onnx', 'source': 'yamnet'},
+    'yamnet_onnx_int8': {'kind': 'derived', 'path': 'yamnet_backends/yamnet_int8.onnx', 'source': 'yamnet'},
+}
+
+MODEL_REGISTRY_CONFIG = {
+    'root': os.getenv('SIGNAWARE_MODELS_DIR', ''),  # Vacío = get_models_folder()
+    'manifest': 'model_registry.json',  # Checksums registrados por `manage.py download_models`
+    'verify_checksums': True  # Verificar el checksum antes de usar un artefacto local
+}
+
+# Configuración del grafo de YAMNet
+YAMNET_MODEL_CONFIG = {
+    'backend': os.getenv('YAMNET_BACKEND', 'tfhub'),  # tfhub, tflite, tflite_int8, onnx, onnx_int8
+    'num_threads': None,  # Hilos del runtime para tflite/onnx (None = por defecto)
+    'length_buckets': True,  # Rellenar la entrada a longitudes fijas para reutilizar el grafo
+    'bucket_max_frames': 64,  # Por encima, las longitudes se redondean a múltiplos de este valor
+    'warmup_seconds': [1, 3]  # Duraciones usadas en la inferencia de calentamiento
+}
+
+# Sonidos personalizados por usuario (clasificadores sobre los embeddings de YAMNet)
+CUSTOM_SOUND_HEADS_CONFIG = {
+    'enabled': True,
+    'folder': 'custom_sound_heads',  # Relativa a la carpeta de modelos
+    'threshold': 0.7,  # Probabilidad mínima para reportar un sonido personalizado
+    'default_category': 'attention_alert',
+    'max_examples_per_label': 256,  # Frames de entrenamiento guardados por etiqueta
+    'max_clips': 10,  # Clips de ejemplo máximos por petición de entrenamiento
+    'max_clip_mb': 5,  # Tamaño máximo de cada clip de ejemplo
+    'background_folder': os.path.join('agent', 'lab', 'audio_fragments'),  # Negativos genéricos
+    'epochs': 300,
+    'l2': 1e-3
+}
+
+# Procesamiento por lotes de carpetas (analyze_directory, transcribe_folder, process_audio_files)
+BATCH_PROCESSING_CONFIG = {
+    'workers': None,  # Procesos del pool (None = núcleos disponibles)
+    'cache_enabled': True,  # Reutilizar resultados de archivos sin cambios
+    'cache_folder': 'batch_results',  # Relativa a la carpeta de cachés
+    'extensions': ['.wav']
+}
+
+# Caché de resultados del workflow de detección por hash del PCM decodificado
+RESULT_CACHE_CONFIG = {
+    'enabled': True,
+    'memory_entries': 256,  # Entradas del nivel LRU en memoria
+    'disk_enabled': False,  # Nivel opcional en disco (compartido entre procesos)
+    'disk_folder': 'workflow_results'  # Relativa a la carpeta de cachés
+}
+
+# Puerta de actividad (energía, ZCR y planitud espectral) antes de YAMNet y Whisper
+ACTIVITY_GATE_CONFIG = {
+    'enabled': True,
+    'frame_ms': 25,  # Duración de frame
+    'hop_ms': 10,  # Salto entre frames
+    'silence_db': -50.0,  # dBFS por debajo de los cuales un frame es silencio
+    'min_active_ratio': 0.05,  # Fracción mínima de frames con energía para no ser silencio
+    'noise_flatness': 0.4,  # Planitud espectral media a partir de la cual se considera ruido
+    'noise_zcr': 0.25,  # Tasa de cruces por cero media a partir de la cual se considera ruido
+    'skip_transcription_on_noise': True  # No transcribir clips que solo contienen ruido
+}
+
+# Configuración de Whisper: dispositivo automático y escalonado de modelos por duración
+WHISPER_CONFIG = {
+    'model_size': os.getenv('WHISPER_MODEL', 'auto'),  # 'auto' = elegir nivel por duración y presupuesto
+    'device': os.getenv('WHISPER_DEVICE', 'auto'),  # auto, cpu, cuda
+    'compute_type': 'auto',  # auto = float16 en cuda, int8 en cpu
+    'cpu_threads': 0,  # 0 = por defecto de CTranslate2
+    'tiers': ['tiny', 'base', 'small', 'medium'],  # De menor a mayor
+    'latency_budget_seconds': 2.0,  # Tiempo máximo deseado de transcripción por clip
+    # Segundos de cómputo por segundo de audio; fijos para que el nivel elegido sea determinista
+    'realtime_factors': {
+        'cpu': {'tiny': 0.04, 'base': 0.08, 'small': 0.25, 'medium': 0.8, 'large': 1.6},
+        'cuda': {'tiny': 0.01, 'base': 0.015, 'small': 0.03, 'medium': 0.06, 'large': 0.1}
+    },
+    'memory_cap_mb': 2048,  # Memoria máxima entre todos los niveles cargados
+    # Memoria aproximada por nivel con int8 (float16 ocupa ~2x)
+    'model_memory_mb': {'tiny': 80, 'base': 160, 'small': 500, 'medium': 1500, 'large': 3100}
+}
+
+# Configuración de la cola de transcripciones Whisper agrupadas por lotes
+WHISPER_BATCHING_CONFIG = {
+    'enabled': True,
+    'max_batch_size': 8,  # Peticiones máximas por lote
+    'max_wait_ms': 50,  # Espera máxima desde la primera petición del lote
+    'inference_batch_size': 8,  # Fragmentos de 30 s decodificados a la vez por el pipeline
+    'max_batch_seconds': 300  # Duración máxima de audio por lote
+}
+
+# Transcripción solo de las regiones con voz según los frames de YAMNet
+SPEECH_REGIONS_CONFIG = {
+    'enabled': True,
+    'speech_class': 'Speech',  # Clase de YAMNet usada para localizar la voz
+    'min_confidence': 0.3,  # Puntuación mínima de un frame para considerarlo voz
+    'padding_seconds': 0.25,  # Margen añadido a cada lado de una región
+    'merge_gap_seconds': 0.5,  # Regiones más cercanas se transcriben juntas
+    'max_speech_ratio': 0.8  # Si la voz cubre más que esto, se transcribe el clip entero
+}
+
+# Ciclo de vida de los modelos pesados (carga bajo demanda, descarga por inactividad)
+MODEL_LIFECYCLE_CONFIG = {
+    'idle_ttl_seconds': 600,  # Descargar modelos sin uso durante este tiempo (0 = nunca)
+    'memory_ceiling_mb': 3072,  # Memoria máxima estimada de modelos por proceso
+    'sweep_interval_seconds': 30,  # Frecuencia de la revisión de modelos inactivos
+    'models': {
+        # memory_mb: estimación para el límite; ttl_seconds sobrescribe idle_ttl_seconds
+        'yamnet': {'memory_mb': 300, 'ttl_seconds': 0},
+        'whisper': {'memory_mb': 1200, 'ttl_seconds': 300},
+        'demucs': {'memory_mb': 1000, 'ttl_seconds': 300},
+        'diarizer': {'memory_mb': 600, 'ttl_seconds': 300}
     }
-} 
\ No newline at end of file
+}
+
+# Transcripción diferida: la respuesta sale tras YAMNet y Whisper corre en segundo plano
+TRANSCRIPTION_JOBS_CONFIG = {
+    'default_mode': 'sync',  # sync = esperar a Whisper; async = responder con transcription_status pending
+    'workers': 2,  # Hilos de transcripción (sus peticiones se agrupan en el batcher de Whisper)
+    'retention_seconds': 3600,  # Tiempo que se conserva un trabajo terminado para consultarlo
+    'stream_timeout_seconds': 120,  # Duración máxima de una conexión SSE
+    'stream_keepalive_seconds': 15  # Intervalo de comentarios keep-alive en SSE
+}
+
+# Separación de voz con Demucs (dentro del proceso) antes de transcribir clips ruidosos
+DEMUCS_CONFIG = {
+    'enabled': False,  # Requiere torch y demucs instalados
+    'model_name': 'htdemucs',
+    'stem': 'vocals',  # Pista que se transcribe
+    'device': 'auto',  # auto, cpu, cuda
+    'chunk_seconds': 30.0,  # Trozo procesado de cada vez (acota la memoria)
+    'overlap_seconds': 1.0,  # Solape entre trozos, fundido con rampas lineales
+    'min_background_confidence': 0.3  # Confianza de un sonido no vocal a partir de la cual el clip es ruidoso
+}
+
+# Diarización de hablantes sobre las regiones con voz de los clips con conversación
+DIARIZATION_CONFIG = {
+    'enabled': False,  # Requiere pyannote.audio y acceso al modelo
+    'model_name': 'pyannote/speaker-diarization-3.1',
+    'min_speech_seconds': 2.0,  # Por debajo no se diariza (un solo hablante probable)
+    'region_gap_seconds': 0.5,  # Silencio entre regiones concatenadas
+    'max_gap_seconds': 1.0,  # Distancia máxima a un turno para segmentos sin solape
+    'unknown_speaker': 'UNKNOWN'
+}
+
+# Ejecución asíncrona del workflow (ainvoke) bajo ASGI
+ASYNC_WORKFLOW_CONFIG = {
+    # Hilos para la inferencia; las subidas que excedan el pool esperan sin ocupar hilos
+    'inference_workers': int(os.getenv('SIGNAWARE_INFERENCE_WORKERS', '4'))
+}
+
+# Ingesta de audio: la subida se decodifica una vez en memoria y solo se escribe
+# a disco cuando se pide conservarla para get_audio
+AUDIO_INGESTION_CONFIG = {
+    'retain_audio_default': True  # Conservar el audio para get_audio si la petición no indica retain_audio
+}
+
+# Subida por lotes de fragmentos (process-audio-batch)
+BATCH_UPLOAD_CONFIG = {
+    'max_fragments': 64,  # Fragmentos máximos por petición
+    'max_total_seconds': 600  # Duración total máxima del audio de una petición
+}
+
+# Subidas troceadas y reanudables de grabaciones largas (upload-sessions)
+UPLOAD_SESSIONS_CONFIG = {
+    'max_session_mb': 500,  # Tamaño máximo de la grabación completa
+    'max_chunk_mb': 16,  # Tamaño máximo de cada trozo (en cuerpo crudo también limita DATA_UPLOAD_MAX_MEMORY_SIZE)
+    'idle_seconds': 3600,  # Sesiones sin actividad durante este tiempo se descartan
+    'sweep_interval_seconds': 300,  # Frecuencia del barrido de sesiones abandonadas y sus archivos
+    'folder': os.path.join(tempfile.gettempdir(), 'signaware_upload_sessions')  # Audio decodificado de cada sesión
+}
+
+# Audio conservado para get_audio: comprimido en disco y transcodificado al servirlo
+AUDIO_RETENTION_CONFIG = {
+    'format': 'flac',  # flac (sin pérdidas) u opus (baja tasa de bits); requiere soundfile, si no se usa wav
+    'folder': os.path.join(tempfile.gettempdir(), 'signaware_audio'),  # Segmentos e índice del almacén
+    'segment_max_mb': 256,  # Tamaño a partir del cual se abre un segmento nuevo
+    'compact_live_ratio': 0.25,  # Segmentos con menos de esta fracción de bytes vivos se compactan
+    # Subidas que ya vienen comprimidas se conservan tal cual (sin recodificar ni perder calidad)
+    'keep_compressed_uploads': True,
+    'transcode_cache_mb': 32,  # Caché LRU de versiones transcodificadas (para peticiones Range repetidas)
+    'stream_block_bytes': 64 * 1024  # Tamaño de bloque al servir un clip desde el mmap del segmento
+}
+
+# Registro compartido (tabla RetainedAudio) de los audios conservados para get_audio
+AUDIO_REGISTRY_CONFIG = {
+    'ttl_seconds': 3600,  # Tiempo que un audio conservado se puede descargar
+    'sweep_interval_seconds': 60,  # Frecuencia del barrido de audios caducados
+    'sweep_batch_size': 500,  # Audios borrados por consulta en cada barrido
+    'user_quota_mb': 200  # Audio conservado por usuario; al superarlo caducan sus audios más antiguos
+}
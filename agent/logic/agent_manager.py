@@ -103,6 +103,38 @@ class AgentManager:
             self.logger.error(f"Error ejecutando agente '{agent_name}': {e}")
             raise
     
+    async def aexecute_agent(self, agent_name: str, user_input: str, **kwargs):
+        """
+        Ejecuta un agente de forma asíncrona (solo agentes con aexecute).
+        
+        Args:
+            agent_name: Nombre del agente a ejecutar
+            user_input: Entrada del usuario
+            **kwargs: Argumentos adicionales para el agente
+            
+        Returns:
+            Respuesta del agente
+            
+        Raises:
+            ValueError: Si el agente no existe o no admite ejecución asíncrona
+            RuntimeError: Si el agente no está inicializado
+        """
+        agent = self.get_agent(agent_name)
+        if not agent:
+            raise ValueError(f"Agente '{agent_name}' no encontrado. Agentes disponibles: {list(self.agents.keys())}")
+        
+        if not agent.is_initialized:
+            raise RuntimeError(f"Agente '{agent_name}' no está inicializado correctamente")
+        
+        if not hasattr(agent, "aexecute"):
+            raise ValueError(f"El agente '{agent_name}' no admite ejecución asíncrona")
+        
+        try:
+            return await agent.aexecute(user_input, **kwargs)
+        except Exception as e:
+            self.logger.error(f"Error ejecutando agente '{agent_name}': {e}")
+            raise
+    
     def get_agent_status(self, agent_name: str) -> Dict[str, Any]:
         """
         Obtiene el estado de un agente específico.
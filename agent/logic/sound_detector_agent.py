@@ -1,4 +1,5 @@
 from ..workflows.sound_detector_workflow import SoundDetectorWorkflow
+from ..config import TRANSCRIPTION_JOBS_CONFIG
 from .base_agent import BaseAgent
 
 
@@ -65,6 +66,38 @@ class SoundDetectorAgent(BaseAgent):
             "messages": []
         }
 
+    def _build_initial_state(self, **kwargs) -> dict:
+        """
+        Estado inicial del workflow a partir de los argumentos de execute/aexecute.
+
+        Raises:
+            ValueError: Si no se recibe audio_path ni audio_file
+        """
+        # Extraer argumentos específicos
+        audio_path = kwargs.get("audio_path")
+        audio_file = kwargs.get("audio_file")
+
+        # Validar argumentos requeridos
+        if not audio_path and not audio_file:
+            raise ValueError(
+                "Se requiere audio_path o audio_file para la detección de sonidos"
+            )
+
+        # Obtener estado inicial
+        initial_state = self.workflow.get_initial_state()
+
+        # Configurar el estado con los datos de entrada
+        if audio_path:
+            initial_state["audio_path"] = audio_path
+        if audio_file:
+            initial_state["audio_file"] = audio_file
+        initial_state["user_id"] = kwargs.get("user_id")
+        if kwargs.get("transcription_mode"):
+            initial_state["transcription_mode"] = kwargs["transcription_mode"]
+        if kwargs.get("retain_audio") is not None:
+            initial_state["retain_audio"] = bool(kwargs["retain_audio"])
+        return initial_state
+
     def execute(self, user_input: str, **kwargs) -> dict:
         """
         Ejecuta el workflow de detección de sonidos.
@@ -74,29 +107,15 @@ class SoundDetectorAgent(BaseAgent):
             **kwargs: Argumentos adicionales que deben incluir:
                 - audio_path: Ruta del archivo de audio
                 - audio_file: Archivo de audio subido
+                - user_id: ID del usuario (opcional, activa sus sonidos personalizados)
+                - transcription_mode: 'sync' o 'async' (opcional, por defecto el configurado)
+                - retain_audio: Conservar el audio en disco para get_audio (opcional)
 
         Returns:
             dict: Estado final con información del sonido detectado
         """
         try:
-            # Extraer argumentos específicos
-            audio_path = kwargs.get("audio_path")
-            audio_file = kwargs.get("audio_file")
-
-            # Validar argumentos requeridos
-            if not audio_path and not audio_file:
-                raise ValueError(
-                    "Se requiere audio_path o audio_file para la detección de sonidos"
-                )
-
-            # Obtener estado inicial
-            initial_state = self.workflow.get_initial_state()
-
-            # Configurar el estado con los datos de entrada
-            if audio_path:
-                initial_state["audio_path"] = audio_path
-            if audio_file:
-                initial_state["audio_file"] = audio_file
+            initial_state = self._build_initial_state(**kwargs)
 
             # Ejecutar el workflow
             final_state = self.workflow.execute(initial_state)
@@ -107,6 +126,42 @@ class SoundDetectorAgent(BaseAgent):
             print(error_msg)
             return "GENERAL_QUERY"
 
+    async def aexecute(self, user_input: str, **kwargs) -> dict:
+        """
+        Versión asíncrona de execute (ainvoke): la inferencia se ejecuta en el
+        pool acotado de hilos y el bucle de eventos queda libre mientras tanto.
+
+        Args:
+            user_input: Entrada del usuario (opcional para este agente)
+            **kwargs: Los mismos argumentos que execute
+
+        Returns:
+            dict: Estado final con información del sonido detectado
+        """
+        initial_state = self._build_initial_state(**kwargs)
+        return await self.workflow.aexecute(initial_state)
+
+    def execute_batch(self, waveforms, names=None, user_id=None, transcription_mode: str = None) -> list:
+        """
+        Detección sobre varios fragmentos de una subida por lotes con una sola
+        pasada de YAMNet (sin pasar por el grafo, fragmento a fragmento).
+
+        Args:
+            waveforms: Formas de onda float32 mono a 16 kHz
+            names: Nombres de los fragmentos
+            user_id: ID del usuario
+            transcription_mode: 'sync' o 'async' (por defecto el configurado)
+
+        Returns:
+            list: Resultado de cada fragmento, en el mismo orden
+        """
+        return self.workflow.nodes.detect_fragments(
+            waveforms,
+            names=names,
+            user_id=user_id,
+            transcription_mode=transcription_mode or TRANSCRIPTION_JOBS_CONFIG['default_mode'],
+        )
+
     def validate_audio_file(self, audio_file) -> bool:
         """
         Valida si el archivo de audio es compatible.
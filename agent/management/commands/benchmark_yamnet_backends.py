@@ -0,0 +1,108 @@
+"""
+Comando de Django para comparar los backends de YAMNet en CPU.
+Ejecutar: python manage.py benchmark_yamnet_backends [--backends tfhub tflite_int8] [--folder agent/lab/audio_fragments]
+"""
+
+import json
+import multiprocessing
+import os
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from agent.tools.audio_analyzer.backend_benchmark import run_backend_benchmark, topk_agreement
+from agent.tools.audio_analyzer.yamnet_backends import BACKEND_ARTIFACTS
+
+DEFAULT_FOLDER = os.path.join('agent', 'lab', 'audio_fragments')
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia, pico de RSS y concordancia top-k de los backends de YAMNet frente a TF Hub'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends',
+            nargs='+',
+            default=list(BACKEND_ARTIFACTS.keys()),
+            help='Backends a comparar (la referencia tfhub se ejecuta siempre)'
+        )
+        parser.add_argument(
+            '--folder',
+            type=str,
+            default=DEFAULT_FOLDER,
+            help=f'Carpeta con los WAV de prueba (default: {DEFAULT_FOLDER})'
+        )
+        parser.add_argument(
+            '--repeats',
+            type=int,
+            default=3,
+            help='Repeticiones por archivo (default: 3)'
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=3,
+            help='Tamaño del top-k para la concordancia (default: 3)'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Imprimir los resultados en JSON'
+        )
+
+    def handle(self, *args, **options):
+        folder = options['folder']
+        if not os.path.isdir(folder):
+            raise CommandError(f"La carpeta {folder} no existe")
+
+        files = sorted(
+            os.path.join(folder, name) for name in os.listdir(folder) if name.endswith('.wav')
+        )
+        if not files:
+            raise CommandError(f"No hay archivos .wav en {folder}")
+
+        backends = ['tfhub'] + [b for b in options['backends'] if b != 'tfhub']
+        unknown = [b for b in backends if b not in BACKEND_ARTIFACTS]
+        if unknown:
+            raise CommandError(f"Backends desconocidos: {unknown}. Disponibles: {list(BACKEND_ARTIFACTS.keys())}")
+
+        self.stdout.write(f"🎧 {len(files)} archivos en {folder}, {options['repeats']} repeticiones")
+
+        # Un proceso nuevo por backend para que el pico de RSS no se contamine
+        context = multiprocessing.get_context('spawn')
+        results = {}
+        for backend in backends:
+            self.stdout.write(f"⏱️ Midiendo {backend}...")
+            with context.Pool(1) as pool:
+                results[backend] = pool.apply(run_backend_benchmark, (backend, files, options['repeats']))
+
+        reference = results['tfhub'].get('mean_scores', {})
+        rows = []
+        for backend, result in results.items():
+            if 'error' in result:
+                rows.append({'backend': backend, 'error': result['error']})
+                continue
+            latencies_ms = np.array(result['latencies']) * 1000
+            agreement = topk_agreement(reference, result['mean_scores'], k=options['top_k'])
+            rows.append({
+                'backend': backend,
+                'load_s': round(result['load_time'], 2),
+                'warmup_s': round(result['warmup_time'], 2),
+                'mean_ms': round(float(latencies_ms.mean()), 2),
+                'p50_ms': round(float(np.percentile(latencies_ms, 50)), 2),
+                'p95_ms': round(float(np.percentile(latencies_ms, 95)), 2),
+                'peak_rss_mb': round(result['peak_rss_mb'], 1),
+                'top1_agreement': round(agreement['top1'], 3),
+                f"top{options['top_k']}_overlap": round(agreement['overlap'], 3),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+
+        for row in rows:
+            if 'error' in row:
+                self.stdout.write(self.style.WARNING(f"⚠️ {row['backend']}: {row['error']}"))
+                continue
+            self.stdout.write(self.style.SUCCESS(f"📊 {row['backend']}"))
+            for key, value in row.items():
+                if key != 'backend':
+                    self.stdout.write(f"   {key}: {value}")
@@ -0,0 +1,93 @@
+"""
+Comando de Django para descargar los artefactos de modelos al registro local.
+Ejecutar: python manage.py download_models [--only yamnet whisper_small] [--verify]
+"""
+
+import os
+import shutil
+import urllib.request
+from django.core.management.base import BaseCommand, CommandError
+from agent.config import MODEL_REGISTRY
+from agent.services.model_registry_service import model_registry
+
+
+class Command(BaseCommand):
+    help = 'Descarga los modelos (YAMNet, Whisper, embeddings, difusión) a la carpeta local y registra sus checksums'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            default=None,
+            help='Artefactos a descargar (por defecto todos)'
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Solo verificar los artefactos locales contra el manifiesto (recalcula el sha256)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Volver a descargar aunque el artefacto ya exista'
+        )
+
+    def handle(self, *args, **options):
+        names = options['only'] or list(MODEL_REGISTRY.keys())
+        unknown = [name for name in names if name not in MODEL_REGISTRY]
+        if unknown:
+            raise CommandError(f"Artefactos desconocidos: {unknown}. Disponibles: {list(MODEL_REGISTRY.keys())}")
+
+        if options['verify']:
+            for name in names:
+                path = model_registry.local_path(name)
+                if not os.path.exists(path):
+                    self.stdout.write(self.style.WARNING(f"⚠️ {name}: no descargado ({path})"))
+                elif model_registry.verify(name, full=True):
+                    self.stdout.write(self.style.SUCCESS(f"✅ {name}: checksum correcto"))
+                else:
+                    self.stdout.write(self.style.ERROR(f"❌ {name}: checksum no coincide"))
+            return
+
+        for name in names:
+            path = model_registry.local_path(name)
+            if MODEL_REGISTRY[name]['kind'] == 'derived':
+                self.stdout.write(f"⏭️ {name}: se genera con `python manage.py export_yamnet_backends`")
+                continue
+            if os.path.exists(path) and not options['force']:
+                self.stdout.write(f"⏭️ {name}: ya existe en {path}")
+            else:
+                self.stdout.write(f"📥 Descargando {name}...")
+                try:
+                    self._download(MODEL_REGISTRY[name], path)
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"❌ Error descargando {name}: {e}"))
+                    continue
+            digest = model_registry.record(name)
+            self.stdout.write(self.style.SUCCESS(f"✅ {name}: {path} (sha256 {digest[:12]}…)"))
+
+    def _download(self, entry, path):
+        """Descarga un artefacto según su tipo."""
+        kind = entry['kind']
+        source = entry['source']
+
+        if kind == 'url':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            urllib.request.urlretrieve(source, path)
+        elif kind == 'tfhub':
+            import tensorflow_hub as hub
+
+            cached_path = hub.resolve(source)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            shutil.copytree(cached_path, path)
+        elif kind == 'whisper':
+            from faster_whisper import download_model
+
+            download_model(source, output_dir=path)
+        elif kind == 'huggingface':
+            from huggingface_hub import snapshot_download
+
+            snapshot_download(repo_id=source, local_dir=path)
+        else:
+            raise CommandError(f"Tipo de artefacto no soportado: {kind}")
@@ -0,0 +1,83 @@
+"""
+Comando de Django para exportar YAMNet a backends ligeros de CPU (TFLite / ONNX, float e int8).
+Ejecutar: python manage.py export_yamnet_backends [--only tflite tflite_int8 onnx onnx_int8]
+"""
+
+import os
+from django.core.management.base import BaseCommand, CommandError
+from agent.services.model_registry_service import model_registry
+from agent.tools.audio_analyzer.yamnet_backends import BACKEND_ARTIFACTS, TFHubBackend
+
+EXPORTABLE_BACKENDS = ['tflite', 'tflite_int8', 'onnx', 'onnx_int8']
+
+
+class Command(BaseCommand):
+    help = 'Convierte el SavedModel de YAMNet a TFLite y ONNX (con variantes int8) y registra los artefactos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            default=EXPORTABLE_BACKENDS,
+            help=f'Backends a exportar (default: {" ".join(EXPORTABLE_BACKENDS)})'
+        )
+
+    def handle(self, *args, **options):
+        unknown = [b for b in options['only'] if b not in EXPORTABLE_BACKENDS]
+        if unknown:
+            raise CommandError(f"Backends no exportables: {unknown}. Disponibles: {EXPORTABLE_BACKENDS}")
+
+        self.stdout.write("📥 Cargando YAMNet de referencia...")
+        reference = TFHubBackend(model_registry.resolve('yamnet'))
+
+        for backend in options['only']:
+            artifact = BACKEND_ARTIFACTS[backend]
+            path = model_registry.local_path(artifact)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.stdout.write(f"🔄 Exportando {backend} → {path}")
+            try:
+                if backend.startswith('tflite'):
+                    self._export_tflite(reference, path, quantize=backend.endswith('int8'))
+                elif backend == 'onnx':
+                    self._export_onnx(reference, path)
+                else:
+                    float_path = model_registry.local_path(BACKEND_ARTIFACTS['onnx'])
+                    if not os.path.exists(float_path):
+                        self._export_onnx(reference, float_path)
+                        model_registry.record(BACKEND_ARTIFACTS['onnx'])
+                    self._quantize_onnx(float_path, path)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"❌ Error exportando {backend}: {e}"))
+                continue
+
+            digest = model_registry.record(artifact)
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            self.stdout.write(self.style.SUCCESS(f"✅ {backend}: {size_mb:.1f} MB (sha256 {digest[:12]}…)"))
+
+    def _export_tflite(self, reference, path, quantize):
+        import tensorflow as tf
+
+        converter = tf.lite.TFLiteConverter.from_concrete_functions(
+            [reference.concrete_function()], reference._model
+        )
+        if quantize:
+            # Cuantización de rango dinámico: pesos int8, activaciones en float
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        with open(path, 'wb') as f:
+            f.write(converter.convert())
+
+    def _export_onnx(self, reference, path):
+        import tensorflow as tf
+        import tf2onnx
+
+        tf2onnx.convert.from_function(
+            reference._graph,
+            input_signature=[tf.TensorSpec(shape=[None], dtype=tf.float32, name='waveform')],
+            opset=13,
+            output_path=path,
+        )
+
+    def _quantize_onnx(self, float_path, path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(float_path, path, weight_type=QuantType.QInt8)
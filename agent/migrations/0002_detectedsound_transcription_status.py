@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-16 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectedsound',
+            name='transcription_status',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='detectedsound',
+            name='transcription_job_id',
+            field=models.CharField(blank=True, db_index=True, max_length=36, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-16 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0002_detectedsound_transcription_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('session_id', models.CharField(max_length=36, primary_key=True, serialize=False)),
+                ('audio_format', models.CharField(max_length=16)),
+                ('sample_rate', models.PositiveIntegerField(blank=True, null=True)),
+                ('channels', models.PositiveSmallIntegerField(default=1)),
+                ('status', models.CharField(default='open', max_length=16)),
+                ('offset', models.PositiveBigIntegerField(default=0)),
+                ('chunks_received', models.PositiveIntegerField(default=0)),
+                ('last_chunk_index', models.IntegerField(blank=True, null=True)),
+                ('samples_received', models.PositiveBigIntegerField(default=0)),
+                ('progress', models.JSONField(blank=True, default=dict)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-16 14:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0003_uploadsession'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetainedAudio',
+            fields=[
+                ('audio_id', models.CharField(max_length=36, primary_key=True, serialize=False)),
+                ('audio_path', models.CharField(max_length=512)),
+                ('sound_type', models.CharField(blank=True, default='', max_length=128)),
+                ('audio_format', models.CharField(max_length=16)),
+                ('content_type', models.CharField(max_length=64)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('etag', models.CharField(blank=True, default='', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='retained_audios', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
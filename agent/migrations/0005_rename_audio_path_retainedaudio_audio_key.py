@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-16 16:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0004_retainedaudio'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='retainedaudio',
+            old_name='audio_path',
+            new_name='audio_key',
+        ),
+    ]
@@ -11,9 +11,57 @@ class DetectedSound(models.Model):
     confidence = models.FloatField()
     timestamp = models.DateTimeField(auto_now_add=True)
     transcription = models.TextField(blank=True, null=True)
+    # Estado de la transcripción diferida: '' (sin transcripción), pending, completed, failed
+    transcription_status = models.CharField(max_length=16, blank=True, default='')
+    transcription_job_id = models.CharField(max_length=36, blank=True, null=True, db_index=True)
 
     def __str__(self):
         return f"{self.sound_type} ({self.category}) - {self.timestamp:%Y-%m-%d %H:%M:%S}"
 
     class Meta:
         ordering = ['-timestamp']
+
+
+class RetainedAudio(models.Model):
+    """Audio conservado para get_audio; compartido por todos los procesos."""
+    audio_id = models.CharField(max_length=36, primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='retained_audios')
+    # Clave del clip en el almacén de segmentos (hash del contenido)
+    audio_key = models.CharField(max_length=512)
+    sound_type = models.CharField(max_length=128, blank=True, default='')
+    audio_format = models.CharField(max_length=16)
+    content_type = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField(default=0)
+    etag = models.CharField(max_length=64, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Índice de caducidad: el barrido borra en orden de expires_at
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.audio_id} ({self.audio_format}) - expira {self.expires_at:%Y-%m-%d %H:%M:%S}"
+
+
+class UploadSession(models.Model):
+    """Sesión de subida troceada; cualquier proceso puede recibir sus trozos."""
+    session_id = models.CharField(max_length=36, primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    audio_format = models.CharField(max_length=16)
+    sample_rate = models.PositiveIntegerField(null=True, blank=True)
+    channels = models.PositiveSmallIntegerField(default=1)
+    # open, completed, failed
+    status = models.CharField(max_length=16, default='open')
+    # Bytes confirmados de la grabación: el siguiente trozo empieza aquí
+    offset = models.PositiveBigIntegerField(default=0)
+    chunks_received = models.PositiveIntegerField(default=0)
+    last_chunk_index = models.IntegerField(null=True, blank=True)
+    samples_received = models.PositiveBigIntegerField(default=0)
+    # Detecciones parciales (sound_events y speech_intervals) hasta el último trozo
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Índice de inactividad: el barrido descarta las sesiones abandonadas
+    updated_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.session_id} ({self.status}) - {self.offset} bytes"
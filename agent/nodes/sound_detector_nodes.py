@@ -4,31 +4,113 @@ Cada nodo representa una etapa del procesamiento de audio.
 """
 
 import os
+import time
 import logging
-import tempfile
-from typing import Dict, Any
+from typing import Dict, Any, List
 from langchain_core.messages import HumanMessage, SystemMessage
 from ..states.sound_detector_state import SoundDetectorState
+from ..config import (
+    STREAMING_ANALYSIS_CONFIG,
+    ACTIVITY_GATE_CONFIG,
+    DEMUCS_CONFIG,
+    DIARIZATION_CONFIG,
+    is_conversation,
+)
+from ..services.metrics_service import metrics_registry
+from ..services.model_lifecycle_service import model_lifecycle
+from ..services.inference_executor_service import inference_executor
+from ..services.result_cache_service import audio_result_cache
+from ..services.transcription_job_service import transcription_jobs, PENDING, COMPLETED
+from ..services.audio_archive_service import audio_archive
+from ..tools.audio_analyzer.activity_gate import ActivityGate, SILENT, NOISE
+from ..tools.audio_decoding.audio_decoder import audio_decoder
+from ..tools.diarizer.speaker_alignment import align_speakers
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Nodos que decodifican, leen/escriben disco o ejecutan modelos: en el workflow
+# asíncrono se ejecutan en el pool de inferencia; el resto corre en el bucle de eventos
+OFFLOADED_NODES = (
+    "activity_gate_node",
+    "save_uploaded_audio_node",
+    "cache_lookup_node",
+    "audio_analysis_node",
+    "source_separation_node",
+    "audio_transcription_node",
+    "speaker_diarization_node",
+    "cache_store_node",
+    "cleanup_audio_node",
+)
+
+# Campos del estado que se reutilizan cuando el mismo audio se reenvía
+CACHED_STATE_FIELDS = (
+    "sound_type",
+    "confidence",
+    "alert_category",
+    "is_conversation_detected",
+    "sound_detections",
+    "detections_by_category",
+    "sound_events",
+    "transcription",
+    "transcription_status",
+)
+
 
 class AudioProcessor:
-    """Clase para manejar el procesamiento de audio."""
+    """
+    Clase para manejar el procesamiento de audio.
+    Los modelos no se cargan al construirla: el gestor de ciclo de vida los
+    carga en el primer uso y los descarga tras inactividad o por memoria.
+    """
     
     def __init__(self):
-        """Inicializa los componentes de procesamiento de audio."""
+        """Registra los componentes de procesamiento de audio sin cargarlos."""
         try:
-            from ..tools.audio_analyzer.yamnet_analyzer import YAMNetAudioAnalyzer
+            from ..tools.audio_analyzer.yamnet_analyzer import (
+                YAMNetAudioAnalyzer,
+                create_custom_head_store,
+                resolve_yamnet_model,
+            )
             from ..tools.audio_transcription.audio_transcriber import AudioTranscriber
             
-            self.analyzer = YAMNetAudioAnalyzer()
-            self.transcriber = AudioTranscriber(verbose=False)
-            
         except ImportError as e:
             logger.error(f"Error importing audio processing modules: {e}")
             raise
+        
+        # Sin modelos: sirven para las claves de caché y los sonidos personalizados
+        self.custom_heads = create_custom_head_store()
+        self.analyzer_version = resolve_yamnet_model()[2]
+        self.transcriber_version = AudioTranscriber.describe()
+        
+        model_lifecycle.register(
+            "yamnet", lambda: YAMNetAudioAnalyzer(custom_heads=self.custom_heads)
+        )
+        model_lifecycle.register("whisper", lambda: AudioTranscriber(verbose=False))
+        if DEMUCS_CONFIG['enabled']:
+            from ..tools.audio_separator.demucs_separator import DemucsSeparator
+            
+            model_lifecycle.register("demucs", lambda: DemucsSeparator())
+        if DIARIZATION_CONFIG['enabled']:
+            from ..tools.diarizer.speaker_diarizer import SpeakerDiarizer
+            
+            model_lifecycle.register("diarizer", lambda: SpeakerDiarizer())
+    
+    def use_analyzer(self):
+        """Context manager que retiene el analizador mientras se usa."""
+        return model_lifecycle.use("yamnet")
+    
+    def use_transcriber(self):
+        """Context manager que retiene el transcriptor mientras se usa."""
+        return model_lifecycle.use("whisper")
+    
+    def use_separator(self):
+        """Context manager que retiene el separador Demucs mientras se usa."""
+        return model_lifecycle.use("demucs")
+    
+    def use_diarizer(self):
+        """Context manager que retiene el pipeline de diarización mientras se usa."""
+        return model_lifecycle.use("diarizer")
 
 
 class SoundDetectorNodes:
@@ -41,16 +123,173 @@ class SoundDetectorNodes:
         """Inicializa los nodos y sus dependencias."""
         self.logger = logging.getLogger(__name__)
         self.audio_processor = AudioProcessor()
+        self.activity_gate = ActivityGate(
+            frame_ms=ACTIVITY_GATE_CONFIG['frame_ms'],
+            hop_ms=ACTIVITY_GATE_CONFIG['hop_ms'],
+            silence_db=ACTIVITY_GATE_CONFIG['silence_db'],
+            min_active_ratio=ACTIVITY_GATE_CONFIG['min_active_ratio'],
+            noise_flatness=ACTIVITY_GATE_CONFIG['noise_flatness'],
+            noise_zcr=ACTIVITY_GATE_CONFIG['noise_zcr'],
+        )
+        self.gate_clips = metrics_registry.counter(
+            "activity_gate_clips_total", "Clips clasificados por la puerta de actividad por etiqueta"
+        )
+        self.gate_skip_ratio = metrics_registry.gauge(
+            "activity_gate_skip_ratio", "Fracción de clips que la puerta de actividad deja sin transcribir"
+        )
+        self.stage_seconds = metrics_registry.histogram(
+            "sound_detector_stage_seconds", "Duración de las etapas de separación, transcripción y diarización"
+        )
+        self.batch_fragments = metrics_registry.histogram(
+            "sound_detector_batch_fragments", "Fragmentos por subida por lotes", buckets=(1, 2, 4, 8, 16, 32, 64)
+        )
+    
+    def async_node(self, name: str, node=None):
+        """
+        Versión asíncrona de un nodo para el workflow con ainvoke.
+        
+        Args:
+            name: Nombre del método del nodo
+            node: Implementación síncrona a envolver (por defecto el propio método,
+                p. ej. una versión instrumentada)
+            
+        Returns:
+            Corrutina que recibe y devuelve el estado
+        """
+        node = node or getattr(self, name)
+        
+        if name in OFFLOADED_NODES:
+            async def run(state: SoundDetectorState) -> SoundDetectorState:
+                return await inference_executor.run(node, state)
+        else:
+            async def run(state: SoundDetectorState) -> SoundDetectorState:
+                return node(state)
+        
+        run.__name__ = f"async_{name}"
+        return run
+    
+    def _record_stage(self, state: SoundDetectorState, stage: str, seconds: float):
+        """Registra la duración de una etapa en el estado y en las métricas."""
+        self.stage_seconds.observe(seconds, stage=stage)
+        if state is not None:
+            state.setdefault("stage_timings", {})[stage] = round(seconds, 3)
+    
+    def _audio_buffer(self, state: SoundDetectorState):
+        """
+        Forma de onda del audio de la petición, decodificada una sola vez y
+        compartida por todos los nodos a través de state["audio_buffer"].
+        
+        La subida se decodifica desde memoria (o desde el archivo temporal de
+        Django si la subida era grande); audio_path solo se usa si no hay subida.
+        
+        Args:
+            state: Estado actual del agente
+            
+        Returns:
+            np.ndarray de solo lectura, o None si no hay audio que decodificar
+        """
+        audio = state.get("audio_buffer")
+        if audio is not None:
+            return audio
+        
+        audio_file = state.get("audio_file")
+        if audio_file is not None:
+            if hasattr(audio_file, "temporary_file_path"):
+                audio = audio_decoder.decode(audio_file.temporary_file_path())
+            else:
+                audio_file.seek(0)
+                audio = audio_decoder.decode(audio_file.read())
+                audio_file.seek(0)
+        elif state.get("audio_path") and os.path.exists(state["audio_path"]):
+            audio = audio_decoder.decode(state["audio_path"])
+        else:
+            return None
+        
+        audio.flags.writeable = False
+        state["audio_buffer"] = audio
+        return audio
+    
+    def _audio_name(self, state: SoundDetectorState) -> str:
+        """Nombre del audio para los logs (el del archivo subido o el de la ruta)."""
+        audio_file = state.get("audio_file")
+        if audio_file is not None and getattr(audio_file, "name", None):
+            return os.path.basename(audio_file.name)
+        return os.path.basename(state.get("audio_path") or "") or "audio"
+    
+    def _count_gate_label(self, label: str):
+        """Cuenta un clip clasificado por la puerta de actividad y actualiza la fracción que no llega a Whisper."""
+        self.gate_clips.inc(label=label)
+        skipped = sum(self.gate_clips.value(label=skipped_label) for skipped_label in self._gate_skip_labels())
+        total = sum(self.gate_clips.samples().values())
+        self.gate_skip_ratio.set(skipped / total if total else 0.0)
+    
+    def _gate_skip_labels(self):
+        """Etiquetas de la puerta de actividad con las que el clip no se transcribe."""
+        if ACTIVITY_GATE_CONFIG['skip_transcription_on_noise']:
+            return (SILENT, NOISE)
+        return (SILENT,)
+    
+    def activity_gate_node(self, state: SoundDetectorState) -> SoundDetectorState:
+        """
+        Primer nodo: clasifica el clip como silencioso, solo ruido o con
+        actividad antes de escribirlo a disco o ejecutar modelos.
+        
+        Args:
+            state: Estado actual del agente
+            
+        Returns:
+            SoundDetectorState: Estado con activity_label y, si es silencio, el resultado final
+        """
+        self.logger.info("Ejecutando nodo: activity_gate_node")
+        state["activity_label"] = ""
+        
+        if not ACTIVITY_GATE_CONFIG['enabled']:
+            return state
+        
+        try:
+            # Decodificación en memoria; el resto de nodos reutiliza el mismo buffer
+            waveform = self._audio_buffer(state)
+            if waveform is None:
+                return state
+            
+            label, summary = self.activity_gate.classify(waveform)
+        except Exception as e:
+            # Si no se puede decodificar aquí, el flujo normal se encarga del error
+            self.logger.warning(f"Puerta de actividad no aplicada: {e}")
+            return state
+        
+        state["activity_label"] = label
+        self._count_gate_label(label)
+        
+        self.logger.info(
+            f"Puerta de actividad: {label} (frames activos {summary['active_ratio']:.2f}, "
+            f"pico {summary['peak_db']:.1f} dBFS, ZCR {summary['zcr']:.3f}, planitud {summary['flatness']:.3f})"
+        )
+        
+        if label == SILENT:
+            state["sound_type"] = "Silence"
+            state["confidence"] = 1.0 - summary["active_ratio"]
+            state["alert_category"] = "unknown"
+            state["is_conversation_detected"] = False
+            state["sound_detections"] = []
+            state["messages"].append(
+                SystemMessage(content="🔇 Audio silencioso: no se ejecutó el análisis")
+            )
+        return state
     
     def save_uploaded_audio_node(self, state: SoundDetectorState) -> SoundDetectorState:
         """
-        Nodo para guardar el audio subido desde el frontend.
+        Nodo de ingesta del audio subido desde el frontend.
+        
+        La subida se decodifica una sola vez en state["audio_buffer"], que es lo
+        que leen el análisis, la transcripción y el resto de nodos. Solo se
+        escribe a disco si se pidió conservar el audio para get_audio.
         
         Args:
             state: Estado actual del agente
             
         Returns:
-            SoundDetectorState: Estado actualizado con la ruta del audio
+            SoundDetectorState: Estado actualizado con el buffer y, si se conserva, la ruta del audio
         """
         self.logger.info("Ejecutando nodo: save_uploaded_audio_node")
         
@@ -58,6 +297,10 @@ class SoundDetectorNodes:
             # El audio ya viene en el estado desde el frontend
             audio_file = state.get("audio_file")
             
+            if not audio_file and self._audio_buffer(state) is not None:
+                # Audio recibido como ruta: ya está en disco y no hay nada que guardar
+                return state
+            
             if not audio_file:
                 self.logger.error("No hay archivo de audio en el estado")
                 state["messages"].append(
@@ -77,47 +320,39 @@ class SoundDetectorNodes:
                 )
                 return state
             
-            # Crear archivo temporal
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-                bytes_written = 0
-                for chunk in audio_file.chunks():
-                    temp_file.write(chunk)
-                    bytes_written += len(chunk)
-                temp_path = temp_file.name
-            
-            self.logger.info(f"Archivo guardado: {temp_path}")
-            self.logger.info(f"Bytes escritos: {bytes_written}")
+            # Decodificar (si la puerta de actividad no lo hizo ya)
+            audio = self._audio_buffer(state)
+            self.logger.info(f"Audio decodificado en memoria: {len(audio) / 16000:.2f}s")
             
-            # Verificar que el archivo se guardó correctamente
-            if not os.path.exists(temp_path):
-                self.logger.error(f"El archivo temporal no se creó: {temp_path}")
-                state["messages"].append(
-                    SystemMessage(content="ERROR: No se pudo crear el archivo temporal")
-                )
+            if not state.get("retain_audio"):
+                # Sin retención no se toca el disco; audio_path solo traía el nombre de la subida
+                state["audio_path"] = ""
                 return state
             
-            file_size = os.path.getsize(temp_path)
-            self.logger.info(f"Tamaño del archivo guardado: {file_size} bytes")
+            # Conservar el audio comprimido para get_audio (las subidas ya comprimidas, tal cual)
+            audio_key = audio_archive.retain(audio, uploaded_file=audio_file)
+            bytes_written = audio_archive.describe(audio_key)["size"]
             
-            if file_size == 0:
+            if bytes_written == 0:
                 self.logger.error("El archivo guardado está vacío")
+                audio_archive.remove(audio_key)
                 state["messages"].append(
                     SystemMessage(content="ERROR: El archivo guardado está vacío")
                 )
                 return state
             
-            # Actualizar estado
-            state["audio_path"] = temp_path
+            # Actualizar estado (clave del clip en el almacén de segmentos)
+            state["audio_path"] = audio_key
             
             # Solo agregar mensaje si no existe ya
-            audio_saved_msg = f"Audio guardado exitosamente en: {temp_path} ({file_size} bytes)"
+            audio_saved_msg = f"Audio guardado exitosamente en el almacén: {audio_key} ({bytes_written} bytes)"
             existing_messages = [msg.content for msg in state["messages"]]
             if audio_saved_msg not in existing_messages:
                 state["messages"].append(
                     HumanMessage(content=audio_saved_msg)
                 )
             
-            self.logger.info(f"Audio guardado exitosamente en: {temp_path} ({file_size} bytes)")
+            self.logger.info(audio_saved_msg)
             return state
             
         except Exception as e:
@@ -128,12 +363,122 @@ class SoundDetectorNodes:
             )
             return state
     
+    def cache_lookup_node(self, state: SoundDetectorState) -> SoundDetectorState:
+        """
+        Nodo que busca el resultado de un audio idéntico ya procesado.
+        La clave es el hash del PCM decodificado más la versión de la
+        configuración y de los modelos; en un acierto no se ejecutan modelos.
+        
+        Args:
+            state: Estado actual del agente
+            
+        Returns:
+            SoundDetectorState: Estado con cache_key y, si hay acierto, el resultado previo
+        """
+        self.logger.info("Ejecutando nodo: cache_lookup_node")
+        state["cache_key"] = None
+        state["cache_hit"] = False
+        
+        if not audio_result_cache.enabled or state.get("audio_buffer") is None:
+            return state
+        
+        try:
+            custom_heads = self.audio_processor.custom_heads
+            waveform = state["audio_buffer"]
+            key = audio_result_cache.make_key(
+                waveform,
+                self.audio_processor.analyzer_version,
+                self.audio_processor.transcriber_version,
+                custom_heads.version(state.get("user_id")) if custom_heads else "",
+                state.get("user_id") if custom_heads else "",
+            )
+            state["cache_key"] = key
+            
+            cached = audio_result_cache.get(key)
+            if cached is None:
+                return state
+            
+            for field in CACHED_STATE_FIELDS:
+                state[field] = cached.get(field, "")
+            state["cache_hit"] = True
+            
+            existing_messages = [msg.content for msg in state["messages"]]
+            for content in cached["messages"]:
+                if content not in existing_messages:
+                    state["messages"].append(SystemMessage(content=content))
+            
+            self.logger.info(f"Resultado recuperado de caché: {state['sound_type']} (confianza: {state['confidence']:.2f})")
+            return state
+            
+        except Exception as e:
+            self.logger.error(f"Error en cache_lookup_node: {e}")
+            return state
+    
+    def cache_store_node(self, state: SoundDetectorState) -> SoundDetectorState:
+        """
+        Nodo que guarda el resultado del análisis para futuros reenvíos del mismo audio.
+        No se guardan resultados con errores.
+        
+        Args:
+            state: Estado actual del agente
+            
+        Returns:
+            SoundDetectorState: Estado sin cambios
+        """
+        self.logger.info("Ejecutando nodo: cache_store_node")
+        
+        key = state.get("cache_key")
+        if not key or state.get("cache_hit") or state.get("sound_type") in ("Error", ""):
+            return state
+        
+        messages = []
+        for msg in state["messages"]:
+            if isinstance(msg, SystemMessage) and msg.content not in messages:
+                messages.append(msg.content)
+        if any("ERROR" in content for content in messages):
+            return state
+        
+        result = {field: state.get(field) for field in CACHED_STATE_FIELDS}
+        result["messages"] = messages
+        if state.get("transcription_status") == PENDING:
+            # Se guarda cuando la transcripción diferida termine, ya completo
+            transcription_jobs.set_cache_entry(state["transcription_job_id"], key, result)
+        else:
+            audio_result_cache.put(key, result)
+        return state
+    
     def audio_analysis_node(self, state: SoundDetectorState) -> SoundDetectorState:
         """
         Nodo para analizar el tipo de sonido en el audio.
+        YAMNet se carga en el primer uso y queda retenido mientras dura el análisis.
+        
+        Args:
+            state: Estado actual del agente
+            
+        Returns:
+            SoundDetectorState: Estado actualizado con el tipo de sonido detectado
+        """
+        try:
+            with self.audio_processor.use_analyzer() as analyzer:
+                return self._analyze_audio(state, analyzer)
+        except Exception as e:
+            self.logger.error(f"No se pudo cargar el analizador de audio: {e}")
+            state["is_conversation_detected"] = False
+            state["sound_type"] = "Error"
+            state["confidence"] = 0.0
+            state["sound_detections"] = []
+            state["messages"].append(
+                SystemMessage(content=f"ERROR en análisis de audio: {str(e)}")
+            )
+            return state
+    
+    def _analyze_audio(self, state: SoundDetectorState, analyzer) -> SoundDetectorState:
+        """
+        Cuerpo de audio_analysis_node con el analizador ya cargado.
         
         Args:
             state: Estado actual del agente
+            analyzer: YAMNetAudioAnalyzer retenido por el gestor de modelos
             
         Returns:
             SoundDetectorState: Estado actualizado con el tipo de sonido detectado
@@ -141,9 +486,10 @@ class SoundDetectorNodes:
         self.logger.info("Ejecutando nodo: audio_analysis_node")
         
         try:
-            # Verificar que existe la ruta del audio
-            if not state.get("audio_path") or not os.path.exists(state["audio_path"]):
-                self.logger.error("No hay ruta de audio válida para analizar")
+            # Verificar que hay audio decodificado
+            audio = state.get("audio_buffer")
+            if audio is None:
+                self.logger.error("No hay audio válido para analizar")
                 state["is_conversation_detected"] = False
                 state["sound_type"] = "Unknown"
                 state["confidence"] = 0.0
@@ -155,10 +501,23 @@ class SoundDetectorNodes:
             
             # Analizar el audio con filtro de sonidos relevantes
             try:
-                filtered_analysis_result = self.audio_processor.analyzer.analyze_file_with_filter(state["audio_path"])
+                # En modo streaming, línea temporal por frames: un evento breve no se diluye en la media del clip
+                clip_analysis = analyzer.analyze_clip(
+                    audio,
+                    user_id=state.get("user_id"),
+                    streaming=STREAMING_ANALYSIS_CONFIG['enabled'],
+                    name=self._audio_name(state),
+                )
+                filtered_analysis_result = clip_analysis["detections"]
+                state["sound_events"] = clip_analysis["events"]
+                # Regiones con voz según los frames de YAMNet, para transcribir solo esas partes
+                state["speech_intervals"] = clip_analysis["speech_intervals"]
                 
                 # Guardar resultados filtrados
                 state["sound_detections"] = filtered_analysis_result if filtered_analysis_result else []
+                state["detections_by_category"] = analyzer.relevance_index.group_by_category(
+                    state["sound_detections"]
+                )
                 
                 # Extraer el resultado principal (el más probable)
                 if filtered_analysis_result:
@@ -176,7 +535,7 @@ class SoundDetectorNodes:
                 
                 # Fallback: análisis sin filtro
                 try:
-                    analysis_result = self.audio_processor.analyzer.analyze_file(state["audio_path"])
+                    analysis_result = analyzer.analyze_file(audio, name=self._audio_name(state))
                     state["sound_detections"] = analysis_result if analysis_result else []
                     
                     if analysis_result:
@@ -253,20 +612,35 @@ class SoundDetectorNodes:
         self.logger.info("Ejecutando nodo: audio_transcription_node")
         
         try:
-            # Verificar que existe la ruta del audio
-            if not state.get("audio_path") or not os.path.exists(state["audio_path"]):
-                self.logger.error("No hay ruta de audio válida para transcribir")
+            # Verificar que hay audio decodificado
+            if state.get("audio_buffer") is None:
+                self.logger.error("No hay audio válido para transcribir")
                 state["transcription"] = ""
                 state["messages"].append(
                     SystemMessage(content="ERROR: No se encontró audio válido para transcribir")
                 )
                 return state
             
-            # Transcribir el audio
-            transcription_result = self.audio_processor.transcriber.transcribe_file(state["audio_path"])
+            if state.get("transcription_mode") == "async":
+                # La respuesta sale ya con la detección; Whisper corre en segundo plano
+                job_id = transcription_jobs.submit(
+                    self._transcription_work(state, deferred=True), user_id=state.get("user_id")
+                )
+                state["transcription"] = ""
+                state["transcription_status"] = PENDING
+                state["transcription_job_id"] = job_id
+                state["messages"].append(
+                    SystemMessage(content=f"Transcripción en curso (trabajo {job_id})")
+                )
+                self.logger.info(f"Transcripción diferida encolada: {job_id}")
+                return state
+            
+            # Transcribir el audio (Whisper se carga en el primer uso)
+            transcription_result = self._transcription_work(state)()
             
             # Actualizar estado
             state["transcription"] = transcription_result if transcription_result else ""
+            state["transcription_status"] = COMPLETED
             
             state["messages"].append(
                 SystemMessage(content=f"Transcripción completada: {state['transcription'][:100]}...")
@@ -283,10 +657,133 @@ class SoundDetectorNodes:
             )
             return state
     
+    def _transcription_work(self, state: SoundDetectorState, deferred: bool = False):
+        """
+        Función que transcribe el audio del estado (síncrona o en un trabajo diferido).
+        Si se pidió separar la voz y aún no se hizo, la separación va dentro del trabajo.
+        En un trabajo diferido las duraciones solo van a las métricas.
+        """
+        timings_state = None if deferred else state
+        buffer = state["audio_buffer"]
+        name = self._audio_name(state)
+        speech_intervals = state.get("speech_intervals")
+        separated_audio = state.get("separated_audio")
+        separate = state.get("separate_vocals") and separated_audio is None
+        
+        def work():
+            audio = separated_audio if separated_audio is not None else buffer
+            if separate:
+                audio = self._separate_vocals(audio, timings_state)
+            start = time.perf_counter()
+            with self.audio_processor.use_transcriber() as transcriber:
+                transcript = transcriber.transcribe_audio(
+                    audio, speech_intervals=speech_intervals, name=name
+                )
+            self._record_stage(timings_state, "transcription", time.perf_counter() - start)
+            if deferred and DIARIZATION_CONFIG['enabled']:
+                # En modo diferido la diarización también va dentro del trabajo
+                transcript = self._diarize_transcript(audio, speech_intervals, transcript, None)
+            return transcript
+        
+        return work
+    
+    def _diarize_transcript(self, audio, speech_intervals, transcript, state):
+        """
+        Diariza las regiones con voz y asigna un hablante a cada segmento.
+        Si hay poca voz para distinguir hablantes, la transcripción no cambia.
+        """
+        if not transcript:
+            return transcript
+        duration = len(audio) / 16000
+        speech_seconds = sum(end - start for start, end in speech_intervals) if speech_intervals else duration
+        if speech_seconds < DIARIZATION_CONFIG['min_speech_seconds']:
+            return transcript
+        
+        start = time.perf_counter()
+        with self.audio_processor.use_diarizer() as diarizer:
+            turns = diarizer.diarize_audio(audio, speech_intervals or None)
+        aligned = align_speakers(
+            transcript,
+            turns,
+            max_gap=DIARIZATION_CONFIG['max_gap_seconds'],
+            unknown_speaker=DIARIZATION_CONFIG['unknown_speaker'],
+        )
+        self._record_stage(state, "diarization", time.perf_counter() - start)
+        return aligned
+    
+    def speaker_diarization_node(self, state: SoundDetectorState) -> SoundDetectorState:
+        """
+        Nodo opcional tras la transcripción: diariza solo las regiones con voz
+        y añade el hablante a cada segmento ({start, end, speaker, text}).
+        
+        Args:
+            state: Estado actual del agente
+            
+        Returns:
+            SoundDetectorState: Estado con la transcripción atribuida por hablante
+        """
+        self.logger.info("Ejecutando nodo: speaker_diarization_node")
+        
+        try:
+            audio = state.get("separated_audio")
+            if audio is None:
+                audio = state["audio_buffer"]
+            state["transcription"] = self._diarize_transcript(
+                audio, state.get("speech_intervals"), state["transcription"], state
+            )
+            speakers = sorted({segment.get("speaker") for segment in state["transcription"] if segment.get("speaker")})
+            if speakers:
+                state["messages"].append(
+                    SystemMessage(content=f"🗣️ Hablantes identificados: {', '.join(speakers)}")
+                )
+        except Exception as e:
+            # La transcripción sin hablantes sigue siendo válida
+            self.logger.error(f"Error en speaker_diarization_node: {e}")
+        return state
+    
+    def _separate_vocals(self, audio, state):
+        """Separa la voz con Demucs y registra la duración de la etapa."""
+        start = time.perf_counter()
+        with self.audio_processor.use_separator() as separator:
+            vocals = separator.separate_array(audio)
+        self._record_stage(state, "source_separation", time.perf_counter() - start)
+        return vocals
+    
+    def source_separation_node(self, state: SoundDetectorState) -> SoundDetectorState:
+        """
+        Nodo opcional previo a la transcripción: separa la voz del fondo con
+        Demucs en clips con voz y otros sonidos relevantes. En modo de
+        transcripción diferida la separación se hace dentro del trabajo para
+        no retrasar la respuesta.
+        
+        Args:
+            state: Estado actual del agente
+            
+        Returns:
+            SoundDetectorState: Estado con separated_audio (voz a 16 kHz) o separate_vocals
+        """
+        self.logger.info("Ejecutando nodo: source_separation_node")
+        state["separate_vocals"] = True
+        
+        if state.get("transcription_mode") == "async":
+            return state
+        
+        try:
+            state["separated_audio"] = self._separate_vocals(state["audio_buffer"], state)
+            state["messages"].append(
+                SystemMessage(content=f"Voz separada del fondo con Demucs ({state['stage_timings']['source_separation']:.2f}s)")
+            )
+        except Exception as e:
+            # Sin separación se transcribe la mezcla original
+            self.logger.error(f"Error en source_separation_node: {e}")
+            state["separate_vocals"] = False
+            state["separated_audio"] = None
+        return state
+    
     def cleanup_audio_node(self, state: SoundDetectorState) -> SoundDetectorState:
         """
-        Nodo para limpiar archivos temporales de audio.
-        NOTA: No eliminamos el archivo inmediatamente para permitir descarga.
+        Nodo para limpiar archivos temporales de audio y liberar los buffers.
+        NOTA: No eliminamos el archivo conservado para permitir descarga.
         
         Args:
             state: Estado actual del agente
@@ -297,15 +794,19 @@ class SoundDetectorNodes:
         self.logger.info("Ejecutando nodo: cleanup_audio_node")
         
         try:
-            # Por ahora no eliminamos el archivo para permitir descarga
-            # En producción, implementar un sistema de limpieza programada
-            if state.get("audio_path") and os.path.exists(state["audio_path"]):
-                file_size = os.path.getsize(state["audio_path"])
-                self.logger.info(f"Archivo temporal mantenido para descarga: {state['audio_path']} ({file_size} bytes)")
+            # El audio conservado sigue en el almacén para permitir la descarga;
+            # el registro de audios lo libera al caducar
+            entry = audio_archive.describe(state.get("audio_path") or "")
+            if entry is not None:
+                self.logger.info(f"Audio mantenido para descarga: {state['audio_path']} ({entry['size']} bytes)")
             
             # No limpiamos la referencia para que esté disponible en el endpoint
             # state["audio_path"] = None
             
+            # Los buffers ya no se necesitan (los trabajos diferidos guardan su propia referencia)
+            state["audio_buffer"] = None
+            state["separated_audio"] = None
+            
             return state
             
         except Exception as e:
@@ -337,3 +838,97 @@ class SoundDetectorNodes:
         
         self.logger.info(f"Tipo de sonido: {sound_type} (confianza: {confidence:.2f})")
         return state
+    
+    def detect_fragments(self, waveforms, names=None, user_id=None, transcription_mode: str = "sync") -> List[Dict[str, Any]]:
+        """
+        Detección sobre varios fragmentos de una subida por lotes, fuera del grafo:
+        puerta de actividad por fragmento, una pasada de YAMNet empaquetada para
+        todos los fragmentos con actividad y transcripción de los que tienen voz
+        (encolados juntos en el batcher de Whisper, o como trabajos diferidos).
+        
+        Args:
+            waveforms: Formas de onda float32 mono a 16 kHz, una por fragmento
+            names: Nombres de los fragmentos para los logs
+            user_id: ID del usuario (sus sonidos personalizados y sus trabajos)
+            transcription_mode: sync (esperar a Whisper) o async (trabajos diferidos)
+            
+        Returns:
+            Lista con el resultado de cada fragmento, en el mismo orden
+        """
+        names = list(names) if names else [f"fragmento {i}" for i in range(len(waveforms))]
+        self.batch_fragments.observe(len(waveforms))
+        results = []
+        active = []
+        for index, waveform in enumerate(waveforms):
+            result = {
+                "index": index,
+                "name": names[index],
+                "activity_label": "",
+                "sound_type": "Unknown",
+                "confidence": 0.0,
+                "alert_category": "unknown",
+                "is_conversation_detected": False,
+                "sound_detections": [],
+                "detections_by_category": {},
+                "speech_intervals": [],
+                "transcription": "",
+                "transcription_status": "",
+                "transcription_job_id": None,
+            }
+            results.append(result)
+            if ACTIVITY_GATE_CONFIG['enabled']:
+                label, summary = self.activity_gate.classify(waveform)
+                result["activity_label"] = label
+                self._count_gate_label(label)
+                if label == SILENT:
+                    result["sound_type"] = "Silence"
+                    result["confidence"] = 1.0 - summary["active_ratio"]
+                    continue
+            active.append(index)
+        
+        if active:
+            with self.audio_processor.use_analyzer() as analyzer:
+                analyses = analyzer.analyze_clips(
+                    [waveforms[i] for i in active], user_id=user_id, names=[names[i] for i in active]
+                )
+                for index, analysis in zip(active, analyses):
+                    detections = analysis["detections"] or []
+                    result = results[index]
+                    result["sound_detections"] = detections
+                    result["detections_by_category"] = analyzer.relevance_index.group_by_category(detections)
+                    result["speech_intervals"] = analysis["speech_intervals"]
+                    if detections:
+                        result["sound_type"], result["confidence"], result["alert_category"] = detections[0][:3]
+                    result["is_conversation_detected"] = result["sound_type"] == "Speech"
+        
+        # Misma regla que el workflow de un clip para decidir si se transcribe
+        speech = [
+            index for index in active
+            if results[index]["activity_label"] not in self._gate_skip_labels()
+            and is_conversation(results[index]["sound_type"], results[index]["confidence"])
+        ]
+        if not speech:
+            return results
+        
+        if transcription_mode == "async":
+            for index in speech:
+                waveform, intervals, name = waveforms[index], results[index]["speech_intervals"], names[index]
+                
+                def work(waveform=waveform, intervals=intervals, name=name):
+                    with self.audio_processor.use_transcriber() as transcriber:
+                        return transcriber.transcribe_audio(waveform, speech_intervals=intervals, name=name)
+                
+                results[index]["transcription_job_id"] = transcription_jobs.submit(work, user_id=user_id)
+                results[index]["transcription_status"] = PENDING
+            return results
+        
+        start = time.perf_counter()
+        with self.audio_processor.use_transcriber() as transcriber:
+            transcripts = transcriber.transcribe_many(
+                [waveforms[i] for i in speech], speech_intervals=[results[i]["speech_intervals"] for i in speech]
+            )
+        self._record_stage(None, "transcription", time.perf_counter() - start)
+        for index, transcript in zip(speech, transcripts):
+            results[index]["transcription"] = transcript or ""
+            results[index]["transcription_status"] = COMPLETED
+        return results
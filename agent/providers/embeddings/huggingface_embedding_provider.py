@@ -3,6 +3,7 @@ import logging
 from typing import List, Union
 from langchain_huggingface import HuggingFaceEmbeddings
 from .embedding_provider import EmbeddingProvider
+from ...services.model_registry_service import model_registry
 
 
 class HuggingFaceEmbeddingProvider(EmbeddingProvider):
@@ -18,6 +19,8 @@ class HuggingFaceEmbeddingProvider(EmbeddingProvider):
         self.model_name = model_name or os.getenv(
             "HF_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
         )
+        # Ruta local del registro de modelos si el artefacto está descargado
+        self.model_path = model_registry.resolve_source(self.model_name)
         self.cache_folder = os.getenv("HF_HOME_CACHE")
         self.device = os.getenv("HF_EMBEDDING_DEVICE", "cpu")
         self.logger = logging.getLogger(__name__)
@@ -25,7 +28,7 @@ class HuggingFaceEmbeddingProvider(EmbeddingProvider):
         # Inicializar el modelo de embeddings
         try:
             self.embeddings_model = HuggingFaceEmbeddings(
-                model_name=self.model_name,
+                model_name=self.model_path,
                 cache_folder=self.cache_folder,
                 model_kwargs={"device": self.device},
             )
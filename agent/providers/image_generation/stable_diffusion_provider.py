@@ -11,6 +11,7 @@ import torch
 from PIL import Image
 
 from .image_generation_provider import ImageGenerationProvider
+from ...services.model_registry_service import model_registry
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -37,8 +38,9 @@ class StableDiffusionProvider(ImageGenerationProvider):
             self.logger.info("🔄 Cargando modelo Stable Diffusion...")
             
             # Cargar el pipeline de Stable Diffusion
+            # Ruta local del registro de modelos si está descargado; si no, el repo de HuggingFace
             self.pipe = StableDiffusionPipeline.from_pretrained(
-                "dreamlike-art/dreamlike-anime-1.0",
+                model_registry.resolve("stable_diffusion"),
                 torch_dtype=torch.float16,
                 use_safetensors=True
             )
@@ -0,0 +1,42 @@
+"""
+Renderers adicionales de Django REST Framework.
+"""
+
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class PrometheusTextRenderer(BaseRenderer):
+    """
+    Formato de exposición de texto de Prometheus (?format=prometheus o el
+    Accept de Prometheus, text/plain; version=0.0.4).
+    """
+
+    # La versión del formato va en el Content-Type para que los scrapers lo interpreten bien
+    media_type = "text/plain; version=0.0.4"
+    format = "prometheus"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        # Errores u otros datos no textuales
+        return str(data).encode(self.charset)
+
+
+class AudioFileRenderer(BaseRenderer):
+    """
+    Acepta cualquier Accept de audio (audio/flac, audio/ogg, ...) en get_audio.
+
+    La vista elige el formato y devuelve el archivo directamente; sin este
+    renderer DRF respondería 406 antes de llegar a la vista.
+    """
+
+    media_type = "audio/*"
+    format = "audio"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return json.dumps(data).encode("utf-8")
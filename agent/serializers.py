@@ -18,9 +18,12 @@ class DetectedSoundSerializer(serializers.ModelSerializer):
         model = DetectedSound
         fields = [
             'id', 'user', 'sound_type', 'sound_type_detail', 'category', 'category_detail', 
-            'confidence', 'timestamp', 'transcription'
+            'confidence', 'timestamp', 'transcription', 'transcription_status', 'transcription_job_id'
+        ]
+        read_only_fields = [
+            'id', 'timestamp', 'user', 'sound_type_detail', 'category_detail',
+            'transcription_status', 'transcription_job_id'
         ]
-        read_only_fields = ['id', 'timestamp', 'user', 'sound_type_detail', 'category_detail']
 
     def get_sound_type_detail(self, obj):
         if obj.sound_type:
@@ -0,0 +1,396 @@
+"""
+Almacén del audio conservado para get_audio.
+
+El audio se guarda comprimido: las subidas que ya vienen en un formato
+comprimido se conservan tal cual y el resto (WAV, PCM de sesiones troceadas)
+se codifica desde la forma de onda ya decodificada a FLAC u Opus. Los clips
+van a un almacén de segmentos de solo anexado (SegmentStore) deduplicado por
+contenido: la clave de cada clip es el hash de su contenido, que también es
+su ETag, y get_audio lo sirve como vista sobre el mmap del segmento, con
+peticiones condicionales y por rangos y transcodificado al formato que acepta
+el cliente.
+"""
+
+import io
+import logging
+import os
+import threading
+import wave
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from ..config import AUDIO_RETENTION_CONFIG
+from ..tools.audio_decoding.audio_decoder import audio_decoder, resample, TARGET_SAMPLE_RATE
+from ..tools.audio_storage.segment_store import SegmentStore
+from .metrics_service import metrics_registry
+
+# Formatos a los que se codifica o transcodifica (formato y subtipo de libsndfile)
+ENCODABLE_FORMATS = {
+    "flac": {"content_type": "audio/flac", "suffix": ".flac", "sf_format": "FLAC", "subtype": "PCM_16"},
+    "opus": {"content_type": "audio/ogg; codecs=opus", "suffix": ".opus", "sf_format": "OGG", "subtype": "OPUS"},
+    "wav": {"content_type": "audio/wav", "suffix": ".wav", "sf_format": "WAV", "subtype": "PCM_16"},
+}
+
+# Subidas comprimidas que se conservan sin recodificar
+COMPRESSED_UPLOADS = {
+    ".flac": ("flac", "audio/flac"),
+    ".opus": ("opus", "audio/ogg; codecs=opus"),
+    ".ogg": ("ogg", "audio/ogg"),
+    ".mp3": ("mp3", "audio/mpeg"),
+    ".m4a": ("m4a", "audio/mp4"),
+    ".aac": ("aac", "audio/aac"),
+    ".webm": ("webm", "audio/webm"),
+}
+
+# Tipos MIME de Accept y el formato que se sirve para cada uno
+ACCEPT_FORMATS = {
+    "audio/flac": "flac",
+    "audio/x-flac": "flac",
+    "audio/ogg": "opus",
+    "audio/opus": "opus",
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/wave": "wav",
+}
+
+# Tasas de muestreo que admite el codificador Opus
+_OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def content_type_for(audio_format: str) -> str:
+    """Tipo MIME de un formato de audio conservado."""
+    if audio_format in ENCODABLE_FORMATS:
+        return ENCODABLE_FORMATS[audio_format]["content_type"]
+    for known_format, content_type in COMPRESSED_UPLOADS.values():
+        if known_format == audio_format:
+            return content_type
+    return "application/octet-stream"
+
+
+def parse_accept(accept: str):
+    """
+    Interpreta una cabecera Accept.
+
+    Args:
+        accept: Valor de la cabecera
+
+    Returns:
+        Lista de (media_type, q) ordenada por preferencia, sin los de q=0
+    """
+    entries = []
+    for position, part in enumerate((accept or "").split(",")):
+        fields = [field.strip() for field in part.split(";")]
+        media_type = fields[0].lower()
+        if not media_type:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            entries.append((media_type, q, position))
+    entries.sort(key=lambda entry: (-entry[1], entry[2]))
+    return [(media_type, q) for media_type, q, _ in entries]
+
+
+def parse_range(header: str, size: int):
+    """
+    Interpreta una cabecera Range de un solo rango en bytes.
+
+    Args:
+        header: Valor de la cabecera (p. ej. 'bytes=0-1023', 'bytes=-500')
+        size: Tamaño total del cuerpo
+
+    Returns:
+        (inicio, fin) inclusivos; None si no hay rango o no se admite (se
+        sirve el cuerpo completo); False si el rango no es satisfacible
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[len("bytes="):].strip().partition("-")
+    try:
+        if not start:
+            # Sufijo: los últimos N bytes
+            length = int(end)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        first = int(start)
+        last = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if first >= size or last < first:
+        return False
+    return first, min(last, size - 1)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Comparación débil de If-None-Match / If-Range con el ETag del audio."""
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(
+        candidate.removeprefix("W/") == etag for candidate in candidates
+    )
+
+
+class AudioArchive:
+    """
+    Almacén comprimido y deduplicado del audio conservado.
+    Implementa el patrón Singleton.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Implementa el patrón Singleton."""
+        if cls._instance is None:
+            cls._instance = super(AudioArchive, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """Inicializa el almacén solo una vez."""
+        if not self._initialized:
+            self.logger = logging.getLogger(__name__)
+            self.store = SegmentStore(
+                AUDIO_RETENTION_CONFIG['folder'],
+                segment_max_bytes=int(AUDIO_RETENTION_CONFIG['segment_max_mb'] * 1024 * 1024),
+                compact_live_ratio=AUDIO_RETENTION_CONFIG['compact_live_ratio'],
+            )
+            self.format = AUDIO_RETENTION_CONFIG['format']
+            if self.format not in ENCODABLE_FORMATS:
+                raise ValueError(f"Formato de retención no soportado: {self.format}")
+            self.keep_compressed_uploads = AUDIO_RETENTION_CONFIG['keep_compressed_uploads']
+            self.transcode_cache_bytes = int(AUDIO_RETENTION_CONFIG['transcode_cache_mb'] * 1024 * 1024)
+            self._transcoded: "OrderedDict[tuple, bytes]" = OrderedDict()
+            self._transcoded_bytes = 0
+            self._lock = threading.Lock()
+
+            self._stored_bytes = metrics_registry.counter(
+                "audio_archive_stored_bytes_total", "Bytes escritos en el almacén de audio por formato"
+            )
+            self._deduplicated = metrics_registry.counter(
+                "audio_archive_deduplicated_total", "Clips conservados cuyo contenido ya estaba en el almacén"
+            )
+            self._transcodes = metrics_registry.counter(
+                "audio_archive_transcodes_total", "Transcodificaciones al servir audio por formato y resultado de caché"
+            )
+            self._initialized = True
+
+    def retain(self, audio: np.ndarray, uploaded_file=None, sample_rate: int = TARGET_SAMPLE_RATE) -> str:
+        """
+        Conserva un audio para get_audio.
+
+        Args:
+            audio: Forma de onda float32 mono ya decodificada
+            uploaded_file: Subida original (UploadedFile de Django); si ya viene
+                comprimida se conserva tal cual
+            sample_rate: Tasa de muestreo de audio
+
+        Returns:
+            str: Clave del clip en el almacén
+        """
+        suffix = os.path.splitext(getattr(uploaded_file, "name", "") or "")[1].lower()
+        if uploaded_file is not None and self.keep_compressed_uploads and suffix in COMPRESSED_UPLOADS:
+            data = b"".join(uploaded_file.chunks())
+            if data:
+                return self._write(data, COMPRESSED_UPLOADS[suffix][0])
+        return self.store_waveform(audio, sample_rate)
+
+    def store_waveform(self, audio: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE) -> str:
+        """
+        Codifica una forma de onda en el formato de retención y la guarda.
+
+        Returns:
+            str: Clave del clip en el almacén
+        """
+        audio_format = self.format
+        try:
+            data = self.encode(audio, sample_rate, audio_format)
+        except Exception as e:
+            # Sin soundfile (o sin codificador en libsndfile) se conserva como WAV
+            self.logger.warning(f"No se pudo codificar a {audio_format}, se conserva como WAV: {e}")
+            audio_format = "wav"
+            data = self.encode(audio, sample_rate, audio_format)
+        return self._write(data, audio_format)
+
+    def encode(self, audio: np.ndarray, sample_rate: int, audio_format: str) -> bytes:
+        """
+        Codifica una forma de onda en memoria.
+
+        Args:
+            audio: Muestras float32 (mono, o (muestras, canales))
+            sample_rate: Tasa de muestreo
+            audio_format: Uno de ENCODABLE_FORMATS
+
+        Returns:
+            bytes: Archivo codificado
+        """
+        if audio_format == "wav":
+            return self._encode_wav(audio, sample_rate)
+        import soundfile as sf
+
+        spec = ENCODABLE_FORMATS[audio_format]
+        if audio_format == "opus" and sample_rate not in _OPUS_SAMPLE_RATES:
+            mono = audio.mean(axis=1) if audio.ndim > 1 else audio
+            audio = resample(np.asarray(mono, dtype=np.float32), sample_rate, TARGET_SAMPLE_RATE)
+            sample_rate = TARGET_SAMPLE_RATE
+        buffer = io.BytesIO()
+        sf.write(buffer, audio, sample_rate, format=spec["sf_format"], subtype=spec["subtype"])
+        return buffer.getvalue()
+
+    def describe(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Metadatos de un clip conservado.
+
+        Returns:
+            Dict con format, content_type, size y etag, o None si la clave no existe
+        """
+        info = self.store.info(key)
+        if info is None:
+            return None
+        return {
+            "format": info["format"],
+            "content_type": content_type_for(info["format"]),
+            "size": info["size"],
+            "etag": key,
+        }
+
+    def read(self, key: str) -> Optional[memoryview]:
+        """
+        Contenido de un clip como vista sobre el mmap de su segmento (sin copia).
+
+        Returns:
+            memoryview, o None si la clave no existe
+        """
+        return self.store.view(key)
+
+    def negotiate(self, accept: str, stored_format: str, requested: str = None) -> Optional[str]:
+        """
+        Elige el formato en el que se sirve el audio.
+
+        El formato almacenado se prefiere siempre que el cliente lo acepte
+        (se sirve sin transcodificar y admite rangos sobre el archivo). Si
+        `Accept` no admite ningún tipo de audio (p. ej. solo application/json,
+        lo que envían por defecto los clientes de API) también se sirve el
+        almacenado, como antes de negociar el formato.
+
+        Args:
+            accept: Cabecera Accept
+            stored_format: Formato del archivo conservado
+            requested: Formato pedido explícitamente (parámetro format)
+
+        Returns:
+            str: Formato a servir, o None si el formato pedido explícitamente no se admite
+        """
+        if requested:
+            requested = requested.lower()
+            if requested == stored_format or requested in ENCODABLE_FORMATS:
+                return requested
+            return None
+
+        entries = parse_accept(accept) or [("*/*", 1.0)]
+        stored_type = content_type_for(stored_format).split(";")[0]
+        # Entre los tipos con la q más alta se prefiere el formato almacenado
+        best_q = entries[0][1]
+        for media_type, q in entries:
+            if q < best_q:
+                break
+            if media_type in ("*/*", "audio/*") or media_type == stored_type:
+                return stored_format
+        for media_type, _ in entries:
+            if media_type in ("*/*", "audio/*") or media_type == stored_type:
+                return stored_format
+            if media_type in ACCEPT_FORMATS:
+                return ACCEPT_FORMATS[media_type]
+        return stored_format
+
+    def transcode(self, key: str, audio_format: str) -> Optional[bytes]:
+        """
+        Versión del clip en otro formato (cacheada por contenido y formato).
+
+        Args:
+            key: Clave del clip conservado
+            audio_format: Uno de ENCODABLE_FORMATS
+
+        Returns:
+            bytes: Clip transcodificado, o None si la clave no existe
+        """
+        cache_key = (key, audio_format)
+        with self._lock:
+            data = self._transcoded.get(cache_key)
+            if data is not None:
+                self._transcoded.move_to_end(cache_key)
+        if data is not None:
+            self._transcodes.inc(format=audio_format, cache="hit")
+            return data
+
+        source = self.read(key)
+        if source is None:
+            return None
+        try:
+            import soundfile as sf
+
+            audio, sample_rate = sf.read(io.BytesIO(source), dtype="float32")
+        except Exception:
+            # Formatos que libsndfile no lee (mp3 antiguos, m4a, webm): 16 kHz mono
+            audio, sample_rate = audio_decoder.decode(source), TARGET_SAMPLE_RATE
+        data = self.encode(audio, sample_rate, audio_format)
+        self._transcodes.inc(format=audio_format, cache="miss")
+
+        if len(data) <= self.transcode_cache_bytes:
+            with self._lock:
+                if cache_key not in self._transcoded:
+                    self._transcoded[cache_key] = data
+                    self._transcoded_bytes += len(data)
+                while self._transcoded_bytes > self.transcode_cache_bytes:
+                    _, evicted = self._transcoded.popitem(last=False)
+                    self._transcoded_bytes -= len(evicted)
+        return data
+
+    def remove(self, key: str):
+        """Quita una referencia al clip (el espacio se recupera al compactar)."""
+        self.store.release(key)
+
+    def compact(self) -> int:
+        """
+        Compacta los segmentos con pocos clips vivos.
+
+        Returns:
+            int: Número de segmentos eliminados
+        """
+        removed = self.store.compact()
+        if removed:
+            self.logger.info(f"Compactación del almacén de audio: {removed} segmentos eliminados")
+        return removed
+
+    def _write(self, data: bytes, audio_format: str) -> str:
+        key, created = self.store.put(data, audio_format)
+        if not created:
+            self._deduplicated.inc()
+        else:
+            self._stored_bytes.inc(len(data), format=audio_format)
+        return key
+
+    def _encode_wav(self, audio: np.ndarray, sample_rate: int) -> bytes:
+        audio = np.asarray(audio, dtype=np.float32)
+        channels = 1 if audio.ndim == 1 else audio.shape[1]
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767.0).astype("<i2")
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(channels)
+            wav.setsampwidth(2)
+            wav.setframerate(int(sample_rate))
+            wav.writeframes(pcm.tobytes())
+        return buffer.getvalue()
+
+
+# Instancia global del almacén de audio conservado (Singleton)
+audio_archive = AudioArchive()
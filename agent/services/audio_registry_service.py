@@ -0,0 +1,208 @@
+"""
+Registro del audio conservado para get_audio.
+
+Cada audio conservado es una fila RetainedAudio (con formato, tamaño y ETag),
+así que cualquier proceso puede servir un audio procesado por otro. La fila
+lleva su fecha de caducidad indexada; un hilo de barrido en segundo plano
+libera los clips caducados en orden de caducidad, por lotes, y compacta el
+almacén de segmentos, y la ruta de las peticiones solo hace consultas por
+clave primaria. Cada usuario tiene una cuota de audio conservado: al
+superarla caducan sus audios más antiguos.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from ..config import AUDIO_REGISTRY_CONFIG
+from .audio_archive_service import audio_archive
+from .metrics_service import metrics_registry
+
+
+class AudioRegistry:
+    """
+    Registro compartido de audios conservados con caducidad.
+    Implementa el patrón Singleton.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Implementa el patrón Singleton."""
+        if cls._instance is None:
+            cls._instance = super(AudioRegistry, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """Inicializa el registro solo una vez."""
+        if not self._initialized:
+            self.logger = logging.getLogger(__name__)
+            self.ttl_seconds = AUDIO_REGISTRY_CONFIG['ttl_seconds']
+            self.batch_size = AUDIO_REGISTRY_CONFIG['sweep_batch_size']
+            self.user_quota_bytes = int(AUDIO_REGISTRY_CONFIG['user_quota_mb'] * 1024 * 1024)
+            self._lock = threading.Lock()
+            self._sweeper = None
+
+            self._registered = metrics_registry.counter(
+                "audio_registry_registered_total", "Audios conservados registrados para get_audio"
+            )
+            self._expired = metrics_registry.counter(
+                "audio_registry_expired_total", "Audios conservados borrados por caducidad"
+            )
+            self._evicted = metrics_registry.counter(
+                "audio_registry_quota_evictions_total", "Audios conservados caducados antes de tiempo por la cuota del usuario"
+            )
+            self._initialized = True
+
+    def register(self, user_id: int, audio_key: str, sound_type: str = "") -> Optional[str]:
+        """
+        Registra un audio conservado. Si con él el usuario supera su cuota,
+        sus audios más antiguos caducan en el momento.
+
+        Args:
+            user_id: Usuario propietario
+            audio_key: Clave del clip en el almacén de audio (el registro se
+                queda con la referencia que tomó el almacén al conservarlo)
+            sound_type: Tipo de sonido detectado
+
+        Returns:
+            str: Identificador del audio, o None si la clave no existe
+        """
+        from django.utils import timezone
+        from ..models import RetainedAudio
+
+        entry = audio_archive.describe(audio_key)
+        if entry is None:
+            return None
+        audio_id = str(uuid.uuid4())
+        try:
+            RetainedAudio.objects.create(
+                audio_id=audio_id,
+                user_id=user_id,
+                audio_key=audio_key,
+                sound_type=sound_type or "",
+                audio_format=entry["format"],
+                content_type=entry["content_type"],
+                size=entry["size"],
+                etag=entry["etag"],
+                expires_at=timezone.now() + timedelta(seconds=self.ttl_seconds),
+            )
+        except Exception:
+            # Sin fila nadie liberaría la referencia del clip
+            audio_archive.remove(audio_key)
+            raise
+        self._registered.inc()
+        self._enforce_quota(user_id, audio_id)
+        self._start_sweeper()
+        return audio_id
+
+    def get(self, audio_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Audio registrado y vigente.
+
+        Args:
+            audio_id: Identificador devuelto por register
+
+        Returns:
+            Dict con user_id, audio_key, sound_type, format, content_type,
+            size y etag, o None si no existe o ha caducado
+        """
+        from django.utils import timezone
+        from ..models import RetainedAudio
+
+        self._start_sweeper()
+        row = RetainedAudio.objects.filter(pk=audio_id, expires_at__gt=timezone.now()).first()
+        if row is None:
+            return None
+        return {
+            "user_id": row.user_id,
+            "audio_key": row.audio_key,
+            "sound_type": row.sound_type,
+            "format": row.audio_format,
+            "content_type": row.content_type,
+            "size": row.size,
+            "etag": row.etag,
+        }
+
+    def sweep(self) -> int:
+        """
+        Borra los audios caducados (referencia al clip y fila) en orden de
+        caducidad y compacta el almacén.
+
+        Returns:
+            int: Número de audios borrados
+        """
+        from django.utils import timezone
+        from ..models import RetainedAudio
+
+        removed = 0
+        while True:
+            expired = list(
+                RetainedAudio.objects.filter(expires_at__lte=timezone.now())
+                .order_by("expires_at")
+                .values_list("audio_id", "audio_key")[:self.batch_size]
+            )
+            if not expired:
+                break
+            for audio_id, audio_key in expired:
+                try:
+                    audio_archive.remove(audio_key)
+                except OSError as e:
+                    self.logger.error(f"Error liberando el clip {audio_key}: {e}")
+            RetainedAudio.objects.filter(pk__in=[audio_id for audio_id, _ in expired]).delete()
+            removed += len(expired)
+            if len(expired) < self.batch_size:
+                break
+        if removed:
+            self._expired.inc(removed)
+            self.logger.info(f"Limpieza completada: {removed} audios caducados eliminados")
+            audio_archive.compact()
+        return removed
+
+    def _enforce_quota(self, user_id: int, keep_audio_id: str):
+        """Hace caducar los audios más antiguos del usuario que excedan su cuota."""
+        from django.db.models import Sum
+        from django.utils import timezone
+        from ..models import RetainedAudio
+
+        now = timezone.now()
+        live = RetainedAudio.objects.filter(user_id=user_id, expires_at__gt=now)
+        if (live.aggregate(total=Sum("size"))["total"] or 0) <= self.user_quota_bytes:
+            return
+        used, evict = 0, []
+        for audio_id, size in live.order_by("-created_at").values_list("audio_id", "size"):
+            used += size
+            if used > self.user_quota_bytes and audio_id != keep_audio_id:
+                evict.append(audio_id)
+        if evict:
+            # El barrido libera sus clips; get() ya no los devuelve
+            RetainedAudio.objects.filter(pk__in=evict).update(expires_at=now)
+            self._evicted.inc(len(evict))
+            self.logger.info(f"Cuota de audio del usuario {user_id} superada: {len(evict)} audios caducados")
+
+    def _start_sweeper(self):
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="audio-registry", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        from django.db import close_old_connections
+
+        interval = AUDIO_REGISTRY_CONFIG['sweep_interval_seconds']
+        while True:
+            time.sleep(interval)
+            try:
+                close_old_connections()
+                self.sweep()
+            except Exception as e:
+                self.logger.error(f"Error en el barrido de audios caducados: {e}")
+
+
+# Instancia global del registro de audios conservados (Singleton)
+audio_registry = AudioRegistry()
@@ -0,0 +1,160 @@
+"""
+Fragmentos y detecciones de las subidas por lotes (process_audio_batch).
+
+Una petición trae varios archivos o un único archivo con sus cortes; aquí se
+decodifican y trocean en fragmentos y, tras el análisis, las detecciones
+relevantes se guardan en bloque: una consulta por tabla para resolver
+categorías y tipos de sonido y un bulk_create para los DetectedSound.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List
+
+import numpy as np
+
+from ..config import BATCH_UPLOAD_CONFIG, SOUND_FILTER_CONFIG
+from ..tools.audio_decoding.audio_decoder import audio_decoder, TARGET_SAMPLE_RATE as SAMPLE_RATE
+from .transcription_job_service import transcription_jobs, PENDING
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_sound_type_name(name):
+    return name.strip().lower().replace(" ", "_")
+
+
+def is_critical_category(alert_category: str) -> bool:
+    """Si los sonidos de una categoría de alerta se marcan como críticos."""
+    return alert_category in SOUND_FILTER_CONFIG['critical_categories']
+
+
+def decode_upload(audio_file) -> np.ndarray:
+    """Forma de onda de una subida (desde memoria o desde el temporal de Django)."""
+    if hasattr(audio_file, "temporary_file_path"):
+        return audio_decoder.decode(audio_file.temporary_file_path())
+    audio_file.seek(0)
+    return audio_decoder.decode(audio_file.read())
+
+
+def batch_fragments(uploads, boundaries):
+    """
+    Fragmentos de una subida por lotes: varios archivos o uno solo con
+    `boundaries` (JSON con los cortes en segundos, p. ej. [3, 6, 9], o con
+    los intervalos [[0, 3], [3, 6]]).
+
+    Args:
+        uploads: Archivos de audio ya validados
+        boundaries: Cortes o intervalos del único archivo (JSON o lista), o None
+
+    Returns:
+        Tupla (waveforms, names, offsets, error): error es None si la subida es válida
+    """
+    if boundaries in (None, "", []):
+        waveforms = [decode_upload(upload) for upload in uploads]
+        names = [upload.name for upload in uploads]
+        offsets = [0.0] * len(uploads)
+    else:
+        if len(uploads) != 1:
+            return None, None, None, "boundaries solo se admite con un único archivo de audio"
+        try:
+            boundaries = json.loads(boundaries) if isinstance(boundaries, str) else boundaries
+            if all(isinstance(item, (int, float)) for item in boundaries):
+                cuts = sorted(float(cut) for cut in boundaries)
+                intervals = None
+            else:
+                intervals = [(float(start), float(end)) for start, end in boundaries]
+        except (TypeError, ValueError):
+            return None, None, None, "boundaries debe ser una lista de segundos o de intervalos [inicio, fin]"
+
+        audio = decode_upload(uploads[0])
+        duration = len(audio) / SAMPLE_RATE
+        if intervals is None:
+            edges = [0.0] + [cut for cut in cuts if 0.0 < cut < duration] + [duration]
+            intervals = list(zip(edges[:-1], edges[1:]))
+        waveforms, names, offsets = [], [], []
+        for start, end in intervals:
+            start, end = max(0.0, start), min(duration, end)
+            if end <= start:
+                continue
+            waveforms.append(audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)])
+            names.append(f"{uploads[0].name}[{start:.2f}-{end:.2f}]")
+            offsets.append(start)
+
+    if not waveforms:
+        return None, None, None, "No hay fragmentos que procesar"
+    if len(waveforms) > BATCH_UPLOAD_CONFIG["max_fragments"]:
+        return None, None, None, f"Máximo {BATCH_UPLOAD_CONFIG['max_fragments']} fragmentos por petición"
+    if sum(len(waveform) for waveform in waveforms) / SAMPLE_RATE > BATCH_UPLOAD_CONFIG["max_total_seconds"]:
+        return None, None, None, f"Máximo {BATCH_UPLOAD_CONFIG['max_total_seconds']} segundos de audio por petición"
+    return waveforms, names, offsets, None
+
+
+def persist_batch_detections(user, results: List[Dict[str, Any]]):
+    """
+    Guarda los DetectedSound de los fragmentos relevantes con una consulta por
+    tabla: categorías y tipos se resuelven en bloque y las filas se insertan
+    con bulk_create. Añade detected_sound_id y sound_type_label a cada resultado.
+    """
+    from core.models import SoundCategory, SoundType
+    from ..models import DetectedSound
+
+    for result in results:
+        result["detected_sound_id"] = None
+        result["sound_type_label"] = "Desconocido"
+
+    relevant = [result for result in results if result["sound_type"].lower() != "unknown"]
+    if not relevant:
+        return
+
+    categories = SoundCategory.objects.in_bulk(
+        {result["alert_category"] for result in relevant}, field_name="name"
+    )
+    by_name = {normalize_sound_type_name(result["sound_type"]): result for result in relevant}
+    sound_types = SoundType.objects.in_bulk(list(by_name), field_name="name")
+    missing = [
+        # Si no existe, crear uno nuevo SOLO para pruebas/desarrollo
+        SoundType(
+            name=name,
+            label=result["sound_type"],
+            description=f"Sonido detectado: {result['sound_type']}",
+            is_critical=is_critical_category(result["alert_category"]),
+        )
+        for name, result in by_name.items()
+        if name not in sound_types
+    ]
+    if missing:
+        SoundType.objects.bulk_create(missing, ignore_conflicts=True)
+        sound_types = SoundType.objects.in_bulk(list(by_name), field_name="name")
+
+    rows, owners = [], []
+    for result in relevant:
+        sound_type_obj = sound_types.get(normalize_sound_type_name(result["sound_type"]))
+        if sound_type_obj is not None:
+            result["sound_type_label"] = sound_type_obj.label
+        category_obj = categories.get(result["alert_category"])
+        if sound_type_obj is None or category_obj is None:
+            logger.warning(
+                f"No se encontró la categoría '{result['alert_category']}' para {result['name']}. No se guardó DetectedSound."
+            )
+            continue
+        rows.append(
+            DetectedSound(
+                user=user,
+                sound_type=sound_type_obj,
+                category=category_obj,
+                confidence=result["confidence"],
+                transcription=result["transcription"],
+                transcription_status=result["transcription_status"],
+                transcription_job_id=result["transcription_job_id"],
+            )
+        )
+        owners.append(result)
+
+    created = DetectedSound.objects.bulk_create(rows)
+    logger.info(f"DetectedSound guardados en bloque: {len(created)}")
+    for result, detected_sound in zip(owners, created):
+        result["detected_sound_id"] = detected_sound.pk
+        if result["transcription_status"] == PENDING and detected_sound.pk is not None:
+            # El trabajo actualizará esta fila cuando Whisper termine
+            transcription_jobs.attach(result["transcription_job_id"], detected_sound.pk)
@@ -0,0 +1,91 @@
+"""
+Ejecutor acotado para la inferencia desde código asíncrono.
+
+Los nodos asíncronos del workflow delegan aquí el trabajo de CPU (decodificar,
+YAMNet, Whisper...) en un pool de hilos de tamaño fijo: el bucle de eventos
+sigue atendiendo otras subidas y las peticiones que exceden el pool esperan
+como corrutinas en lugar de crear hilos nuevos.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from ..config import ASYNC_WORKFLOW_CONFIG
+from .metrics_service import metrics_registry
+
+
+class InferenceExecutor:
+    """
+    Pool de hilos compartido para la inferencia invocada desde corrutinas.
+    Implementa el patrón Singleton.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Implementa el patrón Singleton."""
+        if cls._instance is None:
+            cls._instance = super(InferenceExecutor, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """Inicializa el ejecutor solo una vez."""
+        if not self._initialized:
+            self.logger = logging.getLogger(__name__)
+            self.max_workers = ASYNC_WORKFLOW_CONFIG['inference_workers']
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+            self._lock = threading.Lock()
+            self._submitted = 0
+            self._running = 0
+
+            self._queued = metrics_registry.gauge(
+                "inference_executor_queued", "Tareas de inferencia esperando un hilo libre"
+            )
+            self._active = metrics_registry.gauge(
+                "inference_executor_running", "Tareas de inferencia en ejecución"
+            )
+            self._initialized = True
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Ejecuta una función bloqueante en el pool sin bloquear el bucle de eventos.
+
+        Args:
+            fn: Función a ejecutar
+            *args: Argumentos posicionales
+            **kwargs: Argumentos con nombre
+
+        Returns:
+            Resultado de la función
+        """
+        loop = asyncio.get_running_loop()
+        self._update(submitted=1)
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(self._call, fn, *args, **kwargs))
+        finally:
+            self._update(submitted=-1)
+
+    def _call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        self._update(running=1)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._update(running=-1)
+
+    def _update(self, submitted: int = 0, running: int = 0):
+        with self._lock:
+            self._submitted += submitted
+            self._running += running
+            queued = self._submitted - self._running
+            active = self._running
+        self._queued.set(max(0, queued))
+        self._active.set(active)
+
+
+# Instancia global del ejecutor de inferencia (Singleton)
+inference_executor = InferenceExecutor()
@@ -0,0 +1,205 @@
+"""
+Servicio de métricas en proceso para Signaware.
+Proporciona contadores, gauges e histogramas con etiquetas, compartidos por
+todos los componentes del agente para poder ajustar el rendimiento.
+"""
+
+import bisect
+import threading
+from typing import Dict, Any, Optional, Sequence, Tuple
+
+# Buckets por defecto (segundos) para latencias
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    """Base común: nombre, descripción y valores por combinación de etiquetas."""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[Tuple[str, str], ...], Any] = {}
+
+    def samples(self) -> Dict[Tuple[Tuple[str, str], ...], Any]:
+        """Devuelve una copia de los valores actuales por etiquetas."""
+        with self._lock:
+            return {key: self._copy_value(value) for key, value in self._values.items()}
+
+    def _copy_value(self, value):
+        return value
+
+
+class Counter(_Metric):
+    """Contador monótono."""
+
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """Valor instantáneo que puede subir o bajar."""
+
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    """Histograma acumulativo con buckets fijos."""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, description: str = "", buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, description)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+                self._values[key] = entry
+            entry["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def _copy_value(self, value):
+        return {"counts": list(value["counts"]), "sum": value["sum"], "count": value["count"]}
+
+
+class MetricsRegistry:
+    """
+    Registro global de métricas del proceso.
+    Implementa el patrón Singleton.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        """Implementa el patrón Singleton."""
+        if cls._instance is None:
+            cls._instance = super(MetricsRegistry, cls).__new__(cls)
+            cls._instance._metrics = {}
+            cls._instance._lock = threading.Lock()
+        return cls._instance
+
+    def _get_or_create(self, metric_class, name: str, description: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, description, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"La métrica '{name}' ya existe con otro tipo: {metric.metric_type}")
+            return metric
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(self, name: str, description: str = "", buckets: Optional[Sequence[float]] = None) -> Histogram:
+        return self._get_or_create(Histogram, name, description, buckets=buckets or DEFAULT_LATENCY_BUCKETS)
+
+    def all_metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Obtiene una vista serializable de todas las métricas.
+
+        Returns:
+            Dict[str, Any]: Métricas por nombre con tipo, descripción y valores
+        """
+        result = {}
+        for metric in self.all_metrics():
+            values = []
+            for key, value in metric.samples().items():
+                sample = {"labels": dict(key), "value": value}
+                if isinstance(metric, Histogram):
+                    sample["buckets"] = list(metric.buckets)
+                values.append(sample)
+            result[metric.name] = {
+                "type": metric.metric_type,
+                "description": metric.description,
+                "values": values,
+            }
+        return result
+
+    def to_prometheus(self) -> str:
+        """
+        Exporta todas las métricas en el formato de texto de Prometheus (0.0.4).
+
+        Returns:
+            str: Exposición de texto con HELP, TYPE y muestras
+        """
+        lines = []
+        for metric in sorted(self.all_metrics(), key=lambda m: m.name):
+            description = metric.description.replace("\\", "\\\\").replace("\n", "\\n")
+            lines.append(f"# HELP {metric.name} {description}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for key, value in sorted(metric.samples().items()):
+                if isinstance(metric, Histogram):
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets + (float("inf"),), value["counts"]):
+                        cumulative += count
+                        le = (("le", _format_value(bound)),)
+                        lines.append(f"{metric.name}_bucket{_format_labels(key, le)} {cumulative}")
+                    lines.append(f"{metric.name}_sum{_format_labels(key)} {_format_value(value['sum'])}")
+                    lines.append(f"{metric.name}_count{_format_labels(key)} {value['count']}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Instancia global del registro de métricas (Singleton)
+metrics_registry = MetricsRegistry()
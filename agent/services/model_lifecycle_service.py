@@ -0,0 +1,262 @@
+"""
+Ciclo de vida de los modelos pesados del agente.
+
+Cada modelo se registra con una función de carga y se carga la primera vez
+que se usa. Mientras está en uso se lleva un contador de referencias; cuando
+queda inactivo más allá de su TTL se descarga, y si cargar uno nuevo supera
+el límite de memoria del proceso se descarga primero el menos usado
+recientemente que no esté en uso.
+"""
+
+import gc
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from ..config import MODEL_LIFECYCLE_CONFIG
+from .metrics_service import metrics_registry
+
+
+class _ManagedModel:
+    """Estado de un modelo registrado."""
+
+    def __init__(self, name: str, loader: Callable[[], Any], memory_mb: float, ttl_seconds: float):
+        self.name = name
+        self.loader = loader
+        self.memory_mb = memory_mb
+        self.ttl_seconds = ttl_seconds
+        self.instance: Any = None
+        self.refcount = 0
+        self.last_used = 0.0
+        self.loading = threading.Event()
+        self.loading.set()
+
+
+class ModelLifecycleManager:
+    """
+    Carga bajo demanda, descarga por inactividad y límite de memoria por proceso.
+    Implementa el patrón Singleton.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Implementa el patrón Singleton."""
+        if cls._instance is None:
+            cls._instance = super(ModelLifecycleManager, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """Inicializa el gestor solo una vez."""
+        if not self._initialized:
+            self.logger = logging.getLogger(__name__)
+            self.memory_ceiling_mb = MODEL_LIFECYCLE_CONFIG['memory_ceiling_mb']
+            self._models: Dict[str, _ManagedModel] = {}
+            self._lock = threading.RLock()
+            self._sweeper: Optional[threading.Thread] = None
+
+            self._loads = metrics_registry.counter("model_loads_total", "Cargas de modelos")
+            self._unloads = metrics_registry.counter("model_unloads_total", "Descargas de modelos por motivo")
+            self._load_time = metrics_registry.histogram("model_load_seconds", "Duración de la carga de modelos")
+            self._unload_time = metrics_registry.histogram("model_unload_seconds", "Duración de la descarga de modelos")
+            self._loaded = metrics_registry.gauge("model_loaded", "1 si el modelo está cargado")
+            self._memory = metrics_registry.gauge("models_loaded_memory_mb", "Memoria estimada de los modelos cargados")
+            self._initialized = True
+
+    def register(self, name: str, loader: Callable[[], Any], memory_mb: float = None, ttl_seconds: float = None):
+        """
+        Registra un modelo sin cargarlo.
+
+        Args:
+            name: Nombre del modelo
+            loader: Función que construye la instancia
+            memory_mb: Memoria estimada (por defecto la de la configuración)
+            ttl_seconds: Inactividad tras la que se descarga (0 = nunca)
+        """
+        defaults = MODEL_LIFECYCLE_CONFIG['models'].get(name, {})
+        if memory_mb is None:
+            memory_mb = defaults.get('memory_mb', 0)
+        if ttl_seconds is None:
+            ttl_seconds = defaults.get('ttl_seconds', MODEL_LIFECYCLE_CONFIG['idle_ttl_seconds'])
+
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = _ManagedModel(name, loader, memory_mb, ttl_seconds)
+                self._loaded.set(0, model=name)
+        if ttl_seconds:
+            self._start_sweeper()
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[Any]:
+        """
+        Obtiene el modelo (cargándolo si hace falta) y lo protege de la
+        descarga mientras dura el bloque.
+
+        Args:
+            name: Nombre del modelo registrado
+
+        Yields:
+            Instancia del modelo
+        """
+        instance = self.acquire(name)
+        try:
+            yield instance
+        finally:
+            self.release(name)
+
+    def acquire(self, name: str) -> Any:
+        """Incrementa el contador de referencias y devuelve la instancia cargada."""
+        model = self._get(name)
+        while True:
+            model.loading.wait()
+            with self._lock:
+                if model.instance is not None:
+                    model.refcount += 1
+                    model.last_used = time.monotonic()
+                    return model.instance
+                if model.loading.is_set():
+                    # Este hilo hace la carga; los demás esperan al evento
+                    model.loading.clear()
+                    break
+
+        try:
+            return self._load(model)
+        finally:
+            model.loading.set()
+
+    def release(self, name: str):
+        """Decrementa el contador de referencias."""
+        model = self._get(name)
+        with self._lock:
+            model.refcount = max(0, model.refcount - 1)
+            model.last_used = time.monotonic()
+
+    def unload(self, name: str, reason: str = "manual") -> bool:
+        """
+        Descarga un modelo si no está en uso.
+
+        Returns:
+            bool: True si se descargó
+        """
+        model = self._get(name)
+        with self._lock:
+            if model.instance is None or model.refcount > 0:
+                return False
+            instance, model.instance = model.instance, None
+            self._update_memory()
+
+        start = time.perf_counter()
+        close = getattr(instance, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                self.logger.warning(f"Error cerrando el modelo '{name}': {e}")
+        del instance
+        gc.collect()
+        elapsed = time.perf_counter() - start
+
+        self._unloads.inc(model=name, reason=reason)
+        self._unload_time.observe(elapsed, model=name)
+        self._loaded.set(0, model=name)
+        self.logger.info(f"Modelo '{name}' descargado ({reason}) en {elapsed:.2f}s")
+        return True
+
+    def sweep(self):
+        """Descarga los modelos inactivos más allá de su TTL."""
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                model.name for model in self._models.values()
+                if model.instance is not None
+                and model.refcount == 0
+                and model.ttl_seconds
+                and now - model.last_used > model.ttl_seconds
+            ]
+        for name in idle:
+            self.unload(name, reason="idle")
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Estado de los modelos registrados."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                model.name: {
+                    "loaded": model.instance is not None,
+                    "refcount": model.refcount,
+                    "memory_mb": model.memory_mb,
+                    "idle_seconds": round(now - model.last_used, 1) if model.last_used else None,
+                }
+                for model in self._models.values()
+            }
+
+    def _get(self, name: str) -> _ManagedModel:
+        model = self._models.get(name)
+        if model is None:
+            raise KeyError(f"Modelo '{name}' no registrado. Disponibles: {list(self._models.keys())}")
+        return model
+
+    def _load(self, model: _ManagedModel) -> Any:
+        """Carga el modelo y lo devuelve ya retenido por quien lo cargó."""
+        self._make_room(model)
+
+        start = time.perf_counter()
+        instance = model.loader()
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            # La referencia se toma al publicar la instancia: ni el barrido ni
+            # _make_room pueden descargarla antes de que la use quien la cargó
+            model.instance = instance
+            model.refcount += 1
+            model.last_used = time.monotonic()
+            self._update_memory()
+        self._loads.inc(model=model.name)
+        self._load_time.observe(elapsed, model=model.name)
+        self._loaded.set(1, model=model.name)
+        self.logger.info(f"Modelo '{model.name}' cargado en {elapsed:.2f}s (~{model.memory_mb} MB)")
+        return instance
+
+    def _make_room(self, incoming: _ManagedModel):
+        """Descarga modelos LRU sin uso hasta que el nuevo quepa bajo el límite."""
+        while True:
+            with self._lock:
+                loaded = [m for m in self._models.values() if m.instance is not None]
+                used = sum(m.memory_mb for m in loaded)
+                if used + incoming.memory_mb <= self.memory_ceiling_mb:
+                    return
+                candidates = sorted((m for m in loaded if m.refcount == 0), key=lambda m: m.last_used)
+                if not candidates:
+                    self.logger.warning(
+                        f"Límite de memoria superado al cargar '{incoming.name}' "
+                        f"({used + incoming.memory_mb} MB > {self.memory_ceiling_mb} MB) y no hay modelos libres"
+                    )
+                    return
+                victim = candidates[0].name
+            self.unload(victim, reason="memory")
+
+    def _update_memory(self):
+        self._memory.set(sum(m.memory_mb for m in self._models.values() if m.instance is not None))
+
+    def _start_sweeper(self):
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="model-lifecycle", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        interval = MODEL_LIFECYCLE_CONFIG['sweep_interval_seconds']
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                self.logger.error(f"Error revisando modelos inactivos: {e}")
+
+
+# Instancia global del gestor de modelos (Singleton)
+model_lifecycle = ModelLifecycleManager()
@@ -0,0 +1,233 @@
+"""
+Registro local de artefactos de modelos.
+
+Los cargadores (YAMNet, Whisper, embeddings, Stable Diffusion) preguntan aquí
+antes de ir a la red: si el artefacto está descargado en la carpeta de modelos
+y coincide con el manifiesto, se usa la ruta local; si no, se devuelve el
+identificador remoto original.
+
+El sha256 solo se calcula al descargar o registrar un artefacto. Al cargar se
+compara la firma de archivos (tamaño y fecha de modificación de cada archivo)
+guardada junto al checksum, para no releer gigabytes de pesos en cada arranque.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, List
+
+from ..config import MODEL_REGISTRY, MODEL_REGISTRY_CONFIG, get_models_folder
+
+
+class ModelRegistry:
+    """
+    Resuelve artefactos de modelos a rutas locales verificadas.
+    Implementa el patrón Singleton.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Implementa el patrón Singleton."""
+        if cls._instance is None:
+            cls._instance = super(ModelRegistry, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """Inicializa el registro solo una vez."""
+        if not self._initialized:
+            self.logger = logging.getLogger(__name__)
+            self.root = MODEL_REGISTRY_CONFIG['root'] or get_models_folder()
+            self.manifest_path = os.path.join(self.root, MODEL_REGISTRY_CONFIG['manifest'])
+            self._lock = threading.Lock()
+            self._initialized = True
+
+    def entry(self, name: str) -> Dict[str, Any]:
+        """Obtiene la entrada de configuración de un artefacto."""
+        if name not in MODEL_REGISTRY:
+            raise KeyError(f"Artefacto '{name}' no registrado. Disponibles: {list(MODEL_REGISTRY.keys())}")
+        return MODEL_REGISTRY[name]
+
+    def local_path(self, name: str) -> str:
+        """Ruta local donde se guarda el artefacto."""
+        return os.path.join(self.root, self.entry(name)['path'])
+
+    def resolve(self, name: str) -> str:
+        """
+        Resuelve un artefacto a su ruta local o, si no está disponible, a su origen remoto.
+
+        Args:
+            name: Nombre del artefacto en MODEL_REGISTRY
+
+        Returns:
+            str: Ruta local verificada o identificador remoto
+        """
+        entry = self.entry(name)
+        path = self.local_path(name)
+
+        if not os.path.exists(path):
+            self.logger.warning(f"Artefacto '{name}' no disponible en local ({path}), usando origen remoto: {entry['source']}")
+            return entry['source']
+
+        if MODEL_REGISTRY_CONFIG['verify_checksums'] and not self.verify(name):
+            self.logger.error(f"Artefacto '{name}' en {path} no coincide con el manifiesto, usando origen remoto: {entry['source']}")
+            return entry['source']
+
+        return path
+
+    def resolve_source(self, source: str) -> str:
+        """
+        Resuelve un identificador remoto (p. ej. 'small' o un repo de HuggingFace)
+        a su ruta local si hay un artefacto registrado con ese origen.
+
+        Args:
+            source: Identificador remoto del modelo
+
+        Returns:
+            str: Ruta local verificada o el mismo identificador
+        """
+        for name, entry in MODEL_REGISTRY.items():
+            if entry['source'] == source and entry['kind'] != 'derived':
+                return self.resolve(name)
+        return source
+
+    def version(self, name: str) -> str:
+        """
+        Identificador de versión de un artefacto para claves de caché: el
+        checksum registrado si existe o, si no, su origen.
+
+        Args:
+            name: Nombre del artefacto
+
+        Returns:
+            str: Versión del artefacto
+        """
+        recorded = self._read_manifest().get(name, {}).get('sha256')
+        return recorded[:16] if recorded else self.entry(name)['source']
+
+    def verify(self, name: str, full: bool = False) -> bool:
+        """
+        Comprueba el artefacto local contra el manifiesto.
+
+        Por defecto solo compara la firma de archivos registrada (tamaño y fecha
+        de cada archivo), sin leer su contenido. Con `full=True` recalcula el sha256.
+
+        Args:
+            name: Nombre del artefacto
+            full: Recalcular el checksum completo
+
+        Returns:
+            bool: True si coincide o si aún no hay checksum registrado
+        """
+        path = self.local_path(name)
+        recorded = self._read_manifest().get(name, {})
+        expected = recorded.get('sha256')
+        if not expected:
+            return True
+
+        stored_signature = recorded.get('signature')
+        if not full and stored_signature is not None:
+            return stored_signature == self._signature(path)
+
+        # Manifiesto anterior sin firma (o verificación completa pedida): se hashea una vez
+        valid = self.checksum(path) == expected
+        if valid:
+            self._write_entry(name, expected)
+        return valid
+
+    def record(self, name: str) -> str:
+        """
+        Calcula el checksum del artefacto local y lo guarda en el manifiesto
+        junto con su firma de archivos.
+
+        Args:
+            name: Nombre del artefacto
+
+        Returns:
+            str: Checksum sha256 registrado
+        """
+        digest = self.checksum(self.local_path(name))
+        self._write_entry(name, digest)
+        self.logger.info(f"Artefacto '{name}' registrado: {digest}")
+        return digest
+
+    def _write_entry(self, name: str, digest: str):
+        path = self.local_path(name)
+        with self._lock:
+            manifest = self._read_manifest()
+            manifest[name] = {
+                'path': self.entry(name)['path'],
+                'source': self.entry(name)['source'],
+                'sha256': digest,
+                'signature': self._signature(path),
+                'recorded_at': datetime.now().isoformat(),
+            }
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.manifest_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Estado de todos los artefactos registrados."""
+        manifest = self._read_manifest()
+        return {
+            name: {
+                'local_path': self.local_path(name),
+                'available_offline': os.path.exists(self.local_path(name)),
+                'checksum_recorded': bool(manifest.get(name, {}).get('sha256')),
+            }
+            for name in MODEL_REGISTRY
+        }
+
+    @staticmethod
+    def checksum(path: str) -> str:
+        """sha256 de un archivo, o del contenido y rutas relativas de un directorio."""
+        digest = hashlib.sha256()
+        if os.path.isfile(path):
+            files = [(os.path.basename(path), path)]
+        else:
+            files = []
+            for base, dirs, names in os.walk(path):
+                dirs.sort()
+                for file_name in sorted(names):
+                    full_path = os.path.join(base, file_name)
+                    files.append((os.path.relpath(full_path, path), full_path))
+
+        for relative, full_path in files:
+            digest.update(relative.replace(os.sep, '/').encode('utf-8'))
+            with open(full_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _signature(path: str) -> List[List[Any]]:
+        """[ruta relativa, tamaño, mtime_ns] de cada archivo, en el formato del manifiesto."""
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            return [[os.path.basename(path), stat.st_size, stat.st_mtime_ns]]
+        signature = []
+        for base, _, names in os.walk(path):
+            for file_name in names:
+                full_path = os.path.join(base, file_name)
+                stat = os.stat(full_path)
+                relative = os.path.relpath(full_path, path).replace(os.sep, '/')
+                signature.append([relative, stat.st_size, stat.st_mtime_ns])
+        return sorted(signature)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"No se pudo leer el manifiesto de modelos {self.manifest_path}: {e}")
+            return {}
+
+
+# Instancia global del registro de modelos (Singleton)
+model_registry = ModelRegistry()
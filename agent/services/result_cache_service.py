@@ -0,0 +1,230 @@
+"""
+Caché de resultados del workflow de detección de sonidos.
+
+La clave combina el hash del PCM decodificado con la versión de la
+configuración de análisis (sonidos relevantes, umbrales, filtros) y de los
+modelos, de modo que un reenvío idéntico devuelve el resultado anterior sin
+pasar por YAMNet ni Whisper, y cualquier cambio de configuración invalida
+las entradas previas.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from ..config import (
+    ACTIVITY_GATE_CONFIG,
+    CONFIDENCE_THRESHOLDS,
+    CUSTOM_SOUND_HEADS_CONFIG,
+    DEMUCS_CONFIG,
+    DIARIZATION_CONFIG,
+    RELEVANT_SOUNDS_DICT,
+    RESULT_CACHE_CONFIG,
+    SOUND_FILTER_CONFIG,
+    SPEECH_REGIONS_CONFIG,
+    STREAMING_ANALYSIS_CONFIG,
+    WHISPER_CONFIG,
+    WORKFLOW_CONFIG,
+    get_cache_folder,
+)
+from .metrics_service import metrics_registry
+
+
+class AudioResultCache:
+    """
+    Caché de dos niveles (LRU en memoria y disco opcional) para los
+    resultados del workflow. Implementa el patrón Singleton.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Implementa el patrón Singleton."""
+        if cls._instance is None:
+            cls._instance = super(AudioResultCache, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """Inicializa la caché solo una vez."""
+        if not self._initialized:
+            self.logger = logging.getLogger(__name__)
+            self.max_entries = RESULT_CACHE_CONFIG['memory_entries']
+            self.disk_root = os.path.join(get_cache_folder(), RESULT_CACHE_CONFIG['disk_folder'])
+            self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+            self._lock = threading.Lock()
+            self._version: Optional[str] = None
+
+            self.hits = metrics_registry.counter(
+                "sound_detector_cache_hits_total", "Resultados servidos desde la caché por nivel"
+            )
+            self.misses = metrics_registry.counter(
+                "sound_detector_cache_misses_total", "Consultas a la caché sin resultado"
+            )
+            self.entries = metrics_registry.gauge(
+                "sound_detector_cache_entries", "Entradas en el nivel de memoria"
+            )
+            self._initialized = True
+
+    @property
+    def enabled(self) -> bool:
+        return RESULT_CACHE_CONFIG['enabled']
+
+    def config_version(self) -> str:
+        """
+        Huella de la configuración que afecta al resultado. Si cambia, se
+        vacía el nivel de memoria y se descarta el directorio de disco anterior.
+
+        Returns:
+            str: Versión de la configuración
+        """
+        payload = json.dumps(
+            [
+                RELEVANT_SOUNDS_DICT,
+                SOUND_FILTER_CONFIG,
+                CONFIDENCE_THRESHOLDS,
+                STREAMING_ANALYSIS_CONFIG,
+                CUSTOM_SOUND_HEADS_CONFIG,
+                ACTIVITY_GATE_CONFIG,
+                WHISPER_CONFIG,
+                SPEECH_REGIONS_CONFIG,
+                DEMUCS_CONFIG,
+                DIARIZATION_CONFIG,
+                WORKFLOW_CONFIG,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        version = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+        if version != self._version:
+            self._invalidate(version)
+        return version
+
+    def make_key(self, waveform: np.ndarray, *parts: Any) -> str:
+        """
+        Clave de caché de un clip.
+
+        Args:
+            waveform: PCM decodificado (float32, 16 kHz mono)
+            *parts: Versiones adicionales (modelos, clasificador del usuario)
+
+        Returns:
+            str: Clave hexadecimal
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(self.config_version().encode('utf-8'))
+        for part in parts:
+            digest.update(b'\0')
+            digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(np.ascontiguousarray(waveform, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca un resultado en memoria y, si no está, en disco.
+
+        Args:
+            key: Clave devuelta por make_key
+
+        Returns:
+            Dict con el resultado o None
+        """
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+        if result is not None:
+            self.hits.inc(tier="memory")
+            return result
+
+        result = self._read_disk(key)
+        if result is not None:
+            self.hits.inc(tier="disk")
+            self._put_memory(key, result)
+            return result
+
+        self.misses.inc()
+        return None
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """
+        Guarda un resultado en memoria y, si está activo, en disco.
+
+        Args:
+            key: Clave devuelta por make_key
+            result: Campos del estado a reutilizar
+        """
+        self._put_memory(key, result)
+        if RESULT_CACHE_CONFIG['disk_enabled']:
+            try:
+                self._write_disk(key, result)
+            except OSError as e:
+                self.logger.warning(f"No se pudo escribir en la caché de disco: {e}")
+
+    def clear(self):
+        """Vacía el nivel de memoria."""
+        with self._lock:
+            self._memory.clear()
+        self.entries.set(0)
+
+    def _put_memory(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+            size = len(self._memory)
+        self.entries.set(size)
+
+    def _invalidate(self, version: str):
+        with self._lock:
+            if version == self._version:
+                return
+            previous, self._version = self._version, version
+            self._memory.clear()
+        self.entries.set(0)
+        if previous is not None:
+            self.logger.info(f"Configuración de análisis cambiada ({previous} → {version}), caché invalidada")
+
+        # Las entradas de disco viven en un directorio por versión; las antiguas ya no sirven
+        if RESULT_CACHE_CONFIG['disk_enabled'] and os.path.isdir(self.disk_root):
+            for name in os.listdir(self.disk_root):
+                if name != version:
+                    shutil.rmtree(os.path.join(self.disk_root, name), ignore_errors=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_root, self._version or "", key[:2], f"{key}.pkl")
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not RESULT_CACHE_CONFIG['disk_enabled']:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            self.logger.warning(f"Entrada de caché corrupta {path}: {e}")
+            return None
+
+    def _write_disk(self, key: str, result: Dict[str, Any]):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+
+# Instancia global de la caché de resultados (Singleton)
+audio_result_cache = AudioResultCache()
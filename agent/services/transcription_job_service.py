@@ -0,0 +1,230 @@
+"""
+Trabajos de transcripción diferida.
+
+Cuando la detección se devuelve sin esperar a Whisper, la transcripción se
+encola aquí con un identificador de trabajo. Un pool de hilos la ejecuta y, al
+terminar, actualiza la fila DetectedSound asociada y la entrada de la caché de
+resultados; el cliente la obtiene consultando el trabajo o por SSE.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from ..config import TRANSCRIPTION_JOBS_CONFIG
+from .metrics_service import metrics_registry
+from .result_cache_service import audio_result_cache
+
+PENDING = "pending"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class _TranscriptionJob:
+    """Estado de un trabajo de transcripción."""
+
+    def __init__(self, job_id: str, user_id: Optional[int]):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.status = PENDING
+        self.transcription: Any = ""
+        self.error: Optional[str] = None
+        self.detected_sound_id: Optional[int] = None
+        self.cache_entry: Optional[tuple] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "transcription_status": self.status,
+            "transcription": self.transcription,
+            "error": self.error,
+            "detected_sound_id": self.detected_sound_id,
+        }
+
+
+class TranscriptionJobService:
+    """
+    Cola de transcripciones en segundo plano con seguimiento por identificador.
+    Implementa el patrón Singleton.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Implementa el patrón Singleton."""
+        if cls._instance is None:
+            cls._instance = super(TranscriptionJobService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """Inicializa el servicio solo una vez."""
+        if not self._initialized:
+            self.logger = logging.getLogger(__name__)
+            self.retention_seconds = TRANSCRIPTION_JOBS_CONFIG['retention_seconds']
+            self._jobs: Dict[str, _TranscriptionJob] = {}
+            self._lock = threading.Lock()
+            self._executor = ThreadPoolExecutor(
+                max_workers=TRANSCRIPTION_JOBS_CONFIG['workers'], thread_name_prefix="transcription-job"
+            )
+
+            self._jobs_total = metrics_registry.counter(
+                "transcription_jobs_total", "Trabajos de transcripción diferida por resultado"
+            )
+            self._pending = metrics_registry.gauge(
+                "transcription_jobs_pending", "Trabajos de transcripción en cola o en curso"
+            )
+            self._delay = metrics_registry.histogram(
+                "transcription_job_seconds", "Tiempo desde la respuesta hasta la transcripción lista"
+            )
+            self._initialized = True
+
+    def submit(self, work: Callable[[], Any], user_id: Optional[int] = None) -> str:
+        """
+        Encola una transcripción.
+
+        Args:
+            work: Función sin argumentos que devuelve la transcripción
+            user_id: Usuario propietario del trabajo
+
+        Returns:
+            str: Identificador del trabajo
+        """
+        self._expire()
+        job = _TranscriptionJob(str(uuid.uuid4()), user_id)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._pending.set(self._count_pending())
+        self._executor.submit(self._run, job, work)
+        return job.job_id
+
+    def attach(self, job_id: str, detected_sound_id: int):
+        """
+        Asocia el trabajo a la fila DetectedSound que debe actualizar. Si la
+        transcripción ya terminó, la fila se actualiza en el momento.
+
+        Args:
+            job_id: Identificador del trabajo
+            detected_sound_id: Clave primaria de DetectedSound
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.detected_sound_id = detected_sound_id
+            finished = job.status != PENDING
+        if finished:
+            self._update_detected_sound(job)
+
+    def set_cache_entry(self, job_id: str, cache_key: str, result: Dict[str, Any]):
+        """
+        Guarda en la caché de resultados el resultado completo cuando la
+        transcripción esté lista (no se cachean resultados a medias).
+
+        Args:
+            job_id: Identificador del trabajo
+            cache_key: Clave del audio en la caché de resultados
+            result: Campos del estado; 'transcription' se rellena al terminar
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.cache_entry = (cache_key, result)
+            finished = job.status != PENDING
+        if finished:
+            self._store_cache_entry(job)
+
+    def get(self, job_id: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Estado de un trabajo.
+
+        Args:
+            job_id: Identificador del trabajo
+            user_id: Si se indica, solo se devuelve si el trabajo es de ese usuario
+
+        Returns:
+            Dict con job_id, transcription_status, transcription, error y
+            detected_sound_id, o None si no existe
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or (user_id is not None and job.user_id != user_id):
+                return None
+            return job.to_dict()
+
+    def wait(self, job_id: str, timeout: float = None) -> bool:
+        """
+        Espera a que el trabajo termine.
+
+        Returns:
+            bool: True si terminó dentro del plazo
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job is not None and job.done.wait(timeout)
+
+    def _run(self, job: _TranscriptionJob, work: Callable[[], Any]):
+        try:
+            transcription = work()
+            with self._lock:
+                job.transcription = transcription or ""
+                job.status = COMPLETED
+        except Exception as e:
+            self.logger.error(f"Error en la transcripción diferida {job.job_id}: {e}")
+            with self._lock:
+                job.error = str(e)
+                job.status = FAILED
+        finally:
+            with self._lock:
+                job.finished_at = time.time()
+                self._pending.set(self._count_pending())
+            self._jobs_total.inc(status=job.status)
+            self._delay.observe(job.finished_at - job.created_at)
+
+        self._update_detected_sound(job)
+        self._store_cache_entry(job)
+        job.done.set()
+
+    def _update_detected_sound(self, job: _TranscriptionJob):
+        if job.detected_sound_id is None:
+            return
+        try:
+            from ..models import DetectedSound
+
+            DetectedSound.objects.filter(pk=job.detected_sound_id).update(
+                transcription=job.transcription, transcription_status=job.status
+            )
+        except Exception as e:
+            self.logger.error(f"No se pudo actualizar DetectedSound {job.detected_sound_id}: {e}")
+
+    def _store_cache_entry(self, job: _TranscriptionJob):
+        if job.cache_entry is None or job.status != COMPLETED:
+            return
+        cache_key, result = job.cache_entry
+        job.cache_entry = None
+        audio_result_cache.put(cache_key, dict(result, transcription=job.transcription, transcription_status=COMPLETED))
+
+    def _count_pending(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == PENDING)
+
+    def _expire(self):
+        """Olvida los trabajos terminados hace más de retention_seconds."""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+# Instancia global del servicio de trabajos de transcripción (Singleton)
+transcription_jobs = TranscriptionJobService()
@@ -0,0 +1,592 @@
+"""
+Sesiones de subida troceada y reanudable para grabaciones largas.
+
+El cliente abre una sesión y envía la grabación en trozos con su offset en
+bytes. Cada trozo se decodifica y se analiza con YAMNet al llegar (el
+decodificador y el análisis arrastran entre trozos la cabecera, las muestras
+partidas y la ventana pendiente), así que las detecciones parciales se pueden
+consultar mientras la subida sigue en curso. Si la conexión se corta, el
+cliente consulta el offset confirmado y continúa desde ahí; los trozos
+repetidos se ignoran y los solapados se recortan.
+
+El estado de cada sesión es una fila UploadSession, así que cualquier proceso
+puede recibir el siguiente trozo. Los bytes recibidos se guardan en un archivo
+.raw de la sesión y el audio decodificado (float32 a 16 kHz) en un .f32; los
+trozos de una sesión se procesan bajo un bloqueo de archivo. El decodificador
+y el análisis en curso viven en memoria del proceso que recibió el último
+trozo: si el siguiente llega a otro proceso, este los reconstruye a partir del
+.raw. Un hilo de barrido descarta las sesiones abandonadas y sus archivos.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from ..config import UPLOAD_SESSIONS_CONFIG, is_conversation
+from ..tools.audio_analyzer.sound_event_timeline import summarize_events
+from ..tools.audio_decoding.audio_decoder import IncrementalPCMDecoder, TARGET_SAMPLE_RATE
+from ..tools.file_lock import file_lock
+from .audio_archive_service import audio_archive
+from .metrics_service import metrics_registry
+from .model_lifecycle_service import model_lifecycle
+from .transcription_job_service import transcription_jobs, PENDING, COMPLETED, FAILED as TRANSCRIPTION_FAILED
+
+OPEN = "open"
+COMPLETED_SESSION = "completed"
+FAILED = "failed"
+
+_SESSION_FILE_SUFFIXES = (".raw", ".f32", ".lock")
+
+
+class UploadSessionConflict(Exception):
+    """
+    El trozo no encaja en la sesión: hay un hueco respecto al offset
+    confirmado o la sesión ya no admite trozos.
+    """
+
+    def __init__(self, message: str, expected_offset: Optional[int] = None):
+        super().__init__(message)
+        self.expected_offset = expected_offset
+
+
+class _SessionState:
+    """Decodificador y análisis en curso de una sesión en este proceso."""
+
+    def __init__(self, decoder: IncrementalPCMDecoder, offset: int = 0):
+        self.decoder = decoder
+        self.stream = None  # StreamingAnalysis, se crea con las primeras muestras
+        # Offset de la fila con el que está al día; si no coincide, se reconstruye
+        self.offset = offset
+
+
+def _to_dict(row) -> Dict[str, Any]:
+    """Estado público de una sesión a partir de su fila."""
+    if row.result is not None:
+        events = row.result["sound_events"]
+        speech_intervals = row.result["speech_intervals"]
+    else:
+        events = row.progress.get("sound_events", [])
+        speech_intervals = row.progress.get("speech_intervals", [])
+    return {
+        "session_id": row.session_id,
+        "status": row.status,
+        "offset": row.offset,
+        "chunks_received": row.chunks_received,
+        "last_chunk_index": row.last_chunk_index,
+        "duration": round(row.samples_received / TARGET_SAMPLE_RATE, 2),
+        "sound_events": events,
+        "sound_detections": summarize_events(events),
+        "speech_intervals": speech_intervals,
+        "error": row.error or None,
+    }
+
+
+class UploadSessionManager:
+    """
+    Sesiones de subida troceada con análisis incremental.
+    Implementa el patrón Singleton.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Implementa el patrón Singleton."""
+        if cls._instance is None:
+            cls._instance = super(UploadSessionManager, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """Inicializa el gestor solo una vez."""
+        if not self._initialized:
+            self.logger = logging.getLogger(__name__)
+            self.folder = UPLOAD_SESSIONS_CONFIG['folder']
+            self.max_session_bytes = int(UPLOAD_SESSIONS_CONFIG['max_session_mb'] * 1024 * 1024)
+            self.max_chunk_bytes = int(UPLOAD_SESSIONS_CONFIG['max_chunk_mb'] * 1024 * 1024)
+            self.idle_seconds = UPLOAD_SESSIONS_CONFIG['idle_seconds']
+            # Estado en memoria de las sesiones cuyo último trozo llegó a este proceso
+            self._states: Dict[str, _SessionState] = {}
+            self._lock = threading.Lock()
+            self._sweeper = None
+
+            self._chunks_total = metrics_registry.counter(
+                "upload_session_chunks_total", "Trozos recibidos en sesiones de subida por resultado"
+            )
+            self._open = metrics_registry.gauge(
+                "upload_sessions_open", "Sesiones de subida abiertas"
+            )
+            self._chunk_seconds = metrics_registry.histogram(
+                "upload_session_chunk_seconds", "Tiempo de decodificación y análisis de cada trozo"
+            )
+            self._rebuilds = metrics_registry.counter(
+                "upload_session_rebuilds_total", "Sesiones reconstruidas desde su .raw al cambiar de proceso"
+            )
+            self._expired = metrics_registry.counter(
+                "upload_sessions_expired_total", "Sesiones abandonadas descartadas por el barrido"
+            )
+            self._initialized = True
+
+    def create(
+        self,
+        user_id: int,
+        audio_format: str = "wav",
+        sample_rate: int = None,
+        channels: int = 1,
+    ) -> Dict[str, Any]:
+        """
+        Abre una sesión de subida.
+
+        Args:
+            user_id: Usuario propietario de la sesión
+            audio_format: 'wav' o un formato PCM crudo (pcm_s16le, pcm_s32le, pcm_f32le)
+            sample_rate: Tasa de muestreo del PCM crudo
+            channels: Canales del PCM crudo
+
+        Returns:
+            Dict con el estado de la sesión (offset 0)
+
+        Raises:
+            ValueError: Si el formato no se admite
+        """
+        from django.utils import timezone
+        from ..models import UploadSession
+
+        decoder = IncrementalPCMDecoder(audio_format, sample_rate=sample_rate, channels=channels)
+        os.makedirs(self.folder, exist_ok=True)
+        session_id = str(uuid.uuid4())
+        open(self._raw_path(session_id), "wb").close()
+        open(self._spool_path(session_id), "wb").close()
+        row = UploadSession.objects.create(
+            session_id=session_id,
+            user_id=user_id,
+            audio_format=audio_format,
+            sample_rate=sample_rate,
+            channels=channels or 1,
+            updated_at=timezone.now(),
+        )
+        with self._lock:
+            self._states[session_id] = _SessionState(decoder)
+        self._update_open()
+        self._start_sweeper()
+        self.logger.info(f"Sesión de subida abierta: {session_id} ({audio_format})")
+        return _to_dict(row)
+
+    def append(
+        self,
+        session_id: str,
+        user_id: Optional[int],
+        offset: int,
+        data: bytes,
+        chunk_index: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Añade un trozo a la sesión, lo decodifica y lo analiza.
+
+        Un trozo que termina antes del offset confirmado es un reenvío y se
+        ignora; si solapa, solo se procesa la parte nueva.
+
+        Args:
+            session_id: Identificador de la sesión
+            user_id: Usuario que envía el trozo
+            offset: Posición en bytes del trozo dentro de la grabación
+            data: Bytes del trozo
+            chunk_index: Número de trozo del cliente (informativo)
+
+        Returns:
+            Dict con el estado de la sesión y las detecciones parciales, o
+            None si la sesión no existe
+
+        Raises:
+            UploadSessionConflict: Si el offset deja un hueco o la sesión no está abierta
+            ValueError: Si el trozo supera los límites o no se puede decodificar
+        """
+        from django.utils import timezone
+
+        if self._get(session_id, user_id) is None:
+            return None
+        if len(data) > self.max_chunk_bytes:
+            raise ValueError(f"El trozo supera el máximo de {UPLOAD_SESSIONS_CONFIG['max_chunk_mb']} MB")
+
+        with self._session_lock(session_id):
+            # Releer dentro del bloqueo: otro proceso pudo confirmar trozos mientras se esperaba
+            row = self._get(session_id, user_id)
+            if row is None:
+                return None
+            if row.status != OPEN:
+                raise UploadSessionConflict(f"La sesión está {row.status}")
+            if offset > row.offset:
+                self._chunks_total.inc(outcome="conflict")
+                raise UploadSessionConflict(
+                    f"Falta audio entre {row.offset} y {offset}", expected_offset=row.offset
+                )
+            end = offset + len(data)
+            if end <= row.offset:
+                self._chunks_total.inc(outcome="duplicate")
+                return _to_dict(row)
+            if end > self.max_session_bytes:
+                raise ValueError(f"La grabación supera el máximo de {UPLOAD_SESSIONS_CONFIG['max_session_mb']} MB")
+
+            start = time.perf_counter()
+            try:
+                state = self._state(row)
+                new_data = data[row.offset - offset:]
+                with open(self._raw_path(session_id), "ab") as raw:
+                    raw.write(new_data)
+                self._analyze(row, state, state.decoder.feed(new_data))
+            except Exception as e:
+                # El decodificador y el análisis ya avanzaron: la sesión no se puede reanudar
+                self._fail(row, e)
+                self._chunks_total.inc(outcome="failed")
+                self.logger.error(f"Error procesando trozo de la sesión {session_id}: {e}")
+                raise ValueError(f"No se pudo procesar el trozo: {e}")
+
+            state.offset = end
+            row.offset = end
+            row.chunks_received += 1
+            if chunk_index is not None:
+                row.last_chunk_index = chunk_index
+            if state.stream is not None:
+                row.samples_received = state.stream.samples_received
+                row.progress = {
+                    "sound_events": state.stream.snapshot(),
+                    "speech_intervals": state.stream.speech_intervals(),
+                }
+            row.updated_at = timezone.now()
+            row.save()
+            self._chunks_total.inc(outcome="accepted")
+            self._chunk_seconds.observe(time.perf_counter() - start)
+            return _to_dict(row)
+
+    def get(self, session_id: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Estado de una sesión con las detecciones hasta el último trozo analizado.
+
+        Args:
+            session_id: Identificador de la sesión
+            user_id: Si se indica, solo se devuelve si la sesión es de ese usuario
+
+        Returns:
+            Dict con session_id, status, offset, chunks_received, last_chunk_index,
+            duration, sound_events (los abiertos con open=True), sound_detections,
+            speech_intervals y error, o None si no existe
+        """
+        self._start_sweeper()
+        row = self._get(session_id, user_id)
+        return _to_dict(row) if row is not None else None
+
+    def complete(
+        self,
+        session_id: str,
+        user_id: Optional[int],
+        transcription_mode: str = "sync",
+        retain_audio: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Cierra la sesión: analiza el último bloque parcial, transcribe las
+        regiones con voz si el sonido principal es una conversación y, si se
+        pide, conserva el audio para get_audio.
+
+        La transcripción síncrona se ejecuta después de liberar el bloqueo de
+        la sesión; mientras tanto la sesión figura como completada con la
+        transcripción pendiente. Si Whisper falla, la sesión sigue completada
+        con transcription_status failed y el error en la sesión.
+
+        Args:
+            session_id: Identificador de la sesión
+            user_id: Usuario propietario
+            transcription_mode: sync (esperar a Whisper) o async (trabajo de transcripción)
+            retain_audio: Escribir el audio a disco para get_audio
+
+        Returns:
+            Dict con los campos del estado final del workflow (sound_type,
+            confidence, alert_category, sound_detections, detections_by_category,
+            sound_events, speech_intervals, is_conversation_detected,
+            transcription, transcription_status, transcription_job_id,
+            audio_path) más session_id y duration, o None si la sesión no existe
+
+        Raises:
+            UploadSessionConflict: Si la sesión no está abierta
+        """
+        from django.utils import timezone
+
+        if self._get(session_id, user_id) is None:
+            return None
+
+        work = None
+        with self._session_lock(session_id):
+            row = self._get(session_id, user_id)
+            if row is None:
+                return None
+            if row.status != OPEN:
+                raise UploadSessionConflict(f"La sesión está {row.status}")
+            try:
+                state = self._state(row)
+                samples = state.decoder.finish()
+                with model_lifecycle.use("yamnet") as analyzer:
+                    if state.stream is None:
+                        state.stream = analyzer.start_stream(row.user_id)
+                    self._feed(session_id, state, samples, analyzer)
+                    events = state.stream.finish(analyzer)
+                    detections = analyzer.summarize_timeline(events)
+                    detections_by_category = analyzer.relevance_index.group_by_category(detections)
+                speech_intervals = state.stream.speech_intervals()
+            except Exception as e:
+                self._fail(row, e)
+                raise
+
+            sound_type, confidence, alert_category = detections[0][:3] if detections else ("Unknown", 0.0, "unknown")
+            conversation = is_conversation(sound_type, confidence)
+            result = {
+                "session_id": session_id,
+                "duration": round(state.stream.samples_received / TARGET_SAMPLE_RATE, 2),
+                "sound_type": sound_type,
+                "confidence": confidence,
+                "alert_category": alert_category,
+                "sound_detections": detections,
+                "detections_by_category": detections_by_category,
+                "sound_events": events,
+                "speech_intervals": speech_intervals,
+                "is_conversation_detected": conversation,
+                "transcription": "",
+                "transcription_status": "",
+                "transcription_job_id": None,
+                "audio_path": "",
+            }
+            if retain_audio:
+                result["audio_path"] = audio_archive.store_waveform(
+                    np.fromfile(self._spool_path(session_id), dtype=np.float32)
+                )
+
+            # El .f32 pasa a ser del trabajo de transcripción (lo borra al terminar)
+            spool_path = self._spool_path(session_id)
+            self._remove(self._raw_path(session_id))
+            if conversation:
+                work = self._transcription_work(spool_path, speech_intervals, session_id)
+                result["transcription_status"] = PENDING
+                if transcription_mode == "async":
+                    result["transcription_job_id"] = transcription_jobs.submit(work, user_id=row.user_id)
+                    work = None
+            else:
+                self._remove(spool_path)
+
+            row.status = COMPLETED_SESSION
+            row.samples_received = state.stream.samples_received
+            row.result = result
+            row.progress = {}
+            row.updated_at = timezone.now()
+            row.save()
+            with self._lock:
+                self._states.pop(session_id, None)
+        self._update_open()
+
+        if work is not None:
+            try:
+                result["transcription"] = work() or ""
+                result["transcription_status"] = COMPLETED
+            except Exception as e:
+                # La sesión ya está completada: el fallo queda en la sesión y en el resultado
+                self.logger.error(f"Error transcribiendo la sesión de subida {session_id}: {e}")
+                result["transcription_status"] = TRANSCRIPTION_FAILED
+                row.error = f"Error en la transcripción: {e}"
+            row.result = result
+            row.save(update_fields=["result", "error"])
+
+        self.logger.info(
+            f"Sesión de subida completada: {session_id} ({result['duration']} s, {len(events)} eventos)"
+        )
+        return dict(result)
+
+    def discard(self, session_id: str, user_id: Optional[int] = None) -> bool:
+        """
+        Descarta una sesión y su audio.
+
+        Returns:
+            bool: True si la sesión existía
+        """
+        row = self._get(session_id, user_id)
+        if row is None:
+            return False
+        with self._session_lock(session_id):
+            row.delete()
+            with self._lock:
+                self._states.pop(session_id, None)
+            self._remove(self._raw_path(session_id))
+            if row.status == OPEN:
+                self._remove(self._spool_path(session_id))
+        self._remove(self._lock_path(session_id))
+        self._update_open()
+        return True
+
+    def sweep(self) -> int:
+        """
+        Descarta las sesiones sin actividad durante más de idle_seconds y
+        borra los archivos de sesión huérfanos (sin fila) igual de antiguos.
+
+        Returns:
+            int: Número de sesiones descartadas
+        """
+        from django.utils import timezone
+        from ..models import UploadSession
+
+        cutoff = timezone.now() - timedelta(seconds=self.idle_seconds)
+        expired = list(UploadSession.objects.filter(updated_at__lt=cutoff).values_list("session_id", "status"))
+        for session_id, session_status in expired:
+            with self._session_lock(session_id):
+                UploadSession.objects.filter(pk=session_id).delete()
+                with self._lock:
+                    self._states.pop(session_id, None)
+                self._remove(self._raw_path(session_id))
+                # El .f32 de una sesión completada lo borra su trabajo de transcripción
+                if session_status == OPEN:
+                    self._remove(self._spool_path(session_id))
+            self._remove(self._lock_path(session_id))
+
+        # Archivos que quedaron de procesos caídos o de trabajos que no llegaron a ejecutarse
+        if os.path.isdir(self.folder):
+            file_cutoff = time.time() - self.idle_seconds
+            known = set(UploadSession.objects.values_list("session_id", flat=True))
+            for name in os.listdir(self.folder):
+                stem, suffix = os.path.splitext(name)
+                path = os.path.join(self.folder, name)
+                if suffix in _SESSION_FILE_SUFFIXES and stem not in known:
+                    try:
+                        if os.path.getmtime(path) < file_cutoff:
+                            self._remove(path)
+                    except OSError:
+                        continue
+
+        if expired:
+            self._expired.inc(len(expired))
+            self._update_open()
+            self.logger.info(f"Limpieza completada: {len(expired)} sesiones de subida abandonadas descartadas")
+        return len(expired)
+
+    def _get(self, session_id: str, user_id: Optional[int]):
+        from ..models import UploadSession
+
+        row = UploadSession.objects.filter(pk=session_id).first()
+        if row is None or (user_id is not None and row.user_id != user_id):
+            return None
+        return row
+
+    def _state(self, row) -> _SessionState:
+        """
+        Estado en memoria al día con la fila. Si este proceso no lo tiene (o
+        otro proceso confirmó trozos después), se reconstruye desde el .raw.
+        """
+        with self._lock:
+            state = self._states.get(row.session_id)
+        if state is not None and state.offset == row.offset:
+            return state
+
+        state = _SessionState(
+            IncrementalPCMDecoder(row.audio_format, sample_rate=row.sample_rate, channels=row.channels)
+        )
+        raw_path = self._raw_path(row.session_id)
+        # Bytes escritos por un proceso que cayó antes de confirmar el trozo
+        with open(raw_path, "r+b") as raw:
+            raw.truncate(row.offset)
+        open(self._spool_path(row.session_id), "wb").close()
+        with open(raw_path, "rb") as raw:
+            for block in iter(lambda: raw.read(self.max_chunk_bytes), b""):
+                self._analyze(row, state, state.decoder.feed(block))
+        state.offset = row.offset
+        with self._lock:
+            self._states[row.session_id] = state
+        self._rebuilds.inc()
+        return state
+
+    def _analyze(self, row, state: _SessionState, samples: np.ndarray):
+        if len(samples) == 0:
+            return
+        with model_lifecycle.use("yamnet") as analyzer:
+            if state.stream is None:
+                state.stream = analyzer.start_stream(row.user_id)
+            self._feed(row.session_id, state, samples, analyzer)
+
+    def _feed(self, session_id: str, state: _SessionState, samples: np.ndarray, analyzer):
+        if len(samples) == 0:
+            return
+        with open(self._spool_path(session_id), "ab") as spool:
+            np.asarray(samples, dtype=np.float32).tofile(spool)
+        state.stream.feed(samples, analyzer)
+
+    def _fail(self, row, error: Exception):
+        from django.utils import timezone
+
+        row.status = FAILED
+        row.error = str(error)
+        row.updated_at = timezone.now()
+        row.save()
+        with self._lock:
+            self._states.pop(row.session_id, None)
+        self._remove(self._raw_path(row.session_id))
+        self._remove(self._spool_path(row.session_id))
+        self._update_open()
+
+    def _transcription_work(self, spool_path: str, speech_intervals, name: str):
+        """Función que transcribe el audio de la sesión y borra el archivo al terminar."""
+
+        def work():
+            try:
+                audio = np.fromfile(spool_path, dtype=np.float32)
+                with model_lifecycle.use("whisper") as transcriber:
+                    return transcriber.transcribe_audio(audio, speech_intervals=speech_intervals, name=name)
+            finally:
+                self._remove(spool_path)
+
+        return work
+
+    def _session_lock(self, session_id: str):
+        os.makedirs(self.folder, exist_ok=True)
+        return file_lock(self._lock_path(session_id))
+
+    def _raw_path(self, session_id: str) -> str:
+        return os.path.join(self.folder, f"{session_id}.raw")
+
+    def _spool_path(self, session_id: str) -> str:
+        return os.path.join(self.folder, f"{session_id}.f32")
+
+    def _lock_path(self, session_id: str) -> str:
+        return os.path.join(self.folder, f"{session_id}.lock")
+
+    def _remove(self, path: str):
+        try:
+            if path and os.path.exists(path):
+                os.unlink(path)
+        except OSError as e:
+            self.logger.warning(f"No se pudo borrar {path}: {e}")
+
+    def _update_open(self):
+        from ..models import UploadSession
+
+        self._open.set(UploadSession.objects.filter(status=OPEN).count())
+
+    def _start_sweeper(self):
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="upload-sessions", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        from django.db import close_old_connections
+
+        interval = UPLOAD_SESSIONS_CONFIG['sweep_interval_seconds']
+        while True:
+            time.sleep(interval)
+            try:
+                close_old_connections()
+                self.sweep()
+            except Exception as e:
+                self.logger.error(f"Error en el barrido de sesiones de subida: {e}")
+
+
+# Instancia global del gestor de sesiones de subida (Singleton)
+upload_sessions = UploadSessionManager()
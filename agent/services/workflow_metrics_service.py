@@ -0,0 +1,125 @@
+"""
+Métricas por nodo de los workflows de LangGraph.
+
+Los workflows envuelven cada nodo al registrarlo para medir tiempo real,
+tiempo de CPU del hilo que lo ejecuta y resultado (éxito o excepción), y
+cada función de decisión para contar qué ruta se tomó.
+"""
+
+import functools
+import inspect
+import time
+from typing import Any, Callable
+
+from .metrics_service import metrics_registry
+
+
+class WorkflowMetrics:
+    """
+    Instrumentación de nodos y decisiones de los workflows.
+    Implementa el patrón Singleton.
+    """
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        """Implementa el patrón Singleton."""
+        if cls._instance is None:
+            cls._instance = super(WorkflowMetrics, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        """Inicializa las métricas solo una vez."""
+        if not self._initialized:
+            self.node_seconds = metrics_registry.histogram(
+                "workflow_node_seconds", "Tiempo real de ejecución de cada nodo"
+            )
+            self.node_cpu_seconds = metrics_registry.histogram(
+                "workflow_node_cpu_seconds", "Tiempo de CPU del hilo que ejecuta cada nodo"
+            )
+            self.node_executions = metrics_registry.counter(
+                "workflow_node_executions_total", "Ejecuciones de cada nodo por resultado"
+            )
+            self.node_errors = metrics_registry.counter(
+                "workflow_node_errors_total", "Excepciones de cada nodo por tipo"
+            )
+            self.routes = metrics_registry.counter(
+                "workflow_route_total", "Decisiones de ruta tomadas tras cada nodo"
+            )
+            self._initialized = True
+
+    def instrument_node(self, workflow: str, node: str, fn: Callable) -> Callable:
+        """
+        Envuelve un nodo (síncrono o asíncrono) para medir cada ejecución.
+
+        En los nodos asíncronos el tiempo de CPU solo cubre el bucle de
+        eventos; para medir la inferencia delegada a otros hilos hay que
+        instrumentar la función síncrona antes de convertirla en corrutina.
+
+        Args:
+            workflow: Nombre del workflow (etiqueta)
+            node: Nombre del nodo (etiqueta)
+            fn: Implementación del nodo
+
+        Returns:
+            Función con la misma firma que registra las métricas
+        """
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(state, *args, **kwargs):
+                wall, cpu = time.perf_counter(), time.thread_time()
+                try:
+                    result = await fn(state, *args, **kwargs)
+                except Exception as e:
+                    self._record(workflow, node, wall, cpu, e)
+                    raise
+                self._record(workflow, node, wall, cpu, None)
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(state, *args, **kwargs):
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                result = fn(state, *args, **kwargs)
+            except Exception as e:
+                self._record(workflow, node, wall, cpu, e)
+                raise
+            self._record(workflow, node, wall, cpu, None)
+            return result
+
+        return wrapper
+
+    def instrument_router(self, workflow: str, node: str, fn: Callable) -> Callable:
+        """
+        Envuelve una función de decisión para contar la ruta elegida.
+
+        Args:
+            workflow: Nombre del workflow (etiqueta)
+            node: Nodo tras el que se decide (etiqueta)
+            fn: Función de decisión que devuelve el nombre del siguiente nodo
+
+        Returns:
+            Función de decisión instrumentada
+        """
+        @functools.wraps(fn)
+        def wrapper(state, *args, **kwargs):
+            route = fn(state, *args, **kwargs)
+            self.routes.inc(workflow=workflow, node=node, route=route)
+            return route
+
+        return wrapper
+
+    def _record(self, workflow: str, node: str, wall_start: float, cpu_start: float, error: Any):
+        outcome = "success" if error is None else "exception"
+        self.node_seconds.observe(time.perf_counter() - wall_start, workflow=workflow, node=node, outcome=outcome)
+        self.node_cpu_seconds.observe(time.thread_time() - cpu_start, workflow=workflow, node=node)
+        self.node_executions.inc(workflow=workflow, node=node, outcome=outcome)
+        if error is not None:
+            self.node_errors.inc(workflow=workflow, node=node, exception=type(error).__name__)
+
+
+# Instancia global de la instrumentación de workflows (Singleton)
+workflow_metrics = WorkflowMetrics()
@@ -3,7 +3,7 @@ Estado del agente de audio inteligente para Signaware.
 Define la estructura de datos que se pasa entre los nodos del grafo.
 """
 
-from typing import TypedDict, Annotated, List, Optional
+from typing import TypedDict, Annotated, Dict, List, Optional
 import operator
 from langchain_core.messages import BaseMessage
 
@@ -16,19 +16,51 @@ class SoundDetectorState(TypedDict):
         messages: Lista de mensajes del sistema (se combinan con operator.add)
         is_conversation_detected: Indica si se detectó una conversación
         audio_file: Archivo de audio subido desde el frontend
-        audio_path: Ruta del archivo de audio procesado
+        audio_path: Ruta del audio de entrada y, tras guardarlo, clave del clip conservado en el
+            almacén de segmentos (vacía si no se conserva)
+        audio_buffer: Forma de onda decodificada (float32, 16 kHz, de solo lectura) que comparten los nodos
+        retain_audio: Indica si el audio se escribe a disco para get_audio
         sound_type: Tipo de sonido detectado (Speech, Music, etc.)
-        transcription: Transcripción del audio (si es conversación)
+        transcription: Transcripción del audio (si es conversación); segmentos {start, end, text}
+            y, con diarización, también speaker
         confidence: Nivel de confianza de la detección
         alert_category: Categoría de alerta del sonido detectado (danger_alert, attention_alert, etc.)
         sound_detections: Lista de detecciones de sonidos con sus categorías
+        detections_by_category: Detecciones relevantes agrupadas por categoría de alerta
+        sound_events: Línea temporal de eventos (onset, offset, confianza pico y media)
+        user_id: ID del usuario que envía el audio (para sus sonidos personalizados)
+        cache_key: Clave del audio en la caché de resultados
+        cache_hit: Indica si el resultado se recuperó de la caché
+        activity_label: Clasificación de la puerta de actividad (silent, noise, active)
+        speech_intervals: Intervalos (inicio, fin) en segundos con voz según YAMNet
+        transcription_mode: sync (esperar a Whisper) o async (transcripción diferida)
+        transcription_status: Estado de la transcripción ('', pending, completed, failed)
+        transcription_job_id: Identificador del trabajo de transcripción diferida
+        separate_vocals: Indica si la voz se separa con Demucs antes de transcribir
+        separated_audio: Voz separada (float32, 16 kHz) cuando la separación ya se hizo
+        stage_timings: Duración en segundos de las etapas de separación, transcripción y diarización
     """
     messages: Annotated[List[BaseMessage], operator.add]
     is_conversation_detected: bool
     audio_file: Optional[object]  # Django UploadedFile object
     audio_path: str
+    audio_buffer: Optional[object]  # np.ndarray
+    retain_audio: bool
     sound_type: str
     transcription: str
     confidence: float
     alert_category: str
-    sound_detections: List 
\ No newline at end of file
+    sound_detections: List
+    detections_by_category: Dict[str, List]
+    sound_events: List
+    user_id: Optional[int]
+    cache_key: Optional[str]
+    cache_hit: bool
+    activity_label: str
+    speech_intervals: List
+    transcription_mode: str
+    transcription_status: str
+    transcription_job_id: Optional[str]
+    separate_vocals: bool
+    separated_audio: Optional[object]  # np.ndarray
+    stage_timings: Dict[str, float]
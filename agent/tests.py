@@ -1,3 +1,840 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from . import config
+from .models import DetectedSound, RetainedAudio
+from .services.audio_archive_service import audio_archive, etag_matches, parse_accept, parse_range
+from .services.audio_registry_service import audio_registry
+from .services.batch_upload_service import batch_fragments, persist_batch_detections
+from .services.model_lifecycle_service import model_lifecycle
+from .services.result_cache_service import audio_result_cache
+from .tools.audio_analyzer.activity_gate import ACTIVE, ActivityGate, NOISE, SILENT
+from .tools.audio_analyzer.relevant_sound_index import RelevantSoundIndex, UNKNOWN_CATEGORY
+from .tools.audio_analyzer.sound_event_timeline import (
+    YAMNET_HOP_SAMPLES,
+    YAMNET_MIN_SAMPLES,
+    merge_intervals,
+    speech_regions,
+)
+from .tools.audio_analyzer.yamnet_batcher import YAMNetBatcher, frames_for_samples, pack_waveforms
+from .tools.audio_decoding.audio_decoder import IncrementalPCMDecoder, TARGET_SAMPLE_RATE
+from .tools.audio_storage.segment_store import SegmentStore
+from .tools.audio_transcription.whisper_batcher import (
+    SAMPLE_RATE,
+    clip_timestamps,
+    locate_chunk,
+    pack_regions,
+)
+from .tools.batch_processing.batch_runner import BatchRunner
+from .tools.diarizer.speaker_alignment import align_speakers
+from core.models import SoundCategory, SoundType
+
+
+def _yamnet_frames(waveform: np.ndarray) -> np.ndarray:
+    """Frames de 0.975 s con salto de 0.48 s, como los calcula YAMNet para un clip suelto."""
+    num_frames = frames_for_samples(len(waveform))
+    padded = np.zeros(YAMNET_MIN_SAMPLES + (num_frames - 1) * YAMNET_HOP_SAMPLES, dtype=np.float32)
+    padded[:len(waveform)] = waveform
+    return np.stack([
+        padded[i * YAMNET_HOP_SAMPLES:i * YAMNET_HOP_SAMPLES + YAMNET_MIN_SAMPLES]
+        for i in range(num_frames)
+    ])
+
+
+class YAMNetPackingTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        lengths = [1000, YAMNET_MIN_SAMPLES, YAMNET_MIN_SAMPLES + 1, 3 * YAMNET_HOP_SAMPLES, 40000]
+        self.waveforms = [rng.uniform(-1, 1, length).astype(np.float32) for length in lengths]
+
+    def test_frames_for_samples(self):
+        self.assertEqual(frames_for_samples(0), 1)
+        self.assertEqual(frames_for_samples(YAMNET_MIN_SAMPLES), 1)
+        self.assertEqual(frames_for_samples(YAMNET_MIN_SAMPLES + 1), 2)
+        self.assertEqual(frames_for_samples(YAMNET_MIN_SAMPLES + YAMNET_HOP_SAMPLES), 2)
+        self.assertEqual(frames_for_samples(YAMNET_MIN_SAMPLES + YAMNET_HOP_SAMPLES + 1), 3)
+
+    def test_packed_frames_match_per_clip_framing(self):
+        packed, frame_ranges = pack_waveforms(self.waveforms)
+        packed_frames = _yamnet_frames(packed)
+
+        self.assertEqual(len(packed) % YAMNET_HOP_SAMPLES, 0)
+        for waveform, (first_frame, num_frames) in zip(self.waveforms, frame_ranges):
+            expected = _yamnet_frames(waveform)
+            self.assertEqual(num_frames, len(expected))
+            np.testing.assert_array_equal(packed_frames[first_frame:first_frame + num_frames], expected)
+
+    def test_batcher_returns_per_clip_results(self):
+        def infer(waveform):
+            frames = _yamnet_frames(waveform)
+            return frames.sum(axis=1), frames[:, :8]
+
+        batcher = YAMNetBatcher(infer, max_batch_size=len(self.waveforms), max_wait_ms=200)
+        self.addCleanup(batcher.close)
+        futures = [batcher.submit(waveform) for waveform in self.waveforms]
+
+        for waveform, future in zip(self.waveforms, futures):
+            scores, embeddings = future.result(timeout=5)
+            expected_scores, expected_embeddings = infer(waveform)
+            np.testing.assert_array_equal(scores, expected_scores)
+            np.testing.assert_array_equal(embeddings, expected_embeddings)
+
+
+class RelevantSoundIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = RelevantSoundIndex(
+            ["Speech", "Dog", "Siren", "Music", "Car horn"],
+            {"Dog": "animal", "Siren": "danger_alert", "Car horn": "danger_alert"},
+        )
+        self.scores = np.array([0.9, 0.5, 0.7, 0.2, 0.1])
+
+    def test_select_keeps_relevant_classes_above_threshold(self):
+        self.assertEqual(
+            self.index.select(self.scores, 0.15),
+            [("Siren", 0.7, "danger_alert"), ("Dog", 0.5, "animal")],
+        )
+        self.assertEqual(self.index.select(self.scores, 0.95), [])
+
+    def test_select_with_unknown_and_limit(self):
+        self.assertEqual(
+            self.index.select(self.scores, 0.3, include_unknown=True),
+            [("Speech", 0.9, UNKNOWN_CATEGORY), ("Siren", 0.7, "danger_alert"), ("Dog", 0.5, "animal")],
+        )
+        self.assertEqual(self.index.select(self.scores, 0.0, max_results=1), [("Siren", 0.7, "danger_alert")])
+
+    def test_top_k_ignores_relevance(self):
+        self.assertEqual(
+            self.index.top_k(self.scores, 2),
+            [("Speech", 0.9, UNKNOWN_CATEGORY), ("Siren", 0.7, "danger_alert")],
+        )
+        self.assertEqual(len(self.index.top_k(self.scores, 10)), 5)
+
+    def test_group_by_category(self):
+        grouped = self.index.group_by_category(self.index.select(self.scores, 0.0))
+        self.assertEqual(grouped, {
+            "danger_alert": [("Siren", 0.7), ("Car horn", 0.1)],
+            "animal": [("Dog", 0.5)],
+        })
+
+
+class _RecordingProcessor:
+    """Procesador de prueba que anota los archivos que procesa."""
+
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    def process(self, path):
+        name = os.path.basename(path)
+        self.calls.append(name)
+        if name in self.failing:
+            raise RuntimeError(f"fallo en {name}")
+        with open(path, "rb") as f:
+            return len(f.read())
+
+
+class BatchRunnerResumeTests(SimpleTestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        self.cache_dir = os.path.join(self.folder, "cache")
+        self.files = []
+        for i in range(5):
+            path = os.path.join(self.folder, f"clip{i}.wav")
+            with open(path, "wb") as f:
+                f.write(b"x" * (i + 1))
+            self.files.append(path)
+
+    def _runner(self, processor, model_version="v1"):
+        return BatchRunner(
+            "test", _RecordingProcessor, "process", model_version,
+            workers=1, use_cache=True, cache_dir=self.cache_dir, local_processor=processor,
+        )
+
+    def test_resume_skips_finished_files(self):
+        first = _RecordingProcessor()
+        for done, _ in enumerate(self._runner(first).iter_results(self.files), start=1):
+            if done == 2:
+                break  # Ejecución interrumpida tras dos archivos
+        self.assertEqual(first.calls, ["clip0.wav", "clip1.wav"])
+
+        second = _RecordingProcessor()
+        results = self._runner(second).run(self.files)
+        self.assertEqual(second.calls, ["clip2.wav", "clip3.wav", "clip4.wav"])
+        self.assertEqual(list(results.values()), [1, 2, 3, 4, 5])
+
+    def test_failed_files_are_retried(self):
+        runner = self._runner(_RecordingProcessor(failing={"clip3.wav"}))
+        results = runner.run(self.files)
+        self.assertNotIn(self.files[3], results)
+        self.assertIn(self.files[3], runner.errors)
+
+        retry = _RecordingProcessor()
+        self.assertEqual(len(self._runner(retry).run(self.files)), 5)
+        self.assertEqual(retry.calls, ["clip3.wav"])
+
+    def test_model_version_change_reprocesses(self):
+        self._runner(_RecordingProcessor()).run(self.files)
+        processor = _RecordingProcessor()
+        self._runner(processor, model_version="v2").run(self.files)
+        self.assertEqual(len(processor.calls), 5)
+
+
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        audio_result_cache.clear()
+        self.addCleanup(audio_result_cache.clear)
+        self.waveform = np.linspace(-1.0, 1.0, 1600, dtype=np.float32)
+
+    def test_hits_and_misses_are_counted(self):
+        key = audio_result_cache.make_key(self.waveform, "yamnet-v1")
+        hits = audio_result_cache.hits.value(tier="memory")
+        misses = audio_result_cache.misses.value()
+
+        self.assertIsNone(audio_result_cache.get(key))
+        audio_result_cache.put(key, {"sound_type": "Dog"})
+        self.assertEqual(audio_result_cache.get(key), {"sound_type": "Dog"})
+        self.assertEqual(audio_result_cache.hits.value(tier="memory"), hits + 1)
+        self.assertEqual(audio_result_cache.misses.value(), misses + 1)
+
+    def test_key_depends_on_audio_and_model_versions(self):
+        key = audio_result_cache.make_key(self.waveform, "yamnet-v1")
+        self.assertEqual(audio_result_cache.make_key(self.waveform.copy(), "yamnet-v1"), key)
+        self.assertNotEqual(audio_result_cache.make_key(self.waveform, "yamnet-v2"), key)
+        self.assertNotEqual(audio_result_cache.make_key(self.waveform * 0.5, "yamnet-v1"), key)
+
+    def test_config_change_invalidates_entries(self):
+        for name in (
+            "RELEVANT_SOUNDS_DICT",
+            "SOUND_FILTER_CONFIG",
+            "CONFIDENCE_THRESHOLDS",
+            "STREAMING_ANALYSIS_CONFIG",
+            "CUSTOM_SOUND_HEADS_CONFIG",
+            "ACTIVITY_GATE_CONFIG",
+            "WHISPER_CONFIG",
+            "SPEECH_REGIONS_CONFIG",
+            "DEMUCS_CONFIG",
+            "DIARIZATION_CONFIG",
+            "WORKFLOW_CONFIG",
+        ):
+            with self.subTest(config=name):
+                key = audio_result_cache.make_key(self.waveform)
+                audio_result_cache.put(key, {"sound_type": "Dog"})
+                version = audio_result_cache.config_version()
+
+                with mock.patch.dict(getattr(config, name), {"test_only": True}):
+                    self.assertNotEqual(audio_result_cache.config_version(), version)
+                    self.assertNotEqual(audio_result_cache.make_key(self.waveform), key)
+                    self.assertIsNone(audio_result_cache.get(key))
+                self.assertEqual(audio_result_cache.config_version(), version)
+
+
+class ActivityGateTests(SimpleTestCase):
+    def setUp(self):
+        self.gate = ActivityGate()
+        self.time = np.arange(16000, dtype=np.float32) / 16000
+
+    def test_silence(self):
+        self.assertEqual(self.gate.classify(np.zeros(16000, dtype=np.float32))[0], SILENT)
+        self.assertEqual(self.gate.classify(1e-5 * np.sin(2 * np.pi * 440 * self.time))[0], SILENT)
+        label, summary = self.gate.classify(np.zeros(0, dtype=np.float32))
+        self.assertEqual(label, SILENT)
+        self.assertEqual(summary["active_ratio"], 0.0)
+
+    def test_broadband_noise(self):
+        noise = np.random.default_rng(0).uniform(-0.5, 0.5, 16000).astype(np.float32)
+        label, summary = self.gate.classify(noise)
+        self.assertEqual(label, NOISE)
+        self.assertEqual(summary["active_ratio"], 1.0)
+
+    def test_tone_is_active(self):
+        self.assertEqual(self.gate.classify(0.5 * np.sin(2 * np.pi * 440 * self.time))[0], ACTIVE)
+
+    def test_short_burst_in_silence(self):
+        waveform = np.zeros(16000, dtype=np.float32)
+        waveform[:400] = 0.5 * np.sin(2 * np.pi * 440 * self.time[:400])
+        self.assertEqual(self.gate.classify(waveform)[0], SILENT)
+        self.assertEqual(self.gate.classify(waveform[:200])[0], ACTIVE)
+
+
+class SpeechRegionTests(SimpleTestCase):
+    def test_merge_intervals_pads_and_merges(self):
+        self.assertEqual(
+            merge_intervals([(5.0, 6.0), (1.0, 2.0), (2.3, 3.0)], padding=0.25, merge_gap=0.5, duration=6.1),
+            [(0.75, 3.25), (4.75, 6.1)],
+        )
+
+    def test_merge_intervals_clamps_to_clip(self):
+        self.assertEqual(merge_intervals([(0.1, 0.5)], padding=0.5), [(0.0, 1.0)])
+        self.assertEqual(merge_intervals([(9.8, 10.0)], padding=0.5, duration=10.0), [(9.3, 10.0)])
+        self.assertEqual(merge_intervals([]), [])
+
+    def test_speech_regions_pad_sparse_speech(self):
+        self.assertEqual(speech_regions([(10.0, 12.0)], 60.0), [(9.75, 12.25)])
+        self.assertEqual(speech_regions([(10.0, 12.0), (12.6, 13.0)], 60.0), [(9.75, 13.25)])
+
+    def test_speech_regions_fall_back_to_whole_clip(self):
+        self.assertEqual(speech_regions(None, 30.0), [(0.0, 30.0)])
+        self.assertEqual(speech_regions([], 30.0), [(0.0, 30.0)])
+        self.assertEqual(speech_regions([(0.0, 29.0)], 30.0), [(0.0, 30.0)])
+
+
+class _FakeModel:
+    """Modelo de prueba que sabe si se ha descargado."""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ModelLifecycleTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(setattr, model_lifecycle, "memory_ceiling_mb", model_lifecycle.memory_ceiling_mb)
+        self.loads = {}
+
+    def _register(self, name, memory_mb=100, ttl_seconds=0, delay=0.0):
+        name = f"test-{self._testMethodName}-{name}"
+
+        def loader():
+            time.sleep(delay)
+            self.loads[name] = self.loads.get(name, 0) + 1
+            return _FakeModel()
+
+        model_lifecycle.register(name, loader, memory_mb=memory_mb, ttl_seconds=ttl_seconds)
+        self.addCleanup(model_lifecycle.unload, name, "test")
+        return name
+
+    def _loaded(self, name):
+        return model_lifecycle.status()[name]["loaded"]
+
+    def test_use_holds_a_reference(self):
+        name = self._register("a")
+        with model_lifecycle.use(name) as first:
+            self.assertEqual(model_lifecycle.status()[name]["refcount"], 1)
+            self.assertFalse(model_lifecycle.unload(name))
+            with model_lifecycle.use(name) as second:
+                self.assertIs(second, first)
+                self.assertEqual(model_lifecycle.status()[name]["refcount"], 2)
+        self.assertEqual(model_lifecycle.status()[name]["refcount"], 0)
+        self.assertEqual(self.loads[name], 1)
+        self.assertTrue(model_lifecycle.unload(name))
+        self.assertTrue(first.closed)
+
+    def test_concurrent_acquire_loads_once(self):
+        name = self._register("a", delay=0.05)
+        barrier = threading.Barrier(8)
+        instances = []
+
+        def worker():
+            barrier.wait()
+            instances.append(model_lifecycle.acquire(name))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.loads[name], 1)
+        self.assertEqual(len({id(instance) for instance in instances}), 1)
+        self.assertEqual(model_lifecycle.status()[name]["refcount"], 8)
+        for _ in range(8):
+            model_lifecycle.release(name)
+        self.assertEqual(model_lifecycle.status()[name]["refcount"], 0)
+
+    def test_sweep_unloads_idle_models_only(self):
+        idle = self._register("idle", ttl_seconds=0.05)
+        busy = self._register("busy", ttl_seconds=0.05)
+        pinned = self._register("pinned", ttl_seconds=0)
+        with model_lifecycle.use(idle), model_lifecycle.use(pinned):
+            pass
+        model_lifecycle.acquire(busy)
+        self.addCleanup(model_lifecycle.release, busy)
+        time.sleep(0.1)
+
+        model_lifecycle.sweep()
+        self.assertFalse(self._loaded(idle))
+        self.assertTrue(self._loaded(busy))
+        self.assertTrue(self._loaded(pinned))
+
+    def test_make_room_evicts_least_recently_used(self):
+        model_lifecycle.memory_ceiling_mb = 250
+        first, second, third = (self._register(name) for name in ("a", "b", "c"))
+        for name in (first, second, first):
+            with model_lifecycle.use(name):
+                pass
+
+        with model_lifecycle.use(third):
+            pass
+        self.assertTrue(self._loaded(first))
+        self.assertFalse(self._loaded(second))
+        self.assertTrue(self._loaded(third))
+
+    def test_make_room_never_evicts_models_in_use(self):
+        model_lifecycle.memory_ceiling_mb = 150
+        held, incoming = self._register("held"), self._register("incoming")
+        with model_lifecycle.use(held) as instance:
+            with self.assertLogs("agent.services.model_lifecycle_service", "WARNING"):
+                with model_lifecycle.use(incoming):
+                    self.assertTrue(self._loaded(held))
+            self.assertFalse(instance.closed)
+        with model_lifecycle.use(self._register("next")):
+            pass
+        self.assertFalse(self._loaded(held))
+
+    def test_concurrent_use_under_memory_ceiling(self):
+        model_lifecycle.memory_ceiling_mb = 250
+        names = [self._register(str(i)) for i in range(5)]
+        errors = []
+
+        def worker(offset):
+            for i in range(40):
+                with model_lifecycle.use(names[(offset + i) % len(names)]) as instance:
+                    if instance.closed:
+                        errors.append("modelo descargado mientras estaba en uso")
+
+        threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        status = model_lifecycle.status()
+        self.assertTrue(all(status[name]["refcount"] == 0 for name in names))
+
+        # Con todo libre, la siguiente carga deja la memoria bajo el límite
+        extra = self._register("extra")
+        with model_lifecycle.use(extra):
+            pass
+        status = model_lifecycle.status()
+        self.assertLessEqual(sum(100 for name in names + [extra] if status[name]["loaded"]), 250)
+
+
+class WhisperPackingTests(SimpleTestCase):
+    def setUp(self):
+        first = np.zeros(10 * SAMPLE_RATE, dtype=np.float32)
+        second = np.zeros(4 * SAMPLE_RATE, dtype=np.float32)
+        self.pieces, self.owners, self.clip_offsets, self.packed_starts = pack_regions([
+            (first, [(1.0, 3.0), (6.5, 7.0)]),
+            (second, [(0.0, 4.0), (4.0, 5.0)]),
+        ])
+
+    def test_pack_regions(self):
+        self.assertEqual(self.owners, [0, 0, 1])
+        self.assertEqual(self.clip_offsets, [1.0, 6.5, 0.0])
+        self.assertEqual(self.packed_starts, [0, 2 * SAMPLE_RATE, int(2.5 * SAMPLE_RATE)])
+        self.assertEqual([len(piece) for piece in self.pieces], [2 * SAMPLE_RATE, SAMPLE_RATE // 2, 4 * SAMPLE_RATE])
+
+    def test_clip_timestamps_are_integer_samples(self):
+        timestamps = clip_timestamps(self.packed_starts, self.pieces)
+        self.assertEqual(timestamps, [
+            {"start": 0, "end": 32000},
+            {"start": 32000, "end": 40000},
+            {"start": 40000, "end": 104000},
+        ])
+        for timestamp in timestamps:
+            self.assertIsInstance(timestamp["start"], int)
+            self.assertIsInstance(timestamp["end"], int)
+
+    def test_locate_chunk_maps_packed_time_back(self):
+        self.assertEqual(locate_chunk(self.packed_starts, 0.0), 0)
+        self.assertEqual(locate_chunk(self.packed_starts, 1.99), 0)
+        # Un segmento que empieza justo en el límite (o un redondeo por debajo) es del fragmento siguiente
+        self.assertEqual(locate_chunk(self.packed_starts, 2.0), 1)
+        self.assertEqual(locate_chunk(self.packed_starts, 1.9999), 1)
+        self.assertEqual(locate_chunk(self.packed_starts, 2.5), 2)
+        self.assertEqual(locate_chunk(self.packed_starts, 6.0), 2)
+
+        # Un segmento a 0.2 s del tercer fragmento está a 0.2 s del inicio del segundo clip
+        chunk = locate_chunk(self.packed_starts, 2.7)
+        offset = self.clip_offsets[chunk] - self.packed_starts[chunk] / SAMPLE_RATE
+        self.assertEqual(self.owners[chunk], 1)
+        self.assertAlmostEqual(2.7 + offset, 0.2)
+
+
+class SpeakerAlignmentTests(SimpleTestCase):
+    def test_assigns_speaker_with_most_overlap(self):
+        turns = [(4.0, 10.0, "B"), (0.0, 4.5, "A")]
+        transcript = [
+            {"start": 0.0, "end": 3.0, "text": "hola"},
+            {"start": 3.5, "end": 6.0, "text": "qué tal"},
+        ]
+        self.assertEqual(
+            [segment["speaker"] for segment in align_speakers(transcript, turns)],
+            ["A", "B"],
+        )
+
+    def test_nearest_turn_within_gap(self):
+        turns = [(0.0, 2.0, "A"), (8.0, 9.0, "B")]
+        transcript = [
+            {"start": 2.5, "end": 3.0, "text": "cerca de A"},
+            {"start": 7.5, "end": 7.8, "text": "cerca de B"},
+            {"start": 4.5, "end": 5.0, "text": "lejos"},
+        ]
+        aligned = align_speakers(transcript, turns, max_gap=1.0)
+        self.assertEqual([segment["speaker"] for segment in aligned], ["A", "B", "UNKNOWN"])
+        self.assertEqual(aligned[0], {"start": 2.5, "end": 3.0, "speaker": "A", "text": "cerca de A"})
+
+    def test_long_turn_found_behind_short_ones(self):
+        turns = [(0.0, 100.0, "A"), (10.0, 11.0, "B"), (20.0, 21.0, "C")]
+        transcript = [{"start": 50.0, "end": 55.0, "text": "monólogo"}]
+        self.assertEqual(align_speakers(transcript, turns)[0]["speaker"], "A")
+
+    def test_without_turns(self):
+        transcript = [{"start": 0.0, "end": 1.0, "text": "hola"}]
+        self.assertEqual(align_speakers(transcript, [])[0]["speaker"], "UNKNOWN")
+
+
+def _wav_bytes(samples: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE, channels: int = 1) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def _wav_upload(name: str, seconds: float) -> SimpleUploadedFile:
+    samples = np.full(int(seconds * TARGET_SAMPLE_RATE), 1000, dtype=np.int16)
+    return SimpleUploadedFile(name, _wav_bytes(samples), content_type="audio/wav")
+
+
+class BatchFragmentsTests(SimpleTestCase):
+    def test_one_fragment_per_file(self):
+        waveforms, names, offsets, error = batch_fragments(
+            [_wav_upload("a.wav", 1.0), _wav_upload("b.wav", 0.5)], None
+        )
+        self.assertIsNone(error)
+        self.assertEqual(names, ["a.wav", "b.wav"])
+        self.assertEqual(offsets, [0.0, 0.0])
+        self.assertEqual([len(waveform) for waveform in waveforms], [TARGET_SAMPLE_RATE, TARGET_SAMPLE_RATE // 2])
+
+    def test_cuts_split_a_single_file(self):
+        waveforms, names, offsets, error = batch_fragments([_wav_upload("a.wav", 3.0)], "[2, 1, 7]")
+        self.assertIsNone(error)
+        self.assertEqual(names, ["a.wav[0.00-1.00]", "a.wav[1.00-2.00]", "a.wav[2.00-3.00]"])
+        self.assertEqual(offsets, [0.0, 1.0, 2.0])
+        self.assertEqual([len(waveform) for waveform in waveforms], [TARGET_SAMPLE_RATE] * 3)
+
+    def test_intervals_are_clamped_to_the_clip(self):
+        waveforms, names, offsets, error = batch_fragments(
+            [_wav_upload("a.wav", 3.0)], [[0.5, 1.5], [2.0, 5.0], [4.0, 6.0]]
+        )
+        self.assertIsNone(error)
+        self.assertEqual(names, ["a.wav[0.50-1.50]", "a.wav[2.00-3.00]"])
+        self.assertEqual(offsets, [0.5, 2.0])
+
+    def test_rejected_requests(self):
+        two_files = [_wav_upload("a.wav", 1.0), _wav_upload("b.wav", 1.0)]
+        self.assertIsNotNone(batch_fragments(two_files, "[0.5]")[3])
+        self.assertIsNotNone(batch_fragments([_wav_upload("a.wav", 1.0)], "no-es-json")[3])
+        self.assertIsNotNone(batch_fragments([_wav_upload("a.wav", 1.0)], [[3.0, 4.0]])[3])
+        with mock.patch.dict(config.BATCH_UPLOAD_CONFIG, {"max_fragments": 2}):
+            self.assertIsNotNone(batch_fragments([_wav_upload("a.wav", 3.0)], "[1, 2]")[3])
+        with mock.patch.dict(config.BATCH_UPLOAD_CONFIG, {"max_total_seconds": 1}):
+            self.assertIsNotNone(batch_fragments(two_files, None)[3])
+
+
+class PersistBatchDetectionsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("batch", password="secret")
+        SoundCategory.objects.create(name="danger_alert", label="Alerta de peligro")
+        SoundCategory.objects.create(name="animal", label="Animales")
+
+    def _result(self, name, sound_type, alert_category):
+        return {
+            "name": name,
+            "sound_type": sound_type,
+            "alert_category": alert_category,
+            "confidence": 0.9,
+            "transcription": "",
+            "transcription_status": "",
+            "transcription_job_id": None,
+        }
+
+    def test_bulk_persists_relevant_results(self):
+        results = [
+            self._result("a.wav", "Siren", "danger_alert"),
+            self._result("b.wav", "Dog", "animal"),
+            self._result("c.wav", "unknown", "unknown"),
+            self._result("d.wav", "Bell", "sin_categoria"),
+        ]
+        # Categorías, tipos, tipos nuevos, tipos creados y detecciones: una consulta por paso
+        with self.assertNumQueries(5):
+            persist_batch_detections(self.user, results)
+
+        self.assertEqual(DetectedSound.objects.filter(user=self.user).count(), 2)
+        self.assertIsNotNone(results[0]["detected_sound_id"])
+        self.assertIsNotNone(results[1]["detected_sound_id"])
+        self.assertIsNone(results[2]["detected_sound_id"])
+        self.assertIsNone(results[3]["detected_sound_id"])
+        self.assertEqual(results[0]["sound_type_label"], "Siren")
+        self.assertEqual(results[2]["sound_type_label"], "Desconocido")
+
+    def test_new_sound_types_take_criticality_from_their_category(self):
+        persist_batch_detections(self.user, [
+            self._result("a.wav", "Siren", "danger_alert"),
+            self._result("b.wav", "Dog", "animal"),
+        ])
+        self.assertTrue(SoundType.objects.get(name="siren").is_critical)
+        self.assertFalse(SoundType.objects.get(name="dog").is_critical)
+
+    def test_existing_sound_types_are_reused(self):
+        SoundType.objects.create(name="siren", label="Sirena")
+        results = [self._result("a.wav", "Siren", "danger_alert")]
+        persist_batch_detections(self.user, results)
+        self.assertEqual(SoundType.objects.filter(name="siren").count(), 1)
+        self.assertEqual(results[0]["sound_type_label"], "Sirena")
+
+
+class IncrementalPCMDecoderTests(SimpleTestCase):
+    def setUp(self):
+        self.samples = (np.arange(1000, dtype=np.int32) * 37 % 65536 - 32768).astype(np.int16)
+        self.expected = self.samples.astype(np.float32) / 32768.0
+
+    def _decode_in_chunks(self, decoder, data, chunk_size):
+        parts = [decoder.feed(data[start:start + chunk_size]) for start in range(0, len(data), chunk_size)]
+        parts.append(decoder.finish())
+        return np.concatenate(parts)
+
+    def test_wav_header_and_samples_split_across_chunks(self):
+        decoded = self._decode_in_chunks(IncrementalPCMDecoder("wav"), _wav_bytes(self.samples), 7)
+        np.testing.assert_array_equal(decoded, self.expected)
+
+    def test_raw_pcm_keeps_partial_samples(self):
+        decoder = IncrementalPCMDecoder("pcm_s16le", sample_rate=TARGET_SAMPLE_RATE)
+        decoded = self._decode_in_chunks(decoder, self.samples.astype("<i2").tobytes(), 3)
+        np.testing.assert_array_equal(decoded, self.expected)
+
+    def test_stereo_is_downmixed(self):
+        stereo = np.stack([self.samples, self.samples], axis=1).reshape(-1)
+        decoder = IncrementalPCMDecoder("pcm_s16le", sample_rate=TARGET_SAMPLE_RATE, channels=2)
+        decoded = self._decode_in_chunks(decoder, stereo.astype("<i2").tobytes(), 5)
+        np.testing.assert_array_equal(decoded, self.expected)
+
+    def test_resampling_streams_every_sample(self):
+        decoder = IncrementalPCMDecoder("pcm_s16le", sample_rate=8000)
+        decoded = self._decode_in_chunks(decoder, np.zeros(8000, dtype="<i2").tobytes(), 1001)
+        self.assertEqual(len(decoded), TARGET_SAMPLE_RATE)
+
+    def test_rejects_unsupported_input(self):
+        with self.assertRaises(ValueError):
+            IncrementalPCMDecoder("mp3")
+        with self.assertRaises(ValueError):
+            IncrementalPCMDecoder("pcm_s16le")
+        with self.assertRaises(ValueError):
+            IncrementalPCMDecoder("wav").feed(b"ID3" + b"\x00" * 64)
+
+
+class HttpNegotiationTests(SimpleTestCase):
+    def testparse_range(self):
+        self.assertEqual(parse_range("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(parse_range("bytes=900-", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-5000", 1000), (0, 999))
+        self.assertEqual(parse_range("bytes=500-5000", 1000), (500, 999))
+
+    def testparse_range_unsatisfiable(self):
+        self.assertIs(parse_range("bytes=1000-", 1000), False)
+        self.assertIs(parse_range("bytes=50-10", 1000), False)
+        self.assertIs(parse_range("bytes=-0", 1000), False)
+
+    def testparse_range_ignored(self):
+        self.assertIsNone(parse_range(None, 1000))
+        self.assertIsNone(parse_range("items=0-1", 1000))
+        self.assertIsNone(parse_range("bytes=0-1,5-9", 1000))
+        self.assertIsNone(parse_range("bytes=a-b", 1000))
+
+    def testetag_matches(self):
+        self.assertTrue(etag_matches('"abc"', '"abc"'))
+        self.assertTrue(etag_matches('W/"abc", "def"', '"abc"'))
+        self.assertTrue(etag_matches("*", '"abc"'))
+        self.assertFalse(etag_matches('"def"', '"abc"'))
+        self.assertFalse(etag_matches(None, '"abc"'))
+
+    def test_parse_accept_orders_by_quality(self):
+        self.assertEqual(
+            parse_accept("audio/wav;q=0.5, audio/flac, audio/ogg;q=0, */*;q=0.1"),
+            [("audio/flac", 1.0), ("audio/wav", 0.5), ("*/*", 0.1)],
+        )
+        self.assertEqual(parse_accept(""), [])
+
+    def test_negotiate(self):
+        self.assertEqual(audio_archive.negotiate("audio/wav, audio/flac", "flac"), "flac")
+        self.assertEqual(audio_archive.negotiate("audio/wav", "flac"), "wav")
+        self.assertEqual(audio_archive.negotiate("audio/wav;q=0.9, audio/*;q=0.5", "flac"), "wav")
+        self.assertEqual(audio_archive.negotiate("application/json", "flac"), "flac")
+        self.assertEqual(audio_archive.negotiate("", "mp3"), "mp3")
+        self.assertEqual(audio_archive.negotiate("audio/flac", "flac", requested="OPUS"), "opus")
+        self.assertIsNone(audio_archive.negotiate("audio/flac", "flac", requested="aac"))
+
+
+class AudioRegistryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("registry", password="secret")
+        self.addCleanup(setattr, audio_registry, "batch_size", audio_registry.batch_size)
+        remove = mock.patch("agent.services.audio_registry_service.audio_archive.remove")
+        compact = mock.patch("agent.services.audio_registry_service.audio_archive.compact")
+        self.remove = remove.start()
+        self.compact = compact.start()
+        self.addCleanup(remove.stop)
+        self.addCleanup(compact.stop)
+
+    def _retain(self, audio_id, expires_in, size=100, age=0):
+        RetainedAudio.objects.create(
+            audio_id=audio_id,
+            user=self.user,
+            audio_key=f"key-{audio_id}",
+            audio_format="flac",
+            content_type="audio/flac",
+            size=size,
+            expires_at=timezone.now() + timedelta(seconds=expires_in),
+        )
+        RetainedAudio.objects.filter(pk=audio_id).update(created_at=timezone.now() - timedelta(seconds=age))
+
+    def _live(self):
+        live = RetainedAudio.objects.filter(expires_at__gt=timezone.now())
+        return sorted(live.values_list("audio_id", flat=True))
+
+    def test_sweep_removes_expired_in_expiry_order(self):
+        for audio_id, expires_in in [("c", -10), ("live", 3600), ("a", -30), ("b", -20)]:
+            self._retain(audio_id, expires_in)
+
+        self.assertEqual(audio_registry.sweep(), 3)
+        self.assertEqual(
+            [call.args[0] for call in self.remove.call_args_list],
+            ["key-a", "key-b", "key-c"],
+        )
+        self.assertEqual(list(RetainedAudio.objects.values_list("audio_id", flat=True)), ["live"])
+
+    def test_sweep_works_in_batches(self):
+        audio_registry.batch_size = 2
+        for i in range(5):
+            self._retain(f"old{i}", -60 + i)
+
+        # Tres lotes (2 + 2 + 1): una consulta para leer y otra para borrar cada uno
+        with self.assertNumQueries(6):
+            self.assertEqual(audio_registry.sweep(), 5)
+        self.assertEqual(self.remove.call_count, 5)
+        self.assertFalse(RetainedAudio.objects.exists())
+        self.assertEqual(audio_registry.sweep(), 0)
+        self.assertEqual(self.compact.call_count, 1)
+
+    def test_quota_expires_oldest_audios(self):
+        self.addCleanup(setattr, audio_registry, "user_quota_bytes", audio_registry.user_quota_bytes)
+        audio_registry.user_quota_bytes = 250
+        for age, audio_id in enumerate(("newest", "newer", "older", "oldest")):
+            self._retain(audio_id, 3600, age=age)
+
+        audio_registry._enforce_quota(self.user.pk, "newest")
+        self.assertEqual(self._live(), ["newer", "newest"])
+        self.assertEqual(audio_registry.sweep(), 2)
+
+    def test_quota_keeps_the_new_audio(self):
+        self.addCleanup(setattr, audio_registry, "user_quota_bytes", audio_registry.user_quota_bytes)
+        audio_registry.user_quota_bytes = 150
+        self._retain("older", 3600, age=1)
+        self._retain("large", 3600, size=500)
+
+        audio_registry._enforce_quota(self.user.pk, "large")
+        self.assertEqual(self._live(), ["large"])
+
+
+class SegmentStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+
+    def test_put_deduplicates_and_counts_references(self):
+        store = SegmentStore(self.folder)
+        key, written = store.put(b"clip-a", "flac")
+        again, written_again = store.put(b"clip-a", "flac")
+
+        self.assertTrue(written)
+        self.assertFalse(written_again)
+        self.assertEqual(key, again)
+        self.assertEqual(store.info(key), {"format": "flac", "size": 6, "refs": 2})
+        self.assertEqual(bytes(store.view(key)), b"clip-a")
+
+    def test_release_drops_clip_after_last_reference(self):
+        store = SegmentStore(self.folder)
+        key, _ = store.put(b"clip-a", "flac")
+        store.put(b"clip-a", "flac")
+
+        self.assertTrue(store.release(key))
+        self.assertEqual(store.info(key)["refs"], 1)
+        self.assertTrue(store.release(key))
+        self.assertIsNone(store.info(key))
+        self.assertIsNone(store.view(key))
+        self.assertFalse(store.release(key))
+        self.assertFalse(store.release("no-es-una-clave"))
+
+    def test_segments_rotate_when_full(self):
+        store = SegmentStore(self.folder, segment_max_bytes=100)
+        store.put(b"a" * 60, "wav")
+        store.put(b"b" * 60, "wav")
+
+        self.assertEqual(store.stats()["segments"], 2)
+
+    def test_compact_moves_live_clips_and_removes_segment(self):
+        store = SegmentStore(self.folder, segment_max_bytes=100, compact_live_ratio=0.75)
+        kept, _ = store.put(b"a" * 40, "wav")
+        dropped, _ = store.put(b"x" * 40, "wav")
+        other, _ = store.put(b"b" * 40, "wav")
+        store.release(dropped)
+
+        self.assertEqual(store.compact(), 1)
+        self.assertEqual(bytes(store.view(kept)), b"a" * 40)
+        self.assertEqual(bytes(store.view(other)), b"b" * 40)
+        self.assertEqual(store.stats(), {"clips": 2, "live_bytes": 80, "segments": 1, "segment_bytes": 80})
+
+    def test_compact_keeps_mostly_live_segments(self):
+        store = SegmentStore(self.folder, segment_max_bytes=100, compact_live_ratio=0.25)
+        store.put(b"a" * 40, "wav")
+        dropped, _ = store.put(b"x" * 40, "wav")
+        store.put(b"b" * 40, "wav")
+        store.release(dropped)
+
+        self.assertEqual(store.compact(), 0)
+        self.assertEqual(store.stats()["segments"], 2)
+
+    def test_reopen_replays_index(self):
+        store = SegmentStore(self.folder, segment_max_bytes=100, compact_live_ratio=0.75)
+        kept, _ = store.put(b"a" * 40, "opus")
+        store.put(b"a" * 40, "opus")
+        dropped, _ = store.put(b"x" * 40, "wav")
+        store.put(b"b" * 40, "wav")
+        store.release(dropped)
+        store.compact()
+
+        reopened = SegmentStore(self.folder)
+        self.assertEqual(reopened.info(kept), {"format": "opus", "size": 40, "refs": 2})
+        self.assertEqual(bytes(reopened.view(kept)), b"a" * 40)
+        self.assertIsNone(reopened.info(dropped))
+
+    def test_other_instance_sees_new_clips(self):
+        store = SegmentStore(self.folder)
+        other = SegmentStore(self.folder)
+        key, _ = store.put(b"clip-a", "flac")
+
+        self.assertEqual(bytes(other.view(key)), b"clip-a")
+        store.put(b"clip-b", "flac")
+        _, written = other.put(b"clip-b", "flac")
+        self.assertFalse(written)
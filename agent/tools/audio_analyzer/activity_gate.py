@@ -0,0 +1,115 @@
+"""
+Puerta de actividad previa a YAMNet y Whisper.
+
+Clasifica un clip como silencioso, solo ruido o con actividad a partir de
+tres descriptores por frame calculados de forma vectorizada con numpy:
+energía (dBFS), tasa de cruces por cero y planitud espectral.
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+SILENT = "silent"
+NOISE = "noise"
+ACTIVE = "active"
+
+
+def _frames(waveform: np.ndarray, frame_length: int, hop_length: int) -> np.ndarray:
+    """Vista (frames, frame_length) sin copia; rellena con ceros si el clip es más corto que un frame."""
+    if len(waveform) < frame_length:
+        waveform = np.pad(waveform, (0, frame_length - len(waveform)))
+    num_frames = 1 + (len(waveform) - frame_length) // hop_length
+    return np.lib.stride_tricks.as_strided(
+        waveform,
+        shape=(num_frames, frame_length),
+        strides=(waveform.strides[0] * hop_length, waveform.strides[0]),
+        writeable=False,
+    )
+
+
+class ActivityGate:
+    """Clasificador ligero de actividad basado en energía, ZCR y planitud espectral."""
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: float = 25.0,
+        hop_ms: float = 10.0,
+        silence_db: float = -50.0,
+        min_active_ratio: float = 0.05,
+        noise_flatness: float = 0.4,
+        noise_zcr: float = 0.25,
+    ):
+        """
+        Args:
+            sample_rate: Frecuencia de muestreo de la forma de onda
+            frame_ms: Duración de cada frame en milisegundos
+            hop_ms: Salto entre frames en milisegundos
+            silence_db: Energía (dBFS) por debajo de la cual un frame es silencio
+            min_active_ratio: Fracción mínima de frames con energía para no ser silencio
+            noise_flatness: Planitud espectral media por encima de la cual se considera ruido
+            noise_zcr: Tasa de cruces por cero media por encima de la cual se considera ruido
+        """
+        self.frame_length = int(sample_rate * frame_ms / 1000)
+        self.hop_length = int(sample_rate * hop_ms / 1000)
+        self.silence_db = silence_db
+        self.min_active_ratio = min_active_ratio
+        self.noise_flatness = noise_flatness
+        self.noise_zcr = noise_zcr
+        self.window = np.hanning(self.frame_length).astype(np.float32)
+
+    def features(self, waveform: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Descriptores por frame.
+
+        Args:
+            waveform: Forma de onda float32 mono
+
+        Returns:
+            Dict con energy_db, zcr y flatness (un valor por frame)
+        """
+        frames = _frames(np.ascontiguousarray(waveform, dtype=np.float32), self.frame_length, self.hop_length)
+
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        energy_db = 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        power = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2 + 1e-12
+        flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+        return {"energy_db": energy_db, "zcr": zcr, "flatness": flatness}
+
+    def classify(self, waveform: np.ndarray) -> Tuple[str, Dict[str, float]]:
+        """
+        Clasifica el clip.
+
+        Args:
+            waveform: Forma de onda float32 mono
+
+        Returns:
+            Tupla (etiqueta, resumen): etiqueta es 'silent', 'noise' o 'active';
+            el resumen incluye la fracción de frames activos y las medias de
+            ZCR y planitud sobre esos frames
+        """
+        if len(waveform) == 0:
+            return SILENT, {"active_ratio": 0.0, "peak_db": float(self.silence_db), "zcr": 0.0, "flatness": 0.0}
+
+        features = self.features(waveform)
+        active = features["energy_db"] > self.silence_db
+        active_ratio = float(np.mean(active))
+        summary = {
+            "active_ratio": active_ratio,
+            "peak_db": float(np.max(features["energy_db"])),
+            "zcr": float(np.mean(features["zcr"][active])) if active.any() else 0.0,
+            "flatness": float(np.mean(features["flatness"][active])) if active.any() else 0.0,
+        }
+
+        if active_ratio < self.min_active_ratio:
+            return SILENT, summary
+        # Ruido de banda ancha: espectro plano y muchos cruces por cero en los frames con energía
+        if summary["flatness"] > self.noise_flatness and summary["zcr"] > self.noise_zcr:
+            return NOISE, summary
+        return ACTIVE, summary
@@ -0,0 +1,98 @@
+"""
+Utilidades del benchmark de backends de YAMNet.
+Cada backend se mide en un proceso nuevo para que el pico de RSS sea comparable.
+"""
+
+import os
+import resource
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+
+def run_backend_benchmark(backend: str, files: List[str], repeats: int = 1) -> Dict:
+    """
+    Carga un backend y mide la latencia por archivo (pensado para ejecutarse en un proceso aparte).
+
+    Args:
+        backend: Nombre del backend (tfhub, tflite, tflite_int8, onnx, onnx_int8)
+        files: Rutas de los WAV a analizar
+        repeats: Repeticiones por archivo
+
+    Returns:
+        Dict con tiempos de carga y calentamiento, latencias (s), pico de RSS (MB)
+        y puntuaciones medias por archivo
+    """
+    from agent.config import YAMNET_MODEL_CONFIG
+    from agent.services.model_registry_service import model_registry
+    from agent.tools.audio_decoding.audio_decoder import audio_decoder
+    from .yamnet_backends import BACKEND_ARTIFACTS, create_yamnet_backend
+
+    model_path = model_registry.resolve(BACKEND_ARTIFACTS[backend])
+    if backend != 'tfhub' and not os.path.exists(model_path):
+        return {"backend": backend, "error": "artefacto no exportado (manage.py export_yamnet_backends)"}
+
+    waveforms = {path: audio_decoder.decode(path) for path in files}
+
+    start = time.perf_counter()
+    model = create_yamnet_backend(
+        backend,
+        model_path,
+        length_buckets=YAMNET_MODEL_CONFIG['length_buckets'],
+        bucket_max_frames=YAMNET_MODEL_CONFIG['bucket_max_frames'],
+        warmup_seconds=YAMNET_MODEL_CONFIG['warmup_seconds'],
+        num_threads=YAMNET_MODEL_CONFIG['num_threads'],
+    )
+    load_time = time.perf_counter() - start
+
+    latencies = []
+    mean_scores = {}
+    for path, waveform in waveforms.items():
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            scores, _ = model(waveform)
+            latencies.append(time.perf_counter() - t0)
+        mean_scores[path] = scores.mean(axis=0)
+
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+    return {
+        "backend": backend,
+        "load_time": load_time,
+        "warmup_time": model.warmup_time,
+        "latencies": latencies,
+        "peak_rss_mb": peak_rss_mb,
+        "mean_scores": mean_scores,
+    }
+
+
+def topk_agreement(reference: Dict[str, np.ndarray], candidate: Dict[str, np.ndarray], k: int = 3) -> Dict[str, float]:
+    """
+    Compara el top-k de cada archivo contra el backend de referencia.
+
+    Args:
+        reference: Puntuaciones medias por archivo del backend de referencia
+        candidate: Puntuaciones medias por archivo del backend evaluado
+        k: Tamaño del top-k
+
+    Returns:
+        Dict con top1 (fracción de archivos con la misma clase principal) y
+        overlap (intersección media de los top-k, entre 0 y 1)
+    """
+    common = [path for path in reference if path in candidate]
+    if not common:
+        return {"top1": 0.0, "overlap": 0.0}
+
+    top1_matches = 0
+    overlaps = []
+    for path in common:
+        ref_top = np.argpartition(reference[path], -k)[-k:]
+        cand_top = np.argpartition(candidate[path], -k)[-k:]
+        top1_matches += int(np.argmax(reference[path]) == np.argmax(candidate[path]))
+        overlaps.append(len(set(ref_top.tolist()) & set(cand_top.tolist())) / k)
+
+    return {"top1": top1_matches / len(common), "overlap": float(np.mean(overlaps))}
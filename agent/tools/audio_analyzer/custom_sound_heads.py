@@ -0,0 +1,292 @@
+"""
+Clasificadores personalizados por usuario sobre los embeddings de YAMNet.
+
+Cada usuario puede enseñar sus propios sonidos (su timbre, su microondas...)
+con unos pocos clips. Se entrena una regresión logística uno-contra-resto
+sobre los embeddings de 1024 dimensiones por frame que YAMNet ya calcula, de
+modo que la evaluación no necesita una segunda pasada de ningún modelo.
+
+Por usuario se guarda un único .npz con los pesos y los ejemplos de
+entrenamiento en float16 (necesarios para reentrenar al añadir etiquetas). Las
+modificaciones del .npz van bajo un bloqueo de archivo por usuario para que
+dos entrenamientos simultáneos no pierdan ejemplos.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from agent.tools.file_lock import file_lock
+
+EMBEDDING_DIM = 1024
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-8)
+
+
+class CustomSoundHead:
+    """Regresión logística uno-contra-resto sobre embeddings normalizados."""
+
+    def __init__(
+        self,
+        labels: List[str],
+        categories: List[str],
+        weights: np.ndarray,
+        bias: np.ndarray,
+    ):
+        """
+        Args:
+            labels: Nombres de los sonidos personalizados
+            categories: Categoría de alerta de cada sonido
+            weights: Matriz (etiquetas, 1024)
+            bias: Vector (etiquetas,)
+        """
+        self.labels = labels
+        self.categories = categories
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+
+    @classmethod
+    def fit(
+        cls,
+        examples: Dict[str, np.ndarray],
+        categories: Dict[str, str],
+        background: Optional[np.ndarray] = None,
+        epochs: int = 300,
+        learning_rate: float = 0.5,
+        l2: float = 1e-3,
+    ) -> "CustomSoundHead":
+        """
+        Entrena un clasificador binario por etiqueta; los negativos son los
+        frames del resto de etiquetas y los de fondo.
+
+        Args:
+            examples: Embeddings por frame (n, 1024) de cada etiqueta
+            categories: Categoría de alerta de cada etiqueta
+            background: Embeddings de fondo usados como negativos
+            epochs: Iteraciones de descenso de gradiente
+            learning_rate: Tasa de aprendizaje
+            l2: Regularización L2
+
+        Returns:
+            CustomSoundHead entrenado
+        """
+        labels = sorted(examples)
+        blocks = [examples[label] for label in labels]
+        targets = [np.full(len(block), i) for i, block in enumerate(blocks)]
+        if background is not None and len(background):
+            blocks.append(background)
+            targets.append(np.full(len(background), -1))
+
+        features = _normalize(np.concatenate(blocks).astype(np.float32))
+        target = np.concatenate(targets)
+        # Matriz objetivo uno-contra-resto (frames, etiquetas)
+        y = (target[:, None] == np.arange(len(labels))[None, :]).astype(np.float32)
+
+        # Pesos por clase para compensar el desbalance positivos/negativos
+        positives = y.sum(axis=0)
+        negatives = len(y) - positives
+        sample_weight = np.where(y > 0, len(y) / (2 * np.maximum(positives, 1)), len(y) / (2 * np.maximum(negatives, 1)))
+
+        weights = np.zeros((len(labels), features.shape[1]), dtype=np.float32)
+        bias = np.zeros(len(labels), dtype=np.float32)
+        for _ in range(epochs):
+            probabilities = 1.0 / (1.0 + np.exp(-(features @ weights.T + bias)))
+            error = (probabilities - y) * sample_weight / len(y)
+            weights -= learning_rate * (error.T @ features + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+
+        return cls(labels, [categories[label] for label in labels], weights, bias)
+
+    def predict_frames(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Probabilidad de cada etiqueta por frame.
+
+        Args:
+            embeddings: Embeddings (frames, 1024) de YAMNet
+
+        Returns:
+            Matriz (frames, etiquetas)
+        """
+        if not len(embeddings):
+            return np.zeros((0, len(self.labels)), dtype=np.float32)
+        logits = _normalize(embeddings.astype(np.float32)) @ self.weights.T + self.bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def detect(self, embeddings: np.ndarray, threshold: float) -> List[Tuple[str, float, str]]:
+        """
+        Detecciones del clip: confianza = probabilidad máxima por frame.
+
+        Args:
+            embeddings: Embeddings (frames, 1024) de YAMNet
+            threshold: Probabilidad mínima
+
+        Returns:
+            Lista de tuplas (sound_name, confidence, alert_category)
+        """
+        if not len(embeddings):
+            return []
+        clip_scores = self.predict_frames(embeddings).max(axis=0)
+        return [
+            (label, float(score), category)
+            for label, score, category in zip(self.labels, clip_scores, self.categories)
+            if score >= threshold
+        ]
+
+
+class CustomSoundHeadStore:
+    """
+    Almacén de clasificadores personalizados, un archivo .npz por usuario,
+    con caché en memoria invalidada por fecha de modificación.
+    """
+
+    def __init__(self, folder: str, max_examples_per_label: int = 256, epochs: int = 300, l2: float = 1e-3):
+        """
+        Args:
+            folder: Carpeta donde se guardan los .npz
+            max_examples_per_label: Frames de entrenamiento máximos por etiqueta
+            epochs: Iteraciones de entrenamiento
+            l2: Regularización L2
+        """
+        self.folder = folder
+        self.max_examples_per_label = max_examples_per_label
+        self.epochs = epochs
+        self.l2 = l2
+        self._cache: Dict[str, Tuple[int, Optional[CustomSoundHead]]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, user_id) -> str:
+        return os.path.join(self.folder, f"user_{user_id}.npz")
+
+    def get(self, user_id) -> Optional[CustomSoundHead]:
+        """
+        Clasificador del usuario, o None si no tiene sonidos personalizados.
+
+        Args:
+            user_id: ID del usuario
+        """
+        if user_id is None:
+            return None
+        path = self._path(user_id)
+        if not os.path.exists(path):
+            return None
+
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+
+        with np.load(path, allow_pickle=False) as data:
+            head = CustomSoundHead(
+                labels=data["labels"].tolist(),
+                categories=data["categories"].tolist(),
+                weights=data["weights"],
+                bias=data["bias"],
+            ) if len(data["labels"]) else None
+
+        with self._lock:
+            self._cache[path] = (mtime, head)
+        return head
+
+    def version(self, user_id) -> str:
+        """Versión del clasificador del usuario (fecha de modificación), vacía si no tiene."""
+        if user_id is None:
+            return ""
+        path = self._path(user_id)
+        return str(os.stat(path).st_mtime_ns) if os.path.exists(path) else ""
+
+    def list_labels(self, user_id) -> List[Dict[str, str]]:
+        """Sonidos personalizados del usuario con su categoría y número de frames."""
+        examples, categories = self._load_examples(user_id)
+        return [
+            {"label": label, "alert_category": categories[label], "frames": len(examples[label])}
+            for label in sorted(examples)
+        ]
+
+    def add_examples(
+        self,
+        user_id,
+        label: str,
+        alert_category: str,
+        embeddings: List[np.ndarray],
+        background: Optional[np.ndarray] = None,
+    ) -> CustomSoundHead:
+        """
+        Añade clips de ejemplo a una etiqueta y reentrena el clasificador.
+
+        Args:
+            user_id: ID del usuario
+            label: Nombre del sonido
+            alert_category: Categoría de alerta asociada
+            embeddings: Embeddings por frame de cada clip
+            background: Embeddings de fondo usados como negativos
+
+        Returns:
+            CustomSoundHead reentrenado
+        """
+        new_frames = np.concatenate([e for e in embeddings if len(e)]).astype(np.float16)
+        with self._user_lock(user_id):
+            examples, categories = self._load_examples(user_id)
+            combined = np.concatenate([examples[label], new_frames]) if label in examples else new_frames
+            examples[label] = combined[-self.max_examples_per_label:]
+            categories[label] = alert_category
+            return self._train_and_save(user_id, examples, categories, background)
+
+    def remove_label(self, user_id, label: str, background: Optional[np.ndarray] = None) -> bool:
+        """Elimina una etiqueta y reentrena con las restantes."""
+        with self._user_lock(user_id):
+            examples, categories = self._load_examples(user_id)
+            if label not in examples:
+                return False
+            del examples[label]
+            del categories[label]
+            self._train_and_save(user_id, examples, categories, background)
+            return True
+
+    def _user_lock(self, user_id):
+        # Lectura-modificación-escritura del .npz exclusiva entre hilos y procesos
+        os.makedirs(self.folder, exist_ok=True)
+        return file_lock(os.path.join(self.folder, f"user_{user_id}.lock"))
+
+    def _train_and_save(self, user_id, examples, categories, background) -> Optional[CustomSoundHead]:
+        head = None
+        if examples:
+            head = CustomSoundHead.fit(
+                {label: frames.astype(np.float32) for label, frames in examples.items()},
+                categories,
+                background=background,
+                epochs=self.epochs,
+                l2=self.l2,
+            )
+
+        labels = sorted(examples)
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(user_id)
+        temp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            temp_path,
+            labels=np.array(labels, dtype=str),
+            categories=np.array([categories[label] for label in labels], dtype=str),
+            weights=(head.weights if head else np.zeros((0, EMBEDDING_DIM))).astype(np.float16),
+            bias=(head.bias if head else np.zeros(0)).astype(np.float32),
+            example_counts=np.array([len(examples[label]) for label in labels], dtype=np.int64),
+            examples=(np.concatenate([examples[label] for label in labels]) if labels else np.zeros((0, EMBEDDING_DIM))).astype(np.float16),
+        )
+        os.replace(temp_path, path)
+        return head
+
+    def _load_examples(self, user_id) -> Tuple[Dict[str, np.ndarray], Dict[str, str]]:
+        path = self._path(user_id)
+        if not os.path.exists(path):
+            return {}, {}
+        with np.load(path, allow_pickle=False) as data:
+            labels = data["labels"].tolist()
+            categories = dict(zip(labels, data["categories"].tolist()))
+            splits = np.cumsum(data["example_counts"])[:-1]
+            examples = dict(zip(labels, np.split(data["examples"], splits))) if labels else {}
+        return examples, categories
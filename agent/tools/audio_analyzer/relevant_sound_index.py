@@ -0,0 +1,92 @@
+"""
+Índice compilado de sonidos relevantes sobre las 521 clases de YAMNet.
+
+El diccionario RELEVANT_SOUNDS_DICT se traduce una sola vez a un array de
+índices, una máscara de clases relevantes y la categoría de cada clase, de
+modo que todas las clases relevantes se filtran con una única operación
+vectorizada por clip.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+UNKNOWN_CATEGORY = "unknown"
+
+
+class RelevantSoundIndex:
+    """
+    Traducción de RELEVANT_SOUNDS_DICT a índices numpy sobre el mapa de clases.
+    """
+
+    def __init__(self, class_names: Sequence[str], relevant_sounds: Dict[str, str]):
+        """
+        Args:
+            class_names: Nombres de las clases de YAMNet (en orden de índice)
+            relevant_sounds: Diccionario sonido -> categoría de alerta
+        """
+        self.class_names = list(class_names)
+        self.indices = np.asarray(
+            [i for i, name in enumerate(self.class_names) if name in relevant_sounds],
+            dtype=np.int64,
+        )
+        self.index_categories = [relevant_sounds[self.class_names[i]] for i in self.indices]
+
+        # Categoría por índice de clase (unknown para las no relevantes)
+        self.category_by_class = np.full(len(self.class_names), UNKNOWN_CATEGORY, dtype=object)
+        self.category_by_class[self.indices] = self.index_categories
+        self.relevant_mask = np.zeros(len(self.class_names), dtype=bool)
+        self.relevant_mask[self.indices] = True
+
+    def select(
+        self,
+        scores: np.ndarray,
+        min_confidence: float,
+        include_unknown: bool = False,
+        max_results: int = 0,
+    ) -> List[Tuple[str, float, str]]:
+        """
+        Selecciona todas las clases relevantes por encima del umbral.
+
+        Args:
+            scores: Puntuaciones medias (521,) del clip
+            min_confidence: Confianza mínima
+            include_unknown: Incluir también clases no relevantes por encima del umbral
+            max_results: Máximo de detecciones devueltas (0 = sin límite)
+
+        Returns:
+            Lista de tuplas (sound_name, confidence, alert_category) ordenada por confianza
+        """
+        candidates = np.ones(len(scores), dtype=bool) if include_unknown else self.relevant_mask
+        selected = np.flatnonzero(candidates & (scores >= min_confidence))
+        return self._ranked(scores, selected, max_results)
+
+    def top_k(self, scores: np.ndarray, k: int) -> List[Tuple[str, float, str]]:
+        """
+        Las k clases con mayor puntuación (sin filtrar), con su categoría.
+
+        Args:
+            scores: Puntuaciones medias (521,) del clip
+            k: Número de clases
+
+        Returns:
+            Lista de tuplas (sound_name, confidence, alert_category)
+        """
+        return self._ranked(scores, np.arange(len(scores)), k)
+
+    def group_by_category(self, detections: List[Tuple[str, float, str]]) -> Dict[str, List[Tuple[str, float]]]:
+        """Agrupa detecciones (sound_name, confidence, alert_category) por categoría de alerta."""
+        grouped: Dict[str, List[Tuple[str, float]]] = {}
+        for sound_name, confidence, category in detections:
+            grouped.setdefault(category, []).append((sound_name, confidence))
+        return grouped
+
+    def _ranked(self, scores: np.ndarray, selected: np.ndarray, max_results: int) -> List[Tuple[str, float, str]]:
+        if max_results and len(selected) > max_results:
+            # argpartition: O(n) para quedarse con las max_results mejores
+            selected = selected[np.argpartition(scores[selected], -max_results)[-max_results:]]
+        selected = selected[np.argsort(scores[selected])[::-1]]
+        return [
+            (self.class_names[i], float(scores[i]), self.category_by_class[i])
+            for i in selected
+        ]
@@ -0,0 +1,286 @@
+"""
+Seguimiento de eventos de sonido a partir de los frames de YAMNet.
+Convierte las puntuaciones por frame en una línea temporal de eventos
+(onset/offset, confianza pico y media) sin guardar el histórico de frames,
+y los intervalos de voz en las regiones que se transcriben.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from agent.config import SPEECH_REGIONS_CONFIG
+from .relevant_sound_index import RelevantSoundIndex, UNKNOWN_CATEGORY
+
+# YAMNet trabaja con ventanas fijas de 0.96 s y salto de 0.48 s a 16 kHz
+YAMNET_SAMPLE_RATE = 16000
+YAMNET_WINDOW_SECONDS = 0.96
+YAMNET_HOP_SECONDS = 0.48
+YAMNET_WINDOW_SAMPLES = int(YAMNET_WINDOW_SECONDS * YAMNET_SAMPLE_RATE)
+YAMNET_HOP_SAMPLES = int(YAMNET_HOP_SECONDS * YAMNET_SAMPLE_RATE)
+# Muestras mínimas para que YAMNet produzca un frame (ventana + ventana STFT - salto STFT)
+YAMNET_MIN_SAMPLES = YAMNET_WINDOW_SAMPLES + 400 - 160
+
+
+class SoundEventTracker:
+    """
+    Agrupa frames consecutivos por encima del umbral en eventos por clase.
+
+    Solo mantiene en memoria los eventos abiertos, por lo que el consumo es
+    independiente de la duración del audio.
+    """
+
+    def __init__(
+        self,
+        relevance_index: RelevantSoundIndex,
+        min_confidence: float = 0.3,
+        max_gap_frames: int = 1,
+        min_event_frames: int = 1,
+        extra_classes: Sequence[Tuple[str, str]] = (),
+        extra_min_confidence: float = 0.5,
+        include_unknown: bool = False,
+        categorize: bool = True,
+    ):
+        """
+        Args:
+            relevance_index: Índice compilado de las clases relevantes
+            min_confidence: Confianza mínima de un frame para considerarlo activo
+            max_gap_frames: Frames inactivos tolerados antes de cerrar un evento
+            min_event_frames: Frames activos mínimos para reportar un evento
+            extra_classes: Clases adicionales (nombre, categoría) que no son de
+                YAMNet, p. ej. los sonidos personalizados del usuario
+            extra_min_confidence: Confianza mínima para las clases adicionales
+            include_unknown: Seguir también las clases de YAMNet no relevantes
+            categorize: Asignar la categoría de alerta (si no, todas son unknown)
+        """
+        self.min_confidence = min_confidence
+        self.max_gap_frames = max_gap_frames
+        self.min_event_frames = min_event_frames
+
+        if include_unknown:
+            self.class_indices = np.arange(len(relevance_index.class_names))
+        else:
+            self.class_indices = relevance_index.indices
+        self.class_names = [relevance_index.class_names[i] for i in self.class_indices]
+        if categorize:
+            self.categories = relevance_index.category_by_class[self.class_indices].tolist()
+        else:
+            self.categories = [UNKNOWN_CATEGORY] * len(self.class_indices)
+        self.class_names += [name for name, _ in extra_classes]
+        self.categories += [category for _, category in extra_classes]
+        self.thresholds = np.concatenate([
+            np.full(self.class_indices.size, min_confidence, dtype=np.float32),
+            np.full(len(extra_classes), extra_min_confidence, dtype=np.float32),
+        ])
+
+        self.frame_index = 0
+        self._open_events: Dict[int, Dict] = {}
+        self.events: List[Dict] = []
+
+    def update(self, scores: np.ndarray, extra_scores: np.ndarray = None):
+        """
+        Procesa un bloque de frames consecutivos.
+
+        Args:
+            scores: Matriz (frames, 521) con las puntuaciones de YAMNet
+            extra_scores: Matriz (frames, clases adicionales) alineada con scores
+        """
+        if scores.size == 0 or self.thresholds.size == 0:
+            self.frame_index += len(scores)
+            return
+
+        relevant_scores = scores[:, self.class_indices]
+        if extra_scores is not None:
+            relevant_scores = np.concatenate([relevant_scores, extra_scores], axis=1)
+        active = relevant_scores >= self.thresholds
+
+        for row in range(relevant_scores.shape[0]):
+            frame = self.frame_index + row
+            for column in np.flatnonzero(active[row]):
+                self._extend_event(int(column), frame, float(relevant_scores[row, column]))
+            self._close_stale_events(frame)
+
+        self.frame_index += relevant_scores.shape[0]
+
+    def finish(self) -> List[Dict]:
+        """
+        Cierra los eventos abiertos y devuelve la línea temporal ordenada por onset.
+
+        Returns:
+            Lista de eventos con sound, alert_category, onset, offset,
+            peak_confidence, mean_confidence y frames
+        """
+        for column in list(self._open_events):
+            self._close_event(column)
+        self.events.sort(key=lambda event: (event["onset"], -event["peak_confidence"]))
+        return self.events
+
+    def snapshot(self) -> List[Dict]:
+        """
+        Línea temporal provisional sin cerrar nada: los eventos cerrados más
+        los abiertos (marcados con open=True, su offset aún puede crecer).
+
+        Returns:
+            Lista de eventos ordenada por onset
+        """
+        events = list(self.events)
+        for column, event in self._open_events.items():
+            if event["active_frames"] >= self.min_event_frames:
+                events.append(dict(self._event_dict(column, event), open=True))
+        events.sort(key=lambda event: (event["onset"], -event["peak_confidence"]))
+        return events
+
+    def _extend_event(self, column: int, frame: int, score: float):
+        event = self._open_events.get(column)
+        if event is None:
+            self._open_events[column] = {
+                "first_frame": frame,
+                "last_frame": frame,
+                "peak": score,
+                "total": score,
+                "active_frames": 1,
+            }
+            return
+        event["last_frame"] = frame
+        event["peak"] = max(event["peak"], score)
+        event["total"] += score
+        event["active_frames"] += 1
+
+    def _close_stale_events(self, frame: int):
+        for column in [c for c, e in self._open_events.items() if frame - e["last_frame"] > self.max_gap_frames]:
+            self._close_event(column)
+
+    def _close_event(self, column: int):
+        event = self._open_events.pop(column)
+        if event["active_frames"] < self.min_event_frames:
+            return
+        self.events.append(self._event_dict(column, event))
+
+    def _event_dict(self, column: int, event: Dict) -> Dict:
+        return {
+            "sound": self.class_names[column],
+            "alert_category": self.categories[column],
+            "onset": round(event["first_frame"] * YAMNET_HOP_SECONDS, 2),
+            "offset": round(event["last_frame"] * YAMNET_HOP_SECONDS + YAMNET_WINDOW_SECONDS, 2),
+            "peak_confidence": event["peak"],
+            "mean_confidence": event["total"] / event["active_frames"],
+            "frames": event["active_frames"],
+        }
+
+
+def summarize_events(events: List[Dict], max_results: int = 0) -> List[tuple]:
+    """
+    Resume la línea temporal en el formato de sound_detections.
+
+    Args:
+        events: Eventos devueltos por SoundEventTracker.finish()
+        max_results: Máximo de detecciones devueltas (0 = sin límite)
+
+    Returns:
+        Lista de tuplas (sound_name, peak_confidence, alert_category) por clase,
+        ordenadas por confianza pico descendente
+    """
+    best: Dict[str, tuple] = {}
+    for event in events:
+        current = best.get(event["sound"])
+        if current is None or event["peak_confidence"] > current[1]:
+            best[event["sound"]] = (event["sound"], event["peak_confidence"], event["alert_category"])
+    ranked = sorted(best.values(), key=lambda detection: detection[1], reverse=True)
+    return ranked[:max_results] if max_results else ranked
+
+
+class SpeechIntervalTracker:
+    """
+    Acumula los intervalos (en segundos) en los que la clase de voz supera el
+    umbral, fusionando frames solapados. Sirve para transcribir solo las
+    regiones con voz.
+    """
+
+    def __init__(self, class_index: int, min_confidence: float = 0.3):
+        """
+        Args:
+            class_index: Índice de la clase 'Speech' en las 521 clases de YAMNet
+            min_confidence: Puntuación mínima de un frame para considerarlo voz
+        """
+        self.class_index = class_index
+        self.min_confidence = min_confidence
+        self.frame_index = 0
+        self.intervals: List[Tuple[float, float]] = []
+
+    def update(self, scores: np.ndarray):
+        """
+        Procesa un bloque de frames consecutivos.
+
+        Args:
+            scores: Matriz (frames, 521) con las puntuaciones de YAMNet
+        """
+        if scores.size and self.class_index is not None:
+            for row in np.flatnonzero(scores[:, self.class_index] >= self.min_confidence):
+                start = (self.frame_index + int(row)) * YAMNET_HOP_SECONDS
+                end = start + YAMNET_WINDOW_SECONDS
+                if self.intervals and start <= self.intervals[-1][1]:
+                    self.intervals[-1] = (self.intervals[-1][0], end)
+                else:
+                    self.intervals.append((start, end))
+        self.frame_index += len(scores)
+
+    def finish(self) -> List[Tuple[float, float]]:
+        """Intervalos de voz (inicio, fin) en segundos, ordenados y sin solapes."""
+        return [(round(start, 2), round(end, 2)) for start, end in self.intervals]
+
+
+def merge_intervals(
+    intervals: Sequence[Tuple[float, float]],
+    padding: float = 0.0,
+    merge_gap: float = 0.0,
+    duration: float = None,
+) -> List[Tuple[float, float]]:
+    """
+    Amplía cada intervalo con un margen y fusiona los que quedan a menos de merge_gap.
+
+    Args:
+        intervals: Intervalos (inicio, fin) en segundos
+        padding: Margen añadido a cada lado
+        merge_gap: Distancia máxima entre intervalos para fusionarlos
+        duration: Duración del clip para recortar el último intervalo
+
+    Returns:
+        Lista de intervalos fusionados
+    """
+    merged: List[Tuple[float, float]] = []
+    for start, end in sorted(intervals):
+        start = max(0.0, start - padding)
+        end = end + padding if duration is None else min(duration, end + padding)
+        if merged and start - merged[-1][1] <= merge_gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return [(start, end) for start, end in merged if end > start]
+
+
+def speech_regions(speech_intervals, duration: float) -> List[Tuple[float, float]]:
+    """
+    Regiones a transcribir a partir de los intervalos de voz de YAMNet.
+
+    Args:
+        speech_intervals: Intervalos (inicio, fin) en segundos, o None
+        duration: Duración del clip en segundos
+
+    Returns:
+        Lista de regiones (inicio, fin); una sola con el clip entero si no
+        hay intervalos o si la voz cubre casi todo el clip
+    """
+    whole_clip = [(0.0, duration)]
+    if not SPEECH_REGIONS_CONFIG['enabled'] or not speech_intervals or duration <= 0:
+        return whole_clip
+
+    regions = merge_intervals(
+        speech_intervals,
+        padding=SPEECH_REGIONS_CONFIG['padding_seconds'],
+        merge_gap=SPEECH_REGIONS_CONFIG['merge_gap_seconds'],
+        duration=duration,
+    )
+    speech_seconds = sum(end - start for start, end in regions)
+    if not regions or speech_seconds / duration > SPEECH_REGIONS_CONFIG['max_speech_ratio']:
+        return whole_clip
+    return regions
@@ -1,13 +1,37 @@
 import tensorflow as tf
-import tensorflow_hub as hub
 import numpy as np
-import librosa
 import os
-from typing import List, Tuple, Dict
+import functools
+from typing import List, Tuple, Dict, Iterable, Iterator, Optional, Sequence, Union
+
+from agent.tools.audio_decoding.audio_decoder import audio_decoder
+from .yamnet_batcher import YAMNetBatcher, pack_waveforms, slot_samples
+from .yamnet_backends import BACKEND_ARTIFACTS, create_yamnet_backend
+from .relevant_sound_index import RelevantSoundIndex
+from .custom_sound_heads import CustomSoundHead, CustomSoundHeadStore
+from agent.tools.batch_processing.batch_runner import BatchRunner, list_audio_files
+from .sound_event_timeline import (
+    SoundEventTracker,
+    SpeechIntervalTracker,
+    summarize_events,
+    YAMNET_HOP_SAMPLES,
+    YAMNET_MIN_SAMPLES,
+    YAMNET_SAMPLE_RATE,
+)
 
 # Importación directa de config
 try:
-    from agent.config import RELEVANT_SOUNDS_DICT, SOUND_FILTER_CONFIG
+    from agent.config import (
+        RELEVANT_SOUNDS_DICT,
+        SOUND_FILTER_CONFIG,
+        STREAMING_ANALYSIS_CONFIG,
+        YAMNET_BATCHING_CONFIG,
+        YAMNET_MODEL_CONFIG,
+        CUSTOM_SOUND_HEADS_CONFIG,
+        SPEECH_REGIONS_CONFIG,
+        get_models_folder,
+    )
+    from agent.services.model_registry_service import model_registry
 except ImportError:
     # Fallback para cuando no se puede importar
     RELEVANT_SOUNDS_DICT = {}
@@ -15,6 +39,7 @@ except ImportError:
         'enabled': False,
         'min_confidence': 0.3,
         'include_unknown': False,
+        'max_detections': 0,
         'alert_categories': {
             'danger_alert': '🔴 Peligro',
             'attention_alert': '🟡 Atención', 
@@ -22,6 +47,27 @@ except ImportError:
             'environment_alert': '🔵 Entorno'
         }
     }
+    STREAMING_ANALYSIS_CONFIG = {
+        'enabled': False,
+        'block_frames': 16,
+        'read_block_samples': 65536,
+        'max_gap_frames': 1,
+        'min_event_frames': 1
+    }
+    YAMNET_BATCHING_CONFIG = {'enabled': False}
+    YAMNET_MODEL_CONFIG = {
+        'backend': 'tfhub',
+        'num_threads': None,
+        'length_buckets': True,
+        'bucket_max_frames': 64,
+        'warmup_seconds': [1, 3]
+    }
+    CUSTOM_SOUND_HEADS_CONFIG = {'enabled': False}
+    SPEECH_REGIONS_CONFIG = {'enabled': False, 'speech_class': 'Speech', 'min_confidence': 0.3}
+    model_registry = None
+
+YAMNET_HUB_URL = "https://tfhub.dev/google/yamnet/1"
+YAMNET_CLASS_MAP_URL = "https://raw.githubusercontent.com/tensorflow/models/master/research/audioset/yamnet/yamnet_class_map.csv"
 
 # --- Custom Logging Function ---
 # You can easily turn this off or redirect its output.
@@ -39,111 +85,321 @@ def custom_logger(message: str, level: str = "INFO"):
         print(f"[{level}] {message}")
 
 
+def resolve_yamnet_model(model_url: str = None, backend: str = None) -> Tuple[str, str, str]:
+    """
+    Resuelve backend, ruta del modelo y versión sin cargar nada.
+
+    Args:
+        model_url: Ruta o URL explícita del modelo
+        backend: Backend pedido (por defecto el de la configuración)
+
+    Returns:
+        Tupla (backend, model_url, model_version)
+    """
+    backend = backend or YAMNET_MODEL_CONFIG['backend']
+    model_version = model_url
+    # Primero el artefacto local del registro; la URL de TF Hub solo como último recurso
+    if model_url is None:
+        if model_registry:
+            model_url = model_registry.resolve(BACKEND_ARTIFACTS.get(backend, "yamnet"))
+            if backend != "tfhub" and not os.path.exists(model_url):
+                # Los backends ligeros solo existen en local: volver a la referencia
+                custom_logger(f"Backend '{backend}' no exportado, usando tfhub", level="WARN")
+                backend = "tfhub"
+                model_url = model_registry.resolve("yamnet")
+            model_version = model_registry.version(BACKEND_ARTIFACTS.get(backend, "yamnet"))
+        else:
+            model_url = YAMNET_HUB_URL
+            model_version = model_url
+    return backend, model_url, f"yamnet:{backend}:{model_version}"
+
+
+def create_custom_head_store() -> Optional[CustomSoundHeadStore]:
+    """Almacén de sonidos personalizados según la configuración, o None si están deshabilitados."""
+    if not CUSTOM_SOUND_HEADS_CONFIG['enabled']:
+        return None
+    return CustomSoundHeadStore(
+        os.path.join(get_models_folder(), CUSTOM_SOUND_HEADS_CONFIG['folder']),
+        max_examples_per_label=CUSTOM_SOUND_HEADS_CONFIG['max_examples_per_label'],
+        epochs=CUSTOM_SOUND_HEADS_CONFIG['epochs'],
+        l2=CUSTOM_SOUND_HEADS_CONFIG['l2'],
+    )
+
+
 class YAMNetAudioAnalyzer:
-    def __init__(self, model_url: str = "https://tfhub.dev/google/yamnet/1"):
+    def __init__(self, model_url: str = None, backend: str = None, custom_heads: CustomSoundHeadStore = None):
         custom_logger("📥 Loading YAMNet model...")
-        self.model = hub.load(model_url)
+        self.backend, self.model_url, self.model_version = resolve_yamnet_model(model_url, backend)
+        backend, model_url = self.backend, self.model_url
+        self.model = create_yamnet_backend(
+            backend,
+            model_url,
+            length_buckets=YAMNET_MODEL_CONFIG['length_buckets'],
+            bucket_max_frames=YAMNET_MODEL_CONFIG['bucket_max_frames'],
+            warmup_seconds=YAMNET_MODEL_CONFIG['warmup_seconds'],
+            num_threads=YAMNET_MODEL_CONFIG['num_threads'],
+        )
         self.classes = self._load_class_map()
-        custom_logger(f"✅ Model loaded with {len(self.classes)} classes")
+        custom_logger(
+            f"✅ Model loaded ({backend}) with {len(self.classes)} classes (warm-up {self.model.warmup_time:.2f}s)"
+        )
+
+        # Diccionario de sonidos relevantes compilado a índices sobre las clases
+        self.relevance_index = RelevantSoundIndex(self.classes, RELEVANT_SOUNDS_DICT)
+        speech_class = SPEECH_REGIONS_CONFIG['speech_class']
+        self.speech_class_index = self.classes.index(speech_class) if speech_class in self.classes else None
+
+        # Agrupa las inferencias de peticiones concurrentes en una sola pasada
+        self.batcher = None
+        if YAMNET_BATCHING_CONFIG['enabled']:
+            self.batcher = YAMNetBatcher(
+                self._run_model,
+                max_batch_size=YAMNET_BATCHING_CONFIG['max_batch_size'],
+                max_wait_ms=YAMNET_BATCHING_CONFIG['max_wait_ms'],
+                max_batch_seconds=YAMNET_BATCHING_CONFIG['max_batch_seconds'],
+            )
+
+        # Clasificadores personalizados por usuario sobre los embeddings del mismo pase
+        self.custom_heads = custom_heads if custom_heads is not None else create_custom_head_store()
+        self._background_embeddings = None
+
+    def close(self):
+        """Detiene el batcher para que el modelo pueda liberarse."""
+        if self.batcher is not None:
+            self.batcher.close()
+            self.batcher = None
 
     def _load_class_map(self) -> List[str]:
         """Loads the YAMNet class map from a CSV file."""
-        class_map_path = tf.keras.utils.get_file(
-            "yamnet_class_map.csv",
-            "https://raw.githubusercontent.com/tensorflow/models/master/research/audioset/yamnet/yamnet_class_map.csv",
-        )
+        class_map_path = model_registry.resolve("yamnet_class_map") if model_registry else YAMNET_CLASS_MAP_URL
+        if not os.path.exists(class_map_path):
+            class_map_path = tf.keras.utils.get_file("yamnet_class_map.csv", class_map_path)
         with open(class_map_path, "r", encoding="utf-8") as f:
             lines = f.readlines()[1:]
         return [line.split(",")[2].strip().strip('"') for line in lines]
 
-    def _filter_relevant_sounds(self, results: List[Tuple[str, float]]) -> List[Tuple[str, float, str]]:
+    def _filter_relevant_sounds(self, mean_scores: np.ndarray) -> List[Tuple[str, float, str]]:
         """
-        Filtra los sonidos relevantes según el diccionario configurado.
-        
+        Filtra los sonidos relevantes sobre las 521 clases en una sola operación.
+
         Args:
-            results: Lista de tuplas (sound_name, confidence)
-            
+            mean_scores: Puntuaciones medias del clip por clase
+
         Returns:
             Lista de tuplas (sound_name, confidence, alert_category) con solo sonidos relevantes
         """
         if not SOUND_FILTER_CONFIG['enabled']:
-            # Si el filtro está deshabilitado, devolver todos los resultados
-            return [(sound, conf, 'unknown') for sound, conf in results]
-        
-        filtered_results = []
-        min_confidence = SOUND_FILTER_CONFIG['min_confidence']
-        
-        for sound_name, confidence in results:
-            # Verificar si el sonido está en el diccionario de sonidos relevantes
-            if sound_name in RELEVANT_SOUNDS_DICT and confidence >= min_confidence:
-                alert_category = RELEVANT_SOUNDS_DICT[sound_name]
-                filtered_results.append((sound_name, confidence, alert_category))
-                custom_logger(f"✅ Sonido relevante detectado: {sound_name} ({alert_category}) - Confianza: {confidence:.3f}")
-            elif SOUND_FILTER_CONFIG['include_unknown'] and confidence >= min_confidence:
-                # Incluir sonidos no clasificados si está habilitado
-                filtered_results.append((sound_name, confidence, 'unknown'))
-                custom_logger(f"❓ Sonido no clasificado: {sound_name} - Confianza: {confidence:.3f}")
-        
+            # Si el filtro está deshabilitado, devolver el top-3 sin clasificar
+            return [(sound, conf, 'unknown') for sound, conf, _ in self.relevance_index.top_k(mean_scores, 3)]
+
+        filtered_results = self.relevance_index.select(
+            mean_scores,
+            min_confidence=SOUND_FILTER_CONFIG['min_confidence'],
+            include_unknown=SOUND_FILTER_CONFIG['include_unknown'],
+            max_results=SOUND_FILTER_CONFIG.get('max_detections', 0),
+        )
+        for sound_name, confidence, alert_category in filtered_results:
+            custom_logger(f"✅ Sonido relevante detectado: {sound_name} ({alert_category}) - Confianza: {confidence:.3f}")
         return filtered_results
 
-    def analyze_file(self, filepath: str) -> List[Tuple[str, float]]:
+    @staticmethod
+    def _source_name(source, name: str = None) -> str:
+        """Nombre para los logs de una ruta o de una forma de onda en memoria."""
+        if name:
+            return name
+        return os.path.basename(source) if isinstance(source, str) else "audio en memoria"
+
+    def _mean_scores(self, filepath: str) -> np.ndarray:
+        """Puntuaciones medias por clase de todo el clip."""
+        waveform = audio_decoder.decode(filepath)
+        return self._frame_scores(waveform).mean(axis=0)
+
+    def _custom_head(self, user_id) -> Optional[CustomSoundHead]:
+        """Clasificador personalizado del usuario, si tiene alguno entrenado."""
+        if self.custom_heads is None or user_id is None:
+            return None
+        return self.custom_heads.get(user_id)
+
+    def _merge_custom_detections(
+        self,
+        detections: List[Tuple[str, float, str]],
+        custom_detections: List[Tuple[str, float, str]],
+    ) -> List[Tuple[str, float, str]]:
+        """Une las detecciones de YAMNet y las personalizadas por confianza descendente."""
+        if not custom_detections:
+            return detections
+        merged = sorted(detections + custom_detections, key=lambda detection: detection[1], reverse=True)
+        max_detections = SOUND_FILTER_CONFIG.get('max_detections', 0)
+        return merged[:max_detections] if max_detections else merged
+
+    def analyze_file(self, filepath: str, name: str = None) -> List[Tuple[str, float]]:
         """
-        Analyzes a single audio file using YAMNet.
+        Analyzes a single audio file (path or decoded 16 kHz waveform) using YAMNet.
         Returns a list of tuples, where each tuple contains (class_name, score).
         Uses custom_logger for controlled printing.
         """
-        waveform, sr = librosa.load(filepath, sr=16000)
-        if waveform.ndim > 1:
-            waveform = librosa.to_mono(waveform)
-
-        scores, embeddings, spectrogram = self.model(
-            tf.constant(waveform, dtype=tf.float32)
-        )
-        mean_scores = tf.reduce_mean(scores, axis=0).numpy()
+        mean_scores = self._mean_scores(filepath)
 
-        top_classes_indices = np.argsort(mean_scores)[-3:][::-1]
         detailed_results = [
-            (self.classes[i], mean_scores[i]) for i in top_classes_indices
+            (clase, score) for clase, score, _ in self.relevance_index.top_k(mean_scores, 3)
         ]
 
-        custom_logger(f"🔎 Results for {os.path.basename(filepath)}:")
+        custom_logger(f"🔎 Results for {self._source_name(filepath, name)}:")
         for clase, score in detailed_results:
             custom_logger(f"   → {clase}: {score:.3f}")
         custom_logger("")
 
         return detailed_results
 
-    def analyze_file_with_filter(self, filepath: str) -> List[Tuple[str, float, str]]:
+    def analyze_file_with_filter(self, filepath: str, user_id=None) -> List[Tuple[str, float, str]]:
         """
         Analiza un archivo de audio y filtra solo los sonidos relevantes.
         
         Args:
             filepath: Ruta del archivo de audio
+            user_id: ID del usuario para incluir sus sonidos personalizados
             
         Returns:
             Lista de tuplas (sound_name, confidence, alert_category) con solo sonidos relevantes
         """
-        # Obtener resultados completos de YAMNet
-        all_results = self.analyze_file(filepath)
-        
+        return self.analyze_clip(filepath, user_id=user_id, streaming=False)["detections"]
+
+    def analyze_clip(self, filepath: str, user_id=None, streaming: bool = None, name: str = None) -> Dict:
+        """
+        Análisis completo de un clip en una sola pasada de YAMNet: detecciones
+        relevantes, línea temporal (en modo streaming) e intervalos de voz.
+
+        Args:
+            filepath: Ruta del archivo de audio o forma de onda ya decodificada a 16 kHz
+            user_id: ID del usuario para incluir sus sonidos personalizados
+            streaming: Analizar por bloques con línea temporal (por defecto según la configuración)
+            name: Nombre del clip para los logs (por defecto el del archivo)
+
+        Returns:
+            Dict con detections (sound_name, confidence, alert_category), events
+            (vacío fuera del modo streaming) y speech_intervals (inicio, fin) en segundos
+        """
+        if streaming is None:
+            streaming = STREAMING_ANALYSIS_CONFIG['enabled']
+        custom_head = self._custom_head(user_id)
+        name = self._source_name(filepath, name)
+        speech_tracker = SpeechIntervalTracker(
+            self.speech_class_index, min_confidence=SPEECH_REGIONS_CONFIG['min_confidence']
+        )
+
+        if not streaming:
+            # Puntuaciones de YAMNet para las 521 clases (no solo el top-3) y embeddings del mismo pase
+            scores, embeddings = self._frame_outputs(audio_decoder.decode(filepath))
+            return self._clip_result(scores, embeddings, custom_head, speech_tracker, name)
+
+        events = self.analyze_stream(
+            self._stream_file(filepath), custom_head=custom_head, speech_tracker=speech_tracker
+        )
+        detections = self.summarize_timeline(events)
+
+        custom_logger(f"🕒 Línea temporal para {name}:")
+        for event in events:
+            custom_logger(
+                f"   {event['onset']:.2f}s - {event['offset']:.2f}s → {event['sound']} "
+                f"(pico {event['peak_confidence']:.3f}, media {event['mean_confidence']:.3f})"
+            )
+        custom_logger("")
+
+        return {
+            "detections": detections,
+            "events": events,
+            "speech_intervals": speech_tracker.finish(),
+        }
+
+    def _clip_result(
+        self,
+        scores: np.ndarray,
+        embeddings: np.ndarray,
+        custom_head: Optional[CustomSoundHead],
+        speech_tracker: SpeechIntervalTracker,
+        name: str,
+    ) -> Dict:
+        """Detecciones relevantes e intervalos de voz de un clip a partir de sus frames."""
+        speech_tracker.update(scores)
+
         # Filtrar sonidos relevantes
-        filtered_results = self._filter_relevant_sounds(all_results)
-        
-        custom_logger(f"🎯 Sonidos relevantes filtrados para {os.path.basename(filepath)}:")
-        for sound_name, confidence, alert_category in filtered_results:
+        detections = self._filter_relevant_sounds(scores.mean(axis=0))
+        if custom_head is not None:
+            detections = self._merge_custom_detections(
+                detections,
+                custom_head.detect(embeddings, CUSTOM_SOUND_HEADS_CONFIG['threshold']),
+            )
+
+        custom_logger(f"🎯 Sonidos relevantes filtrados para {name}:")
+        for sound_name, confidence, alert_category in detections:
             category_emoji = SOUND_FILTER_CONFIG['alert_categories'].get(alert_category, '❓')
             custom_logger(f"   {category_emoji} {sound_name}: {confidence:.3f} ({alert_category})")
         custom_logger("")
-        
-        return filtered_results
 
-    def analyze_directory(self, folder_path: str) -> List[List[Tuple[str, float]]]:
+        return {
+            "detections": detections,
+            "events": [],
+            "speech_intervals": speech_tracker.finish(),
+        }
+
+    def analyze_clips(
+        self, waveforms: Sequence[np.ndarray], user_id=None, names: Sequence[str] = None
+    ) -> List[Dict]:
+        """
+        Analiza varios clips cortos (p. ej. los fragmentos de una subida por
+        lotes) empaquetados en pasadas de YAMNet alineadas a la rejilla de
+        frames: mismo resultado que analyze_clip sin streaming, con una sola
+        pasada por cada `max_batch_seconds` de audio.
+
+        Args:
+            waveforms: Formas de onda float32 mono a 16 kHz
+            user_id: ID del usuario para incluir sus sonidos personalizados
+            names: Nombres de los clips para los logs
+
+        Returns:
+            Lista con un dict (detections, events, speech_intervals) por clip, en el mismo orden
+        """
+        names = list(names) if names else [f"fragmento {i}" for i in range(len(waveforms))]
+        custom_head = self._custom_head(user_id)
+        max_samples = int(YAMNET_BATCHING_CONFIG.get('max_batch_seconds', 120) * YAMNET_SAMPLE_RATE)
+
+        # Grupos consecutivos que caben en un buffer empaquetado
+        groups, current, current_samples = [], [], 0
+        for index, waveform in enumerate(waveforms):
+            samples = slot_samples(len(waveform))
+            if current and current_samples + samples > max_samples:
+                groups.append(current)
+                current, current_samples = [], 0
+            current.append(index)
+            current_samples += samples
+        if current:
+            groups.append(current)
+
+        results: List[Optional[Dict]] = [None] * len(waveforms)
+        for group in groups:
+            packed, frame_ranges = pack_waveforms([np.asarray(waveforms[i], dtype=np.float32) for i in group])
+            scores, embeddings = self._run_model(packed)
+            for index, (first_frame, num_frames) in zip(group, frame_ranges):
+                frames = slice(first_frame, first_frame + num_frames)
+                speech_tracker = SpeechIntervalTracker(
+                    self.speech_class_index, min_confidence=SPEECH_REGIONS_CONFIG['min_confidence']
+                )
+                results[index] = self._clip_result(
+                    scores[frames], embeddings[frames], custom_head, speech_tracker, names[index]
+                )
+        return results
+
+    def analyze_directory(
+        self, folder_path: str, workers: int = None, use_cache: bool = None
+    ) -> List[List[Tuple[str, float]]]:
         """
         Analyses all .wav files in the given directory.
         Returns a list of lists of detailed analysis results for each file.
         Uses custom_logger for controlled printing.
+
+        Files are spread over a process pool and results are cached on disk by
+        content hash and model version, so re-runs only analyse changed files.
         """
-        all_files_results = []
         custom_logger(f" Initiating directory analysis: {folder_path}")
 
         if not os.path.exists(folder_path):
@@ -153,11 +409,297 @@ class YAMNetAudioAnalyzer:
             )
             return []
 
-        for archivo in os.listdir(folder_path):
-            if archivo.endswith(".wav"):
-                full_filepath = os.path.join(folder_path, archivo)
-                detailed_file_result = self.analyze_file(full_filepath)
-                all_files_results.append(detailed_file_result)
+        results = self.directory_runner(workers, use_cache).run(list_audio_files(folder_path, [".wav"]))
 
         custom_logger(f" Directory analysis completed.")
-        return all_files_results
+        return list(results.values())
+
+    def directory_runner(self, workers: int = None, use_cache: bool = None) -> BatchRunner:
+        """
+        Ejecutor por lotes de analyze_file; su iter_results permite consumir
+        los resultados según terminan.
+
+        Args:
+            workers: Procesos del pool (por defecto los de la configuración)
+            use_cache: Usar la caché de resultados en disco
+
+        Returns:
+            BatchRunner configurado con este modelo
+        """
+        return BatchRunner(
+            "yamnet_analysis",
+            functools.partial(YAMNetAudioAnalyzer, model_url=self.model_url, backend=self.backend),
+            "analyze_file",
+            self.model_version,
+            workers=workers,
+            use_cache=use_cache,
+            local_processor=self,
+        )
+
+    def _run_model(self, waveform: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Pasada directa de YAMNet; devuelve (scores, embeddings) por frame."""
+        return self.model(waveform)
+
+    def _frame_outputs(self, waveform: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Ejecuta YAMNet sobre un bloque (vía el batcher si está activo) y devuelve (scores, embeddings) por frame."""
+        if self.batcher is not None:
+            return self.batcher.infer(waveform)
+        return self._run_model(waveform)
+
+    def _frame_scores(self, waveform: np.ndarray) -> np.ndarray:
+        """Puntuaciones por frame de un bloque."""
+        scores, _ = self._frame_outputs(waveform)
+        return scores
+
+    def clip_embeddings(self, source: Union[str, bytes]) -> np.ndarray:
+        """
+        Embeddings de 1024 dimensiones por frame de un clip.
+
+        Args:
+            source: Ruta del archivo o bytes del audio
+
+        Returns:
+            Matriz (frames, 1024)
+        """
+        _, embeddings = self._frame_outputs(audio_decoder.decode(source))
+        return embeddings
+
+    def background_embeddings(self) -> Optional[np.ndarray]:
+        """Embeddings de los clips de fondo usados como negativos (se calculan una vez)."""
+        if self._background_embeddings is None:
+            folder = CUSTOM_SOUND_HEADS_CONFIG['background_folder']
+            if not os.path.isdir(folder):
+                return None
+            embeddings = [
+                self.clip_embeddings(os.path.join(folder, name))
+                for name in sorted(os.listdir(folder))
+                if name.endswith(".wav")
+            ]
+            if not embeddings:
+                return None
+            self._background_embeddings = np.concatenate(embeddings)
+        return self._background_embeddings
+
+    def train_custom_sound(
+        self,
+        user_id,
+        label: str,
+        sources: List[Union[str, bytes]],
+        alert_category: str = None,
+    ) -> CustomSoundHead:
+        """
+        Enseña un sonido personalizado a partir de unos pocos clips de ejemplo.
+
+        Args:
+            user_id: ID del usuario
+            label: Nombre del sonido
+            sources: Rutas o bytes de los clips de ejemplo
+            alert_category: Categoría de alerta (por defecto la de la configuración)
+
+        Returns:
+            CustomSoundHead reentrenado
+        """
+        if self.custom_heads is None:
+            raise RuntimeError("Los sonidos personalizados están deshabilitados")
+        alert_category = alert_category or CUSTOM_SOUND_HEADS_CONFIG['default_category']
+        if alert_category not in SOUND_FILTER_CONFIG['alert_categories']:
+            raise ValueError(
+                f"Categoría de alerta desconocida '{alert_category}'. "
+                f"Disponibles: {list(SOUND_FILTER_CONFIG['alert_categories'])}"
+            )
+        # Una etiqueta con nombre de clase de YAMNet se mezclaría con las detecciones genéricas
+        if label.casefold() in {name.casefold() for name in self.classes}:
+            raise ValueError(f"'{label}' es una clase de YAMNet; elige otro nombre para el sonido personalizado")
+        return self.custom_heads.add_examples(
+            user_id,
+            label,
+            alert_category,
+            [self.clip_embeddings(source) for source in sources],
+            background=self.background_embeddings(),
+        )
+
+    def remove_custom_sound(self, user_id, label: str) -> bool:
+        """Elimina un sonido personalizado del usuario."""
+        if self.custom_heads is None:
+            return False
+        return self.custom_heads.remove_label(user_id, label, background=self.background_embeddings())
+
+    def _stream_file(self, filepath: str) -> Iterator[np.ndarray]:
+        """
+        Lee el archivo por bloques a 16 kHz mono sin cargarlo entero en memoria
+        cuando es un WAV a la tasa de YAMNet (o trocea la forma de onda ya decodificada).
+
+        Args:
+            filepath: Ruta del archivo de audio o forma de onda a 16 kHz
+
+        Yields:
+            Bloques float32 de la forma de onda
+        """
+        return audio_decoder.stream(filepath, STREAMING_ANALYSIS_CONFIG['read_block_samples'])
+
+    def analyze_stream(
+        self,
+        blocks: Iterable[np.ndarray],
+        custom_head: CustomSoundHead = None,
+        speech_tracker: SpeechIntervalTracker = None,
+    ) -> List[Dict]:
+        """
+        Analiza una forma de onda a 16 kHz que llega por bloques y construye
+        la línea temporal de eventos relevantes.
+
+        La inferencia se hace sobre ventanas de `block_frames` frames de YAMNet
+        conservando el solapamiento entre bloques, de modo que la memoria usada
+        no depende de la duración total del audio.
+
+        Args:
+            blocks: Iterable de bloques float32 mono a 16 kHz
+            custom_head: Clasificador personalizado evaluado sobre los mismos embeddings
+            speech_tracker: Acumulador de intervalos de voz alimentado con los mismos frames
+
+        Returns:
+            Lista de eventos (sound, alert_category, onset, offset,
+            peak_confidence, mean_confidence, frames) ordenada por onset
+        """
+        stream = StreamingAnalysis(self, custom_head=custom_head, speech_tracker=speech_tracker)
+        for block in blocks:
+            stream.feed(block)
+        return stream.finish()
+
+    def summarize_timeline(self, events: List[Dict]) -> List[Tuple[str, float, str]]:
+        """
+        Detecciones de una línea temporal; con el filtro deshabilitado, el
+        top-3 como en analyze_file.
+        """
+        return summarize_events(events, max_results=0 if SOUND_FILTER_CONFIG['enabled'] else 3)
+
+    def start_stream(self, user_id=None) -> "StreamingAnalysis":
+        """
+        Análisis incremental para audio que llega por partes (p. ej. una subida
+        troceada): se alimenta con feed() a medida que llegan los bloques.
+
+        Args:
+            user_id: ID del usuario para incluir sus sonidos personalizados
+
+        Returns:
+            StreamingAnalysis con seguimiento de eventos y de voz
+        """
+        return StreamingAnalysis(
+            self,
+            custom_head=self._custom_head(user_id),
+            speech_tracker=SpeechIntervalTracker(
+                self.speech_class_index, min_confidence=SPEECH_REGIONS_CONFIG['min_confidence']
+            ),
+        )
+
+    def analyze_file_timeline(self, filepath: str, user_id=None) -> Tuple[List[Tuple[str, float, str]], List[Dict]]:
+        """
+        Analiza un archivo en modo streaming.
+
+        Args:
+            filepath: Ruta del archivo de audio
+            user_id: ID del usuario para incluir sus sonidos personalizados
+
+        Returns:
+            Tupla (detecciones, eventos): las detecciones tienen el formato de
+            analyze_file_with_filter (confianza pico por clase) y los eventos
+            son la línea temporal completa
+        """
+        result = self.analyze_clip(filepath, user_id=user_id, streaming=True)
+        return result["detections"], result["events"]
+
+
+class StreamingAnalysis:
+    """
+    Estado del análisis por bloques: ventana de arrastre con las muestras
+    aún no cubiertas por un frame completo (los eventos que cruzan el límite
+    entre bloques no se cortan) y eventos abiertos en el tracker.
+
+    No guarda el audio ya analizado, así que la memoria no depende de la
+    duración. El analizador puede cambiar entre bloques (p. ej. si el gestor
+    de modelos lo descargó y volvió a cargar): los frames solo dependen del modelo.
+    """
+
+    def __init__(
+        self,
+        analyzer: YAMNetAudioAnalyzer,
+        custom_head: CustomSoundHead = None,
+        speech_tracker: SpeechIntervalTracker = None,
+    ):
+        """
+        Args:
+            analyzer: Analizador con el que se ejecuta YAMNet por defecto
+            custom_head: Clasificador personalizado evaluado sobre los mismos embeddings
+            speech_tracker: Acumulador de intervalos de voz alimentado con los mismos frames
+        """
+        self.analyzer = analyzer
+        self.custom_head = custom_head
+        self.speech_tracker = speech_tracker
+        self.block_frames = STREAMING_ANALYSIS_CONFIG['block_frames']
+        self.inference_samples = YAMNET_MIN_SAMPLES + (self.block_frames - 1) * YAMNET_HOP_SAMPLES
+        self.advance_samples = self.block_frames * YAMNET_HOP_SAMPLES
+        self.samples_received = 0
+
+        self.tracker = SoundEventTracker(
+            analyzer.relevance_index,
+            min_confidence=SOUND_FILTER_CONFIG['min_confidence'],
+            max_gap_frames=STREAMING_ANALYSIS_CONFIG['max_gap_frames'],
+            min_event_frames=STREAMING_ANALYSIS_CONFIG['min_event_frames'],
+            extra_classes=list(zip(custom_head.labels, custom_head.categories)) if custom_head else (),
+            extra_min_confidence=CUSTOM_SOUND_HEADS_CONFIG.get('threshold', 0.5),
+            # Mismo conjunto de clases que analyze_file con SOUND_FILTER_CONFIG
+            include_unknown=SOUND_FILTER_CONFIG['include_unknown'] or not SOUND_FILTER_CONFIG['enabled'],
+            categorize=SOUND_FILTER_CONFIG['enabled'],
+        )
+        self._buffer = np.zeros(0, dtype=np.float32)
+        # Muestras del arrastre ya cubiertas por los frames emitidos
+        self._covered_samples = 0
+
+    def feed(self, block: np.ndarray, analyzer: YAMNetAudioAnalyzer = None):
+        """
+        Analiza las ventanas completas disponibles y conserva el resto para el siguiente bloque.
+
+        Args:
+            block: Bloque float32 mono a 16 kHz
+            analyzer: Analizador a usar en este bloque (por defecto el inicial)
+        """
+        if analyzer is not None:
+            self.analyzer = analyzer
+        block = np.asarray(block, dtype=np.float32)
+        self.samples_received += len(block)
+        self._buffer = np.concatenate([self._buffer, block])
+        while len(self._buffer) >= self.inference_samples:
+            self._track(self._buffer[:self.inference_samples], self.block_frames)
+            self._buffer = self._buffer[self.advance_samples:]
+            self._covered_samples = self.inference_samples - self.advance_samples
+
+    def snapshot(self) -> List[Dict]:
+        """Línea temporal provisional hasta el último bloque analizado."""
+        return self.tracker.snapshot()
+
+    def speech_intervals(self) -> List[Tuple[float, float]]:
+        """Intervalos de voz hasta el último bloque analizado."""
+        return self.speech_tracker.finish() if self.speech_tracker is not None else []
+
+    def finish(self, analyzer: YAMNetAudioAnalyzer = None) -> List[Dict]:
+        """
+        Analiza el último bloque parcial y cierra los eventos abiertos.
+
+        Returns:
+            Lista de eventos ordenada por onset
+        """
+        if analyzer is not None:
+            self.analyzer = analyzer
+        # Último bloque parcial (YAMNet rellena con silencio), solo si quedan
+        # muestras que ningún frame emitido cubre
+        if len(self._buffer) > self._covered_samples:
+            self._track(self._buffer)
+        self._buffer = np.zeros(0, dtype=np.float32)
+        return self.tracker.finish()
+
+    def _track(self, waveform: np.ndarray, frames: int = None):
+        scores, embeddings = self.analyzer._frame_outputs(waveform)
+        scores, embeddings = scores[:frames], embeddings[:frames]
+        extra_scores = self.custom_head.predict_frames(embeddings) if self.custom_head else None
+        self.tracker.update(scores, extra_scores)
+        if self.speech_tracker is not None:
+            self.speech_tracker.update(scores)
@@ -0,0 +1,234 @@
+"""
+Backends de inferencia de YAMNet para CPU.
+
+- tfhub: SavedModel original de TF Hub (referencia), vía tf.function con firma fija.
+- tflite / tflite_int8: grafo TFLite convertido del SavedModel (int8 con
+  cuantización de rango dinámico).
+- onnx / onnx_int8: grafo ONNX ejecutado con ONNX Runtime (int8 dinámico).
+
+Los artefactos tflite/onnx se generan con `python manage.py export_yamnet_backends`
+y se resuelven a través del registro de modelos. Todos los backends comparten el
+relleno por cubetas de longitud y la inferencia de calentamiento.
+"""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Iterable, Tuple
+
+import numpy as np
+
+from .sound_event_timeline import YAMNET_HOP_SAMPLES, YAMNET_MIN_SAMPLES, YAMNET_SAMPLE_RATE
+from .yamnet_batcher import frames_for_samples
+
+# Backend -> nombre del artefacto en MODEL_REGISTRY
+BACKEND_ARTIFACTS = {
+    'tfhub': 'yamnet',
+    'tflite': 'yamnet_tflite',
+    'tflite_int8': 'yamnet_tflite_int8',
+    'onnx': 'yamnet_onnx',
+    'onnx_int8': 'yamnet_onnx_int8',
+}
+
+
+class YAMNetBackend(ABC):
+    """
+    Interfaz común de los backends de YAMNet.
+
+    Las formas de onda se rellenan con ceros hasta un conjunto pequeño de
+    longitudes (cubetas de frames) y se recortan los frames sobrantes; como
+    YAMNet ya rellena con ceros, los frames del clip no cambian y el runtime
+    reutiliza las mismas formas de tensor.
+    """
+
+    name = "base"
+
+    def __init__(self, length_buckets: bool = True, bucket_max_frames: int = 64):
+        """
+        Args:
+            length_buckets: Rellenar la entrada a longitudes de cubeta
+            bucket_max_frames: Tamaño máximo de cubeta potencia de dos; por
+                encima se redondea a múltiplos de este valor
+        """
+        self.length_buckets = length_buckets
+        self.bucket_max_frames = bucket_max_frames
+        self.warmup_time = 0.0
+
+    @abstractmethod
+    def _infer(self, waveform: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Ejecuta el grafo sobre una forma de onda ya rellenada; devuelve (scores, embeddings)."""
+        pass
+
+    def bucket_frames(self, frames: int) -> int:
+        """Número de frames de la cubeta que contiene `frames` frames."""
+        if not self.length_buckets:
+            return frames
+        if frames <= self.bucket_max_frames:
+            return 1 << (frames - 1).bit_length()
+        return -(-frames // self.bucket_max_frames) * self.bucket_max_frames
+
+    def warmup(self, durations: Iterable[float]) -> float:
+        """
+        Ejecuta inferencias con silencio para construir el grafo y reservar memoria.
+
+        Args:
+            durations: Duraciones en segundos a calentar
+
+        Returns:
+            float: Tiempo total de calentamiento en segundos
+        """
+        start = time.perf_counter()
+        for seconds in durations:
+            self(np.zeros(int(seconds * YAMNET_SAMPLE_RATE), dtype=np.float32))
+        self.warmup_time = time.perf_counter() - start
+        return self.warmup_time
+
+    def __call__(self, waveform: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ejecuta YAMNet sobre una forma de onda mono a 16 kHz.
+
+        Args:
+            waveform: Forma de onda float32
+
+        Returns:
+            Tupla (scores, embeddings) por frame del clip original
+        """
+        frames = frames_for_samples(len(waveform))
+        padded_samples = YAMNET_MIN_SAMPLES + (self.bucket_frames(frames) - 1) * YAMNET_HOP_SAMPLES
+        if padded_samples > len(waveform):
+            padded = np.zeros(padded_samples, dtype=np.float32)
+            padded[:len(waveform)] = waveform
+        else:
+            padded = np.asarray(waveform, dtype=np.float32)
+
+        scores, embeddings = self._infer(padded)
+        return scores[:frames], embeddings[:frames]
+
+
+class TFHubBackend(YAMNetBackend):
+    """SavedModel de TF Hub con firma de entrada fija (sin retrazado)."""
+
+    name = "tfhub"
+
+    def __init__(self, model_handle: str, **kwargs):
+        super().__init__(**kwargs)
+        import tensorflow as tf
+        import tensorflow_hub as hub
+
+        self._tf = tf
+        self._model = hub.load(model_handle)
+        self._graph = tf.function(
+            self._forward,
+            input_signature=[tf.TensorSpec(shape=[None], dtype=tf.float32)],
+        )
+
+    def _forward(self, waveform):
+        scores, embeddings, _ = self._model(waveform)
+        return scores, embeddings
+
+    def concrete_function(self):
+        """Función concreta con firma [None] float32 (usada para exportar a TFLite/ONNX)."""
+        return self._graph.get_concrete_function()
+
+    def _infer(self, waveform: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        scores, embeddings = self._graph(self._tf.convert_to_tensor(waveform))
+        return scores.numpy(), embeddings.numpy()
+
+
+class TFLiteBackend(YAMNetBackend):
+    """Intérprete TFLite; usa tflite_runtime si está instalado (más ligero que TF completo)."""
+
+    name = "tflite"
+
+    def __init__(self, model_path: str, num_threads: int = None, **kwargs):
+        super().__init__(**kwargs)
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self._interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self._input_index = self._interpreter.get_input_details()[0]['index']
+        outputs = self._interpreter.get_output_details()
+        # Identificar salidas por su última dimensión: 521 clases y 1024 de embedding
+        self._scores_index = next(o['index'] for o in outputs if o['shape'][-1] == 521)
+        self._embeddings_index = next(o['index'] for o in outputs if o['shape'][-1] == 1024)
+        self._input_length = None
+        # El intérprete no es seguro entre hilos
+        self._lock = threading.Lock()
+
+    def _infer(self, waveform: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            if self._input_length != len(waveform):
+                # Con cubetas de longitud las reasignaciones son poco frecuentes
+                self._interpreter.resize_tensor_input(self._input_index, [len(waveform)])
+                self._interpreter.allocate_tensors()
+                self._input_length = len(waveform)
+            self._interpreter.set_tensor(self._input_index, waveform)
+            self._interpreter.invoke()
+            return (
+                self._interpreter.get_tensor(self._scores_index).copy(),
+                self._interpreter.get_tensor(self._embeddings_index).copy(),
+            )
+
+
+class ONNXBackend(YAMNetBackend):
+    """Sesión de ONNX Runtime en CPU."""
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, num_threads: int = None, **kwargs):
+        super().__init__(**kwargs)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self._session.get_inputs()[0].name
+        outputs = self._session.get_outputs()
+        self._output_names = [
+            next(o.name for o in outputs if o.shape[-1] == 521),
+            next(o.name for o in outputs if o.shape[-1] == 1024),
+        ]
+
+    def _infer(self, waveform: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        scores, embeddings = self._session.run(self._output_names, {self._input_name: waveform})
+        return scores, embeddings
+
+
+def create_yamnet_backend(
+    backend: str,
+    model_handle: str,
+    length_buckets: bool = True,
+    bucket_max_frames: int = 64,
+    warmup_seconds: Iterable[float] = (1, 3),
+    num_threads: int = None,
+) -> YAMNetBackend:
+    """
+    Crea y calienta el backend configurado.
+
+    Args:
+        backend: Nombre del backend (tfhub, tflite, tflite_int8, onnx, onnx_int8)
+        model_handle: Ruta del artefacto (o URL de TF Hub para tfhub)
+        length_buckets: Rellenar la entrada a longitudes de cubeta
+        bucket_max_frames: Tamaño máximo de cubeta potencia de dos
+        warmup_seconds: Duraciones para la inferencia de calentamiento
+        num_threads: Hilos del runtime (solo tflite/onnx)
+
+    Returns:
+        YAMNetBackend: Backend listo para inferencia
+    """
+    kwargs = {'length_buckets': length_buckets, 'bucket_max_frames': bucket_max_frames}
+    if backend == 'tfhub':
+        instance = TFHubBackend(model_handle, **kwargs)
+    elif backend in ('tflite', 'tflite_int8'):
+        instance = TFLiteBackend(model_handle, num_threads=num_threads, **kwargs)
+    elif backend in ('onnx', 'onnx_int8'):
+        instance = ONNXBackend(model_handle, num_threads=num_threads, **kwargs)
+    else:
+        raise ValueError(f"Backend de YAMNet no soportado: {backend}. Disponibles: {list(BACKEND_ARTIFACTS.keys())}")
+
+    instance.name = backend
+    instance.warmup(warmup_seconds)
+    return instance
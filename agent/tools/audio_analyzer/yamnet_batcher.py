@@ -0,0 +1,191 @@
+"""
+Micro-batching de inferencias YAMNet entre peticiones concurrentes.
+
+YAMNet solo acepta una forma de onda 1-D, así que las peticiones de un lote se
+empaquetan una detrás de otra alineadas a la rejilla de frames del modelo
+(salto de 0.48 s). Cada clip ocupa un hueco relleno con ceros de forma que
+ningún frame que se le asigna mezcla muestras de otro clip: los resultados son
+los mismos que con una inferencia individual pero con una sola pasada.
+"""
+
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .sound_event_timeline import YAMNET_HOP_SAMPLES, YAMNET_MIN_SAMPLES, YAMNET_SAMPLE_RATE
+from agent.services.metrics_service import metrics_registry
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def frames_for_samples(num_samples: int) -> int:
+    """Número de frames que YAMNet produce para una forma de onda de `num_samples` muestras."""
+    return 1 + math.ceil(max(0, num_samples - YAMNET_MIN_SAMPLES) / YAMNET_HOP_SAMPLES)
+
+
+def slot_samples(num_samples: int) -> int:
+    """Muestras reservadas para un clip dentro del buffer empaquetado (múltiplo del salto)."""
+    needed = YAMNET_MIN_SAMPLES + (frames_for_samples(num_samples) - 1) * YAMNET_HOP_SAMPLES
+    return math.ceil(needed / YAMNET_HOP_SAMPLES) * YAMNET_HOP_SAMPLES
+
+
+def pack_waveforms(waveforms: Sequence[np.ndarray]) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+    """
+    Empaqueta varias formas de onda en un único buffer alineado a frames.
+
+    Args:
+        waveforms: Formas de onda float32 mono a 16 kHz
+
+    Returns:
+        Tupla (buffer, rangos) donde rangos[i] = (primer_frame, num_frames) del clip i
+    """
+    slots = [slot_samples(len(w)) for w in waveforms]
+    packed = np.zeros(sum(slots), dtype=np.float32)
+    frame_ranges = []
+    offset = 0
+    for waveform, slot in zip(waveforms, slots):
+        packed[offset:offset + len(waveform)] = waveform
+        frame_ranges.append((offset // YAMNET_HOP_SAMPLES, frames_for_samples(len(waveform))))
+        offset += slot
+    return packed, frame_ranges
+
+
+class _BatchRequest:
+    __slots__ = ("waveform", "future", "enqueued_at")
+
+    def __init__(self, waveform: np.ndarray):
+        self.waveform = waveform
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class YAMNetBatcher:
+    """
+    Cola de inferencias YAMNet con agrupación dinámica.
+
+    Las peticiones se acumulan hasta `max_batch_size` o hasta que pasan
+    `max_wait_ms` desde la primera, se ejecutan en una sola pasada del modelo
+    y el resultado de cada una se devuelve a su llamador mediante un Future.
+    """
+
+    def __init__(
+        self,
+        infer_fn: Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_batch_seconds: float = 120.0,
+    ):
+        """
+        Args:
+            infer_fn: Función que ejecuta YAMNet sobre una forma de onda y
+                devuelve (scores, embeddings) como arrays numpy
+            max_batch_size: Número máximo de peticiones por lote
+            max_wait_ms: Espera máxima desde la primera petición del lote
+            max_batch_seconds: Duración máxima del buffer empaquetado (memoria)
+        """
+        self.infer_fn = infer_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_samples = int(max_batch_seconds * YAMNET_SAMPLE_RATE)
+
+        self._queue: "queue.Queue[_BatchRequest]" = queue.Queue()
+        self._carry = None
+
+        self._queue_depth = metrics_registry.gauge(
+            "yamnet_batcher_queue_depth", "Peticiones YAMNet esperando lote"
+        )
+        self._batch_size = metrics_registry.histogram(
+            "yamnet_batcher_batch_size", "Peticiones por lote de YAMNet", buckets=BATCH_SIZE_BUCKETS
+        )
+        self._wait_time = metrics_registry.histogram(
+            "yamnet_batcher_wait_seconds", "Tiempo en cola hasta la inferencia"
+        )
+        self._inference_time = metrics_registry.histogram(
+            "yamnet_batcher_inference_seconds", "Duración de la pasada por lote"
+        )
+
+        self._thread = threading.Thread(target=self._run, name="yamnet-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, waveform: np.ndarray) -> Future:
+        """
+        Encola una forma de onda para inferencia.
+
+        Args:
+            waveform: Forma de onda float32 mono a 16 kHz
+
+        Returns:
+            Future que se resuelve con (scores, embeddings) del clip
+        """
+        request = _BatchRequest(np.asarray(waveform, dtype=np.float32))
+        self._queue.put(request)
+        self._queue_depth.set(self._queue.qsize())
+        return request.future
+
+    def infer(self, waveform: np.ndarray, timeout: float = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Versión bloqueante de submit()."""
+        return self.submit(waveform).result(timeout=timeout)
+
+    def close(self):
+        """Detiene el hilo de trabajo (libera la referencia al modelo)."""
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _collect_batch(self) -> Optional[List[_BatchRequest]]:
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        if first is None:
+            return None
+        batch = [first]
+        total_samples = slot_samples(len(first.waveform))
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # Cierre solicitado: se procesa este lote y el hilo termina en la siguiente vuelta
+                self._queue.put(None)
+                break
+            request_samples = slot_samples(len(request.waveform))
+            if total_samples + request_samples > self.max_batch_samples:
+                # No cabe: se procesa al principio del siguiente lote
+                self._carry = request
+                break
+            batch.append(request)
+            total_samples += request_samples
+
+        self._queue_depth.set(self._queue.qsize())
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+            dispatched_at = time.monotonic()
+            for request in batch:
+                self._wait_time.observe(dispatched_at - request.enqueued_at)
+            self._batch_size.observe(len(batch))
+
+            try:
+                packed, frame_ranges = pack_waveforms([r.waveform for r in batch])
+                scores, embeddings = self.infer_fn(packed)
+                self._inference_time.observe(time.monotonic() - dispatched_at)
+                for request, (first_frame, num_frames) in zip(batch, frame_ranges):
+                    frames = slice(first_frame, first_frame + num_frames)
+                    request.future.set_result((scores[frames], embeddings[frames]))
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
@@ -0,0 +1 @@
+# Audio decoding tools 
\ No newline at end of file
@@ -0,0 +1,430 @@
+"""
+Decodificación y remuestreo de audio compartidos por el analizador y el transcriptor.
+
+- WAV: se lee la cabecera RIFF y se interpreta el bloque de datos directamente
+  con numpy (vista sin copia para float32 mono a 16 kHz).
+- Otras tasas: remuestreo polifásico con el filtro FIR cacheado por relación.
+- Formatos comprimidos (FLAC/OGG/MP3): libsndfile en proceso vía soundfile,
+  sin lanzar un decodificador externo por archivo; librosa queda como último recurso.
+- Los clips decodificados se guardan en una caché LRU pequeña, así que el
+  análisis y la transcripción de una misma petición decodifican una sola vez.
+- Una forma de onda ya decodificada (p. ej. la de una subida decodificada en
+  memoria) se acepta tal cual en decode y stream.
+"""
+
+import io
+import os
+import struct
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from math import gcd
+from typing import Iterator, NamedTuple, Optional, Union
+
+import numpy as np
+
+TARGET_SAMPLE_RATE = 16000
+
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavInfo(NamedTuple):
+    """Información de la cabecera de un WAV."""
+    audio_format: int
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+    data_offset: int
+    data_size: int
+
+    @property
+    def dtype(self) -> Optional[np.dtype]:
+        """Tipo numpy de las muestras, o None si no se puede leer directamente."""
+        if self.audio_format == _WAVE_FORMAT_PCM:
+            return {8: np.dtype("u1"), 16: np.dtype("<i2"), 32: np.dtype("<i4")}.get(self.bits_per_sample)
+        if self.audio_format == _WAVE_FORMAT_IEEE_FLOAT:
+            return {32: np.dtype("<f4"), 64: np.dtype("<f8")}.get(self.bits_per_sample)
+        return None
+
+    @property
+    def num_frames(self) -> int:
+        return self.data_size // (self.channels * self.bits_per_sample // 8)
+
+
+def parse_wav_header(header: bytes) -> Optional[WavInfo]:
+    """
+    Interpreta la cabecera RIFF/WAVE.
+
+    Args:
+        header: Primeros bytes del archivo (basta con los chunks previos a 'data')
+
+    Returns:
+        WavInfo o None si no es un WAV legible directamente
+    """
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+
+    fmt = None
+    position = 12
+    while position + 8 <= len(header):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", header, position)
+        body = position + 8
+        if chunk_id == b"fmt ":
+            audio_format, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", header, body)
+            if audio_format == _WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                # El subformato está en los dos primeros bytes del GUID
+                audio_format = struct.unpack_from("<H", header, body + 24)[0]
+            fmt = (audio_format, channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            info = WavInfo(*fmt, data_offset=body, data_size=chunk_size)
+            return info if info.dtype is not None and info.channels > 0 else None
+        position = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _to_float32(samples: np.ndarray, channels: int) -> np.ndarray:
+    """Convierte muestras PCM/float a float32 mono en [-1, 1]."""
+    if samples.dtype == np.uint8:
+        audio = (samples.astype(np.float32) - 128.0) / 128.0
+    elif samples.dtype.kind == "i":
+        audio = samples.astype(np.float32) / float(2 ** (8 * samples.dtype.itemsize - 1))
+    else:
+        audio = samples.astype(np.float32, copy=False)
+
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    return audio
+
+
+@lru_cache(maxsize=16)
+def _polyphase_filter(up: int, down: int) -> np.ndarray:
+    """Filtro FIR anti-aliasing para la relación up/down (mismo diseño que resample_poly)."""
+    from scipy.signal import firwin
+
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    return firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """
+    Remuestreo polifásico con el filtro cacheado por relación de tasas.
+
+    Args:
+        audio: Forma de onda mono float32
+        orig_sr: Tasa de muestreo original
+        target_sr: Tasa de muestreo destino
+
+    Returns:
+        Forma de onda float32 a target_sr
+    """
+    if orig_sr == target_sr:
+        return audio
+    from scipy.signal import resample_poly
+
+    divisor = gcd(orig_sr, target_sr)
+    up, down = target_sr // divisor, orig_sr // divisor
+    return resample_poly(audio, up, down, window=_polyphase_filter(up, down)).astype(np.float32, copy=False)
+
+
+class StreamResampler:
+    """
+    Remuestreo polifásico por bloques con el mismo resultado que resample()
+    sobre la señal completa: cada bloque se calcula con el contexto de
+    entrada que cubre el filtro y solo se emiten las muestras que ya no
+    dependen de entrada futura.
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int = TARGET_SAMPLE_RATE):
+        divisor = gcd(orig_sr, target_sr)
+        self.up, self.down = target_sr // divisor, orig_sr // divisor
+        self.window = _polyphase_filter(self.up, self.down)
+        # Muestras de entrada a cada lado del centro que abarca el filtro
+        self.context = (len(self.window) - 1) // 2 // self.up + 2
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._start = 0  # Índice absoluto de _buffer[0], múltiplo de down
+        self._received = 0
+        self._emitted = 0
+
+    def feed(self, audio: np.ndarray, final: bool = False) -> np.ndarray:
+        """
+        Añade muestras y devuelve las de salida ya definitivas.
+
+        Args:
+            audio: Muestras float32 a la tasa original
+            final: Último bloque: se emite el resto de la salida
+
+        Returns:
+            Muestras float32 a la tasa destino
+        """
+        from scipy.signal import resample_poly
+
+        self._buffer = np.concatenate([self._buffer, np.asarray(audio, dtype=np.float32)])
+        self._received += len(audio)
+        if final:
+            last = -(-self._received * self.up // self.down)
+        else:
+            last = max(0, (self._received - 1 - self.context) * self.up // self.down + 1)
+        if last <= self._emitted or len(self._buffer) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        resampled = resample_poly(self._buffer, self.up, self.down, window=self.window)
+        offset = self._start * self.up // self.down
+        output = resampled[self._emitted - offset:last - offset].astype(np.float32, copy=False)
+        self._emitted = last
+
+        # La entrada anterior al contexto de la siguiente muestra ya no hace falta
+        keep_from = (self._emitted * self.down // self.up - self.context) // self.down * self.down
+        if keep_from > self._start:
+            self._buffer = self._buffer[keep_from - self._start:]
+            self._start = keep_from
+        return output
+
+
+# Bytes máximos en los que se busca el chunk 'data' de un WAV recibido por trozos
+_MAX_HEADER_BYTES = 65536
+
+RAW_PCM_FORMATS = {
+    "pcm_s16le": np.dtype("<i2"),
+    "pcm_s32le": np.dtype("<i4"),
+    "pcm_f32le": np.dtype("<f4"),
+}
+
+
+class IncrementalPCMDecoder:
+    """
+    Decodificador de audio que llega por trozos (subidas troceadas).
+
+    Solo admite formatos sin compresión: WAV PCM/float (la cabecera llega en
+    el primer trozo) o PCM crudo con tasa y canales declarados. Los bytes de
+    una muestra partida entre dos trozos se guardan para el siguiente y el
+    remuestreo arrastra su contexto entre trozos (ver finish()).
+    """
+
+    def __init__(
+        self,
+        audio_format: str = "wav",
+        sample_rate: int = None,
+        channels: int = 1,
+        target_sr: int = TARGET_SAMPLE_RATE,
+    ):
+        """
+        Args:
+            audio_format: 'wav' o uno de RAW_PCM_FORMATS
+            sample_rate: Tasa de muestreo del PCM crudo (se ignora en WAV)
+            channels: Canales del PCM crudo (se ignora en WAV)
+            target_sr: Tasa de muestreo de salida
+        """
+        if audio_format != "wav" and audio_format not in RAW_PCM_FORMATS:
+            raise ValueError(f"Formato no admitido para subida troceada: {audio_format}")
+        if audio_format != "wav" and not sample_rate:
+            raise ValueError("El PCM crudo requiere sample_rate")
+        self.audio_format = audio_format
+        self.target_sr = target_sr
+        self.info: Optional[WavInfo] = None
+        if audio_format != "wav":
+            dtype = RAW_PCM_FORMATS[audio_format]
+            audio_code = _WAVE_FORMAT_IEEE_FLOAT if dtype.kind == "f" else _WAVE_FORMAT_PCM
+            self.info = WavInfo(audio_code, int(channels), int(sample_rate), dtype.itemsize * 8, 0, 0)
+        self._header = b""
+        self._remainder = b""
+        self._data_remaining = None
+        self._resampler = None
+
+    def feed(self, data: bytes) -> np.ndarray:
+        """
+        Decodifica un trozo.
+
+        Args:
+            data: Bytes a continuación de los ya recibidos
+
+        Returns:
+            Muestras float32 mono a target_sr decodificadas de este trozo
+            (puede estar vacío si aún falta la cabecera o una muestra completa)
+        """
+        data = bytes(data)
+        if self.info is None:
+            data = self._header + data
+            self._header = b""
+            try:
+                info = parse_wav_header(data[:_MAX_HEADER_BYTES])
+            except struct.error:
+                # Chunk 'fmt ' cortado entre dos trozos
+                info = None
+            if info is None:
+                if (
+                    len(data) > _MAX_HEADER_BYTES
+                    or not b"RIFF".startswith(data[:4])
+                    or (len(data) >= 12 and data[8:12] != b"WAVE")
+                ):
+                    raise ValueError("Cabecera WAV no válida, formato comprimido o muestras no admitidas")
+                # Cabecera incompleta: esperar al siguiente trozo
+                self._header = data
+                return np.zeros(0, dtype=np.float32)
+            self.info = info
+            # Tamaño 0 o 0xFFFFFFFF: grabadores que no conocen la longitud final
+            self._data_remaining = info.data_size if 0 < info.data_size < 0xFFFFFFFF else None
+            data = data[info.data_offset:]
+
+        if self._data_remaining is not None:
+            data = data[:self._data_remaining]
+            self._data_remaining -= len(data)
+
+        data = self._remainder + data
+        frame_bytes = self.info.dtype.itemsize * self.info.channels
+        usable = len(data) - len(data) % frame_bytes
+        self._remainder = data[usable:]
+        if usable == 0:
+            return np.zeros(0, dtype=np.float32)
+        samples = np.frombuffer(data, dtype=self.info.dtype, count=usable // self.info.dtype.itemsize)
+        audio = _to_float32(samples, self.info.channels)
+        if self.info.sample_rate == self.target_sr:
+            return audio
+        if self._resampler is None:
+            self._resampler = StreamResampler(self.info.sample_rate, self.target_sr)
+        return self._resampler.feed(audio)
+
+    def finish(self) -> np.ndarray:
+        """
+        Cierra la decodificación.
+
+        Returns:
+            Últimas muestras retenidas por el remuestreo (vacío si no hay remuestreo)
+        """
+        if self._resampler is None:
+            return np.zeros(0, dtype=np.float32)
+        return self._resampler.feed(np.zeros(0, dtype=np.float32), final=True)
+
+
+class AudioDecoder:
+    """
+    Decodificador de audio a float32 mono con caché de clips recientes.
+    """
+
+    def __init__(self, target_sr: int = TARGET_SAMPLE_RATE, cache_size: int = 8):
+        """
+        Args:
+            target_sr: Tasa de muestreo de salida
+            cache_size: Número de clips decodificados que se mantienen en memoria
+        """
+        self.target_sr = target_sr
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read_header(self, filepath: str) -> Optional[WavInfo]:
+        """Lee solo la cabecera del archivo; None si no es un WAV legible directamente."""
+        with open(filepath, "rb") as f:
+            info = parse_wav_header(f.read(4096))
+            if info is None:
+                return None
+            # Algunos grabadores dejan el tamaño de 'data' sin actualizar
+            available = os.fstat(f.fileno()).st_size - info.data_offset
+            return info._replace(data_size=min(info.data_size, max(0, available)))
+
+    def decode(self, source: Union[str, bytes, np.ndarray]) -> np.ndarray:
+        """
+        Decodifica un archivo (ruta) o un buffer de bytes a float32 mono a target_sr.
+
+        Args:
+            source: Ruta del archivo, contenido en bytes o forma de onda ya
+                decodificada a target_sr (se devuelve sin copiar)
+
+        Returns:
+            Forma de onda float32 (de solo lectura si procede de la caché)
+        """
+        if isinstance(source, np.ndarray):
+            return source.astype(np.float32, copy=False)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return self._decode_bytes(bytes(source))
+
+        stat = os.stat(source)
+        key = (os.path.abspath(source), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        audio = self._decode_path(source)
+        audio.flags.writeable = False
+
+        with self._lock:
+            self._cache[key] = audio
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return audio
+
+    def stream(self, filepath: Union[str, np.ndarray], block_samples: int) -> Iterator[np.ndarray]:
+        """
+        Devuelve la forma de onda por bloques.
+
+        Para WAV ya a la tasa destino los bloques se leen con memmap, sin cargar
+        el archivo entero; en el resto de casos se decodifica y se trocea.
+
+        Args:
+            filepath: Ruta del archivo o forma de onda ya decodificada
+            block_samples: Muestras (a target_sr) por bloque
+
+        Yields:
+            Bloques float32 mono
+        """
+        info = None if isinstance(filepath, np.ndarray) else self.read_header(filepath)
+        if info is not None and info.sample_rate == self.target_sr:
+            if info.num_frames == 0:
+                return
+            samples = np.memmap(
+                filepath, dtype=info.dtype, mode="r",
+                offset=info.data_offset, shape=(info.num_frames * info.channels,),
+            )
+            step = block_samples * info.channels
+            for start in range(0, len(samples), step):
+                yield _to_float32(np.asarray(samples[start:start + step]), info.channels)
+            return
+
+        audio = self.decode(filepath)
+        for start in range(0, len(audio), block_samples):
+            yield audio[start:start + block_samples]
+
+    def _decode_path(self, filepath: str) -> np.ndarray:
+        info = self.read_header(filepath)
+        if info is not None:
+            with open(filepath, "rb") as f:
+                f.seek(info.data_offset)
+                data = f.read(info.data_size)
+            return self._from_wav_data(data, info)
+        return self._decode_compressed(filepath)
+
+    def _decode_bytes(self, data: bytes) -> np.ndarray:
+        info = parse_wav_header(data[:4096])
+        if info is not None:
+            return self._from_wav_data(data[info.data_offset:info.data_offset + info.data_size], info)
+        return self._decode_compressed(io.BytesIO(data))
+
+    def _from_wav_data(self, data: bytes, info: WavInfo) -> np.ndarray:
+        usable = len(data) - len(data) % (info.dtype.itemsize * info.channels)
+        samples = np.frombuffer(data, dtype=info.dtype, count=usable // info.dtype.itemsize)
+        return resample(_to_float32(samples, info.channels), info.sample_rate, self.target_sr)
+
+    def _decode_compressed(self, source) -> np.ndarray:
+        try:
+            import soundfile as sf
+
+            audio, sample_rate = sf.read(source, dtype="float32", always_2d=True)
+            return resample(audio.mean(axis=1), sample_rate, self.target_sr)
+        except Exception:
+            # Último recurso: librosa/audioread (formatos que libsndfile no soporta)
+            import librosa
+
+            if hasattr(source, "seek"):
+                source.seek(0)
+            audio, _ = librosa.load(source, sr=self.target_sr, mono=True)
+            return audio.astype(np.float32, copy=False)
+
+
+# Instancia compartida del decodificador
+audio_decoder = AudioDecoder()
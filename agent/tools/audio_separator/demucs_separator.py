@@ -1,36 +1,179 @@
 import os
-import subprocess
+import time
+import logging
+import numpy as np
+import soundfile as sf
+
+from agent.config import DEMUCS_CONFIG
+from agent.tools.audio_decoding.audio_decoder import audio_decoder
+from agent.services.metrics_service import metrics_registry
+
+SAMPLE_RATE = 16000
+
+
+def _overlap_weights(length: int, overlap: int, fade_in: bool, fade_out: bool) -> np.ndarray:
+    """Pesos de un trozo: rampas lineales en los solapes, que suman 1 con las del trozo vecino."""
+    weights = np.ones(length, dtype=np.float32)
+    ramp = min(overlap, length)
+    if ramp > 0:
+        rising = (np.arange(ramp, dtype=np.float32) + 0.5) / ramp
+        if fade_in:
+            weights[:ramp] = rising
+        if fade_out:
+            weights[-ramp:] = rising[::-1]
+    return weights
 
 
 class DemucsSeparator:
+    """
+    Separación de fuentes con Demucs dentro del proceso.
+
+    El modelo se carga una sola vez y trabaja sobre arrays float32: las
+    entradas largas se procesan en trozos solapados (la memoria depende del
+    tamaño del trozo, no de la duración) y los trozos se funden con rampas
+    lineales en el solape.
+    """
+
     def __init__(
         self,
+        model_name: str = None,
+        stems: str = None,
+        device: str = None,
+        chunk_seconds: float = None,
+        overlap_seconds: float = None,
         output_dir: str = "demucs_output",
-        stems: str = "vocals",
         verbose: bool = False,
     ):
+        import torch
+        from demucs.pretrained import get_model
+
+        self.logger = logging.getLogger(__name__)
+        self.model_name = model_name or DEMUCS_CONFIG['model_name']
+        self.stems = stems or DEMUCS_CONFIG['stem']
+        self.chunk_seconds = chunk_seconds or DEMUCS_CONFIG['chunk_seconds']
+        self.overlap_seconds = DEMUCS_CONFIG['overlap_seconds'] if overlap_seconds is None else overlap_seconds
         self.output_dir = output_dir
-        self.stems = stems
         self.verbose = verbose
 
+        device = device or DEMUCS_CONFIG['device']
+        if device == "auto":
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = device
+
+        start = time.perf_counter()
+        self.model = get_model(self.model_name)
+        self.model.to(self.device)
+        self.model.eval()
+        if self.stems not in self.model.sources:
+            raise ValueError(f"Demucs '{self.model_name}' no tiene la pista '{self.stems}': {self.model.sources}")
+        self.source_index = self.model.sources.index(self.stems)
+        self.logger.info(f"Demucs '{self.model_name}' cargado en {time.perf_counter() - start:.2f}s ({self.device})")
+
+        self._latency = metrics_registry.histogram(
+            "demucs_separation_seconds", "Duración de la separación de fuentes por clip"
+        )
+        self._audio_seconds = metrics_registry.counter(
+            "demucs_audio_seconds_total", "Segundos de audio separados"
+        )
+
+    def close(self):
+        """Libera el modelo (y la memoria de GPU si la usaba)."""
+        self.model = None
+        if self.device == "cuda":
+            import torch
+
+            torch.cuda.empty_cache()
+
+    def separate_array(self, waveform: np.ndarray, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+        """
+        Extrae la pista configurada (por defecto la voz) de una forma de onda.
+
+        Args:
+            waveform: Forma de onda float32 mono
+            sample_rate: Frecuencia de muestreo de la entrada y de la salida
+
+        Returns:
+            np.ndarray: Pista separada, float32 mono, misma longitud que la entrada
+        """
+        waveform = np.asarray(waveform, dtype=np.float32)
+        total = len(waveform)
+        if total == 0:
+            return waveform.copy()
+
+        start = time.perf_counter()
+        # Normalización global (como la CLI de Demucs), común a todos los trozos
+        mean = float(waveform.mean())
+        std = float(waveform.std()) or 1.0
+
+        chunk = max(1, int(self.chunk_seconds * sample_rate))
+        overlap = min(int(self.overlap_seconds * sample_rate), chunk // 2)
+        step = chunk - overlap
+
+        output = np.zeros(total, dtype=np.float32)
+        weight_sum = np.zeros(total, dtype=np.float32)
+        offset = 0
+        while True:
+            end = min(offset + chunk, total)
+            stem = self._separate_chunk(waveform[offset:end], sample_rate, mean, std)
+            weights = _overlap_weights(end - offset, overlap, fade_in=offset > 0, fade_out=end < total)
+            output[offset:end] += stem * weights
+            weight_sum[offset:end] += weights
+            if end >= total:
+                break
+            offset += step
+
+        output /= np.maximum(weight_sum, 1e-8)
+        elapsed = time.perf_counter() - start
+        self._latency.observe(elapsed, model=self.model_name)
+        self._audio_seconds.inc(total / sample_rate, model=self.model_name)
+
+        if self.verbose:
+            print(f"🎧 Demucs '{self.stems}' separada en {elapsed:.2f}s ({total / sample_rate:.1f}s de audio)")
+        return output
+
+    def _separate_chunk(self, piece: np.ndarray, sample_rate: int, mean: float, std: float) -> np.ndarray:
+        import torch
+        from demucs.apply import apply_model
+        from demucs.audio import convert_audio
+
+        mix = convert_audio(
+            torch.from_numpy(np.ascontiguousarray(piece))[None],
+            sample_rate,
+            self.model.samplerate,
+            self.model.audio_channels,
+        )
+        mix = (mix - mean) / std
+        with torch.no_grad():
+            sources = apply_model(
+                self.model, mix[None], shifts=0, split=True, overlap=0.25, progress=False, device=self.device
+            )[0]
+        stem = sources[self.source_index] * std + mean
+        stem = convert_audio(stem.cpu(), self.model.samplerate, sample_rate, 1)[0].numpy()
+
+        # El remuestreo puede desviar la longitud en una muestra
+        if len(stem) < len(piece):
+            stem = np.pad(stem, (0, len(piece) - len(stem)))
+        return stem[:len(piece)].astype(np.float32, copy=False)
+
     def separate(self, input_audio: str):
-        cmd = [
-            "demucs",
-            input_audio,
-            "--two-stems",
-            self.stems,
-            "--out",
-            self.output_dir,
-        ]
+        """
+        Compatibilidad con el uso anterior: separa un archivo y guarda la pista
+        en output_dir/<modelo>/<nombre>/<pista>.wav (a 16 kHz mono).
+
+        Args:
+            input_audio: Ruta del archivo de audio
 
+        Returns:
+            str: Ruta de la pista separada
+        """
         if self.verbose:
             print(f"🎧 Separando pistas con Demucs para: {input_audio}...")
-        subprocess.run(cmd, check=True)
+        stem = self.separate_array(audio_decoder.decode(input_audio), SAMPLE_RATE)
 
         track_name = os.path.splitext(os.path.basename(input_audio))[0]
-        path_vocals = os.path.join(
-            self.output_dir, "htdemucs", track_name, f"{self.stems}.wav"
-        )
+        path_vocals = os.path.join(self.output_dir, self.model_name, track_name, f"{self.stems}.wav")
+        os.makedirs(os.path.dirname(path_vocals), exist_ok=True)
+        sf.write(path_vocals, stem, SAMPLE_RATE)
 
         if self.verbose:
             print(f"✅ '{self.stems}' separada guardada en: {path_vocals}")
@@ -40,4 +183,5 @@ class DemucsSeparator:
 
 # Ejemplo de uso:
 # separator = DemucsSeparator(verbose=True)
+# voz = separator.separate_array(forma_de_onda_16k)
 # ruta_vocals = separator.separate("audio_fragments/fragmento_20250620_181110.wav")
@@ -0,0 +1 @@
+# Audio storage tools 
\ No newline at end of file
@@ -0,0 +1,342 @@
+"""
+Almacén de clips en segmentos de solo anexado.
+
+- Los clips (bytes ya codificados) se añaden al final de archivos grandes
+  (segment-000001.seg, ...) en lugar de crear un archivo por clip; el segmento
+  activo rota al superar segment_max_bytes.
+- Un índice compacto de registros binarios de tamaño fijo (index-<gen>.log)
+  guarda por hash de contenido el segmento, offset, longitud, formato y número
+  de referencias. Un mismo contenido se guarda una sola vez (deduplicación) y
+  cada conservación añade una referencia.
+- Los clips se leen como memoryview sobre un mmap del segmento, sin copiarlos.
+- La compactación reescribe los clips vivos de los segmentos casi vacíos en el
+  segmento activo, borra los segmentos viejos y genera un índice nuevo.
+- Varios procesos comparten el almacén: las escrituras van bajo un bloqueo de
+  archivo y cada proceso aplica los registros nuevos del índice al detectar
+  que le faltan.
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from agent.tools.file_lock import file_lock
+
+# op, hash, segmento, offset, longitud, referencias, formato
+_RECORD = struct.Struct("<B16sIQQI8s")
+_PUT, _REF, _UNREF, _MOVE = 1, 2, 3, 4
+
+_KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+_SEGMENT_PATTERN = re.compile(r"^segment-(\d{6})\.seg$")
+
+
+class _Blob:
+    """Ubicación y referencias de un clip en el almacén."""
+
+    __slots__ = ("segment", "offset", "length", "refs", "audio_format")
+
+    def __init__(self, segment: int, offset: int, length: int, refs: int, audio_format: str):
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+        self.refs = refs
+        self.audio_format = audio_format
+
+
+class SegmentStore:
+    """Almacén de clips deduplicado por contenido en segmentos de solo anexado."""
+
+    def __init__(self, folder: str, segment_max_bytes: int = 256 * 1024 * 1024, compact_live_ratio: float = 0.25):
+        """
+        Args:
+            folder: Carpeta de los segmentos y del índice
+            segment_max_bytes: Tamaño a partir del cual se abre un segmento nuevo
+            compact_live_ratio: Fracción de bytes vivos por debajo de la cual
+                un segmento (no activo) se compacta
+        """
+        self.folder = folder
+        self.segment_max_bytes = segment_max_bytes
+        self.compact_live_ratio = compact_live_ratio
+        os.makedirs(folder, exist_ok=True)
+        self._lock_path = os.path.join(folder, "store.lock")
+        self._current_path = os.path.join(folder, "CURRENT")
+        self._lock = threading.RLock()
+        self._blobs: Dict[bytes, _Blob] = {}
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._generation: Optional[int] = None
+        self._position = 0
+        self._records = 0
+
+    # -- API -----------------------------------------------------------------
+
+    def put(self, data: bytes, audio_format: str) -> Tuple[str, bool]:
+        """
+        Guarda un clip (o añade una referencia si el contenido ya existe).
+
+        Args:
+            data: Bytes del clip codificado
+            audio_format: Formato del clip (flac, opus, wav, mp3, ...)
+
+        Returns:
+            (clave del clip (hash del contenido en hexadecimal), True si se
+            escribió y False si ya existía)
+        """
+        digest = hashlib.sha256(data).digest()[:16]
+        with self._exclusive():
+            if digest in self._blobs:
+                self._append_record(_REF, digest)
+                return digest.hex(), False
+            segment, offset = self._append_data(data)
+            self._append_record(_PUT, digest, segment, offset, len(data), 1, audio_format)
+        return digest.hex(), True
+
+    def release(self, key: str) -> bool:
+        """
+        Quita una referencia al clip; sin referencias, sus bytes quedan muertos
+        hasta la siguiente compactación.
+
+        Returns:
+            bool: True si el clip existía
+        """
+        digest = self._digest(key)
+        if digest is None:
+            return False
+        with self._exclusive():
+            if digest not in self._blobs:
+                return False
+            self._append_record(_UNREF, digest)
+        return True
+
+    def info(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Metadatos de un clip.
+
+        Returns:
+            Dict con format, size y refs, o None si la clave no existe
+        """
+        blob = self._lookup(key)
+        if blob is None:
+            return None
+        return {"format": blob.audio_format, "size": blob.length, "refs": blob.refs}
+
+    def view(self, key: str) -> Optional[memoryview]:
+        """
+        Contenido de un clip como memoryview sobre el mmap de su segmento.
+
+        Returns:
+            memoryview de solo lectura, o None si la clave no existe
+        """
+        for _ in range(2):
+            blob = self._lookup(key)
+            if blob is None:
+                return None
+            try:
+                mapped = self._map(blob.segment, blob.offset + blob.length)
+                return memoryview(mapped)[blob.offset:blob.offset + blob.length]
+            except FileNotFoundError:
+                # Otro proceso compactó el segmento: releer el índice y reintentar
+                with self._lock:
+                    self._drop_map(blob.segment)
+                    self._refresh()
+        return None
+
+    def compact(self) -> int:
+        """
+        Compacta los segmentos no activos con pocos bytes vivos y reescribe
+        el índice si acumula muchos registros obsoletos.
+
+        Returns:
+            int: Número de segmentos eliminados
+        """
+        removed = 0
+        with self._exclusive():
+            active = self._active_segment()
+            live: Dict[int, int] = {}
+            for blob in self._blobs.values():
+                live[blob.segment] = live.get(blob.segment, 0) + blob.length
+            for segment in self._segment_ids():
+                if segment == active:
+                    continue
+                path = self._segment_path(segment)
+                total = os.path.getsize(path)
+                if total and live.get(segment, 0) / total >= self.compact_live_ratio:
+                    continue
+                for digest, blob in list(self._blobs.items()):
+                    if blob.segment != segment:
+                        continue
+                    data = bytes(self._map(segment, blob.offset + blob.length)[blob.offset:blob.offset + blob.length])
+                    new_segment, new_offset = self._append_data(data)
+                    self._append_record(_MOVE, digest, new_segment, new_offset, blob.length)
+                self._drop_map(segment)
+                try:
+                    os.unlink(path)
+                    removed += 1
+                except OSError:
+                    # En Windows no se puede borrar mientras otro proceso lo tenga mapeado; sin
+                    # clips vivos se reintenta en la siguiente compactación
+                    pass
+            if self._records > 2 * len(self._blobs) + 1024:
+                self._rewrite_index()
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        """Clips, bytes vivos, segmentos y bytes en disco del almacén."""
+        with self._lock:
+            self._refresh()
+            segments = self._segment_ids()
+            return {
+                "clips": len(self._blobs),
+                "live_bytes": sum(blob.length for blob in self._blobs.values()),
+                "segments": len(segments),
+                "segment_bytes": sum(os.path.getsize(self._segment_path(segment)) for segment in segments),
+            }
+
+    # -- Índice --------------------------------------------------------------
+
+    @contextmanager
+    def _exclusive(self):
+        with self._lock, file_lock(self._lock_path):
+            self._refresh()
+            yield
+
+    def _lookup(self, key: str) -> Optional[_Blob]:
+        digest = self._digest(key)
+        if digest is None:
+            return None
+        with self._lock:
+            blob = self._blobs.get(digest)
+            if blob is None:
+                # Puede haberlo escrito otro proceso
+                self._refresh()
+                blob = self._blobs.get(digest)
+            return blob
+
+    def _digest(self, key: str) -> Optional[bytes]:
+        if not isinstance(key, str) or not _KEY_PATTERN.match(key):
+            return None
+        return bytes.fromhex(key)
+
+    def _read_generation(self) -> int:
+        try:
+            with open(self._current_path, "r") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _index_path(self, generation: int) -> str:
+        return os.path.join(self.folder, f"index-{generation:06d}.log")
+
+    def _refresh(self):
+        """Aplica los registros del índice escritos desde la última lectura."""
+        generation = self._read_generation()
+        if generation != self._generation:
+            self._blobs.clear()
+            self._generation, self._position, self._records = generation, 0, 0
+        try:
+            with open(self._index_path(generation), "rb") as f:
+                f.seek(self._position)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Solo registros completos (otro proceso puede estar escribiendo el siguiente)
+        usable = len(data) - len(data) % _RECORD.size
+        for record in _RECORD.iter_unpack(data[:usable]):
+            self._apply(*record)
+        self._position += usable
+        self._records += usable // _RECORD.size
+
+    def _apply(self, op: int, digest: bytes, segment: int, offset: int, length: int, refs: int, audio_format: bytes):
+        blob = self._blobs.get(digest)
+        if op == _PUT:
+            self._blobs[digest] = _Blob(segment, offset, length, refs, audio_format.rstrip(b"\0").decode("ascii"))
+        elif blob is None:
+            return
+        elif op == _REF:
+            blob.refs += 1
+        elif op == _UNREF:
+            blob.refs -= 1
+            if blob.refs <= 0:
+                del self._blobs[digest]
+        elif op == _MOVE:
+            blob.segment, blob.offset = segment, offset
+
+    def _append_record(self, op: int, digest: bytes, segment: int = 0, offset: int = 0, length: int = 0,
+                       refs: int = 0, audio_format: str = ""):
+        record = _RECORD.pack(op, digest, segment, offset, length, refs, audio_format.encode("ascii")[:8])
+        with open(self._index_path(self._generation), "ab") as f:
+            f.write(record)
+        self._apply(op, digest, segment, offset, length, refs, record[-8:])
+        self._position += _RECORD.size
+        self._records += 1
+
+    def _rewrite_index(self):
+        """Genera un índice nuevo con un registro por clip vivo."""
+        generation = self._generation + 1
+        with open(self._index_path(generation), "wb") as f:
+            for digest, blob in self._blobs.items():
+                f.write(_RECORD.pack(
+                    _PUT, digest, blob.segment, blob.offset, blob.length, blob.refs,
+                    blob.audio_format.encode("ascii")[:8],
+                ))
+        temp_path = f"{self._current_path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(str(generation))
+        os.replace(temp_path, self._current_path)
+        old_path = self._index_path(self._generation)
+        self._generation = None
+        self._refresh()
+        try:
+            os.unlink(old_path)
+        except OSError:
+            pass
+
+    # -- Segmentos -----------------------------------------------------------
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.folder, f"segment-{segment:06d}.seg")
+
+    def _segment_ids(self):
+        return sorted(
+            int(match.group(1)) for match in map(_SEGMENT_PATTERN.match, os.listdir(self.folder)) if match
+        )
+
+    def _active_segment(self) -> int:
+        segments = self._segment_ids()
+        return segments[-1] if segments else 1
+
+    def _append_data(self, data: bytes):
+        """Añade bytes al segmento activo (rotándolo si está lleno) y devuelve (segmento, offset)."""
+        segment = self._active_segment()
+        path = self._segment_path(segment)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size and size + len(data) > self.segment_max_bytes:
+            segment, size = segment + 1, 0
+            path = self._segment_path(segment)
+        with open(path, "ab") as f:
+            f.write(data)
+        return segment, size
+
+    def _map(self, segment: int, end: int) -> mmap.mmap:
+        with self._lock:
+            mapped = self._maps.get(segment)
+            if mapped is None or len(mapped) < end:
+                # El segmento creció desde que se mapeó: se cierra el mapeo anterior
+                self._drop_map(segment)
+                with open(self._segment_path(segment), "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment] = mapped
+            return mapped
+
+    def _drop_map(self, segment: int):
+        mapped = self._maps.pop(segment, None)
+        if mapped is not None:
+            try:
+                mapped.close()
+            except BufferError:
+                # Aún hay memoryviews en uso (respuestas en curso); se libera al recolectarlas
+                pass
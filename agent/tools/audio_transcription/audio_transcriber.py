@@ -1,43 +1,320 @@
 import os
+import time
+import logging
+import functools
+import threading
+from collections import OrderedDict
 from faster_whisper import WhisperModel
 
+from agent.config import WHISPER_CONFIG, WHISPER_BATCHING_CONFIG
+from agent.tools.audio_analyzer.sound_event_timeline import speech_regions
+from agent.tools.audio_decoding.audio_decoder import audio_decoder
+from agent.tools.audio_transcription.whisper_batcher import WhisperBatcher
+from agent.tools.batch_processing.batch_runner import BatchRunner, list_audio_files
+from agent.services.metrics_service import metrics_registry
+from agent.services.model_registry_service import model_registry
+
+SAMPLE_RATE = 16000
+
+
+def detect_device() -> str:
+    """Devuelve 'cuda' si CTranslate2 ve alguna GPU, si no 'cpu'."""
+    try:
+        import ctranslate2
+
+        return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    except Exception:
+        return "cpu"
+
+
+def default_compute_type(device: str) -> str:
+    """float16 en GPU; int8 en CPU (pesos cuantizados, ~4x menos memoria que float32)."""
+    return "float16" if device == "cuda" else "int8"
+
 
 class AudioTranscriber:
     def __init__(
         self,
-        model_size: str = "large",
-        device: str = "cuda",
-        compute_type: str = "float16",
+        model_size: str = None,
+        device: str = None,
+        compute_type: str = None,
         language: str = "es",
         verbose: bool = False,
+        latency_budget: float = None,
     ):
+        self.logger = logging.getLogger(__name__)
         self.verbose = verbose
         self.language = language
-        self.model = WhisperModel(model_size, device=device, compute_type=compute_type)
 
-    def transcribe_file(self, audio_path: str):
-        segments, _ = self.model.transcribe(audio_path, language=self.language)
-        transcript = [
-            {"start": segment.start, "end": segment.end, "text": segment.text.strip()}
-            for segment in segments
-        ]
+        device = device or WHISPER_CONFIG['device']
+        self.device = detect_device() if device == "auto" else device
+        compute_type = compute_type or WHISPER_CONFIG['compute_type']
+        self.compute_type = default_compute_type(self.device) if compute_type == "auto" else compute_type
+
+        # Un tamaño explícito fija el modelo; 'auto' elige nivel según duración y presupuesto
+        self.model_size = model_size or WHISPER_CONFIG['model_size']
+        self.tiers = WHISPER_CONFIG['tiers'] if self.model_size == "auto" else [self.model_size]
+        self.latency_budget = latency_budget or WHISPER_CONFIG['latency_budget_seconds']
+        self.memory_cap_mb = WHISPER_CONFIG['memory_cap_mb']
+        self.model_version = self.describe(self.model_size, self.device, self.compute_type, language, self.latency_budget)
+
+        device_factors = WHISPER_CONFIG['realtime_factors'].get(self.device, WHISPER_CONFIG['realtime_factors']['cpu'])
+        self._realtime_factors = {tier: device_factors.get(tier, 1.0) for tier in self.tiers}
+        self._models: "OrderedDict[str, WhisperModel]" = OrderedDict()
+        # Una cola de transcripciones agrupadas por nivel cargado
+        self._batchers: "dict[str, WhisperBatcher]" = {}
+        self._lock = threading.Lock()
+
+        self._latency = metrics_registry.histogram(
+            "whisper_transcription_seconds", "Latencia de transcripción por nivel de modelo"
+        )
+        self._loaded_mb = metrics_registry.gauge(
+            "whisper_loaded_memory_mb", "Memoria estimada de los modelos Whisper cargados"
+        )
+
+        if self.verbose:
+            print(f"🎙️ Whisper en {self.device} ({self.compute_type}), niveles: {', '.join(self.tiers)}")
+
+        # El nivel más pequeño se carga al inicio para que el primer clip no pague la carga
+        self._get_model(self.tiers[0])
+
+    @staticmethod
+    def describe(
+        model_size: str = None,
+        device: str = None,
+        compute_type: str = None,
+        language: str = "es",
+        latency_budget: float = None,
+    ) -> str:
+        """
+        Versión de la configuración de transcripción sin cargar ningún modelo
+        (para claves de caché).
+
+        Returns:
+            str: Niveles, dispositivo, tipo de cómputo, idioma y presupuesto
+        """
+        device = device or WHISPER_CONFIG['device']
+        device = detect_device() if device == "auto" else device
+        compute_type = compute_type or WHISPER_CONFIG['compute_type']
+        compute_type = default_compute_type(device) if compute_type == "auto" else compute_type
+        model_size = model_size or WHISPER_CONFIG['model_size']
+        tiers = WHISPER_CONFIG['tiers'] if model_size == "auto" else [model_size]
+        latency_budget = latency_budget or WHISPER_CONFIG['latency_budget_seconds']
+        # El dispositivo fija los factores de tiempo real con los que se elige el nivel
+        return f"whisper:{'/'.join(tiers)}:{device}:{compute_type}:{language}:{latency_budget}"
+
+    def close(self):
+        """Libera todos los niveles cargados."""
+        with self._lock:
+            batchers = list(self._batchers.values())
+            self._batchers.clear()
+            self._models.clear()
+        for batcher in batchers:
+            batcher.close()
+        self._loaded_mb.set(0)
+
+    @property
+    def model(self) -> WhisperModel:
+        """Modelo del nivel más pequeño (compatibilidad con el uso directo anterior)."""
+        return self._get_model(self.tiers[0])
+
+    def _model_memory_mb(self, tier: str) -> float:
+        memory = WHISPER_CONFIG['model_memory_mb'].get(tier, 0)
+        return memory * 2 if self.compute_type.startswith("float16") else memory
 
+    def select_tier(self, duration: float, latency_budget: float = None) -> str:
+        """
+        Elige el nivel más grande cuya latencia estimada cabe en el presupuesto.
+
+        La estimación usa los factores de tiempo real configurados (no los
+        medidos): el nivel solo depende de la duración, el presupuesto y la
+        configuración recogida en model_version, así que las transcripciones
+        cacheadas con una misma versión salen del mismo nivel.
+
+        Args:
+            duration: Duración del clip en segundos
+            latency_budget: Presupuesto en segundos (por defecto el configurado)
+
+        Returns:
+            str: Nivel de Whisper (tiny, base, small, medium...)
+        """
+        budget = latency_budget or self.latency_budget
+        selected = self.tiers[0]
+        for tier in self.tiers:
+            if self._model_memory_mb(tier) > self.memory_cap_mb:
+                break
+            if duration * self._realtime_factors[tier] <= budget:
+                selected = tier
+        return selected
+
+    def _get_model(self, tier: str) -> WhisperModel:
+        with self._lock:
+            model = self._models.get(tier)
+            if model is not None:
+                self._models.move_to_end(tier)
+                return model
+
+            # Liberar los niveles menos usados hasta que el nuevo quepa bajo el límite
+            needed = self._model_memory_mb(tier)
+            while self._models and self._loaded_memory_mb() + needed > self.memory_cap_mb:
+                evicted, _ = self._models.popitem(last=False)
+                batcher = self._batchers.pop(evicted, None)
+                if batcher is not None:
+                    # Las peticiones ya encoladas terminan antes de que el hilo se detenga
+                    batcher.close()
+                self.logger.info(f"Whisper '{evicted}' descargado por el límite de memoria ({self.memory_cap_mb} MB)")
+
+            start = time.perf_counter()
+            # Ruta local del registro de modelos si está descargado; si no, el nombre del modelo
+            model = WhisperModel(
+                model_registry.resolve_source(tier),
+                device=self.device,
+                compute_type=self.compute_type,
+                cpu_threads=WHISPER_CONFIG['cpu_threads'],
+            )
+            self._models[tier] = model
+            self._loaded_mb.set(self._loaded_memory_mb())
+            self.logger.info(f"Whisper '{tier}' cargado en {time.perf_counter() - start:.2f}s ({self.device}, {self.compute_type})")
+            return model
+
+    def _get_batcher(self, tier: str) -> WhisperBatcher:
+        model = self._get_model(tier)
+        with self._lock:
+            batcher = self._batchers.get(tier)
+            if batcher is None:
+                batcher = WhisperBatcher(
+                    model,
+                    language=self.language,
+                    tier=tier,
+                    max_batch_size=WHISPER_BATCHING_CONFIG['max_batch_size'],
+                    max_wait_ms=WHISPER_BATCHING_CONFIG['max_wait_ms'],
+                    inference_batch_size=WHISPER_BATCHING_CONFIG['inference_batch_size'],
+                    max_batch_seconds=WHISPER_BATCHING_CONFIG['max_batch_seconds'],
+                )
+                self._batchers[tier] = batcher
+            return batcher
+
+    def _loaded_memory_mb(self) -> float:
+        return sum(self._model_memory_mb(tier) for tier in self._models)
+
+    def transcribe_file(self, audio_path: str, latency_budget: float = None, speech_intervals=None):
+        # Reutiliza el clip ya decodificado por el analizador (caché compartida)
+        audio = audio_decoder.decode(audio_path)
+        return self.transcribe_audio(
+            audio, latency_budget=latency_budget, speech_intervals=speech_intervals, name=os.path.basename(audio_path)
+        )
+
+    def transcribe_audio(self, audio, latency_budget: float = None, speech_intervals=None, name: str = "audio"):
+        """
+        Transcribe una forma de onda ya decodificada (p. ej. la voz separada por Demucs).
+
+        Args:
+            audio: PCM float32 mono a 16 kHz
+            latency_budget: Presupuesto de latencia en segundos
+            speech_intervals: Intervalos de voz de YAMNet (inicio, fin)
+            name: Nombre para los mensajes de depuración
+
+        Returns:
+            Lista de segmentos {start, end, text} con tiempos sobre el clip
+        """
+        duration = len(audio) / SAMPLE_RATE
+
+        # Solo se transcriben las regiones con voz; los tiempos se devuelven sobre el clip original
+        regions = speech_regions(speech_intervals, duration)
+        speech_seconds = sum(end - start for start, end in regions)
+        tier = self.select_tier(speech_seconds, latency_budget)
+
+        start = time.perf_counter()
+        if WHISPER_BATCHING_CONFIG['enabled']:
+            # Las peticiones concurrentes del mismo nivel comparten una pasada del modelo
+            transcript = self._get_batcher(tier).transcribe(audio, regions)
+        else:
+            model = self._get_model(tier)
+            transcript = []
+            for region_start, region_end in regions:
+                offset = int(region_start * SAMPLE_RATE)
+                segments, _ = model.transcribe(
+                    audio[offset:int(region_end * SAMPLE_RATE)], language=self.language
+                )
+                transcript.extend(
+                    {
+                        "start": round(region_start + segment.start, 2),
+                        "end": round(region_start + segment.end, 2),
+                        "text": segment.text.strip(),
+                    }
+                    for segment in segments
+                )
+        elapsed = time.perf_counter() - start
+        self._latency.observe(elapsed, tier=tier, device=self.device)
         if self.verbose:
-            print(f"📝 Transcripción de {os.path.basename(audio_path)}:")
+            print(
+                f"📝 Transcripción de {name} (whisper {tier}, {elapsed:.2f}s, "
+                f"{speech_seconds:.1f}s de voz en {duration:.1f}s):"
+            )
             for seg in transcript:
                 print(f"[{seg['start']:.2f}s - {seg['end']:.2f}s]: {seg['text']}")
             print("-" * 50)
 
         return transcript
 
-    def transcribe_folder(self, folder_path: str):
-        results = {}
-        for file in os.listdir(folder_path):
-            if file.endswith(".wav"):
-                audio_path = os.path.join(folder_path, file)
-                transcript = self.transcribe_file(audio_path)
-                results[file] = transcript
-        return results
+    def transcribe_many(self, audios, speech_intervals=None, latency_budget: float = None):
+        """
+        Transcribe varios clips a la vez. Con el batcher activo todos se
+        encolan antes de esperar, así que los del mismo nivel comparten pasada.
+
+        Args:
+            audios: Formas de onda float32 mono a 16 kHz
+            speech_intervals: Intervalos de voz de YAMNet por clip (o None)
+            latency_budget: Presupuesto de latencia en segundos por clip
+
+        Returns:
+            Lista de transcripciones (segmentos {start, end, text}), una por clip
+        """
+        speech_intervals = speech_intervals or [None] * len(audios)
+        if not WHISPER_BATCHING_CONFIG['enabled']:
+            return [
+                self.transcribe_audio(audio, latency_budget=latency_budget, speech_intervals=intervals)
+                for audio, intervals in zip(audios, speech_intervals)
+            ]
+
+        start = time.perf_counter()
+        pending = []
+        # Momento en que termina cada clip: la latencia se mide por grupo de nivel
+        finished_at = {}
+        for index, (audio, intervals) in enumerate(zip(audios, speech_intervals)):
+            regions = speech_regions(intervals, len(audio) / SAMPLE_RATE)
+            tier = self.select_tier(sum(end - begin for begin, end in regions), latency_budget)
+            future = self._get_batcher(tier).submit(audio, regions)
+            future.add_done_callback(lambda _, index=index: finished_at.setdefault(index, time.perf_counter()))
+            pending.append((tier, future))
+
+        transcripts = [future.result() for _, future in pending]
+        for tier in {tier for tier, _ in pending}:
+            tier_finished = max(finished_at[index] for index, (clip_tier, _) in enumerate(pending) if clip_tier == tier)
+            self._latency.observe(tier_finished - start, tier=tier, device=self.device)
+        return transcripts
+
+    def transcribe_folder(self, folder_path: str, workers: int = None, use_cache: bool = None):
+        # Pool de procesos + caché por hash de contenido: las re-ejecuciones solo transcriben lo nuevo
+        runner = BatchRunner(
+            "whisper_transcription",
+            functools.partial(
+                AudioTranscriber,
+                model_size=self.model_size,
+                device=self.device,
+                compute_type=self.compute_type,
+                language=self.language,
+                verbose=self.verbose,
+                latency_budget=self.latency_budget,
+            ),
+            "transcribe_file",
+            self.model_version,
+            workers=workers,
+            use_cache=use_cache,
+            local_processor=self,
+        )
+        results = runner.run(list_audio_files(folder_path, [".wav"]))
+        return {os.path.basename(path): transcript for path, transcript in results.items()}
 
 
 # Ejemplo de uso:
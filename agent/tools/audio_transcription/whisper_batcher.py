@@ -0,0 +1,279 @@
+"""
+Agrupación de transcripciones Whisper entre peticiones concurrentes.
+
+Cada petición aporta sus regiones de voz; las regiones de todas las peticiones
+de un lote se trocean en fragmentos de como máximo 30 s, se colocan una detrás
+de otra en un único buffer y se transcriben con el pipeline por lotes de
+faster-whisper (`BatchedInferencePipeline`) pasando los límites de cada
+fragmento como `clip_timestamps`. Los segmentos resultantes se devuelven a su
+petición con los tiempos referidos al clip original.
+"""
+
+import bisect
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from agent.services.metrics_service import metrics_registry
+
+SAMPLE_RATE = 16000
+# Ventana máxima de Whisper: cada fragmento del lote debe caber en ella
+MAX_CHUNK_SECONDS = 30.0
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def split_regions(regions: Sequence[Tuple[float, float]], max_seconds: float = MAX_CHUNK_SECONDS) -> List[Tuple[float, float]]:
+    """
+    Trocea las regiones más largas que la ventana de Whisper.
+
+    Args:
+        regions: Regiones (inicio, fin) en segundos
+        max_seconds: Duración máxima de cada fragmento
+
+    Returns:
+        Lista de fragmentos (inicio, fin) en segundos
+    """
+    chunks = []
+    for start, end in regions:
+        while end - start > max_seconds:
+            chunks.append((start, start + max_seconds))
+            start += max_seconds
+        if end > start:
+            chunks.append((start, end))
+    return chunks
+
+
+def pack_regions(
+    requests: Sequence[Tuple[np.ndarray, Sequence[Tuple[float, float]]]]
+) -> Tuple[List[np.ndarray], List[int], List[float], List[int]]:
+    """
+    Recorta las regiones de cada clip para colocarlas una detrás de otra.
+
+    Args:
+        requests: Pares (audio, regiones en segundos) de cada petición
+
+    Returns:
+        Fragmentos de audio, índice de la petición de cada fragmento, inicio del
+        fragmento en su clip (segundos) e inicio en el buffer empaquetado (muestras)
+    """
+    pieces, owners, clip_offsets, packed_starts = [], [], [], []
+    packed_offset = 0
+    for index, (audio, regions) in enumerate(requests):
+        for start, end in regions:
+            piece = audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+            if len(piece) == 0:
+                continue
+            pieces.append(piece)
+            owners.append(index)
+            clip_offsets.append(start)
+            packed_starts.append(packed_offset)
+            packed_offset += len(piece)
+    return pieces, owners, clip_offsets, packed_starts
+
+
+def clip_timestamps(packed_starts: Sequence[int], pieces: Sequence[np.ndarray]) -> List[Dict[str, int]]:
+    """
+    Límites de los fragmentos para `BatchedInferencePipeline.transcribe`, que
+    los usa para recortar el buffer: deben ser muestras enteras, no segundos.
+    """
+    return [{"start": int(start), "end": int(start) + len(piece)} for start, piece in zip(packed_starts, pieces)]
+
+
+def locate_chunk(packed_starts: Sequence[int], seconds: float) -> int:
+    """Índice del fragmento que contiene un instante (segundos) del buffer empaquetado."""
+    sample = int(round(seconds * SAMPLE_RATE)) + int(1e-3 * SAMPLE_RATE)
+    return max(0, bisect.bisect_right(packed_starts, sample) - 1)
+
+
+class _TranscriptionRequest:
+    __slots__ = ("audio", "regions", "future", "enqueued_at")
+
+    def __init__(self, audio: np.ndarray, regions: Sequence[Tuple[float, float]]):
+        self.audio = audio
+        self.regions = split_regions(regions)
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class WhisperBatcher:
+    """
+    Cola de transcripciones de un modelo Whisper con agrupación dinámica.
+
+    Las peticiones se acumulan hasta `max_batch_size` o hasta que pasan
+    `max_wait_ms` desde la primera; el lote se transcribe en una sola llamada
+    al pipeline por lotes y cada petición recibe sus segmentos mediante un Future.
+    """
+
+    def __init__(
+        self,
+        model,
+        language: str = "es",
+        tier: str = "",
+        max_batch_size: int = 8,
+        max_wait_ms: float = 50.0,
+        inference_batch_size: int = 8,
+        max_batch_seconds: float = 300.0,
+    ):
+        """
+        Args:
+            model: WhisperModel ya cargado
+            language: Idioma de la transcripción
+            tier: Nivel del modelo (etiqueta de las métricas)
+            max_batch_size: Número máximo de peticiones por lote
+            max_wait_ms: Espera máxima desde la primera petición del lote
+            inference_batch_size: Fragmentos de 30 s que decodifica el pipeline a la vez
+            max_batch_seconds: Duración máxima de audio por lote (memoria)
+        """
+        self.model = model
+        self.language = language
+        self.tier = tier
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.inference_batch_size = inference_batch_size
+        self.max_batch_samples = int(max_batch_seconds * SAMPLE_RATE)
+
+        try:
+            from faster_whisper import BatchedInferencePipeline
+
+            self.pipeline = BatchedInferencePipeline(model=model)
+        except ImportError:
+            # faster-whisper < 1.1: mismo agrupamiento en cola, fragmentos transcritos uno a uno
+            self.pipeline = None
+
+        self._queue: "queue.Queue[Optional[_TranscriptionRequest]]" = queue.Queue()
+        self._carry = None
+
+        self._queue_depth = metrics_registry.gauge(
+            "whisper_batcher_queue_depth", "Transcripciones esperando lote"
+        )
+        self._batch_size = metrics_registry.histogram(
+            "whisper_batcher_batch_size", "Peticiones por lote de Whisper", buckets=BATCH_SIZE_BUCKETS
+        )
+        self._wait_time = metrics_registry.histogram(
+            "whisper_batcher_wait_seconds", "Tiempo en cola hasta la transcripción"
+        )
+        self._batch_time = metrics_registry.histogram(
+            "whisper_batcher_batch_seconds", "Duración de la transcripción por lote"
+        )
+
+        self._thread = threading.Thread(target=self._run, name=f"whisper-batcher-{tier}", daemon=True)
+        self._thread.start()
+
+    def submit(self, audio: np.ndarray, regions: Sequence[Tuple[float, float]]) -> Future:
+        """
+        Encola las regiones de un clip para transcribir.
+
+        Args:
+            audio: PCM float32 mono a 16 kHz del clip completo
+            regions: Regiones (inicio, fin) en segundos a transcribir
+
+        Returns:
+            Future que se resuelve con la lista de segmentos {start, end, text}
+        """
+        request = _TranscriptionRequest(np.asarray(audio, dtype=np.float32), regions)
+        self._queue.put(request)
+        self._queue_depth.set(self._queue.qsize(), tier=self.tier)
+        return request.future
+
+    def transcribe(self, audio: np.ndarray, regions: Sequence[Tuple[float, float]], timeout: float = None) -> List[Dict[str, Any]]:
+        """Versión bloqueante de submit()."""
+        return self.submit(audio, regions).result(timeout=timeout)
+
+    def close(self):
+        """Termina las peticiones en cola y detiene el hilo de trabajo."""
+        self._queue.put(None)
+        self._thread.join(timeout=30)
+
+    def _request_samples(self, request: _TranscriptionRequest) -> int:
+        return sum(int((end - start) * SAMPLE_RATE) for start, end in request.regions)
+
+    def _collect_batch(self) -> Optional[List[_TranscriptionRequest]]:
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        if first is None:
+            return None
+        batch = [first]
+        total_samples = self._request_samples(first)
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # Cierre solicitado: se procesa este lote y el hilo termina en la siguiente vuelta
+                self._queue.put(None)
+                break
+            request_samples = self._request_samples(request)
+            if total_samples + request_samples > self.max_batch_samples:
+                # No cabe: se procesa al principio del siguiente lote
+                self._carry = request
+                break
+            batch.append(request)
+            total_samples += request_samples
+
+        self._queue_depth.set(self._queue.qsize(), tier=self.tier)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+            dispatched_at = time.monotonic()
+            for request in batch:
+                self._wait_time.observe(dispatched_at - request.enqueued_at, tier=self.tier)
+            self._batch_size.observe(len(batch), tier=self.tier)
+
+            try:
+                results = self._transcribe_batch(batch)
+                self._batch_time.observe(time.monotonic() - dispatched_at, tier=self.tier)
+                for request, transcript in zip(batch, results):
+                    request.future.set_result(transcript)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _transcribe_batch(self, batch: List[_TranscriptionRequest]) -> List[List[Dict[str, Any]]]:
+        pieces, owners, clip_offsets, packed_starts = pack_regions(
+            [(request.audio, request.regions) for request in batch]
+        )
+        results: List[List[Dict[str, Any]]] = [[] for _ in batch]
+        if not pieces:
+            return results
+
+        if self.pipeline is None:
+            for piece, owner, clip_offset in zip(pieces, owners, clip_offsets):
+                segments, _ = self.model.transcribe(piece, language=self.language)
+                results[owner].extend(self._segment(segment, clip_offset) for segment in segments)
+            return results
+
+        segments, _ = self.pipeline.transcribe(
+            np.concatenate(pieces),
+            language=self.language,
+            clip_timestamps=clip_timestamps(packed_starts, pieces),
+            vad_filter=False,
+            batch_size=self.inference_batch_size,
+        )
+        for segment in segments:
+            chunk = locate_chunk(packed_starts, segment.start)
+            offset = clip_offsets[chunk] - packed_starts[chunk] / SAMPLE_RATE
+            results[owners[chunk]].append(self._segment(segment, offset))
+        return results
+
+    @staticmethod
+    def _segment(segment, offset: float) -> Dict[str, Any]:
+        return {
+            "start": round(offset + segment.start, 2),
+            "end": round(offset + segment.end, 2),
+            "text": segment.text.strip(),
+        }
@@ -0,0 +1 @@
+# Batch processing tools 
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""
+Ejecutor por lotes compartido para procesar carpetas de audio.
+
+Reparte los archivos en un pool de procesos (un modelo cargado por proceso),
+devuelve los resultados según van terminando y los guarda en una caché en
+disco indexada por el hash del contenido y la versión del modelo. Como cada
+resultado se persiste en cuanto llega, una ejecución interrumpida se reanuda
+simplemente volviendo a lanzarla: los archivos ya procesados salen de la caché.
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import pickle
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from agent.config import BATCH_PROCESSING_CONFIG, get_cache_folder
+except ImportError:
+    BATCH_PROCESSING_CONFIG = {
+        'workers': None,
+        'cache_enabled': False,
+        'cache_folder': 'batch_results',
+        'extensions': ['.wav']
+    }
+    get_cache_folder = None
+
+# Procesador cargado una vez por proceso del pool
+_WORKER_PROCESSOR = None
+
+
+def _init_worker(factory: Callable[[], Any]):
+    global _WORKER_PROCESSOR
+    _WORKER_PROCESSOR = factory()
+
+
+def _process_file(task: Tuple[str, str]) -> Tuple[str, Any, Optional[str]]:
+    method, path = task
+    try:
+        return path, getattr(_WORKER_PROCESSOR, method)(path), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def list_audio_files(folder: str, extensions: Iterable[str] = None) -> List[str]:
+    """
+    Archivos de audio de una carpeta en orden alfabético.
+
+    Args:
+        folder: Carpeta a recorrer
+        extensions: Extensiones aceptadas (por defecto las de la configuración)
+
+    Returns:
+        Lista de rutas completas
+    """
+    extensions = tuple(extensions or BATCH_PROCESSING_CONFIG['extensions'])
+    if not os.path.isdir(folder):
+        return []
+    return [
+        os.path.join(folder, name)
+        for name in sorted(os.listdir(folder))
+        if name.lower().endswith(extensions)
+    ]
+
+
+def file_content_hash(path: str) -> str:
+    """sha256 del contenido de un archivo."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BatchRunner:
+    """
+    Procesa una lista de archivos con un método de un procesador (analizador,
+    transcriptor, diarizador) en paralelo y con caché de resultados.
+    """
+
+    def __init__(
+        self,
+        task_name: str,
+        factory: Callable[[], Any],
+        method: str,
+        model_version: str,
+        workers: Optional[int] = None,
+        use_cache: Optional[bool] = None,
+        cache_dir: Optional[str] = None,
+        local_processor: Any = None,
+    ):
+        """
+        Args:
+            task_name: Nombre de la tarea (separa las cachés entre herramientas)
+            factory: Callable serializable que construye el procesador en cada proceso
+            method: Método del procesador que recibe la ruta del archivo
+            model_version: Versión del modelo y su configuración; forma parte de la clave
+            workers: Procesos del pool (por defecto los de la configuración o los núcleos)
+            use_cache: Usar la caché en disco (por defecto según la configuración)
+            cache_dir: Carpeta de la caché (por defecto la de la configuración)
+            local_processor: Procesador ya cargado en este proceso; se usa en lugar del
+                pool cuando solo hay un worker o un único archivo pendiente
+        """
+        self.logger = logging.getLogger(__name__)
+        self.task_name = task_name
+        self.factory = factory
+        self.method = method
+        self.model_version = model_version
+        self.workers = workers or BATCH_PROCESSING_CONFIG['workers'] or os.cpu_count() or 1
+        self.use_cache = BATCH_PROCESSING_CONFIG['cache_enabled'] if use_cache is None else use_cache
+        if cache_dir is None and get_cache_folder is not None:
+            cache_dir = os.path.join(get_cache_folder(), BATCH_PROCESSING_CONFIG['cache_folder'])
+        self.cache_dir = os.path.join(cache_dir, task_name) if cache_dir else None
+        self.local_processor = local_processor
+        self.errors: Dict[str, str] = {}
+
+    def run(self, files: Iterable[str]) -> Dict[str, Any]:
+        """
+        Procesa todos los archivos y devuelve los resultados en el orden de entrada.
+
+        Args:
+            files: Rutas de los archivos
+
+        Returns:
+            Dict ruta -> resultado (los archivos con error no aparecen; ver self.errors)
+        """
+        files = list(files)
+        results = dict(self.iter_results(files))
+        return {path: results[path] for path in files if path in results}
+
+    def iter_results(self, files: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+        """
+        Procesa los archivos y devuelve (ruta, resultado) según van terminando.
+        Primero salen los que ya estaban en caché.
+
+        Args:
+            files: Rutas de los archivos
+
+        Yields:
+            Tuplas (ruta, resultado)
+        """
+        self.errors = {}
+        pending: Dict[str, str] = {}
+        for path in files:
+            key = self._cache_key(path) if self.use_cache and self.cache_dir else None
+            cached = self._read_cache(key)
+            if cached is not None:
+                yield path, cached[0]
+                continue
+            pending[path] = key
+
+        if not pending:
+            return
+
+        self.logger.info(f"[{self.task_name}] {len(pending)} archivos pendientes con {self._effective_workers(pending)} procesos")
+
+        for path, result, error in self._execute(list(pending)):
+            if error is not None:
+                self.logger.error(f"[{self.task_name}] Error procesando {path}: {error}")
+                self.errors[path] = error
+                continue
+            self._write_cache(pending[path], result)
+            yield path, result
+
+    def _effective_workers(self, pending: Dict[str, str]) -> int:
+        return max(1, min(self.workers, len(pending)))
+
+    def _execute(self, paths: List[str]) -> Iterator[Tuple[str, Any, Optional[str]]]:
+        workers = min(self.workers, len(paths))
+        if workers <= 1:
+            processor = self.local_processor if self.local_processor is not None else self.factory()
+            method = getattr(processor, self.method)
+            for path in paths:
+                try:
+                    yield path, method(path), None
+                except Exception as e:
+                    yield path, None, str(e)
+            return
+
+        # spawn: TensorFlow/CTranslate2/torch no son seguros tras un fork
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=_init_worker, initargs=(self.factory,)) as pool:
+            yield from pool.imap_unordered(_process_file, [(self.method, path) for path in paths])
+
+    def _cache_key(self, path: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(self.model_version.encode('utf-8'))
+        digest.update(self.method.encode('utf-8'))
+        digest.update(file_content_hash(path).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pkl")
+
+    def _read_cache(self, key: Optional[str]) -> Optional[Tuple[Any]]:
+        if key is None:
+            return None
+        path = self._cache_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return (pickle.load(f),)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            self.logger.warning(f"[{self.task_name}] Entrada de caché corrupta {path}: {e}")
+            return None
+
+    def _write_cache(self, key: Optional[str], result: Any):
+        if key is None:
+            return
+        path = self._cache_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Escritura atómica: una interrupción nunca deja una entrada a medias
+        os.replace(temp_path, path)
@@ -0,0 +1,113 @@
+"""
+Alineación de turnos de hablante con segmentos de transcripción.
+
+Los turnos se indexan una vez ordenados por inicio junto con el máximo fin
+acumulado, de modo que para cada segmento se localizan con búsqueda binaria
+los turnos que lo solapan: O((n + m) log n) para n turnos y m segmentos
+cuando cada segmento solapa un número acotado de turnos.
+"""
+
+import bisect
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+Turn = Tuple[float, float, str]
+
+
+class SpeakerTurnIndex:
+    """Índice de intervalos sobre los turnos de hablante de la diarización."""
+
+    def __init__(self, turns: Sequence[Turn]):
+        """
+        Args:
+            turns: Turnos (inicio, fin, hablante) en segundos, en cualquier orden
+        """
+        self.turns = sorted(turns, key=lambda turn: turn[0])
+        self.starts = [turn[0] for turn in self.turns]
+        # max_end[i]: mayor fin entre los turnos 0..i (acota la búsqueda hacia atrás)
+        # y max_end_turn[i] el turno que lo alcanza
+        self.max_end = []
+        self.max_end_turn = []
+        running, running_turn = float("-inf"), None
+        for turn in self.turns:
+            if turn[1] > running:
+                running, running_turn = turn[1], turn
+            self.max_end.append(running)
+            self.max_end_turn.append(running_turn)
+
+    def overlapping(self, start: float, end: float) -> List[Turn]:
+        """
+        Turnos que solapan el intervalo [start, end).
+
+        Args:
+            start: Inicio en segundos
+            end: Fin en segundos
+
+        Returns:
+            Lista de turnos (inicio, fin, hablante)
+        """
+        index = bisect.bisect_left(self.starts, end) - 1
+        found = []
+        while index >= 0 and self.max_end[index] > start:
+            turn = self.turns[index]
+            if turn[1] > start:
+                found.append(turn)
+            index -= 1
+        return found
+
+    def nearest(self, start: float, end: float, max_gap: float) -> Optional[Turn]:
+        """
+        Turno más cercano a un intervalo que no solapa ninguno.
+
+        Args:
+            start: Inicio en segundos
+            end: Fin en segundos
+            max_gap: Distancia máxima en segundos
+
+        Returns:
+            Turno más cercano o None si está más lejos de max_gap
+        """
+        index = bisect.bisect_left(self.starts, end)
+        candidates = []
+        if index < len(self.turns):
+            candidates.append((self.turns[index][0] - end, self.turns[index]))
+        if index > 0:
+            # Sin solape, el turno anterior más cercano es el de mayor fin
+            candidates.append((start - self.max_end[index - 1], self.max_end_turn[index - 1]))
+        candidates = [(gap, turn) for gap, turn in candidates if gap <= max_gap]
+        return min(candidates, key=lambda item: item[0])[1] if candidates else None
+
+
+def align_speakers(
+    transcript: Sequence[Dict[str, Any]],
+    turns: Sequence[Turn],
+    max_gap: float = 1.0,
+    unknown_speaker: str = "UNKNOWN",
+) -> List[Dict[str, Any]]:
+    """
+    Asigna a cada segmento el hablante con más tiempo de solape.
+
+    Args:
+        transcript: Segmentos {start, end, text} de Whisper
+        turns: Turnos (inicio, fin, hablante) de la diarización
+        max_gap: Distancia máxima al turno más cercano si el segmento no solapa ninguno
+        unknown_speaker: Etiqueta cuando no hay turno aplicable
+
+    Returns:
+        Lista de segmentos {start, end, speaker, text}
+    """
+    index = SpeakerTurnIndex(turns)
+    aligned = []
+    for segment in transcript:
+        start, end = segment["start"], segment["end"]
+        overlap: Dict[str, float] = {}
+        for turn_start, turn_end, speaker in index.overlapping(start, end):
+            overlap[speaker] = overlap.get(speaker, 0.0) + min(end, turn_end) - max(start, turn_start)
+
+        if overlap:
+            speaker = max(overlap, key=overlap.get)
+        else:
+            nearest = index.nearest(start, end, max_gap)
+            speaker = nearest[2] if nearest else unknown_speaker
+
+        aligned.append({"start": start, "end": end, "speaker": speaker, "text": segment["text"]})
+    return aligned
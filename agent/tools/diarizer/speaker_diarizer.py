@@ -1,26 +1,51 @@
 import os
+import time
+import logging
+import functools
+import numpy as np
 from pyannote.audio import Pipeline
 
+from agent.config import DIARIZATION_CONFIG
+from agent.tools.batch_processing.batch_runner import BatchRunner, list_audio_files
+from agent.services.metrics_service import metrics_registry
+
+SAMPLE_RATE = 16000
+
 
 class SpeakerDiarizer:
     def __init__(
         self,
-        audio_folder: str,
-        model_name: str = "pyannote/speaker-diarization-3.1",
+        audio_folder: str = None,
+        model_name: str = None,
         verbose: bool = False,
     ):
+        self.logger = logging.getLogger(__name__)
         self.audio_folder = audio_folder
         self.verbose = verbose
-        self.pipeline = Pipeline.from_pretrained(model_name)
+        self.model_name = model_name or DIARIZATION_CONFIG['model_name']
+        self.pipeline = Pipeline.from_pretrained(self.model_name)
+        self._latency = metrics_registry.histogram(
+            "diarization_seconds", "Duración de la diarización por clip"
+        )
 
-    def process_audio_files(self):
-        results = {}
-        for file in os.listdir(self.audio_folder):
-            if file.endswith(".wav"):
-                audio_path = os.path.join(self.audio_folder, file)
-                segments = self.extract_segments(audio_path)
-                results[file] = segments
-        return results
+    def process_audio_files(self, workers: int = None, use_cache: bool = None):
+        # Pool de procesos + caché por hash de contenido: las re-ejecuciones solo diarizan lo nuevo
+        runner = BatchRunner(
+            "speaker_diarization",
+            functools.partial(
+                SpeakerDiarizer,
+                audio_folder=self.audio_folder,
+                model_name=self.model_name,
+                verbose=self.verbose,
+            ),
+            "extract_segments",
+            f"pyannote:{self.model_name}",
+            workers=workers,
+            use_cache=use_cache,
+            local_processor=self,
+        )
+        results = runner.run(list_audio_files(self.audio_folder, [".wav"]))
+        return {os.path.basename(path): segments for path, segments in results.items()}
 
     def extract_segments(self, audio_path: str, verbose: bool = None):
         diarization = self.pipeline(audio_path)
@@ -41,7 +66,64 @@ class SpeakerDiarizer:
 
         return segments
 
+    def diarize_audio(self, audio: np.ndarray, speech_intervals=None):
+        """
+        Diariza una forma de onda en memoria, solo sobre las regiones con voz.
+
+        Las regiones se concatenan (separadas por un breve silencio) y se
+        diarizan en una sola pasada para que las etiquetas de hablante sean
+        coherentes entre regiones; los turnos se devuelven con tiempos sobre
+        el clip original.
+
+        Args:
+            audio: PCM float32 mono a 16 kHz
+            speech_intervals: Regiones (inicio, fin) en segundos; None = clip entero
+
+        Returns:
+            Lista de turnos (inicio, fin, hablante)
+        """
+        import torch
+
+        duration = len(audio) / SAMPLE_RATE
+        regions = [(max(0.0, start), min(duration, end)) for start, end in (speech_intervals or [(0.0, duration)])]
+        regions = [(start, end) for start, end in regions if end > start]
+        if not regions:
+            return []
+
+        # Buffer con las regiones y un hueco de silencio entre ellas; offsets para volver al clip
+        gap = np.zeros(int(DIARIZATION_CONFIG['region_gap_seconds'] * SAMPLE_RATE), dtype=np.float32)
+        pieces, mapping, packed_offset = [], [], 0.0
+        for start, end in regions:
+            piece = np.asarray(audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)], dtype=np.float32)
+            mapping.append((packed_offset, packed_offset + len(piece) / SAMPLE_RATE, start))
+            pieces.extend([piece, gap])
+            packed_offset += (len(piece) + len(gap)) / SAMPLE_RATE
+        packed = np.concatenate(pieces[:-1])
+
+        started = time.perf_counter()
+        diarization = self.pipeline({"waveform": torch.from_numpy(packed)[None], "sample_rate": SAMPLE_RATE})
+        self._latency.observe(time.perf_counter() - started)
+
+        turns = []
+        for turn, _, speaker in diarization.itertracks(yield_label=True):
+            # Un turno puede cruzar el hueco entre regiones: se recorta a cada región
+            for packed_start, packed_end, clip_start in mapping:
+                overlap_start, overlap_end = max(turn.start, packed_start), min(turn.end, packed_end)
+                if overlap_end > overlap_start:
+                    turns.append((
+                        round(clip_start + overlap_start - packed_start, 3),
+                        round(clip_start + overlap_end - packed_start, 3),
+                        speaker,
+                    ))
+        turns.sort()
+        return turns
+
+    def close(self):
+        """Libera el pipeline de pyannote."""
+        self.pipeline = None
+
 
 # Ejemplo de uso:
 # diarizer = SpeakerDiarizer(audio_folder="audio_fragments", verbose=True)
 # resultados = diarizer.process_audio_files()
+# turnos = diarizer.diarize_audio(forma_de_onda_16k, speech_intervals=[(1.0, 4.5), (7.2, 9.0)])
@@ -0,0 +1,33 @@
+"""
+Bloqueo de archivos entre procesos.
+
+Lo usan los almacenes en disco que varios workers modifican a la vez
+(segmentos de audio conservado, clasificadores personalizados por usuario).
+"""
+
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def file_lock(path: str):
+    """Bloqueo exclusivo entre procesos (fcntl en POSIX, msvcrt en Windows)."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
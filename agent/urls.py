@@ -1,10 +1,20 @@
 from django.urls import path, include
 from .views import (
     process_audio,
+    process_audio_async,
+    process_audio_batch,
+    upload_sessions_view,
+    upload_session_view,
+    upload_session_chunk,
+    upload_session_complete,
     get_audio,
     health_check,
+    metrics,
+    transcription_job,
+    transcription_job_stream,
     process_audio_legacy,
     AgentView,
+    CustomSoundView,
 )
 from rest_framework.routers import DefaultRouter
 from .views import DetectedSoundViewSet
@@ -15,10 +25,20 @@ router.register(r'detected-sounds', DetectedSoundViewSet)
 urlpatterns = [
     # Endpoints personalizados
     path("process-audio/", process_audio, name="process_audio"),
+    path("process-audio-async/", process_audio_async, name="process_audio_async"),
+    path("process-audio-batch/", process_audio_batch, name="process_audio_batch"),
+    path("upload-sessions/", upload_sessions_view, name="upload_sessions"),
+    path("upload-sessions/<str:session_id>/", upload_session_view, name="upload_session"),
+    path("upload-sessions/<str:session_id>/chunks/", upload_session_chunk, name="upload_session_chunk"),
+    path("upload-sessions/<str:session_id>/complete/", upload_session_complete, name="upload_session_complete"),
     path("audio/<str:audio_id>/", get_audio, name="get_audio"),
     path("health/", health_check, name="health_check"),
+    path("metrics/", metrics, name="metrics"),
+    path("transcription-jobs/<str:job_id>/", transcription_job, name="transcription_job"),
+    path("transcription-jobs/<str:job_id>/stream/", transcription_job_stream, name="transcription_job_stream"),
     path("process-audio-legacy/", process_audio_legacy, name="process_audio_legacy"),
     path("text_generation/", AgentView.as_view(), name="text_generation"),
+    path("custom-sounds/", CustomSoundView.as_view(), name="custom_sounds"),
     # Endpoints REST automáticos
     *router.urls,
 ]
\ No newline at end of file
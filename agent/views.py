@@ -6,42 +6,62 @@ Proporciona endpoints para procesamiento de audio y transcripción.
 import logging
 import json
 import soundfile as sf
-import os
-import uuid
 import time
-from datetime import datetime, timedelta
-from django.http import JsonResponse, FileResponse
+from datetime import datetime
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from langchain_core.messages import HumanMessage
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.views import APIView
 import dotenv
 from rest_framework import viewsets
 from .models import DetectedSound
 from .serializers import DetectedSoundSerializer
 from core.models import SoundCategory, SoundType
+from core.permissions import HasMetricsScrapeToken
 import numpy as np
 from .logic.agent_manager import AgentManager
 from .providers.text_generation.text_generator_manager import text_generator_manager
+from .services.metrics_service import metrics_registry
+from .renderers import PrometheusTextRenderer, AudioFileRenderer
+from .services.transcription_job_service import transcription_jobs, PENDING
+from .services.upload_session_service import upload_sessions, UploadSessionConflict
+from .services.audio_archive_service import (
+    audio_archive,
+    content_type_for,
+    etag_matches,
+    parse_range,
+    ENCODABLE_FORMATS,
+)
+from .services.audio_registry_service import audio_registry
+from .services.batch_upload_service import (
+    batch_fragments,
+    is_critical_category,
+    normalize_sound_type_name,
+    persist_batch_detections,
+)
+from .config import (
+    TRANSCRIPTION_JOBS_CONFIG,
+    AUDIO_INGESTION_CONFIG,
+    AUDIO_RETENTION_CONFIG,
+    CUSTOM_SOUND_HEADS_CONFIG,
+)
+from .tools.audio_decoding.audio_decoder import TARGET_SAMPLE_RATE as SAMPLE_RATE
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
-# Almacenamiento temporal de audios procesados (en producción usar base de datos)
-processed_audios = {}
-
-
 AGENT_MANAGER = AgentManager()
 
 
-def normalize_sound_type_name(name):
-    return name.strip().lower().replace(" ", "_")
-
-
 class AgentView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -73,44 +93,221 @@ class AgentView(APIView):
             )
 
 
-def cleanup_old_audios():
+ALLOWED_AUDIO_TYPES = [
+    "audio/wav",
+    "audio/mp3",
+    "audio/mpeg",
+    "audio/ogg",
+    "audio/x-wav",
+    "audio/wave",
+]
+
+
+def _validate_audio_upload(files):
     """
-    Limpia archivos de audio antiguos (más de 1 hora).
+    Valida el archivo de audio de una subida.
+
+    Args:
+        files: request.FILES
+
+    Returns:
+        Tupla (audio_file, error): error es None si el archivo es válido
     """
-    try:
-        current_time = time.time()
-        max_age = 3600  # 1 hora en segundos
-        to_delete = []
-
-        for audio_id, audio_info in processed_audios.items():
-            # Verificar si el archivo existe y es antiguo
-            if os.path.exists(audio_info["audio_path"]):
-                file_age = current_time - os.path.getmtime(audio_info["audio_path"])
-                if file_age > max_age:
-                    to_delete.append(audio_id)
-                    try:
-                        os.unlink(audio_info["audio_path"])
-                        logger.info(
-                            f"Archivo antiguo eliminado: {audio_info['audio_path']}"
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"Error eliminando archivo {audio_info['audio_path']}: {e}"
-                        )
-            else:
-                # El archivo no existe, eliminar de la lista
-                to_delete.append(audio_id)
+    logger.info(f"FILES keys: {list(files.keys())}")
+
+    # Verificar que se envió un archivo de audio
+    if "audio" not in files:
+        logger.error("No se recibió archivo de audio")
+        logger.error(f"Archivos recibidos: {list(files.keys())}")
+        return None, "Se requiere un archivo de audio"
+
+    audio_file = files["audio"]
+    logger.info(f"Archivo de audio recibido: {audio_file.name}")
+    logger.info(f"Tamaño del archivo: {audio_file.size} bytes")
+    logger.info(f"Content-Type del archivo: {audio_file.content_type}")
+
+    # Validar tipo de archivo
+    file_content_type = audio_file.content_type.lower()
+
+    # Verificar si el tipo está permitido directamente
+    if file_content_type not in ALLOWED_AUDIO_TYPES:
+        # Verificar si es un archivo WAV por extensión
+        if audio_file.name.lower().endswith(".wav"):
+            logger.info(
+                f"Archivo WAV detectado por extensión, Content-Type: {file_content_type}"
+            )
+        else:
+            logger.error(f"Tipo de archivo no soportado: {file_content_type}")
+            return None, f"Tipo de archivo no soportado. Tipos permitidos: {', '.join(ALLOWED_AUDIO_TYPES)}"
 
-        # Eliminar entradas de la memoria
-        for audio_id in to_delete:
-            del processed_audios[audio_id]
-            logger.info(f"Entrada eliminada de processed_audios: {audio_id}")
+    # Verificar que el archivo no esté vacío
+    if audio_file.size == 0:
+        logger.error("Archivo de audio vacío")
+        return None, "El archivo de audio está vacío"
 
-        if to_delete:
-            logger.info(f"Limpieza completada: {len(to_delete)} archivos eliminados")
+    logger.info(
+        f"Archivo de audio válido: {audio_file.name} ({audio_file.size} bytes)"
+    )
+    return audio_file, None
 
-    except Exception as e:
-        logger.error(f"Error en limpieza de archivos: {e}")
+
+def _transcription_mode(data, query_params):
+    """
+    Modo de transcripción pedido (sync o async).
+
+    Returns:
+        str: Modo, o None si el valor no es válido
+    """
+    transcription_mode = (
+        data.get("transcription_mode")
+        or query_params.get("transcription_mode")
+        or TRANSCRIPTION_JOBS_CONFIG["default_mode"]
+    )
+    return transcription_mode if transcription_mode in ("sync", "async") else None
+
+
+def _retain_audio(data, query_params):
+    """
+    Indica si se pidió conservar el audio en disco para get_audio.
+
+    Returns:
+        bool: retain_audio de la petición o el valor por defecto configurado
+    """
+    value = data.get("retain_audio") or query_params.get("retain_audio")
+    if value in (None, ""):
+        return AUDIO_INGESTION_CONFIG["retain_audio_default"]
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def _build_process_audio_response(user, final_state):
+    """
+    Registra el audio procesado, guarda el DetectedSound si el sonido es
+    relevante y construye la respuesta de process_audio.
+
+    Args:
+        user: Usuario autenticado
+        final_state: Estado final del workflow
+
+    Returns:
+        dict: Cuerpo de la respuesta
+    """
+    # Solo los audios conservados en el almacén se pueden reproducir con get_audio
+    audio_id = None
+    audio_path = final_state.get("audio_path", "")
+    if audio_path:
+        # Registro compartido: cualquier proceso puede servir el audio
+        audio_id = audio_registry.register(
+            user.id, audio_path, sound_type=final_state.get("sound_type", "Unknown")
+        )
+
+    # Guardar DetectedSound en la base de datos si el sonido es relevante
+    sound_type = final_state.get("sound_type", "Unknown")
+    alert_category = final_state.get("alert_category", "unknown")
+    confidence = final_state.get("confidence", 0.0)
+    transcription = final_state.get("transcription", "")
+    transcription_status = final_state.get("transcription_status", "")
+    transcription_job_id = final_state.get("transcription_job_id")
+
+    # Inicializar variables para el label en español
+    sound_type_label = "Desconocido"  # Valor por defecto
+    sound_type_obj = None
+
+    if sound_type.lower() != "unknown":
+        import traceback
+
+        logger.debug(
+            f"Intentando guardar DetectedSound: sound_type={sound_type}, alert_category={alert_category}, confidence={confidence}, transcription={transcription}"
+        )
+
+        try:
+            category_obj = SoundCategory.objects.get(name=alert_category)
+            normalized_name = normalize_sound_type_name(sound_type)
+            # Buscar el SoundType por nombre normalizado
+            try:
+                sound_type_obj = SoundType.objects.get(name=normalized_name)
+                sound_type_label = (
+                    sound_type_obj.label
+                )  # Obtener el label en español
+            except SoundType.DoesNotExist:
+                # Si no existe, crear uno nuevo SOLO para pruebas/desarrollo
+                sound_type_obj = SoundType.objects.create(
+                    name=normalized_name,
+                    label=sound_type,  # Si no hay label en español, usar el detectado
+                    description=f"Sonido detectado: {sound_type}",
+                    is_critical=is_critical_category(alert_category),
+                )
+                sound_type_label = sound_type_obj.label
+            try:
+                ds = DetectedSound.objects.create(
+                    user=user,
+                    sound_type=sound_type_obj,
+                    category=category_obj,
+                    confidence=confidence,
+                    transcription=transcription,
+                    transcription_status=transcription_status,
+                    transcription_job_id=transcription_job_id,
+                )
+                logger.info(f"DetectedSound guardado correctamente: {ds}")
+                if transcription_status == PENDING:
+                    # El trabajo actualizará esta fila cuando Whisper termine
+                    transcription_jobs.attach(transcription_job_id, ds.id)
+            except Exception as e:
+                logger.error(
+                    f"Error al guardar DetectedSound: {e}\n{traceback.format_exc()}"
+                )
+        except SoundCategory.DoesNotExist:
+            logger.warning(
+                f"No se encontró la categoría '{alert_category}' para el sonido detectado. No se guardó DetectedSound."
+            )
+        except Exception as e:
+            logger.error(
+                f"Error inesperado al buscar categoría o guardar DetectedSound: {e}\n{traceback.format_exc()}"
+            )
+
+    # Preparar respuesta - solo incluir mensajes únicos y relevantes
+    messages = final_state.get("messages", [])
+    unique_messages = []
+    seen_contents = set()
+
+    for msg in messages:
+        if msg.content not in seen_contents:
+            unique_messages.append(msg)
+            seen_contents.add(msg.content)
+
+    response_data = {
+        "success": True,
+        "user_id": user.id,
+        "audio_id": audio_id,
+        "sound_type": final_state.get("sound_type", "Unknown"),
+        "sound_type_label": sound_type_label,  # <-- SIEMPRE INCLUIR EL LABEL EN ESPAÑOL
+        "confidence": final_state.get("confidence", 0.0),
+        "alert_category": final_state.get("alert_category", "unknown"),
+        "is_conversation_detected": final_state.get(
+            "is_conversation_detected", False
+        ),
+        "transcription": final_state.get("transcription", ""),
+        "transcription_status": transcription_status,
+        "transcription_job_id": transcription_job_id,
+        "sound_detections": final_state.get("sound_detections", []),
+        "detections_by_category": final_state.get("detections_by_category", {}),
+        "sound_events": final_state.get("sound_events", []),
+        "cached": final_state.get("cache_hit", False),
+        "stage_timings": final_state.get("stage_timings", {}),
+        "messages": [
+            {
+                "type": "system" if "ERROR" in msg.content else "info",
+                "content": msg.content,
+            }
+            for msg in unique_messages
+        ],
+    }
+
+    logger.info(
+        f"Procesamiento completado: {response_data['sound_type']} (confianza: {response_data['confidence']:.2f})"
+    )
+    logger.info(f"Audio ID generado: {audio_id}")
+
+    return response_data
 
 
 @api_view(["POST"])
@@ -124,7 +321,13 @@ def process_audio(request):
     - Transcripción (si es conversación)
     - Nivel de confianza
     - Mensajes del sistema
-    - ID del audio para reproducir
+    - ID del audio para reproducir (solo si se conserva: `retain_audio=true`,
+      por defecto según AUDIO_INGESTION_CONFIG; si no, el audio no toca el disco)
+
+    Con `transcription_mode=async` la respuesta sale tras el análisis con
+    `transcription_status: pending` y un `transcription_job_id`; la
+    transcripción se consulta en transcription-jobs/<job_id>/ (o por SSE en
+    transcription-jobs/<job_id>/stream/) y se guarda en el DetectedSound.
 
     Args:
         request: Request HTTP con archivo de audio
@@ -137,183 +340,393 @@ def process_audio(request):
         logger.info(f"Usuario: {request.user.id}")
         logger.info(f"Método: {request.method}")
         logger.info(f"Content-Type: {request.content_type}")
-        logger.info(f"FILES keys: {list(request.FILES.keys())}")
 
-        # Verificar que se envió un archivo de audio
-        if "audio" not in request.FILES:
-            logger.error("No se recibió archivo de audio")
-            logger.error(f"Archivos recibidos: {list(request.FILES.keys())}")
+        audio_file, error = _validate_audio_upload(request.FILES)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        transcription_mode = _transcription_mode(request.data, request.query_params)
+        if transcription_mode is None:
             return Response(
-                {"error": "Se requiere un archivo de audio"},
+                {"error": "transcription_mode debe ser 'sync' o 'async'"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        audio_file = request.FILES["audio"]
-        logger.info(f"Archivo de audio recibido: {audio_file.name}")
-        logger.info(f"Tamaño del archivo: {audio_file.size} bytes")
-        logger.info(f"Content-Type del archivo: {audio_file.content_type}")
-
-        # Validar tipo de archivo
-        allowed_types = [
-            "audio/wav",
-            "audio/mp3",
-            "audio/mpeg",
-            "audio/ogg",
-            "audio/x-wav",
-            "audio/wave",
-        ]
-        file_content_type = audio_file.content_type.lower()
-
-        # Verificar si el tipo está permitido directamente
-        if file_content_type not in allowed_types:
-            # Verificar si es un archivo WAV por extensión
-            if audio_file.name.lower().endswith(".wav"):
-                logger.info(
-                    f"Archivo WAV detectado por extensión, Content-Type: {file_content_type}"
-                )
-            else:
-                logger.error(f"Tipo de archivo no soportado: {file_content_type}")
-                return Response(
-                    {
-                        "error": f"Tipo de archivo no soportado. Tipos permitidos: {', '.join(allowed_types)}"
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        # final_state = SOUND_DETECTOR_AGENT.execute(user_input=None, audio_path=audio_file.name, audio_file=audio_file)
+        final_state = AGENT_MANAGER.execute_agent(
+            agent_name="sound_detector",
+            user_input=None,
+            audio_path=audio_file.name,
+            audio_file=audio_file,
+            user_id=request.user.id,
+            transcription_mode=transcription_mode,
+            retain_audio=_retain_audio(request.data, request.query_params),
+        )
 
-        # Verificar que el archivo no esté vacío
-        if audio_file.size == 0:
-            logger.error("Archivo de audio vacío")
-            return Response(
-                {"error": "El archivo de audio está vacío"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        response_data = _build_process_audio_response(request.user, final_state)
+        return Response(response_data, status=status.HTTP_200_OK)
 
-        logger.info(
-            f"Archivo de audio válido: {audio_file.name} ({audio_file.size} bytes)"
+    except Exception as e:
+        logger.error(f"Error en procesamiento de audio: {e}")
+        logger.exception("Traceback completo:")
+        return Response(
+            {"error": "Error interno del servidor", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
-        # final_state = SOUND_DETECTOR_AGENT.execute(user_input=None, audio_path=audio_file.name, audio_file=audio_file)
-        final_state = AGENT_MANAGER.execute_agent(
+
+@csrf_exempt
+async def process_audio_async(request):
+    """
+    Versión asíncrona de process_audio para despliegues ASGI.
+
+    El workflow se ejecuta con ainvoke: la inferencia va al pool acotado de
+    hilos y el bucle de eventos sigue atendiendo otras subidas mientras tanto,
+    sin ocupar un hilo por petición. Misma entrada y misma respuesta que
+    process_audio (autenticación JWT en la cabecera Authorization).
+
+    Args:
+        request: Request HTTP con archivo de audio
+
+    Returns:
+        JsonResponse: JSON con resultados del procesamiento
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Método no permitido"}, status=405)
+
+    try:
+        user = await sync_to_async(_authenticate_jwt)(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({"error": str(e.detail)}, status=401)
+    if user is None:
+        return JsonResponse(
+            {"error": "Las credenciales de autenticación no se proveyeron."}, status=401
+        )
+
+    try:
+        logger.info("Iniciando procesamiento de audio (async)")
+        logger.info(f"Usuario: {user.id}")
+
+        # El parseo del multipart es bloqueante: se hace fuera del bucle de eventos
+        files = await sync_to_async(lambda: request.FILES)()
+        audio_file, error = _validate_audio_upload(files)
+        if error:
+            return JsonResponse({"error": error}, status=400)
+
+        transcription_mode = _transcription_mode(request.POST, request.GET)
+        if transcription_mode is None:
+            return JsonResponse(
+                {"error": "transcription_mode debe ser 'sync' o 'async'"}, status=400
+            )
+
+        final_state = await AGENT_MANAGER.aexecute_agent(
             agent_name="sound_detector",
             user_input=None,
             audio_path=audio_file.name,
             audio_file=audio_file,
+            user_id=user.id,
+            transcription_mode=transcription_mode,
+            retain_audio=_retain_audio(request.POST, request.GET),
         )
-        # Generar ID único para el audio
-        audio_id = str(uuid.uuid4())
 
-        # Guardar información del audio procesado
-        processed_audios[audio_id] = {
-            "user_id": request.user.id,
-            "audio_path": final_state.get("audio_path", ""),
-            "timestamp": final_state.get("timestamp", ""),
-            "sound_type": final_state.get("sound_type", "Unknown"),
-        }
+        # Acceso a la base de datos: fuera del bucle de eventos
+        response_data = await sync_to_async(_build_process_audio_response)(user, final_state)
+        return JsonResponse(response_data, status=200)
+
+    except Exception as e:
+        logger.error(f"Error en procesamiento de audio (async): {e}")
+        logger.exception("Traceback completo:")
+        return JsonResponse(
+            {"error": "Error interno del servidor", "details": str(e)}, status=500
+        )
 
-        # Guardar DetectedSound en la base de datos si el sonido es relevante
-        sound_type = final_state.get("sound_type", "Unknown")
-        alert_category = final_state.get("alert_category", "unknown")
-        confidence = final_state.get("confidence", 0.0)
-        transcription = final_state.get("transcription", "")
-        raw_data = final_state.get("sound_detections", [])
-        audio_path = final_state.get("audio_path", "")
 
-        # Inicializar variables para el label en español
-        sound_type_label = "Desconocido"  # Valor por defecto
-        sound_type_obj = None
+def _authenticate_jwt(request):
+    """Usuario del token JWT de la cabecera Authorization, o None si no hay token."""
+    result = JWTAuthentication().authenticate(request)
+    return result[0] if result else None
 
-        if sound_type.lower() != "unknown":
-            import traceback
 
-            logger.debug(
-                f"Intentando guardar DetectedSound: sound_type={sound_type}, alert_category={alert_category}, confidence={confidence}, transcription={transcription}"
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def process_audio_batch(request):
+    """
+    Endpoint para procesar varios fragmentos de audio en una sola petición.
+
+    Acepta varios archivos en el campo `audio` (p. ej. fragmentos de 3 s
+    grabados de forma continua) o un único archivo con `boundaries`. Todos
+    los fragmentos pasan por una sola pasada empaquetada de YAMNet, los que
+    tienen voz se transcriben juntos (o como trabajos diferidos con
+    `transcription_mode=async`) y las detecciones se guardan con bulk_create.
+
+    Args:
+        request: Request HTTP con los archivos de audio
+
+    Returns:
+        Response: JSON con el resultado de cada fragmento, en orden
+    """
+    try:
+        logger.info(f"Iniciando procesamiento por lotes (usuario {request.user.id})")
+
+        transcription_mode = _transcription_mode(request.data, request.query_params)
+        if transcription_mode is None:
+            return Response(
+                {"error": "transcription_mode debe ser 'sync' o 'async'"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-            try:
-                category_obj = SoundCategory.objects.get(name=alert_category)
-                normalized_name = normalize_sound_type_name(sound_type)
-                # Buscar el SoundType por nombre normalizado
-                try:
-                    sound_type_obj = SoundType.objects.get(name=normalized_name)
-                    sound_type_label = (
-                        sound_type_obj.label
-                    )  # Obtener el label en español
-                except SoundType.DoesNotExist:
-                    # Si no existe, crear uno nuevo SOLO para pruebas/desarrollo
-                    sound_type_obj = SoundType.objects.create(
-                        name=normalized_name,
-                        label=sound_type,  # Si no hay label en español, usar el detectado
-                        description=f"Sonido detectado: {sound_type}",
-                        is_critical=alert_category
-                        in ["siren", "car_horn", "gun_shot", "glass_breaking"],
-                    )
-                    sound_type_label = sound_type_obj.label
-                try:
-                    ds = DetectedSound.objects.create(
-                        user=request.user,
-                        sound_type=sound_type_obj,
-                        category=category_obj,
-                        confidence=confidence,
-                        transcription=transcription,
-                    )
-                    logger.info(f"DetectedSound guardado correctamente: {ds}")
-                except Exception as e:
-                    logger.error(
-                        f"Error al guardar DetectedSound: {e}\n{traceback.format_exc()}"
-                    )
-            except SoundCategory.DoesNotExist:
-                logger.warning(
-                    f"No se encontró la categoría '{alert_category}' para el sonido detectado. No se guardó DetectedSound."
-                )
-            except Exception as e:
-                logger.error(
-                    f"Error inesperado al buscar categoría o guardar DetectedSound: {e}\n{traceback.format_exc()}"
-                )
+        uploads = request.FILES.getlist("audio")
+        if not uploads:
+            return Response({"error": "Se requiere al menos un archivo de audio"}, status=status.HTTP_400_BAD_REQUEST)
+        for upload in uploads:
+            _, error = _validate_audio_upload({"audio": upload})
+            if error:
+                return Response({"error": f"{upload.name}: {error}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        waveforms, names, offsets, error = batch_fragments(uploads, request.data.get("boundaries"))
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        start = time.perf_counter()
+        results = AGENT_MANAGER.get_agent("sound_detector").execute_batch(
+            waveforms,
+            names=names,
+            user_id=request.user.id,
+            transcription_mode=transcription_mode,
+        )
+        persist_batch_detections(request.user, results)
+
+        fragments = []
+        for result, offset, waveform in zip(results, offsets, waveforms):
+            fragments.append({
+                "index": result["index"],
+                "name": result["name"],
+                "start": round(offset, 3),
+                "duration": round(len(waveform) / SAMPLE_RATE, 3),
+                "activity_label": result["activity_label"],
+                "sound_type": result["sound_type"],
+                "sound_type_label": result["sound_type_label"],
+                "confidence": result["confidence"],
+                "alert_category": result["alert_category"],
+                "is_conversation_detected": result["is_conversation_detected"],
+                "transcription": result["transcription"],
+                "transcription_status": result["transcription_status"],
+                "transcription_job_id": result["transcription_job_id"],
+                "sound_detections": result["sound_detections"],
+                "detections_by_category": result["detections_by_category"],
+                "detected_sound_id": result["detected_sound_id"],
+            })
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"Lote procesado: {len(fragments)} fragmentos en {elapsed:.2f}s")
+        return Response(
+            {
+                "success": True,
+                "user_id": request.user.id,
+                "fragments": fragments,
+                "processing_seconds": round(elapsed, 3),
+            },
+            status=status.HTTP_200_OK,
+        )
 
-        # Preparar respuesta - solo incluir mensajes únicos y relevantes
-        messages = final_state.get("messages", [])
-        unique_messages = []
-        seen_contents = set()
+    except Exception as e:
+        logger.error(f"Error en procesamiento por lotes: {e}")
+        logger.exception("Traceback completo:")
+        return Response(
+            {"error": "Error interno del servidor", "details": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
 
-        for msg in messages:
-            if msg.content not in seen_contents:
-                unique_messages.append(msg)
-                seen_contents.add(msg.content)
 
-        response_data = {
-            "success": True,
-            "user_id": request.user.id,
-            "audio_id": audio_id,
-            "sound_type": final_state.get("sound_type", "Unknown"),
-            "sound_type_label": sound_type_label,  # <-- SIEMPRE INCLUIR EL LABEL EN ESPAÑOL
-            "confidence": final_state.get("confidence", 0.0),
-            "alert_category": final_state.get("alert_category", "unknown"),
-            "is_conversation_detected": final_state.get(
-                "is_conversation_detected", False
-            ),
-            "transcription": final_state.get("transcription", ""),
-            "sound_detections": final_state.get("sound_detections", []),
-            "messages": [
-                {
-                    "type": "system" if "ERROR" in msg.content else "info",
-                    "content": msg.content,
-                }
-                for msg in unique_messages
-            ],
-        }
+def _int_param(value):
+    """
+    Entero no negativo de un parámetro de la petición.
 
-        logger.info(
-            f"Procesamiento completado: {response_data['sound_type']} (confianza: {response_data['confidence']:.2f})"
+    Returns:
+        int: Valor, o None si falta o no es válido
+    """
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number >= 0 else None
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def upload_sessions_view(request):
+    """
+    Endpoint para abrir una subida troceada de una grabación larga.
+
+    Acepta `format` (wav, o pcm_s16le / pcm_s32le / pcm_f32le con
+    `sample_rate` y `channels`). Los trozos se envían después a
+    upload-sessions/<id>/chunks/ con su offset en bytes.
+
+    Args:
+        request: Request HTTP
+
+    Returns:
+        Response: Estado de la sesión con session_id y offset 0
+    """
+    audio_format = request.data.get("format", "wav")
+    sample_rate = request.data.get("sample_rate")
+    channels = request.data.get("channels", 1)
+    if (sample_rate is not None and _int_param(sample_rate) is None) or _int_param(channels) is None:
+        return Response(
+            {"error": "sample_rate y channels deben ser enteros"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        session = upload_sessions.create(
+            request.user.id,
+            audio_format=audio_format,
+            sample_rate=_int_param(sample_rate),
+            channels=_int_param(channels),
+        )
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(session, status=status.HTTP_201_CREATED)
+
+
+@api_view(["GET", "DELETE"])
+@permission_classes([IsAuthenticated])
+def upload_session_view(request, session_id):
+    """
+    Endpoint de consulta (o descarte) de una subida troceada.
+
+    Mientras la subida sigue en curso devuelve las detecciones hasta el
+    último trozo analizado (los eventos aún abiertos llevan open=True) y el
+    offset confirmado desde el que reanudar.
+
+    Args:
+        request: Request HTTP
+        session_id: Identificador de la sesión
+
+    Returns:
+        Response: Estado de la sesión y detecciones parciales
+    """
+    if request.method == "DELETE":
+        if not upload_sessions.discard(session_id, request.user.id):
+            return Response({"error": "Sesión de subida no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    session = upload_sessions.get(session_id, request.user.id)
+    if session is None:
+        return Response({"error": "Sesión de subida no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(session, status=status.HTTP_200_OK)
+
+
+@api_view(["POST", "PUT"])
+@permission_classes([IsAuthenticated])
+def upload_session_chunk(request, session_id):
+    """
+    Endpoint para enviar un trozo de una subida troceada.
+
+    El trozo va en el cuerpo crudo de la petición (application/octet-stream)
+    o como archivo `chunk` en multipart. El offset en bytes se indica con la
+    cabecera `Upload-Offset` o el parámetro `offset`; `chunk_index` es
+    opcional. Si el offset deja un hueco se responde 409 con el offset
+    esperado; los trozos ya recibidos se aceptan sin reprocesarlos.
+
+    Args:
+        request: Request HTTP con el trozo
+        session_id: Identificador de la sesión
+
+    Returns:
+        Response: Estado de la sesión con el nuevo offset y las detecciones parciales
+    """
+    offset = _int_param(request.headers.get("Upload-Offset", request.query_params.get("offset")))
+    chunk_index = _int_param(request.headers.get("Upload-Chunk-Index", request.query_params.get("chunk_index")))
+    if request.content_type.startswith("multipart/"):
+        chunk = request.FILES.get("chunk")
+        data = chunk.read() if chunk is not None else b""
+        if offset is None:
+            offset = _int_param(request.data.get("offset"))
+        if chunk_index is None:
+            chunk_index = _int_param(request.data.get("chunk_index"))
+    else:
+        data = request.body
+    if offset is None:
+        return Response(
+            {"error": "Falta el offset del trozo (cabecera Upload-Offset o parámetro offset)"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if not data:
+        return Response({"error": "El trozo está vacío"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        session = upload_sessions.append(session_id, request.user.id, offset, data, chunk_index=chunk_index)
+    except UploadSessionConflict as e:
+        return Response(
+            {"error": str(e), "expected_offset": e.expected_offset},
+            status=status.HTTP_409_CONFLICT,
         )
-        logger.info(f"Audio ID generado: {audio_id}")
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if session is None:
+        return Response({"error": "Sesión de subida no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+
+    response = Response(session, status=status.HTTP_200_OK)
+    response["Upload-Offset"] = str(session["offset"])
+    return response
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def upload_session_complete(request, session_id):
+    """
+    Endpoint para cerrar una subida troceada.
+
+    Analiza el audio pendiente, transcribe las regiones con voz (o encola un
+    trabajo con `transcription_mode=async`) y guarda la detección igual que
+    process_audio. Con `retain_audio` el audio queda disponible en get_audio.
 
-        # Limpiar archivos antiguos
-        cleanup_old_audios()
+    Args:
+        request: Request HTTP
+        session_id: Identificador de la sesión
 
+    Returns:
+        Response: Mismo cuerpo que process_audio más session_id, duration y speech_intervals
+    """
+    transcription_mode = _transcription_mode(request.data, request.query_params)
+    if transcription_mode is None:
+        return Response(
+            {"error": "transcription_mode debe ser 'sync' o 'async'"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        result = upload_sessions.complete(
+            session_id,
+            request.user.id,
+            transcription_mode=transcription_mode,
+            retain_audio=_retain_audio(request.data, request.query_params),
+        )
+        if result is None:
+            return Response({"error": "Sesión de subida no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+
+        final_state = dict(
+            result,
+            timestamp=datetime.now().isoformat(),
+            messages=[
+                HumanMessage(
+                    content=f"Grabación de {result['duration']} s analizada: "
+                    f"{len(result['sound_events'])} eventos, sonido principal {result['sound_type']}"
+                )
+            ],
+        )
+        response_data = _build_process_audio_response(request.user, final_state)
+        response_data.update(
+            session_id=session_id,
+            duration=result["duration"],
+            speech_intervals=result["speech_intervals"],
+        )
         return Response(response_data, status=status.HTTP_200_OK)
 
+    except UploadSessionConflict as e:
+        return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
     except Exception as e:
-        logger.error(f"Error en procesamiento de audio: {e}")
+        logger.error(f"Error completando la sesión de subida {session_id}: {e}")
         logger.exception("Traceback completo:")
         return Response(
             {"error": "Error interno del servidor", "details": str(e)},
@@ -321,86 +734,129 @@ def process_audio(request):
         )
 
 
+def _iter_blocks(view):
+    """Recorre una vista del clip (mmap o transcodificación) en bloques para StreamingHttpResponse."""
+    block = AUDIO_RETENTION_CONFIG["stream_block_bytes"]
+    for start in range(0, len(view), block):
+        yield view[start:start + block]
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, AudioFileRenderer])
 def get_audio(request, audio_id):
     """
     Endpoint para obtener el audio procesado.
 
+    El audio se sirve en el formato almacenado si el cliente lo acepta (o si
+    `Accept` no pide ningún audio) y, si no, se transcodifica al que pida
+    `Accept` (audio/flac, audio/ogg, audio/wav) o el parámetro `audio_format`;
+    solo un `audio_format` no admitido devuelve 406. Admite peticiones por rango
+    (Range / If-Range) y condicionales (If-None-Match con el ETag).
+
     Args:
         request: Request HTTP
         audio_id: ID único del audio procesado
 
     Returns:
-        FileResponse: Archivo de audio
+        HttpResponse: Audio completo (200), un rango (206), 304 si el cliente
+        ya tiene esa versión o JSON de error
     """
     try:
         logger.info(f"Intentando obtener audio: {audio_id}")
         logger.info(f"Usuario solicitante: {request.user.id}")
-        logger.info(f"Audios disponibles: {list(processed_audios.keys())}")
-
-        # Verificar que el audio existe y pertenece al usuario
-        if audio_id not in processed_audios:
-            logger.error(f"Audio {audio_id} no encontrado en processed_audios")
-            return Response(
-                {"error": "Audio no encontrado"}, status=status.HTTP_404_NOT_FOUND
-            )
 
-        audio_info = processed_audios[audio_id]
-        logger.info(f"Información del audio: {audio_info}")
+        # Verificar que el audio existe (y no ha caducado) y pertenece al usuario
+        audio_info = audio_registry.get(audio_id)
+        if audio_info is None:
+            logger.error(f"Audio {audio_id} no encontrado en el registro")
+            return JsonResponse({"error": "Audio no encontrado"}, status=status.HTTP_404_NOT_FOUND)
 
         # Verificar que el usuario tiene acceso al audio
         if audio_info["user_id"] != request.user.id:
             logger.error(
                 f"Usuario {request.user.id} no tiene acceso al audio {audio_id}"
             )
-            return Response(
-                {"error": "Acceso denegado"}, status=status.HTTP_403_FORBIDDEN
-            )
-
-        audio_path = audio_info["audio_path"]
-        logger.info(f"Ruta del archivo: {audio_path}")
-
-        # Verificar que el archivo existe
-        if not os.path.exists(audio_path):
-            logger.error(f"Archivo no encontrado en disco: {audio_path}")
-            return Response(
-                {"error": "Archivo de audio no encontrado en el servidor"},
-                status=status.HTTP_404_NOT_FOUND,
-            )
-
-        file_size = os.path.getsize(audio_path)
-        logger.info(f"Tamaño del archivo: {file_size} bytes")
+            return JsonResponse({"error": "Acceso denegado"}, status=status.HTTP_403_FORBIDDEN)
 
-        if file_size == 0:
-            logger.error(f"Archivo vacío: {audio_path}")
-            return Response(
+        audio_key = audio_info["audio_key"]
+        if audio_info["size"] == 0:
+            logger.error(f"Audio vacío: {audio_key}")
+            return JsonResponse(
                 {"error": "Archivo de audio está vacío"},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        # Servir el archivo de audio
-        try:
-            response = FileResponse(open(audio_path, "rb"), content_type="audio/wav")
-            response["Content-Disposition"] = (
-                f'attachment; filename="audio_{audio_id}.wav"'
+        audio_format = audio_archive.negotiate(
+            request.headers.get("Accept", ""),
+            audio_info["format"],
+            requested=request.query_params.get("audio_format"),
+        )
+        if audio_format is None:
+            return JsonResponse(
+                {
+                    "error": "Formato de audio no aceptable",
+                    "available": sorted({audio_info["format"], *ENCODABLE_FORMATS}),
+                },
+                status=status.HTTP_406_NOT_ACCEPTABLE,
             )
-            response["Content-Length"] = file_size
 
-            logger.info(f"Archivo enviado exitosamente: {audio_id} ({file_size} bytes)")
+        stored = audio_format == audio_info["format"]
+        etag = f'"{audio_info["etag"]}"' if stored else f'"{audio_info["etag"]}-{audio_format}"'
+        # El ETag no depende del contenido servido: 304 sin leer ni transcodificar
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response["ETag"] = etag
+            response["Vary"] = "Accept"
             return response
 
-        except Exception as e:
-            logger.error(f"Error al abrir/leer archivo {audio_path}: {e}")
-            return Response(
-                {"error": "Error al leer el archivo de audio"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        # Formato almacenado: vista sobre el mmap del segmento; otro formato: transcodificado
+        if stored:
+            body, content_type = audio_archive.read(audio_key), audio_info["content_type"]
+        else:
+            body, content_type = audio_archive.transcode(audio_key, audio_format), content_type_for(audio_format)
+        if body is None:
+            logger.error(f"Clip no encontrado en el almacén: {audio_key}")
+            return JsonResponse(
+                {"error": "Archivo de audio no encontrado en el servidor"},
+                status=status.HTTP_404_NOT_FOUND,
             )
+        body = memoryview(body)
+        size = len(body)
+        extension = ENCODABLE_FORMATS[audio_format]["suffix"] if audio_format in ENCODABLE_FORMATS else f".{audio_format}"
+
+        byte_range = None
+        if_range = request.headers.get("If-Range")
+        if not if_range or etag_matches(if_range, etag):
+            byte_range = parse_range(request.headers.get("Range"), size)
+        if byte_range is False:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1
+        response = StreamingHttpResponse(_iter_blocks(body[start:end + 1]), content_type=content_type)
+        if byte_range:
+            response.status_code = status.HTTP_206_PARTIAL_CONTENT
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        response["Content-Length"] = length
+        response["Content-Disposition"] = f'attachment; filename="audio_{audio_id}{extension}"'
+        response["Accept-Ranges"] = "bytes"
+        response["ETag"] = etag
+        response["Vary"] = "Accept"
+        response["Cache-Control"] = "private, max-age=3600"
+
+        logger.info(
+            f"Audio enviado: {audio_id} ({audio_format}, {length} de {size} bytes, status {response.status_code})"
+        )
+        return response
 
     except Exception as e:
         logger.error(f"Error al servir audio {audio_id}: {e}")
         logger.exception("Traceback completo:")
-        return Response(
+        return JsonResponse(
             {"error": "Error al servir el audio"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
@@ -432,6 +888,203 @@ def health_check(request):
         )
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated | HasMetricsScrapeToken])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, PrometheusTextRenderer])
+def metrics(request):
+    """
+    Endpoint con las métricas internas del agente (colas, lotes, latencias,
+    tiempos por nodo de los workflows).
+
+    Con ?format=prometheus o Accept: text/plain; version=0.0.4 (el que envía
+    Prometheus) devuelve el formato de texto de Prometheus para su scraping.
+    Además de con un JWT se puede leer con el token estático de
+    METRICS_SCRAPE_TOKEN (Authorization: Token <token>), que no caduca.
+
+    Los valores son los del proceso que atiende la petición: con varios
+    workers cada scrape ve solo los contadores de uno de ellos.
+
+    Returns:
+        Response: Métricas por nombre con su tipo y valores
+    """
+    try:
+        if request.accepted_renderer.format == PrometheusTextRenderer.format:
+            return Response(metrics_registry.to_prometheus(), status=status.HTTP_200_OK)
+        return Response(metrics_registry.snapshot(), status=status.HTTP_200_OK)
+    except Exception as e:
+        logger.error(f"Error obteniendo métricas: {e}")
+        return Response(
+            {"error": "Error obteniendo métricas"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+def _transcription_job_status(job_id, user):
+    """
+    Estado de un trabajo de transcripción del usuario: en memoria mientras se
+    conserva y, si ya expiró, desde la fila DetectedSound asociada.
+    """
+    job = transcription_jobs.get(job_id, user_id=user.id)
+    if job is not None:
+        return job
+
+    detected = DetectedSound.objects.filter(user=user, transcription_job_id=job_id).first()
+    if detected is None:
+        return None
+    return {
+        "job_id": job_id,
+        "transcription_status": detected.transcription_status,
+        "transcription": detected.transcription or "",
+        "error": None,
+        "detected_sound_id": detected.id,
+    }
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def transcription_job(request, job_id):
+    """
+    Endpoint de consulta de una transcripción diferida.
+
+    Args:
+        request: Request HTTP
+        job_id: Identificador devuelto por process_audio en modo async
+
+    Returns:
+        Response: job_id, transcription_status, transcription, error y detected_sound_id
+    """
+    job = _transcription_job_status(job_id, request.user)
+    if job is None:
+        return Response(
+            {"error": "Trabajo de transcripción no encontrado"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    return Response(job, status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def transcription_job_stream(request, job_id):
+    """
+    Endpoint SSE que envía la transcripción diferida en cuanto está lista.
+
+    Emite un evento `transcription` con el mismo cuerpo que el endpoint de
+    consulta y cierra la conexión; mientras espera envía comentarios
+    keep-alive. Si se agota el tiempo, emite un evento `timeout`.
+
+    Args:
+        request: Request HTTP
+        job_id: Identificador devuelto por process_audio en modo async
+
+    Returns:
+        StreamingHttpResponse: Flujo text/event-stream
+    """
+    if _transcription_job_status(job_id, request.user) is None:
+        return Response(
+            {"error": "Trabajo de transcripción no encontrado"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    user = request.user
+
+    def events():
+        keepalive = TRANSCRIPTION_JOBS_CONFIG["stream_keepalive_seconds"]
+        deadline = time.monotonic() + TRANSCRIPTION_JOBS_CONFIG["stream_timeout_seconds"]
+        while True:
+            # Un trabajo que no está en memoria de este proceso no va a avanzar aquí:
+            # se envía el estado guardado en la base de datos
+            job = transcription_jobs.get(job_id, user_id=user.id)
+            if job is None or job["transcription_status"] != PENDING:
+                job = _transcription_job_status(job_id, user)
+                yield f"event: transcription\ndata: {json.dumps(job, default=str)}\n\n"
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                yield f"event: timeout\ndata: {json.dumps({'job_id': job_id})}\n\n"
+                return
+            if not transcription_jobs.wait(job_id, timeout=min(keepalive, remaining)):
+                yield ": keep-alive\n\n"
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _audio_processor():
+    """Procesador de audio compartido por el agente de detección de sonidos."""
+    return AGENT_MANAGER.get_agent("sound_detector").workflow.nodes.audio_processor
+
+
+class CustomSoundView(APIView):
+    """
+    Sonidos personalizados del usuario: se enseñan con unos pocos clips y se
+    detectan con los embeddings del mismo pase de YAMNet.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # Solo lee el almacén en disco: no hace falta cargar YAMNet
+        custom_heads = _audio_processor().custom_heads
+        if custom_heads is None:
+            return Response({"custom_sounds": []}, status=status.HTTP_200_OK)
+        return Response(
+            {"custom_sounds": custom_heads.list_labels(request.user.id)},
+            status=status.HTTP_200_OK,
+        )
+
+    def post(self, request):
+        label = (request.data.get("label") or "").strip()
+        clips = request.FILES.getlist("audio")
+        if not label or not clips:
+            return Response(
+                {"error": "Se requiere 'label' y al menos un archivo 'audio'"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        max_clips = CUSTOM_SOUND_HEADS_CONFIG["max_clips"]
+        max_clip_bytes = CUSTOM_SOUND_HEADS_CONFIG["max_clip_mb"] * 1024 * 1024
+        if len(clips) > max_clips:
+            return Response(
+                {"error": f"Máximo {max_clips} clips por petición"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if any(clip.size > max_clip_bytes for clip in clips):
+            return Response(
+                {"error": f"Cada clip debe ocupar como máximo {CUSTOM_SOUND_HEADS_CONFIG['max_clip_mb']} MB"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            with _audio_processor().use_analyzer() as analyzer:
+                head = analyzer.train_custom_sound(
+                    request.user.id,
+                    label,
+                    [clip.read() for clip in clips],
+                    alert_category=request.data.get("alert_category"),
+                )
+            logger.info(f"Sonido personalizado '{label}' entrenado para usuario {request.user.id} con {len(clips)} clips")
+            return Response(
+                {"label": label, "clips": len(clips), "custom_sounds": head.labels},
+                status=status.HTTP_201_CREATED,
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error entrenando sonido personalizado: {e}")
+            return Response(
+                {"error": "No se pudo entrenar el sonido personalizado", "details": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    def delete(self, request):
+        label = (request.data.get("label") or request.query_params.get("label") or "").strip()
+        with _audio_processor().use_analyzer() as analyzer:
+            removed = analyzer.remove_custom_sound(request.user.id, label)
+        if not removed:
+            return Response({"error": f"Sonido personalizado '{label}' no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def process_audio_legacy(request):
@@ -8,10 +8,14 @@ from langchain_core.messages import HumanMessage
 from langgraph.graph import StateGraph, START, END
 from ..nodes.chatbot_nodes import ChatbotNodes
 from ..states.chatbot_state import ChatbotState
+from ..services.workflow_metrics_service import workflow_metrics
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Etiqueta del workflow en las métricas por nodo
+WORKFLOW_NAME = "chatbot"
+
 
 class ChatbotWorkflow:
 
@@ -31,15 +35,15 @@ class ChatbotWorkflow:
         self.workflow_graph = StateGraph(ChatbotState)
         
         # Añadir nodo de clasificación de intención
-        self.workflow_graph.add_node("classify_intent_node", self.nodes.classify_intent_node)
+        self.workflow_graph.add_node("classify_intent_node", self._instrumented_node("classify_intent_node"))
         
         # Añadir nodos específicos por categoría de intención
-        self.workflow_graph.add_node("hearing_aids_node", self.nodes.hearing_aids_node)
-        self.workflow_graph.add_node("medical_center_node", self.nodes.medical_center_node)
-        self.workflow_graph.add_node("medical_news_node", self.nodes.medical_news_node)
-        self.workflow_graph.add_node("sound_report_node", self.nodes.sound_report_node)
-        self.workflow_graph.add_node("general_query_node", self.nodes.general_query_node)
-        self.workflow_graph.add_node("generate_image_node", self.nodes.generate_image_node)
+        self.workflow_graph.add_node("hearing_aids_node", self._instrumented_node("hearing_aids_node"))
+        self.workflow_graph.add_node("medical_center_node", self._instrumented_node("medical_center_node"))
+        self.workflow_graph.add_node("medical_news_node", self._instrumented_node("medical_news_node"))
+        self.workflow_graph.add_node("sound_report_node", self._instrumented_node("sound_report_node"))
+        self.workflow_graph.add_node("general_query_node", self._instrumented_node("general_query_node"))
+        self.workflow_graph.add_node("generate_image_node", self._instrumented_node("generate_image_node"))
         
         # Definir los bordes del chatbot
         # 1. El flujo comienza con clasificación de intención
@@ -48,7 +52,7 @@ class ChatbotWorkflow:
         # 2. Borde condicional desde 'classify_intent_node' hacia nodos específicos
         self.workflow_graph.add_conditional_edges(
             "classify_intent_node",
-            self._route_to_specific_node,
+            workflow_metrics.instrument_router(WORKFLOW_NAME, "classify_intent_node", self._route_to_specific_node),
             {
                 "hearing_aids_node": "hearing_aids_node",
                 "medical_center_node": "medical_center_node",
@@ -75,6 +79,10 @@ class ChatbotWorkflow:
             self.logger.error(f"Error compilando workflow: {e}")
             self.compiled_workflow = None
     
+    def _instrumented_node(self, name: str):
+        """Nodo envuelto con las métricas de tiempo y resultado."""
+        return workflow_metrics.instrument_node(WORKFLOW_NAME, name, getattr(self.nodes, name))
+    
     def _route_to_specific_node(self, state: dict) -> str:
         """
         Rutea hacia el nodo específico según la intención detectada.
@@ -8,10 +8,24 @@ from langchain_core.messages import HumanMessage
 from langgraph.graph import StateGraph, START, END
 from ..states.sound_detector_state import SoundDetectorState
 from ..nodes.sound_detector_nodes import SoundDetectorNodes
+from ..tools.audio_analyzer.activity_gate import SILENT, NOISE
+from ..config import (
+    ACTIVITY_GATE_CONFIG,
+    TRANSCRIPTION_JOBS_CONFIG,
+    DEMUCS_CONFIG,
+    DIARIZATION_CONFIG,
+    AUDIO_INGESTION_CONFIG,
+    is_conversation,
+)
+from ..services.transcription_job_service import COMPLETED
+from ..services.workflow_metrics_service import workflow_metrics
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Etiqueta del workflow en las métricas por nodo
+WORKFLOW_NAME = "sound_detector"
+
 
 class SoundDetectorWorkflow:
     """
@@ -25,53 +39,151 @@ class SoundDetectorWorkflow:
         self.nodes = SoundDetectorNodes()
         self.workflow_graph = None
         self.compiled_workflow = None
+        self.async_workflow_graph = None
+        self.async_compiled_workflow = None
         self._create_workflow()
     
-    def _create_workflow(self):
-        """Crea y configura el grafo de flujo de trabajo del agente."""
-        self.logger.info("Creando workflow del agente")
+    def _build_graph(self, node) -> StateGraph:
+        """
+        Construye el grafo de flujo de trabajo del agente.
         
-        # Crear el grafo
-        self.workflow_graph = StateGraph(SoundDetectorState)
+        Args:
+            node: Función que devuelve la implementación de un nodo por nombre
+                (síncrona para invoke, asíncrona para ainvoke)
+            
+        Returns:
+            StateGraph: Grafo sin compilar
+        """
+        graph = StateGraph(SoundDetectorState)
         
         # Añadir nodos
-        self.workflow_graph.add_node("save_uploaded_audio_node", self.nodes.save_uploaded_audio_node)
-        self.workflow_graph.add_node("audio_analysis_node", self.nodes.audio_analysis_node)
-        self.workflow_graph.add_node("audio_transcription_node", self.nodes.audio_transcription_node)
-        self.workflow_graph.add_node("show_sound_type_node", self.nodes.show_sound_type_node)
-        self.workflow_graph.add_node("cleanup_audio_node", self.nodes.cleanup_audio_node)
+        graph.add_node("activity_gate_node", node("activity_gate_node"))
+        graph.add_node("save_uploaded_audio_node", node("save_uploaded_audio_node"))
+        graph.add_node("cache_lookup_node", node("cache_lookup_node"))
+        graph.add_node("audio_analysis_node", node("audio_analysis_node"))
+        graph.add_node("source_separation_node", node("source_separation_node"))
+        graph.add_node("audio_transcription_node", node("audio_transcription_node"))
+        graph.add_node("speaker_diarization_node", node("speaker_diarization_node"))
+        graph.add_node("show_sound_type_node", node("show_sound_type_node"))
+        graph.add_node("cache_store_node", node("cache_store_node"))
+        graph.add_node("cleanup_audio_node", node("cleanup_audio_node"))
         
         # Definir los bordes
-        # 1. El flujo comienza con guardar el audio subido
-        self.workflow_graph.add_edge(START, "save_uploaded_audio_node")
+        # 1. El flujo comienza con la puerta de actividad: los clips silenciosos
+        #    no se escriben a disco ni pasan por los modelos
+        graph.add_edge(START, "activity_gate_node")
+        graph.add_conditional_edges(
+            "activity_gate_node",
+            self._route("activity_gate_node", self._decide_after_activity_gate),
+            {
+                "save_uploaded_audio_node": "save_uploaded_audio_node",
+                "show_sound_type_node": "show_sound_type_node"
+            }
+        )
         
-        # 2. Después de guardar, el audio se analiza
-        self.workflow_graph.add_edge("save_uploaded_audio_node", "audio_analysis_node")
+        # 2. Después de guardar, se busca un resultado previo del mismo audio;
+        #    si existe, se salta directamente a la limpieza sin ejecutar modelos
+        graph.add_edge("save_uploaded_audio_node", "cache_lookup_node")
+        graph.add_conditional_edges(
+            "cache_lookup_node",
+            self._route("cache_lookup_node", self._decide_after_cache_lookup),
+            {
+                "audio_analysis_node": "audio_analysis_node",
+                "cleanup_audio_node": "cleanup_audio_node"
+            }
+        )
         
         # 3. Borde condicional desde 'audio_analysis_node'
-        self.workflow_graph.add_conditional_edges(
+        graph.add_conditional_edges(
             "audio_analysis_node",
-            self._decide_what_to_do_with_audio,
+            self._route("audio_analysis_node", self._decide_what_to_do_with_audio),
             {
+                "source_separation_node": "source_separation_node",
                 "audio_transcription_node": "audio_transcription_node",
                 "show_sound_type_node": "show_sound_type_node"
             }
         )
+        # La separación de voz (opcional) siempre desemboca en la transcripción
+        graph.add_edge("source_separation_node", "audio_transcription_node")
         
-        # 4. Después de procesar, limpiar archivos temporales
-        self.workflow_graph.add_edge("audio_transcription_node", "cleanup_audio_node")
-        self.workflow_graph.add_edge("show_sound_type_node", "cleanup_audio_node")
+        # 4. Tras transcribir, diarización opcional; después guardar el resultado
+        #    en caché y limpiar archivos temporales
+        graph.add_conditional_edges(
+            "audio_transcription_node",
+            self._route("audio_transcription_node", self._decide_after_transcription),
+            {
+                "speaker_diarization_node": "speaker_diarization_node",
+                "cache_store_node": "cache_store_node"
+            }
+        )
+        graph.add_edge("speaker_diarization_node", "cache_store_node")
+        graph.add_edge("show_sound_type_node", "cache_store_node")
+        graph.add_edge("cache_store_node", "cleanup_audio_node")
         
         # 5. El nodo de limpieza termina el flujo
-        self.workflow_graph.add_edge("cleanup_audio_node", END)
+        graph.add_edge("cleanup_audio_node", END)
+        
+        return graph
+    
+    def _create_workflow(self):
+        """Crea y configura el grafo de flujo de trabajo del agente (versiones síncrona y asíncrona)."""
+        self.logger.info("Creando workflow del agente")
+        
+        self.workflow_graph = self._build_graph(self._instrumented_node)
+        # Mismo grafo con nodos asíncronos: la inferencia va al pool acotado de hilos.
+        # Se instrumenta la función síncrona para que el tiempo de CPU sea el del
+        # hilo que ejecuta la inferencia y no el del bucle de eventos
+        self.async_workflow_graph = self._build_graph(
+            lambda name: self.nodes.async_node(name, self._instrumented_node(name))
+        )
         
         # Compilar el workflow
         try:
             self.compiled_workflow = self.workflow_graph.compile()
+            self.async_compiled_workflow = self.async_workflow_graph.compile()
             self.logger.info("Workflow creado y compilado exitosamente")
         except Exception as e:
             self.logger.error(f"Error compilando workflow: {e}")
             self.compiled_workflow = None
+            self.async_compiled_workflow = None
+    
+    def _instrumented_node(self, name: str):
+        """Nodo síncrono envuelto con las métricas de tiempo y resultado."""
+        return workflow_metrics.instrument_node(WORKFLOW_NAME, name, getattr(self.nodes, name))
+    
+    def _route(self, source: str, decide):
+        """Función de decisión envuelta para contar la ruta tomada tras 'source'."""
+        return workflow_metrics.instrument_router(WORKFLOW_NAME, source, decide)
+    
+    def _decide_after_activity_gate(self, state: SoundDetectorState) -> str:
+        """
+        Función de decisión tras la puerta de actividad.
+        
+        Args:
+            state: Estado actual del agente
+            
+        Returns:
+            str: Nombre del siguiente nodo a ejecutar
+        """
+        if state.get("activity_label") == SILENT:
+            self.logger.info("Decisión: Clip silencioso, se omiten YAMNet y Whisper")
+            return "show_sound_type_node"
+        return "save_uploaded_audio_node"
+    
+    def _decide_after_cache_lookup(self, state: SoundDetectorState) -> str:
+        """
+        Función de decisión tras consultar la caché de resultados.
+        
+        Args:
+            state: Estado actual del agente
+            
+        Returns:
+            str: Nombre del siguiente nodo a ejecutar
+        """
+        if state.get("cache_hit"):
+            self.logger.info("Decisión: Resultado en caché, sin ejecutar modelos")
+            return "cleanup_audio_node"
+        return "audio_analysis_node"
     
     def _decide_what_to_do_with_audio(self, state: SoundDetectorState) -> str:
         """
@@ -91,14 +203,52 @@ class SoundDetectorWorkflow:
         
         self.logger.info(f"Decisión basada en: {sound_type} (confianza: {confidence:.2f})")
         
+        # Un clip que la puerta de actividad clasificó como solo ruido no se transcribe
+        if state.get("activity_label") == NOISE and ACTIVITY_GATE_CONFIG['skip_transcription_on_noise']:
+            self.logger.info("Decisión: Mostrar tipo de sonido (solo ruido, sin transcripción)")
+            return "show_sound_type_node"
+        
         # Si es conversación y tiene buena confianza, transcribir
-        if sound_type == "Speech" and confidence > 0.5:
+        if is_conversation(sound_type, confidence):
+            if DEMUCS_CONFIG['enabled'] and self._has_background_sounds(state):
+                self.logger.info("Decisión: Separar voz y transcribir (conversación con ruido de fondo)")
+                return "source_separation_node"
             self.logger.info("Decisión: Transcribir audio (conversación detectada)")
             return "audio_transcription_node"
         else:
             self.logger.info("Decisión: Mostrar tipo de sonido (no es conversación)")
             return "show_sound_type_node"
     
+    def _decide_after_transcription(self, state: SoundDetectorState) -> str:
+        """
+        Función de decisión tras la transcripción.
+        
+        Args:
+            state: Estado actual del agente
+            
+        Returns:
+            str: Nombre del siguiente nodo a ejecutar
+        """
+        # En modo diferido la diarización se hace dentro del trabajo de transcripción
+        if (
+            DIARIZATION_CONFIG['enabled']
+            and state.get("transcription_status") == COMPLETED
+            and state.get("transcription")
+        ):
+            self.logger.info("Decisión: Diarizar la conversación")
+            return "speaker_diarization_node"
+        return "cache_store_node"
+    
+    def _has_background_sounds(self, state: SoundDetectorState) -> bool:
+        """
+        Indica si junto a la voz hay otros sonidos relevantes con confianza
+        suficiente como para que merezca la pena separar la voz.
+        """
+        return any(
+            detection[0] != "Speech" and detection[1] >= DEMUCS_CONFIG['min_background_confidence']
+            for detection in state.get("sound_detections", [])
+        )
+    
     def get_initial_state(self) -> SoundDetectorState:
         """
         Crea el estado inicial del agente.
@@ -111,9 +261,24 @@ class SoundDetectorWorkflow:
             "is_conversation_detected": False,
             "audio_file": None,
             "audio_path": "",
+            "audio_buffer": None,
+            "retain_audio": AUDIO_INGESTION_CONFIG['retain_audio_default'],
             "sound_type": "",
             "transcription": "",
-            "confidence": 0.0
+            "confidence": 0.0,
+            "detections_by_category": {},
+            "sound_events": [],
+            "user_id": None,
+            "cache_key": None,
+            "cache_hit": False,
+            "activity_label": "",
+            "speech_intervals": [],
+            "transcription_mode": TRANSCRIPTION_JOBS_CONFIG['default_mode'],
+            "transcription_status": "",
+            "transcription_job_id": None,
+            "separate_vocals": False,
+            "separated_audio": None,
+            "stage_timings": {}
         }
     
     def execute(self, initial_state: SoundDetectorState) -> SoundDetectorState:
@@ -135,3 +300,23 @@ class SoundDetectorWorkflow:
         except Exception as e:
             self.logger.error(f"Error ejecutando workflow: {e}")
             raise
+    
+    async def aexecute(self, initial_state: SoundDetectorState) -> SoundDetectorState:
+        """
+        Ejecuta el workflow de forma asíncrona (ainvoke) con el estado inicial proporcionado.
+        
+        Args:
+            initial_state: Estado inicial para la ejecución
+            
+        Returns:
+            AgentState: Estado final después de la ejecución
+        """
+        if not self.async_compiled_workflow:
+            raise RuntimeError("Workflow no está compilado correctamente")
+        
+        try:
+            final_state = await self.async_compiled_workflow.ainvoke(initial_state)
+            return final_state
+        except Exception as e:
+            self.logger.error(f"Error ejecutando workflow: {e}")
+            raise
@@ -1,3 +1,6 @@
+import hmac
+
+from django.conf import settings
 from rest_framework import permissions
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -9,3 +12,15 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return request.user and request.user.is_authenticated
         return request.user and request.user.is_staff
+
+
+class HasMetricsScrapeToken(permissions.BasePermission):
+    """
+    Permite leer las métricas con el token estático METRICS_SCRAPE_TOKEN
+    (Authorization: Token <token>), para scrapers que no renuevan un JWT.
+    """
+
+    def has_permission(self, request, view):
+        token = getattr(settings, "METRICS_SCRAPE_TOKEN", "")
+        scheme, _, credentials = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+        return bool(token) and scheme.lower() == "token" and hmac.compare_digest(credentials.strip(), token)
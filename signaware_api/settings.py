@@ -136,6 +136,18 @@ CORS_ALLOW_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
 
 CORS_ALLOW_HEADERS = list(default_headers) + [
     "authorization",
+    # Reproducción por rangos y peticiones condicionales de get_audio
+    "range",
+    "if-range",
+    "if-none-match",
+]
+
+# Cabeceras de get_audio legibles desde el frontend
+CORS_EXPOSE_HEADERS = [
+    "accept-ranges",
+    "content-range",
+    "content-length",
+    "etag",
 ]
 
 # =============================================================================
@@ -159,6 +171,13 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": False,
 }
 
+# =============================================================================
+# Metrics
+# =============================================================================
+# Token estático para que Prometheus lea /agent/metrics/ sin JWT
+# (cabecera Authorization: Token <token>); vacío = solo usuarios autenticados
+METRICS_SCRAPE_TOKEN = os.getenv("METRICS_SCRAPE_TOKEN", "")
+
 CSRF_TRUSTED_ORIGINS = [
     'https://safedriveapi.shop',
 ]